@@ -83,9 +83,9 @@ class CustomSocialAccountAdapter(DefaultSocialAccountAdapter):
         # Enviar email de bienvenida solo para usuarios nuevos
         if is_new_user and final_email:
             try:
-                from django.core.mail import send_mail
                 from django.conf import settings
                 from datetime import datetime
+                from .jobs import send_email_later, welcome_email_key
                 
                 # Verificar que tenemos la configuración necesaria
                 if not settings.DEFAULT_FROM_EMAIL:
@@ -125,18 +125,9 @@ El equipo de Bingo JyM
                     logger.info(f"Provider: {provider}")
                     logger.info(f"Usuario nuevo: {is_new_user}")
                     
-                    result = send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [final_email],
-                        fail_silently=False,  # No silenciar errores para poder debuggear
-                    )
-                    
-                    if result == 1:
-                        logger.info(f"✅ Email de bienvenida enviado EXITOSAMENTE a {final_email}, resultado: {result}")
-                    else:
-                        logger.warning(f"⚠️ Email de bienvenida NO se envió correctamente a {final_email}, resultado: {result}")
+                    # El envío lo hace el worker (trabajo email.send, con reintentos)
+                    welcome_job = send_email_later(subject, message, [final_email], idempotency_key=welcome_email_key(user))
+                    logger.info(f"✅ Email de bienvenida encolado para {final_email} (trabajo {welcome_job.id})")
             except Exception as e:
                 # Log el error pero no interrumpir el registro
                 logger.error(f"❌ ERROR CRÍTICO enviando email de bienvenida a {final_email} (social login): {str(e)}", exc_info=True)
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin
 from django.db import transaction
 from django.contrib import messages
@@ -9,10 +10,21 @@ from .models import (
     FlashMessage, Message, CreditRequest, WithdrawalRequest, Transaction,
     BankAccount, PrintableCard, Announcement, BingoTicket, DailyBingoSchedule, BingoTicketSettings,
     AccountsReceivable, AccountsReceivablePayment, PackageTemplate, Franchise, FranchiseManual,
-    DiceModuleSettings, DiceGame, DicePlayer, DiceRound, DiceMatchmakingQueue
+    DiceModuleSettings, DiceGame, DicePlayer, DiceRound, DiceMatchmakingQueue, OrganizerStats
 )
+from .utils.organizer_stats import stats_for_organizers
 
 # --- Admin para el Modelo de Usuario ---
+class UserChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # reputation_level de toda la página con una consulta y sin crear filas; los
+        # usuarios que no organizan quedan en cero (Bronce) sin calcular nada
+        stats = stats_for_organizers((user.id for user in self.result_list if user.is_organizer), save=False)
+        for user in self.result_list:
+            user.prefetched_organizer_stats = stats.get(user.id) or OrganizerStats(organizer_id=user.id)
+
+
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'credit_balance', 'reputation_level', 'manual_reputation', 'is_organizer', 'is_staff', 'is_blocked')
@@ -24,6 +36,9 @@ class CustomUserAdmin(UserAdmin):
     )
     readonly_fields = ('blocked_at', 'blocked_by')
 
+    def get_changelist(self, request, **kwargs):
+        return UserChangeList
+
 # --- Admin para Solicitudes de Crédito ---
 @admin.register(CreditRequest)
 class CreditRequestAdmin(admin.ModelAdmin):
@@ -7,4 +7,6 @@ class BingoAppConfig(AppConfig):
     
     def ready(self):
         # Importar señales para que se registren
-        import bingo_app.signals
\ No newline at end of file
+        import bingo_app.signals
+        # Registrar los trabajos en segundo plano (utils.jobs)
+        import bingo_app.jobs
\ No newline at end of file
@@ -1,80 +1,51 @@
 from decimal import Decimal
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 import asyncio
 from datetime import datetime
 from collections import defaultdict
-from .models import Game, Player, ChatMessage, Transaction, Message, User, DiceGame, DicePlayer
-from django.utils import timezone
-from django.db.models import Sum
+from .models import Game, ChatMessage, User, DiceGame, DicePlayer
+from .utils.bingo_patterns import find_game_winners
+from .utils.live_state import apply_live_state, get_live_state_store
+from .utils.auto_call_scheduler import get_auto_call_scheduler, runs_in_process
+from .utils.game_broadcast import buyer_group_name
+from .utils.dice_rounds import DiceRollError, roll_dice
+from .utils.conversations import send_private_message
+from .utils.game_events import PROTOCOL_VERSION, called_numbers_snapshot, number_called_event, replay_since
+
+logger = logging.getLogger(__name__)
 
 # Manager global para auto-calling persistente
 class AutoCallManager:
+    """
+    Fachada sobre el planificador distribuido (utils.auto_call_scheduler).
+    Las llamadas ya no dependen del consumer que las inició: el planificador
+    toma un lease por juego y publica number_called en el channel layer.
+    """
     _instance = None
-    _tasks = {}  # {game_id: task}
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
     
-    def start_auto_call(self, game_id, consumer):
+    def start_auto_call(self, game_id, consumer=None):
         """Inicia auto-calling persistente para un juego"""
-        if game_id in self._tasks and not self._tasks[game_id].done():
-            return  # Ya está ejecutándose
-        
-        print(f"🔄 AutoCallManager: Iniciando auto-calling persistente para juego {game_id}")
-        self._tasks[game_id] = asyncio.create_task(self._persistent_auto_call(game_id, consumer))
+        if not runs_in_process():
+            # El proceso autocall lo encuentra en su próxima búsqueda de juegos activos
+            return
+        scheduler = get_auto_call_scheduler()
+        scheduler.ensure_running()
+        print(f"🔄 AutoCallManager: Agendando auto-calling para juego {game_id}")
+        scheduler.schedule(game_id)
     
     def stop_auto_call(self, game_id):
         """Detiene auto-calling persistente para un juego"""
-        if game_id in self._tasks and not self._tasks[game_id].done():
-            print(f"🔄 AutoCallManager: Deteniendo auto-calling persistente para juego {game_id}")
-            self._tasks[game_id].cancel()
-            del self._tasks[game_id]
-    
-    async def _persistent_auto_call(self, game_id, consumer):
-        """Tarea persistente de auto-calling"""
-        try:
-            while True:
-                # Verificar si el juego sigue activo
-                game_active = await consumer.is_auto_calling_active()
-                if not game_active:
-                    print(f"🔄 AutoCallManager: Auto-calling terminado para juego {game_id} - juego inactivo")
-                    break
-                
-                # Llamar siguiente número
-                number = await consumer.call_next_number()
-                if not number:
-                    await asyncio.sleep(1)
-                    continue
-
-                called_numbers = await consumer.get_current_numbers()
-                
-                # Notificar a todos los conectados
-                await consumer.notify_number_called(number, called_numbers)
-
-                # Verificar ganadores
-                winner = await consumer.check_all_players_for_bingo()
-                if winner:
-                    prize = await consumer.process_winner(winner)
-                    await consumer.notify_game_ended(winner.user.username, prize, called_numbers)
-                    print(f"🔄 AutoCallManager: Auto-calling terminado para juego {game_id} - juego terminado")
-                    break
-
-                # Esperar intervalo
-                interval = await database_sync_to_async(lambda: consumer.game.auto_call_interval)()
-                await asyncio.sleep(interval)
-                
-        except asyncio.CancelledError:
-            print(f"🔄 AutoCallManager: Auto-calling cancelado para juego {game_id}")
-        except Exception as e:
-            print(f"❌ AutoCallManager: Error en auto-calling para juego {game_id}: {str(e)}")
-        finally:
-            if game_id in self._tasks:
-                del self._tasks[game_id]
+        print(f"🔄 AutoCallManager: Deteniendo auto-calling para juego {game_id}")
+        get_auto_call_scheduler().cancel(game_id)
 
 # Instancia global del manager
 auto_call_manager = AutoCallManager()
@@ -180,9 +151,18 @@ class BingoConsumer(AsyncWebsocketConsumer):
             self.game_group_name,
             self.channel_name
         )
+        # Grupo propio del jugador en esta sala: recibe el contenido de sus cartones
+        self.buyer_group_name = buyer_group_name(self.game_id, self.user.id)
+        await self.channel_layer.group_add(
+            self.buyer_group_name,
+            self.channel_name
+        )
         await self.accept()
         self.register_connection()
 
+        # Tras un reinicio el planificador retoma los juegos con auto-calling activo
+        get_auto_call_scheduler().ensure_running()
+
         # Enviar estado actual del juego al conectar
         await self.send_game_status()
         await self.broadcast_presence()
@@ -191,25 +171,46 @@ class BingoConsumer(AsyncWebsocketConsumer):
         """Envía el estado actual del juego al cliente"""
         game_data = await self.get_game_data()
 
+        # Instantánea compacta: bitset de números llamados + secuencia actual
         await self.send(text_data=json.dumps({
             'type': 'game_status',
             'is_started': game_data['is_started'],
             'is_finished': game_data['is_finished'],
             'is_auto_calling': game_data['is_auto_calling'],
             'current_number': game_data['current_number'],
-            'called_numbers': game_data['called_numbers'],
+            **called_numbers_snapshot(game_data['called_numbers']),
             'prize': float(game_data['prize']) if isinstance(game_data['prize'], Decimal) else game_data['prize'],
             'total_cards_sold': game_data['total_cards_sold'],
             'next_prize_target': game_data['next_prize_target'],
             'progress_percentage': game_data['progress_percentage']
         }))
 
+    async def send_numbers_replay(self, last_seq):
+        """Reenvía los números llamados después de last_seq (o una instantánea si no es válido)"""
+        game_data = await self.get_game_data()
+        numbers = replay_since(game_data['called_numbers'], last_seq)
+        if numbers is None:
+            await self.send_game_status()
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'numbers_replay',
+            'from_seq': last_seq,
+            'seq': len(game_data['called_numbers']),
+            'numbers': numbers
+        }))
+
     @database_sync_to_async
     def get_game_data(self):
         if not self.game:
             return None
             
-        self.game.refresh_from_db()
+        # Los números llamados, el premio y los cartones salen del estado vivo;
+        # de la base solo se releen los indicadores de la partida
+        if get_live_state_store().get(self.game.id) is not None:
+            self.game.refresh_from_db(fields=['is_started', 'is_finished', 'is_auto_calling'])
+            apply_live_state(self.game)
+        else:
+            self.game.refresh_from_db()
         return {
             'is_started': self.game.is_started,
             'is_finished': self.game.is_finished,
@@ -245,6 +246,11 @@ class BingoConsumer(AsyncWebsocketConsumer):
                 self.game_group_name,
                 self.channel_name
             )
+        if getattr(self, 'buyer_group_name', None):
+            await self.channel_layer.group_discard(
+                self.buyer_group_name,
+                self.channel_name
+            )
 
     @database_sync_to_async
     def get_game(self):
@@ -283,11 +289,9 @@ class BingoConsumer(AsyncWebsocketConsumer):
         if self.game.is_finished:
             return None
             
-        players = Player.objects.filter(game=self.game).select_related('user')
-        for player in players:
-            if player.check_bingo():
-                return player
-        return None
+        # Solo se evalúan los cartones que contienen los números nuevos
+        winners = find_game_winners(self.game)
+        return winners[0] if winners else None
 
     @database_sync_to_async
     def process_winner(self, player):
@@ -400,11 +404,7 @@ class BingoConsumer(AsyncWebsocketConsumer):
     async def notify_number_called(self, number, called_numbers):
         await self.channel_layer.group_send(
             self.game_group_name,
-            {
-                'type': 'number_called',
-                'number': number,
-                'called_numbers': called_numbers
-            }
+            number_called_event(number, len(called_numbers))
         )
 
     async def notify_game_ended(self, winner, prize, called_numbers):
@@ -414,7 +414,7 @@ class BingoConsumer(AsyncWebsocketConsumer):
                 'type': 'game_ended',
                 'winner': winner,
                 'prize': float(prize) if isinstance(prize, Decimal) else prize,
-                'called_numbers': called_numbers
+                'seq': len(called_numbers)
             }
         )
 
@@ -457,6 +457,14 @@ class BingoConsumer(AsyncWebsocketConsumer):
                 if message:
                     await self.handle_chat_message(message)
 
+            elif data['type'] == 'sync':
+                # El cliente detectó un hueco en la secuencia de number_called
+                try:
+                    last_seq = int(data.get('last_seq', 0))
+                except (TypeError, ValueError):
+                    last_seq = None
+                await self.send_numbers_replay(last_seq)
+
         except json.JSONDecodeError:
             await self.send(text_data=json.dumps({
                 'type': 'error',
@@ -527,8 +535,9 @@ class BingoConsumer(AsyncWebsocketConsumer):
     async def number_called(self, event):
         await self.send(text_data=json.dumps({
             'type': 'number_called',
-            'number': event['number'],
-            'called_numbers': event['called_numbers']
+            'v': PROTOCOL_VERSION,
+            'seq': event.get('seq'),
+            'number': event['number']
         }))
 
     async def game_ended(self, event):
@@ -536,7 +545,7 @@ class BingoConsumer(AsyncWebsocketConsumer):
             'type': 'game_ended',
             'winner': event['winner'],
             'prize': event['prize'],
-            'called_numbers': event['called_numbers']
+            'seq': event.get('seq')
         }))
 
     async def auto_call_toggled(self, event):
@@ -568,6 +577,31 @@ class BingoConsumer(AsyncWebsocketConsumer):
             'progress_percentage': event.get('progress_percentage', 0)
         }))
 
+    async def game_progress(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'game_progress',
+            'purchases': event.get('purchases'),
+            'quantity': event.get('quantity'),
+            'prize_increased': event.get('prize_increased'),
+            'new_prize': event.get('new_prize'),
+            'increase_amount': event.get('increase_amount'),
+            'total_cards_sold': event.get('total_cards_sold'),
+            'max_cards_sold': event.get('max_cards_sold'),
+            'held_balance': event.get('held_balance'),
+            'next_prize_target': event.get('next_prize_target'),
+            'progress_percentage': event.get('progress_percentage', 0)
+        }))
+
+    async def cards_purchased(self, event):
+        # Solo llega a los sockets del comprador (grupo game_<id>_user_<id>)
+        await self.send(text_data=json.dumps({
+            'type': 'cards_purchased',
+            'purchase_id': event.get('purchase_id'),
+            'new_cards': event.get('new_cards'),
+            'player_cards_count': event.get('player_cards_count'),
+            'new_balance': event.get('new_balance')
+        }))
+
     async def card_purchased(self, event):
         await self.send(text_data=json.dumps({
             'type': 'card_purchased',
@@ -660,12 +694,9 @@ class MessageConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def create_message(self, recipient_id, content):
+        # Crea el mensaje y suma el no leído del destinatario en su conversación
         recipient = User.objects.get(id=recipient_id)
-        return Message.objects.create(
-            sender=self.user,
-            recipient=recipient,
-            content=content
-        )
+        return send_private_message(self.user, recipient, content)
     
     @database_sync_to_async
     def serialize_message(self, message):
@@ -697,6 +728,13 @@ class MessageConsumer(AsyncWebsocketConsumer):
             'type': 'message_sent',
             'message': event['message']
         }))
+
+    async def unread_count(self, event):
+        # Contador de la bandeja de notificaciones; comparte el grupo user_<id> con NotificationConsumer
+        await self.send(text_data=json.dumps({
+            'type': 'unread_count',
+            'count': event['count']
+        }))
    
 class RaffleConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -829,6 +867,9 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'type': 'win_notification',
             'message': event['message'],
         }))
+        # Los premios de bingo traen el saldo en el mismo mensaje (PayoutNotifications)
+        if 'new_balance' in event:
+            await self.credit_update(event)
 
     async def credit_update(self, event):
         await self.send(text_data=json.dumps({
@@ -843,6 +884,13 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'message': event['message'],
             'sound_type': event.get('sound_type')
         }))
+
+    async def unread_count(self, event):
+        # Total de no leídas (utils.notification_inbox), enviado al confirmarse cada cambio
+        await self.send(text_data=json.dumps({
+            'type': 'unread_count',
+            'count': event['count']
+        }))
     
     async def credit_approved_notification(self, event):
         await self.send(text_data=json.dumps({
@@ -955,7 +1003,6 @@ class DiceGameConsumer(AsyncWebsocketConsumer):
             # cambiarlo automáticamente a PLAYING (esto evita que se quede trabado si el servidor se reinicia)
             if dice_game.status == 'SPINNING' and dice_game.started_at:
                 from django.utils import timezone
-                from datetime import timedelta
                 time_elapsed = timezone.now() - dice_game.started_at
                 if time_elapsed.total_seconds() > 7:
                     # Ya debería estar en PLAYING, cambiarlo automáticamente
@@ -1016,555 +1063,38 @@ class DiceGameConsumer(AsyncWebsocketConsumer):
     
     async def handle_roll_dice(self, data):
         """
-        Maneja el lanzamiento de dados de un jugador.
+        Maneja el lanzamiento de dados de un jugador. La ronda se resuelve en una sola
+        transacción (utils.dice_rounds) y las difusiones salen del estado calculado.
         """
-        import random
-        
         try:
-            def roll_dice_and_validate(room_code, user_id):
-                try:
-                    dice_game = DiceGame.objects.get(room_code=room_code)
-                    
-                    # Verificación pasiva: Si el juego está en SPINNING y han pasado más de 7 segundos,
-                    # cambiarlo automáticamente a PLAYING (primera acción del jugador)
-                    if dice_game.status == 'SPINNING' and dice_game.started_at:
-                        from django.utils import timezone
-                        time_elapsed = timezone.now() - dice_game.started_at
-                        if time_elapsed.total_seconds() > 7:
-                            # Cambiar a PLAYING automáticamente
-                            dice_game.status = 'PLAYING'
-                            dice_game.save(update_fields=['status'])
-                            from .tasks import notify_game_status_change
-                            notify_game_status_change(dice_game)
-                            print(f"✅ [WEBSOCKET] Estado cambiado de SPINNING a PLAYING para {dice_game.room_code} (primera acción del jugador, {time_elapsed.total_seconds():.1f}s transcurridos)")
-                    
-                    # Verificar que el juego esté en estado PLAYING
-                    if dice_game.status == 'FINISHED':
-                        return {'error': 'El juego ya terminó.'}
-                    elif dice_game.status == 'SPINNING':
-                        return {'error': 'El juego aún no ha comenzado. Espera a que termine la animación del premio.'}
-                    elif dice_game.status != 'PLAYING':
-                        return {'error': f'El juego no está disponible para lanzar dados. Estado actual: {dice_game.status}'}
-                    
-                    # Obtener jugador
-                    try:
-                        player = DicePlayer.objects.get(game=dice_game, user_id=user_id)
-                    except DicePlayer.DoesNotExist:
-                        return {'error': 'No eres parte de esta partida.'}
-                    
-                    # Verificar que el jugador no esté eliminado
-                    if player.is_eliminated:
-                        return {'error': 'Ya estás eliminado de esta partida.'}
-                    
-                    # Verificar si el jugador ya lanzó en esta ronda
-                    # Obtener la ronda actual (o crear una nueva)
-                    from .models import DiceRound
-                    current_round = dice_game.rounds.filter(eliminated_player__isnull=True).order_by('-round_number').first()
-                    
-                    if not current_round:
-                        # Crear nueva ronda
-                        last_round = dice_game.rounds.order_by('-round_number').first()
-                        round_number = (last_round.round_number + 1) if last_round else 1
-                        current_round = DiceRound.objects.create(
-                            game=dice_game,
-                            round_number=round_number,
-                            player_results={}
-                        )
-                    
-                    # Verificar si la ronda ya fue procesada
-                    # Una ronda está procesada si:
-                    # 1. Tiene un eliminated_player (se procesó y eliminó a alguien)
-                    # 2. O tiene todos los resultados de los jugadores activos (se procesó pero no eliminó a nadie)
-                    active_players_count = DicePlayer.objects.filter(
-                        game=dice_game,
-                        is_eliminated=False
-                    ).count()
-                    
-                    rounds_results_count = len(current_round.player_results) if current_round.player_results else 0
-                    is_round_processed = (
-                        current_round.eliminated_player is not None or
-                        (rounds_results_count >= active_players_count and active_players_count > 0)
-                    )
-                    
-                    if is_round_processed:
-                        # La ronda ya fue procesada, verificar si debemos crear una nueva
-                        # IMPORTANTE: Solo crear nueva ronda si el juego aún está activo y hay más de 1 jugador
-                        from django.db import transaction
-                        with transaction.atomic():
-                            # Refrescar desde DB para obtener el estado más reciente
-                            dice_game.refresh_from_db()
-                            
-                            # Verificar si el juego ya terminó
-                            if dice_game.status == 'FINISHED':
-                                return {'error': 'El juego ya terminó'}
-                            
-                            # Verificar cuántos jugadores activos quedan
-                            active_players_remaining = DicePlayer.objects.filter(
-                                game=dice_game,
-                                is_eliminated=False
-                            ).count()
-                            
-                            # Si solo queda 1 jugador o menos, el juego debería haber terminado
-                            if active_players_remaining <= 1:
-                                return {'error': 'El juego ya terminó. Solo queda 1 jugador.'}
-                            
-                            last_round = dice_game.rounds.order_by('-round_number').first()
-                            
-                            # Verificar nuevamente si ya existe una nueva ronda (puede que otro jugador la haya creado)
-                            if last_round:
-                                # Verificar si la última ronda ya fue procesada
-                                active_players_count_check = DicePlayer.objects.filter(
-                                    game=dice_game,
-                                    is_eliminated=False
-                                ).count()
-                                last_round_results_count = len(last_round.player_results) if last_round.player_results else 0
-                                is_last_round_processed = (
-                                    last_round.eliminated_player is not None or
-                                    (last_round_results_count >= active_players_count_check and active_players_count_check > 0)
-                                )
-                                
-                                if is_last_round_processed:
-                                    # La última ronda fue procesada, crear una nueva SOLO si el juego continúa
-                                    # Verificar nuevamente que el juego no haya terminado
-                                    dice_game.refresh_from_db()
-                                    if dice_game.status == 'FINISHED':
-                                        return {'error': 'El juego ya terminó'}
-                                    
-                                    active_players_final_check = DicePlayer.objects.filter(
-                                        game=dice_game,
-                                        is_eliminated=False
-                                    ).count()
-                                    
-                                    if active_players_final_check <= 1:
-                                        return {'error': 'El juego ya terminó. Solo queda 1 jugador.'}
-                                    
-                                    round_number = last_round.round_number + 1
-                                    # Verificar si ya existe una ronda con este número (evitar duplicados)
-                                    if not dice_game.rounds.filter(round_number=round_number).exists():
-                                        current_round = DiceRound.objects.create(
-                                            game=dice_game,
-                                            round_number=round_number,
-                                            player_results={}
-                                        )
-                                        print(f"✅ Creada nueva ronda {round_number} porque la ronda anterior ya fue procesada")
-                                    else:
-                                        # Ya existe una ronda con este número, usarla
-                                        current_round = dice_game.rounds.get(round_number=round_number)
-                                        print(f"ℹ️ Usando ronda existente {round_number}")
-                                else:
-                                    # La última ronda no fue procesada, usarla
-                                    current_round = last_round
-                            else:
-                                # No hay rondas, crear la primera
-                                round_number = 1
-                                current_round = DiceRound.objects.create(
-                                    game=dice_game,
-                                    round_number=round_number,
-                                    player_results={}
-                                )
-                                print(f"✅ Creada primera ronda {round_number}")
-                    
-                    # Verificar si el jugador ya lanzó en esta ronda
-                    if str(user_id) in current_round.player_results:
-                        return {'error': 'Ya lanzaste los dados en esta ronda. Espera a que todos terminen.'}
-                    
-                    # Lanzar dados (esto se hace en el servidor para evitar trampas)
-                    die1 = random.randint(1, 6)
-                    die2 = random.randint(1, 6)
-                    total = die1 + die2
-                    
-                    # Guardar resultado en la ronda
-                    current_round.player_results[str(user_id)] = [die1, die2, total]
-                    current_round.save()
-                    
-                    return {
-                        'user_id': user_id,
-                        'username': player.user.username,
-                        'die1': die1,
-                        'die2': die2,
-                        'total': total,
-                        'round_number': current_round.round_number,
-                        'current_round_id': current_round.id,
-                    }
-                except DiceGame.DoesNotExist:
-                    return {'error': 'Partida no encontrada'}
-                except Exception as e:
-                    return {'error': f'Error: {str(e)}'}
-            
-            result = await database_sync_to_async(roll_dice_and_validate)(self.room_code, self.scope['user'].id)
-            
-            if 'error' in result:
+            try:
+                outcome = await database_sync_to_async(roll_dice)(self.room_code, self.scope['user'].id)
+            except DiceRollError as e:
                 await self.send(text_data=json.dumps({
                     'type': 'error',
-                    'message': result['error']
+                    'message': str(e)
                 }))
                 return
             
             # Notificar a todos los jugadores del lanzamiento
             await self.channel_layer.group_send(
                 self.room_group_name,
-                {
-                    'type': 'dice_rolled',
-                    'user_id': result['user_id'],
-                    'username': result['username'],
-                    'die1': result['die1'],
-                    'die2': result['die2'],
-                    'total': result['total'],
-                }
+                {'type': 'dice_rolled', **outcome['roll']}
             )
             
-            # Verificar si todos los jugadores han lanzado en esta ronda y procesar ronda si es necesario
-            def check_and_process_round(round_id):
-                try:
-                    from .models import DiceRound, DicePlayer, Transaction
-                    current_round = DiceRound.objects.get(id=round_id)
-                    dice_game = current_round.game
-                    
-                    # Obtener jugadores activos (no eliminados)
-                    active_players = DicePlayer.objects.filter(
-                        game=dice_game,
-                        is_eliminated=False
-                    )
-                    
-                    # Control de flujo: Verificar si todos han lanzado antes de procesar
-                    # No permitir que la lógica de process_round se ejecute hasta que todos hayan lanzado
-                    active_players_count = active_players.count()
-                    results_count = len([k for k in current_round.player_results.keys() if not k.startswith('_')])
-                    
-                    if results_count < active_players_count:
-                        print(f"⏳ [WAITING_FOR_ROLLS] Esperando lanzamientos: {results_count}/{active_players_count} jugadores han lanzado")
-                        return None
-                    
-                    # Todos han lanzado, procesar ronda
-                    from django.db import transaction
-                    
-                    with transaction.atomic():
-                        # Refrescar desde DB para obtener estado actualizado
-                        dice_game.refresh_from_db()
-                        current_round.refresh_from_db()
-                        
-                        # Evitar doble pago: verificar si el juego ya está FINISHED
-                        if dice_game.status == 'FINISHED':
-                            print(f"⚠️ [ATOMICITY] Juego {dice_game.room_code} ya está FINISHED, evitando procesamiento duplicado")
-                            return None
-                        
-                        active_players = list(DicePlayer.objects.filter(
-                            game=dice_game,
-                            is_eliminated=False
-                        ).select_for_update())
-                        
-                        if len(active_players) <= 1:
-                            # Solo queda 1 jugador, es el ganador
-                            # Evitar doble pago: verificar nuevamente antes de crear transacción
-                            if dice_game.status == 'FINISHED':
-                                print(f"⚠️ [ATOMICITY] Juego {dice_game.room_code} ya está FINISHED antes de crear transacción, evitando doble pago")
-                                return None
-                            
-                            winner = active_players[0]
-                            dice_game.winner = winner.user
-                            # Cambiar estado a FINISHED ANTES de crear la transacción para evitar procesos paralelos
-                            dice_game.status = 'FINISHED'
-                            dice_game.finished_at = timezone.now()
-                            dice_game.save()
-                            
-                            # Acreditar premio al ganador
-                            winner.user.credit_balance += dice_game.final_prize
-                            winner.user.save()
-                            
-                            # RESTAR PREMIO DEL POZO ACUMULADO
-                            from .models import DiceModuleSettings
-                            settings = DiceModuleSettings.get_settings()
-                            settings.refresh_from_db()
-                            
-                            pool_before = settings.accumulated_pool
-                            if settings.accumulated_pool >= dice_game.final_prize:
-                                settings.accumulated_pool -= dice_game.final_prize
-                                settings.save()
-                                print(f"💰 [POOL] Premio descontado del pozo: ${dice_game.final_prize}, Pozo antes: ${pool_before}, Pozo después: ${settings.accumulated_pool}")
-                            else:
-                                # Si el pozo no tiene suficientes fondos, usar lo que hay y ajustar
-                                actual_prize = settings.accumulated_pool
-                                settings.accumulated_pool = Decimal('0.00')
-                                settings.save()
-                                print(f"⚠️ [POOL] ADVERTENCIA: Pozo insuficiente. Premio solicitado: ${dice_game.final_prize}, Pozo disponible: ${pool_before}, Premio ajustado: ${actual_prize}")
-                                # Ajustar el premio otorgado
-                                if actual_prize < dice_game.final_prize:
-                                    winner.user.credit_balance -= (dice_game.final_prize - actual_prize)
-                                    winner.user.save()
-                                    dice_game.final_prize = actual_prize
-                                    dice_game.save()
-                            
-                            # Crear transacción con logging detallado
-                            transaction_obj = Transaction.objects.create(
-                                user=winner.user,
-                                amount=dice_game.final_prize,
-                                transaction_type='DICE_WIN',
-                                description=f"Ganador de partida de dados {dice_game.room_code}"
-                            )
-                            print(f"💰 [TRANSACTION] DICE_WIN creada: ID={transaction_obj.id}, Usuario={winner.user.username}, Monto=${dice_game.final_prize}, Saldo antes={winner.user.credit_balance - dice_game.final_prize}, Saldo después={winner.user.credit_balance}")
-                            
-                            # IMPORTANTE: Liberar blocked_credits de TODOS los participantes
-                            all_players_in_game = DicePlayer.objects.filter(game=dice_game)
-                            for player in all_players_in_game:
-                                if player.user.blocked_credits >= dice_game.entry_price:
-                                    player.user.blocked_credits -= dice_game.entry_price
-                                    player.user.save()
-                                    print(f"🔓 [GAME_END] Créditos desbloqueados para {player.user.username}: ${dice_game.entry_price}")
-                                else:
-                                    print(f"⚠️ [GAME_END] Advertencia: {player.user.username} tiene menos blocked_credits ({player.user.blocked_credits}) de lo esperado (${dice_game.entry_price})")
-                            
-                            # Normalización de vidas: Asegurar que los resultados incluyan TODOS los jugadores (incluso eliminados)
-                            # El servidor debe enviar un entero (3, 2, 1, 0) en el índice [2], no el total de los dados
-                            complete_round_results = {}
-                            all_players_in_game = DicePlayer.objects.filter(game=dice_game)
-                            for player in all_players_in_game:
-                                player_id_str = str(player.user.id)
-                                if player_id_str in current_round.player_results:
-                                    # Obtener el resultado original [die1, die2, total]
-                                    original_result = current_round.player_results[player_id_str]
-                                    # Normalizar: reemplazar el total con las vidas actuales del jugador
-                                    die1 = original_result[0] if len(original_result) > 0 else 0
-                                    die2 = original_result[1] if len(original_result) > 1 else 0
-                                    lives = int(player.lives)  # Asegurar que sea un entero (3, 2, 1, 0)
-                                    complete_round_results[player_id_str] = [die1, die2, lives]
-                                else:
-                                    # Si no tiene resultado, usar valores por defecto con vidas actuales
-                                    lives = int(player.lives)  # Asegurar que sea un entero
-                                    complete_round_results[player_id_str] = [0, 0, lives]
-                            
-                            return {
-                                'round_complete': True,
-                                'round_number': current_round.round_number,
-                                'results': complete_round_results,
-                                'eliminated': None,
-                                'winner': winner.user.username,
-                                'game_finished': True,
-                                'final_prize': str(dice_game.final_prize),
-                                'multiplier': dice_game.multiplier
-                            }
-                        
-                        # Encontrar TODOS los jugadores con el total más bajo (manejar empates)
-                        lowest_total = float('inf')
-                        players_with_lowest = []  # Lista de jugadores con el total más bajo
-                        
-                        # Primero, encontrar el total más bajo
-                        for player in active_players:
-                            player_result = current_round.player_results.get(str(player.user.id))
-                            if player_result:
-                                total = player_result[2]  # El total está en el índice 2
-                                if total < lowest_total:
-                                    lowest_total = total
-                        
-                        # Luego, encontrar TODOS los jugadores con ese total más bajo
-                        for player in active_players:
-                            player_result = current_round.player_results.get(str(player.user.id))
-                            if player_result:
-                                total = player_result[2]
-                                if total == lowest_total:
-                                    players_with_lowest.append(player)
-                        
-                        # Verificar si hay empate (más de un jugador con el total más bajo)
-                        is_tie = len(players_with_lowest) > 1
-                        
-                        eliminated_msg = None
-                        eliminated_players = []
-                        
-                        if is_tie:
-                            # EMPATE: Ninguno pierde vida, se marca la ronda como 'Empate'
-                            print(f"🤝 [ROUND] Empate detectado: {len(players_with_lowest)} jugadores con total {lowest_total}")
-                            # No se reduce vida, no se elimina a nadie
-                            # La ronda se marca como empate y todos vuelven a lanzar
-                            current_round.eliminated_player = None  # Asegurar que no hay eliminado
-                            # Guardar información del empate en player_results
-                            current_round.player_results['_tie'] = True
-                            current_round.player_results['_tie_total'] = lowest_total
-                            current_round.player_results['_tie_players'] = [str(p.user.id) for p in players_with_lowest]
-                        else:
-                            # NO HAY EMPATE: Solo un jugador con el total más bajo, pierde vida
-                            loser_player = players_with_lowest[0]
-                            loser_player.lives -= 1
-                            
-                            if loser_player.lives <= 0:
-                                loser_player.is_eliminated = True
-                                eliminated_players.append(loser_player.user.username)
-                                print(f"💀 [ROUND] Jugador {loser_player.user.username} eliminado (0 vidas)")
-                            
-                            loser_player.save()
-                            
-                            # Guardar información en la ronda
-                            current_round.eliminated_player = loser_player.user
-                            if loser_player.lives <= 0:
-                                eliminated_msg = loser_player.user.username
-                            
-                            # Limpiar información de empate si existía
-                            if '_tie' in current_round.player_results:
-                                del current_round.player_results['_tie']
-                                del current_round.player_results['_tie_total']
-                                del current_round.player_results['_tie_players']
-                        
-                        current_round.save()
-                        
-                        # Verificar si solo queda 1 jugador después de las eliminaciones
-                        remaining_players = DicePlayer.objects.filter(
-                            game=dice_game,
-                            is_eliminated=False
-                        )
-                        
-                        if remaining_players.count() == 1:
-                            # Hay un ganador - Finalizar juego
-                            # Evitar doble pago: verificar nuevamente antes de crear transacción
-                            if dice_game.status == 'FINISHED':
-                                print(f"⚠️ [ATOMICITY] Juego {dice_game.room_code} ya está FINISHED antes de crear transacción, evitando doble pago")
-                                return None
-                            
-                            winner = remaining_players.first()
-                            dice_game.winner = winner.user
-                            # Cambiar estado a FINISHED ANTES de crear la transacción para evitar procesos paralelos
-                            dice_game.status = 'FINISHED'
-                            dice_game.finished_at = timezone.now()
-                            dice_game.save()
-                            
-                            # Acreditar premio al ganador
-                            winner.user.credit_balance += dice_game.final_prize
-                            winner.user.save()
-                            
-                            # RESTAR PREMIO DEL POZO ACUMULADO
-                            from .models import DiceModuleSettings
-                            settings = DiceModuleSettings.get_settings()
-                            settings.refresh_from_db()
-                            
-                            pool_before = settings.accumulated_pool
-                            if settings.accumulated_pool >= dice_game.final_prize:
-                                settings.accumulated_pool -= dice_game.final_prize
-                                settings.save()
-                                print(f"💰 [POOL] Premio descontado del pozo: ${dice_game.final_prize}, Pozo antes: ${pool_before}, Pozo después: ${settings.accumulated_pool}")
-                            else:
-                                # Si el pozo no tiene suficientes fondos, usar lo que hay y ajustar
-                                actual_prize = settings.accumulated_pool
-                                settings.accumulated_pool = Decimal('0.00')
-                                settings.save()
-                                print(f"⚠️ [POOL] ADVERTENCIA: Pozo insuficiente. Premio solicitado: ${dice_game.final_prize}, Pozo disponible: ${pool_before}, Premio ajustado: ${actual_prize}")
-                                # Ajustar el premio otorgado
-                                if actual_prize < dice_game.final_prize:
-                                    winner.user.credit_balance -= (dice_game.final_prize - actual_prize)
-                                    winner.user.save()
-                                    dice_game.final_prize = actual_prize
-                                    dice_game.save()
-                            
-                            # Crear transacción con logging detallado
-                            transaction_obj = Transaction.objects.create(
-                                user=winner.user,
-                                amount=dice_game.final_prize,
-                                transaction_type='DICE_WIN',
-                                description=f"Ganador de partida de dados {dice_game.room_code}"
-                            )
-                            print(f"💰 [TRANSACTION] DICE_WIN creada: ID={transaction_obj.id}, Usuario={winner.user.username}, Monto=${dice_game.final_prize}, Saldo antes={winner.user.credit_balance - dice_game.final_prize}, Saldo después={winner.user.credit_balance}")
-                            
-                            # IMPORTANTE: Liberar blocked_credits de TODOS los participantes
-                            all_players_in_game = DicePlayer.objects.filter(game=dice_game)
-                            for player in all_players_in_game:
-                                if player.user.blocked_credits >= dice_game.entry_price:
-                                    player.user.blocked_credits -= dice_game.entry_price
-                                    player.user.save()
-                                    print(f"🔓 [GAME_END] Créditos desbloqueados para {player.user.username}: ${dice_game.entry_price}")
-                                else:
-                                    print(f"⚠️ [GAME_END] Advertencia: {player.user.username} tiene menos blocked_credits ({player.user.blocked_credits}) de lo esperado (${dice_game.entry_price})")
-                            
-                            # Normalización de vidas: Asegurar que los resultados incluyan TODOS los jugadores
-                            # El servidor debe enviar un entero (3, 2, 1, 0) en el índice [2], no el total de los dados
-                            complete_round_results = {}
-                            all_players_in_game = DicePlayer.objects.filter(game=dice_game)
-                            for player in all_players_in_game:
-                                player_id_str = str(player.user.id)
-                                if player_id_str in current_round.player_results:
-                                    # Obtener el resultado original [die1, die2, total]
-                                    original_result = current_round.player_results[player_id_str]
-                                    # Normalizar: reemplazar el total con las vidas actuales del jugador
-                                    die1 = original_result[0] if len(original_result) > 0 else 0
-                                    die2 = original_result[1] if len(original_result) > 1 else 0
-                                    lives = int(player.lives)  # Asegurar que sea un entero (3, 2, 1, 0)
-                                    complete_round_results[player_id_str] = [die1, die2, lives]
-                                else:
-                                    # Si no tiene resultado, usar valores por defecto con vidas actuales
-                                    lives = int(player.lives)  # Asegurar que sea un entero
-                                    complete_round_results[player_id_str] = [0, 0, lives]
-                            
-                            return {
-                                'round_complete': True,
-                                'round_number': current_round.round_number,
-                                'results': complete_round_results,
-                                'eliminated': eliminated_msg,
-                                'winner': winner.user.username,
-                                'game_finished': True,
-                                'final_prize': str(dice_game.final_prize),
-                                'multiplier': dice_game.multiplier
-                            }
-                        
-                        # Normalización de vidas: Asegurar que los resultados incluyan TODOS los jugadores activos
-                        # El servidor debe enviar un entero (3, 2, 1, 0) en el índice [2], no el total de los dados
-                        complete_round_results = {}
-                        for player in active_players:
-                            player_id_str = str(player.user.id)
-                            if player_id_str in current_round.player_results:
-                                # Obtener el resultado original [die1, die2, total]
-                                original_result = current_round.player_results[player_id_str]
-                                # Normalizar: reemplazar el total con las vidas actuales del jugador
-                                # Formato: [dado1, dado2, vidas_restantes]
-                                die1 = original_result[0] if len(original_result) > 0 else 0
-                                die2 = original_result[1] if len(original_result) > 1 else 0
-                                lives = int(player.lives)  # Asegurar que sea un entero (3, 2, 1, 0)
-                                complete_round_results[player_id_str] = [die1, die2, lives]
-                            else:
-                                # Si no tiene resultado, usar valores por defecto con vidas actuales
-                                lives = int(player.lives)  # Asegurar que sea un entero
-                                complete_round_results[player_id_str] = [0, 0, lives]
-                        
-                        # Verificar si hubo empate
-                        is_tie_round = current_round.player_results.get('_tie', False)
-                        
-                        return {
-                            'round_complete': True,
-                            'round_number': current_round.round_number,
-                            'results': complete_round_results,
-                            'eliminated': eliminated_msg,
-                            'winner': None,
-                            'game_finished': False,
-                            'is_tie': is_tie_round,  # Indicar si hubo empate
-                            'tie_total': current_round.player_results.get('_tie_total') if is_tie_round else None
-                        }
-                        
-                except Exception as e:
-                    print(f"Error verificando/procesando ronda: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    return None
-            
-            
-            # Verificar si la ronda está completa y procesarla
-            round_result = await database_sync_to_async(check_and_process_round)(result['current_round_id'])
-            
+            round_result = outcome['round_result']
             if round_result:
                 # Delay entre rondas: dar tiempo al frontend para terminar la animación de los dados
-                import asyncio
-                await asyncio.sleep(2)  # Esperar 2 segundos antes de enviar round_result
+                await asyncio.sleep(2)
                 
-                # Ronda completa, notificar resultados
-                if round_result.get('game_finished'):
-                    # Juego terminado
-                    print(f"🏆 Juego terminado - Ganador: {round_result.get('winner')}, Premio: {round_result.get('final_prize')}")
-                    # Obtener el multiplicador del resultado o del juego
+                if round_result['game_finished']:
                     multiplier = round_result.get('multiplier')
-                    if not multiplier:
-                        dice_game_refresh = await database_sync_to_async(DiceGame.objects.get)(room_code=self.room_code)
-                        multiplier = dice_game_refresh.multiplier
-                    
-                    print(f"📢 Enviando game_finished: winner={round_result['winner']}, prize={round_result['final_prize']}, multiplier={multiplier}")
                     await self.channel_layer.group_send(
                         self.room_group_name,
                         {
                             'type': 'game_finished',
                             'winner': round_result['winner'],
-                            'prize': str(round_result['final_prize']),
+                            'prize': round_result['final_prize'],
                             'multiplier': str(multiplier) if multiplier else 'N/A',
                         }
                     )
@@ -1582,12 +1112,9 @@ class DiceGameConsumer(AsyncWebsocketConsumer):
                         }
                     )
                     # Sincronización de animación y estado: delay obligatorio de 3 segundos
-                    import asyncio
-                    await asyncio.sleep(3)  # Esperar 3 segundos para que los navegadores terminen de mostrar los dados
-        except Exception as e:
-            import traceback
-            print(f"Error en handle_roll_dice: {e}")
-            print(traceback.format_exc())
+                    await asyncio.sleep(3)
+        except Exception:
+            logger.exception('Error en handle_roll_dice (sala %s)', self.room_code)
             await self.send(text_data=json.dumps({
                 'type': 'error',
                 'message': 'Error al lanzar dados'
@@ -1618,48 +1145,17 @@ class DiceGameConsumer(AsyncWebsocketConsumer):
     
     async def round_result(self, event):
         """
-        Notifica resultado de una ronda.
+        Notifica resultado de una ronda. Los resultados ya incluyen a todos los jugadores
+        como [dado1, dado2, vidas] (utils.dice_rounds.lives_results).
         """
-        # Asegurar que los resultados incluyan los 3 jugadores
-        results = event.get('results', {})
-        
-        # Obtener todos los jugadores del juego para asegurar que todos estén en los resultados
-        try:
-            def get_all_players(room_code):
-                dice_game = DiceGame.objects.get(room_code=room_code)
-                return list(dice_game.dice_players.all())
-            
-            players_list = await database_sync_to_async(get_all_players)(self.room_code)
-            
-            # Crear un diccionario completo de resultados
-            complete_results = {}
-            for player in players_list:
-                player_id_str = str(player.user.id)
-                if player_id_str in results:
-                    complete_results[player_id_str] = results[player_id_str]
-                else:
-                    # Si el jugador no tiene resultado, poner un valor por defecto como array [dado1, dado2, vidas]
-                    # Esto es vital para que el JavaScript no reciba formatos mezclados (objetos y arrays)
-                    complete_results[player_id_str] = [0, 0, 3]
-            
-            await self.send(text_data=json.dumps({
-                'type': 'round_result',
-                'round_number': event['round_number'],
-                'results': complete_results,
-                'eliminated': event.get('eliminated'),
-                'is_tie': event.get('is_tie', False),
-                'tie_total': event.get('tie_total'),
-            }))
-        except Exception as e:
-            # Si hay error, enviar los resultados originales
-            await self.send(text_data=json.dumps({
-                'type': 'round_result',
-                'round_number': event['round_number'],
-                'results': results,
-                'eliminated': event.get('eliminated'),
-                'is_tie': event.get('is_tie', False),
-                'tie_total': event.get('tie_total'),
-            }))
+        await self.send(text_data=json.dumps({
+            'type': 'round_result',
+            'round_number': event['round_number'],
+            'results': event.get('results', {}),
+            'eliminated': event.get('eliminated'),
+            'is_tie': event.get('is_tie', False),
+            'tie_total': event.get('tie_total'),
+        }))
     
     async def game_finished(self, event):
         """
@@ -1726,7 +1222,6 @@ class DiceGameConsumer(AsyncWebsocketConsumer):
                         })
                     
                     # Obtener número de ronda actual (catch-up para usuarios que entran tarde)
-                    from .models import DiceRound
                     current_round = dice_game.rounds.filter(eliminated_player__isnull=True).order_by('-round_number').first()
                     if not current_round:
                         # Si no hay ronda activa, obtener la última ronda
@@ -4,7 +4,8 @@ from django.core.validators import MinValueValidator, validate_email
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 import json
-from .models import BankAccount, User, Game, CreditRequest, Raffle, PercentageSettings, WithdrawalRequest, Announcement, AccountsReceivable, AccountsReceivablePayment
+from .models import BankAccount, User, Game, CreditRequest, Raffle, PercentageSettings, WithdrawalRequest, Announcement, AccountsReceivable, AccountsReceivablePayment, Transaction
+from .utils.ledger_export import EXPORT_FORMATS, day_bounds
 
 class RegistrationForm(UserCreationForm):
     is_organizer = forms.BooleanField(
@@ -775,3 +776,66 @@ class AccountsReceivablePaymentForm(forms.ModelForm):
                 )
         
         return proof
+
+
+class TransactionFilterForm(forms.Form):
+    """Filtros del historial de transacciones (todos opcionales, por GET)."""
+    type = forms.ChoiceField(
+        required=False,
+        choices=[('', 'Todos los tipos')] + Transaction.TRANSACTION_TYPES,
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
+    )
+    date_from = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'})
+    )
+    date_to = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'})
+    )
+    game = forms.IntegerField(
+        required=False,
+        min_value=1,
+        widget=forms.NumberInput(attrs={'class': 'form-control form-control-sm', 'placeholder': 'ID de partida'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise ValidationError('La fecha inicial no puede ser posterior a la final.')
+        return cleaned_data
+
+    def filter(self, queryset):
+        """Aplica los filtros válidos; date_to incluye el día completo."""
+        if not self.is_valid():
+            return queryset
+        data = self.cleaned_data
+        if data.get('type'):
+            queryset = queryset.filter(transaction_type=data['type'])
+        start, end = day_bounds(data.get('date_from'), data.get('date_to'))
+        if start:
+            queryset = queryset.filter(created_at__gte=start)
+        if end:
+            queryset = queryset.filter(created_at__lt=end)
+        if data.get('game'):
+            queryset = queryset.filter(related_game_id=data['game'])
+        return queryset
+
+
+class LedgerExportForm(forms.Form):
+    """Parámetros de la exportación contable (por GET)."""
+    format = forms.ChoiceField(required=False, choices=[(f, f.upper()) for f in EXPORT_FORMATS])
+    franchise = forms.IntegerField(required=False, min_value=1)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise ValidationError('La fecha inicial no puede ser posterior a la final.')
+        cleaned_data['format'] = cleaned_data.get('format') or 'csv'
+        return cleaned_data
@@ -0,0 +1,78 @@
+"""
+Trabajos en segundo plano de la app (cola en utils.jobs, worker run_job_worker).
+Se registran al importar este módulo desde BingoAppConfig.ready().
+
+Colas: 'email' (envíos de SendGrid), 'ai' (análisis con Gemini) y 'default'
+(rollups del libro y resincronización del matchmaking de dados, periódicos); el límite de concurrencia de cada una está en
+BINGO_JOB_QUEUES.
+"""
+
+from django.conf import settings
+
+from bingo_app.utils.jobs import enqueue, job
+
+
+@job('email.send', queue='email', max_attempts=5)
+def send_email(subject, message, recipient_list, from_email=None, html_message=None):
+    from django.core.mail import send_mail
+
+    sent = send_mail(
+        subject,
+        message,
+        from_email or settings.DEFAULT_FROM_EMAIL,
+        recipient_list,
+        fail_silently=False,
+        html_message=html_message,
+    )
+    return {'sent': sent}
+
+
+def send_email_later(subject, message, recipient_list, idempotency_key=None, html_message=None):
+    """Encola el email; con idempotency_key (p. ej. bienvenida por usuario) se envía una sola vez."""
+    return enqueue('email.send', {
+        'subject': subject,
+        'message': message,
+        'recipient_list': list(recipient_list),
+        'html_message': html_message,
+    }, idempotency_key=idempotency_key)
+
+
+def welcome_email_key(user):
+    # Registro, alta por red social y el adapter pueden pedir la bienvenida: sale una vez
+    return f'welcome-email:{user.pk}'
+
+
+@job('ledger.rollups', max_attempts=1, every=getattr(settings, 'BINGO_LEDGER_ROLLUP_INTERVAL', 60))
+def ledger_rollups():
+    """Suma a LedgerRollup las transacciones nuevas; el worker lo encola cada BINGO_LEDGER_ROLLUP_INTERVAL."""
+    from bingo_app.utils.ledger_rollups import catch_up_ledger_rollups
+
+    return {'processed': catch_up_ledger_rollups()}
+
+
+@job('dice.matchmaking_resync', max_attempts=1,
+     every=getattr(settings, 'BINGO_DICE_MATCHMAKING_RESYNC_INTERVAL', 30))
+def dice_matchmaking_resync():
+    """Respaldo del matchmaker: forma los tríos que siguen esperando en la base."""
+    from bingo_app.utils.dice_matchmaking import DiceMatchmaker
+
+    return {'games': len(DiceMatchmaker().load())}
+
+
+@job('ai.dashboard_analysis', queue='ai', max_attempts=2)
+def dashboard_analysis(start_date=None, end_date=None):
+    """Análisis del dashboard de administración con Gemini; el resultado queda en el trabajo."""
+    import datetime
+
+    from bingo_app.ai_assistant import ai_assistant
+    from bingo_app.views import _get_admin_dashboard_context_mejorado
+
+    if not ai_assistant.is_available():
+        return None
+    context = _get_admin_dashboard_context_mejorado(
+        datetime.date.fromisoformat(start_date) if start_date else None,
+        datetime.date.fromisoformat(end_date) if end_date else None,
+    )
+    analysis = ai_assistant.analyze_dashboard_metrics(context)
+    # Si Gemini falla, ai_assistant devuelve el análisis básico: la vista ya usa el local
+    return analysis if analysis and analysis.get('source') == 'gemini' else None
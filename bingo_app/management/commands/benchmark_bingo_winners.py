@@ -0,0 +1,142 @@
+"""
+Benchmark de detección de ganadores de bingo.
+
+Compara, con cartones sintéticos y sin tocar la base de datos:
+- python: evaluación completa de todos los cartones en cada llamada (check_bingo)
+- index: índice incremental (WinnerIndex)
+- numpy: evaluación vectorizada (PackedCards), si NumPy está instalado
+
+Verifica además que los tres métodos encuentren los mismos ganadores para los seis
+patrones de Game.WINNING_PATTERNS.
+
+Ejecutar: python manage.py benchmark_bingo_winners --sizes 100,1000,5000 --calls 40
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from bingo_app.utils.bingo_patterns import WinnerIndex, card_has_bingo, compile_pattern
+from bingo_app.utils.bingo_vectorized import NUMPY_AVAILABLE, PackedCards
+
+PATTERNS = ['HORIZONTAL', 'VERTICAL', 'DIAGONAL', 'FULL', 'CORNERS', 'CUSTOM']
+VERIFY_SAMPLE = 300
+CUSTOM_PATTERN = [
+    [1, 0, 0, 0, 1],
+    [0, 1, 0, 1, 0],
+    [0, 0, 1, 0, 0],
+    [0, 1, 0, 1, 0],
+    [1, 0, 0, 0, 1],
+]
+
+
+def synthetic_card(rng):
+    """Cartón B-I-N-G-O 5x5 con comodín central (mismo formato que generate_bingo_card)."""
+    columns = []
+    for start in (1, 16, 31, 46, 61):
+        numbers = rng.sample(range(start, start + 15), 5)
+        columns.append(numbers)
+    columns[2][2] = 0
+    return [list(row) for row in zip(*columns)]
+
+
+class Command(BaseCommand):
+    help = 'Compara el rendimiento de la detección de ganadores (Python, índice incremental y NumPy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='50,200,1000,2000,5000,10000',
+                            help='Cantidades de cartones a probar, separadas por comas')
+        parser.add_argument('--calls', type=int, default=40, help='Números llamados por partida')
+        parser.add_argument('--seed', type=int, default=7, help='Semilla para los cartones sintéticos')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        calls = options['calls']
+        rng = random.Random(options['seed'])
+
+        if not NUMPY_AVAILABLE:
+            self.stdout.write(self.style.WARNING('NumPy no está instalado: solo se comparan python e index'))
+
+        self.stdout.write('=== BENCHMARK DE DETECCIÓN DE GANADORES ===')
+        self.stdout.write(f'Llamadas por partida: {calls}\n')
+        self.stdout.write(f"{'cartones':>9} | {'python ms/llamada':>18} | {'index ms/llamada':>17} | {'numpy ms/llamada':>17}")
+
+        break_even_python = None
+        break_even_index = None
+        for size in sizes:
+            rows = [(owner, [synthetic_card(rng)]) for owner in range(size)]
+            sequence = rng.sample(range(1, 76), min(calls, 75))
+
+            # La verificación recalcula todo en Python: se limita a una muestra
+            self._verify(rows[:VERIFY_SAMPLE], sequence)
+
+            targets = compile_pattern('HORIZONTAL')
+            python_ms = self._time_python(rows, sequence, targets)
+            index_ms = self._time_index(rows, sequence, targets)
+            numpy_ms = self._time_numpy(rows, sequence, targets) if NUMPY_AVAILABLE else None
+
+            numpy_text = f'{numpy_ms:17.3f}' if numpy_ms is not None else f"{'-':>17}"
+            self.stdout.write(f'{size:>9} | {python_ms:18.3f} | {index_ms:17.3f} | {numpy_text}')
+
+            if numpy_ms is not None:
+                if break_even_python is None and numpy_ms < python_ms:
+                    break_even_python = size
+                if break_even_index is None and numpy_ms < index_ms:
+                    break_even_index = size
+
+        if NUMPY_AVAILABLE:
+            self.stdout.write('')
+            self.stdout.write(f'NumPy supera a la evaluación completa en Python desde: {break_even_python or "no alcanzado"} cartones')
+            self.stdout.write(f'NumPy supera al índice incremental desde: {break_even_index or "no alcanzado"} cartones')
+            self.stdout.write('Ajusta BINGO_VECTORIZED_MIN_CARDS según estos resultados.')
+        self.stdout.write(self.style.SUCCESS('\nBenchmark completado'))
+
+    def _verify(self, rows, sequence):
+        """Los tres evaluadores deben coincidir en cada llamada y para cada patrón."""
+        for pattern in PATTERNS:
+            targets = compile_pattern(pattern, CUSTOM_PATTERN)
+            index = WinnerIndex(targets)
+            for owner, cards in rows:
+                for card in cards:
+                    index.add_card(owner, card)
+            packed = PackedCards.from_rows(targets, rows) if NUMPY_AVAILABLE else None
+            called = []
+            for number in sequence:
+                called.append(number)
+                index.mark(number)
+                marked = set(called)
+                expected = {owner for owner, cards in rows
+                            if any(card_has_bingo(card, marked, targets) for card in cards)}
+                if index.winners != expected:
+                    raise AssertionError(f'WinnerIndex difiere en {pattern} tras {len(called)} llamadas')
+                if packed is not None and packed.winning_owners(called) != expected:
+                    raise AssertionError(f'PackedCards difiere en {pattern} tras {len(called)} llamadas')
+
+    def _time_python(self, rows, sequence, targets):
+        start = time.perf_counter()
+        called = set()
+        for number in sequence:
+            called.add(number)
+            for owner, cards in rows:
+                any(card_has_bingo(card, called, targets) for card in cards)
+        return (time.perf_counter() - start) * 1000 / len(sequence)
+
+    def _time_index(self, rows, sequence, targets):
+        start = time.perf_counter()
+        index = WinnerIndex(targets)
+        for owner, cards in rows:
+            for card in cards:
+                index.add_card(owner, card)
+        for number in sequence:
+            index.mark(number)
+        return (time.perf_counter() - start) * 1000 / len(sequence)
+
+    def _time_numpy(self, rows, sequence, targets):
+        start = time.perf_counter()
+        packed = PackedCards.from_rows(targets, rows)
+        called = []
+        for number in sequence:
+            called.append(number)
+            packed.winning_owners(called)
+        return (time.perf_counter() - start) * 1000 / len(sequence)
@@ -0,0 +1,100 @@
+"""
+Benchmark de generación de cartones de bingo.
+
+Compara, sin tocar la base de datos:
+- legacy: random.sample por columna, un cartón por llamada (antiguo generate_bingo_card)
+- python: CardGenerator en Python puro (SHAKE-256, formato empaquetado)
+- numpy: CardGenerator vectorizado, si NumPy está instalado
+
+Para cada método informa cartones/segundo y verifica que los cartones sean válidos
+(rangos B-I-N-G-O, sin números repetidos, comodín central) y únicos. Comprueba además
+que las rutas Python y NumPy den los mismos cartones con la misma semilla.
+
+Ejecutar: python manage.py benchmark_card_generation --count 100000
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from bingo_app.utils.bingo_vectorized import NUMPY_AVAILABLE
+from bingo_app.utils.card_generator import (
+    CARD_BYTES, COLUMN_RANGE, COLUMN_STARTS, CardGenerator, pack_card, unpack_cards,
+)
+
+
+def legacy_card(rng):
+    columns = []
+    for start in COLUMN_STARTS:
+        columns.append(rng.sample(range(start, start + COLUMN_RANGE), 5))
+    columns[2][2] = 0
+    return [list(row) for row in zip(*columns)]
+
+
+def card_is_valid(card):
+    for col, start in enumerate(COLUMN_STARTS):
+        column = [card[row][col] for row in range(5)]
+        if col == 2:
+            if column[2] != 0:
+                return False
+            del column[2]
+        if len(set(column)) != len(column):
+            return False
+        if any(not (start <= number < start + COLUMN_RANGE) for number in column):
+            return False
+    return True
+
+
+class Command(BaseCommand):
+    help = 'Mide la generación masiva de cartones y verifica validez y unicidad'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help='Cartones por método')
+        parser.add_argument('--seed', type=str, default='benchmark', help='Semilla para los generadores')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        seed = options['seed'].encode('utf-8').ljust(32, b'\0')
+
+        self.stdout.write(f"=== BENCHMARK GENERACIÓN DE CARTONES ({count} cartones) ===\n")
+        self.stdout.write(f"Formato empaquetado: {CARD_BYTES} bytes por cartón "
+                          f"({count * CARD_BYTES / 1024:.0f} KB para {count})\n")
+
+        rng = random.Random(seed)
+        start = time.perf_counter()
+        legacy = [legacy_card(rng) for _ in range(count)]
+        self._report('legacy', legacy, time.perf_counter() - start)
+
+        methods = [('python', False)]
+        if NUMPY_AVAILABLE:
+            methods.append(('numpy', True))
+        else:
+            self.stdout.write(self.style.WARNING('NumPy no está instalado: solo se mide la ruta Python'))
+
+        packed_by_method = {}
+        for name, use_numpy in methods:
+            start = time.perf_counter()
+            packed = CardGenerator(seed, use_numpy=use_numpy).generate_packed(count)
+            packed_elapsed = time.perf_counter() - start
+            cards = unpack_cards(packed)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{name:>7}: solo empaquetado {count / packed_elapsed:,.0f} cartones/s")
+            self._report(name, cards, elapsed)
+            packed_by_method[name] = packed
+
+        if len(packed_by_method) == 2:
+            if packed_by_method['python'] == packed_by_method['numpy']:
+                self.stdout.write(self.style.SUCCESS('Python y NumPy generan los mismos cartones'))
+            else:
+                self.stdout.write(self.style.ERROR('Python y NumPy generan cartones distintos'))
+
+    def _report(self, name, cards, elapsed):
+        valid = sum(1 for card in cards if card_is_valid(card))
+        unique = len({pack_card(card) for card in cards})
+        rate = len(cards) / elapsed if elapsed else 0
+        line = f"{name:>7}: {elapsed:.2f}s ({rate:,.0f} cartones/s) | válidos {valid}/{len(cards)} | únicos {unique}"
+        if valid == len(cards) and unique == len(cards):
+            self.stdout.write(self.style.SUCCESS(line))
+        else:
+            self.stdout.write(self.style.WARNING(line))
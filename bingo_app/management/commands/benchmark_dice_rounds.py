@@ -0,0 +1,111 @@
+"""
+Benchmark del motor de rondas de dados (utils.dice_rounds.roll_dice).
+
+Juega --games partidas completas de tres jugadores simulados y, para cada
+lanzamiento, cuenta las consultas y mide la latencia, separando los lanzamientos
+que dejan la ronda abierta, los que la cierran y los que terminan la partida.
+Verifica al final de cada partida que haya un solo ganador con el premio
+acreditado, una transacción DICE_WIN y los créditos bloqueados liberados.
+
+Todo se ejecuta en una transacción que se revierte al final.
+
+Ejecutar: python manage.py benchmark_dice_rounds --games 20
+"""
+
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bingo_app.models import DiceGame, DiceModuleSettings, DicePlayer, Transaction, User
+from bingo_app.utils.dice_rounds import roll_dice
+
+ENTRY_PRICE = Decimal('1.00')
+FINAL_PRIZE = Decimal('2.40')
+MAX_ROLLS = 500
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide consultas y latencia por lanzamiento del motor de rondas de dados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=20, help='Partidas a jugar')
+
+    def handle(self, *args, **options):
+        self.stats = defaultdict(list)
+        self.failures = []
+        try:
+            with transaction.atomic():
+                DiceModuleSettings.objects.filter(pk=DiceModuleSettings.get_settings().pk).update(
+                    accumulated_pool=FINAL_PRIZE * options['games']
+                )
+                for _ in range(options['games']):
+                    self._play()
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write('=== BENCHMARK RONDAS DE DADOS ===')
+        for kind in ('abierta', 'cierre', 'final'):
+            samples = self.stats[kind]
+            if not samples:
+                continue
+            queries = [q for q, _ in samples]
+            latency = sum(ms for _, ms in samples) / len(samples)
+            self.stdout.write(f'{kind:>8}: {len(samples):>5} lanzamientos | consultas máx {max(queries)}, '
+                              f'media {sum(queries) / len(queries):.1f} | {latency:.2f} ms')
+        if self.failures:
+            for failure in self.failures[:50]:
+                self.stdout.write(self.style.ERROR(failure))
+            raise CommandError(f'{len(self.failures)} inconsistencias')
+        self.stdout.write(self.style.SUCCESS('Partidas consistentes: un ganador, premio pagado y créditos liberados'))
+
+    def _play(self):
+        run_id = uuid.uuid4().hex[:6]
+        users = [
+            User.objects.create(username=f'bench_dice_{run_id}_{i}', credit_balance=Decimal('0.00'),
+                                blocked_credits=ENTRY_PRICE)
+            for i in range(3)
+        ]
+        game = DiceGame.objects.create(entry_price=ENTRY_PRICE, base_prize=ENTRY_PRICE * 3, final_prize=FINAL_PRIZE,
+                                       status='PLAYING', started_at=timezone.now())
+        for user in users:
+            DicePlayer.objects.create(user=user, game=game, lives=3)
+
+        for _ in range(MAX_ROLLS):
+            active = list(DicePlayer.objects.filter(game=game, is_eliminated=False).values_list('user_id', flat=True))
+            outcome = None
+            for user_id in active:
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    outcome = roll_dice(game.room_code, user_id)
+                    elapsed = (time.perf_counter() - started) * 1000
+                result = outcome['round_result']
+                kind = 'abierta' if result is None else ('final' if result['game_finished'] else 'cierre')
+                self.stats[kind].append((len(queries.captured_queries), elapsed))
+            if outcome['round_result'] and outcome['round_result']['game_finished']:
+                break
+        self._verify(game, users)
+
+    def _verify(self, game, users):
+        game.refresh_from_db()
+        if game.status != 'FINISHED' or game.winner_id is None:
+            self.failures.append(f'Partida {game.room_code} sin terminar')
+            return
+        balances = {u.id: (u.credit_balance, u.blocked_credits) for u in User.objects.filter(id__in=[u.id for u in users])}
+        for user_id, (credit, blocked) in balances.items():
+            expected = game.final_prize if user_id == game.winner_id else Decimal('0.00')
+            if credit != expected or blocked != Decimal('0.00'):
+                self.failures.append(f'{game.room_code}: usuario {user_id} saldo {credit} bloqueado {blocked}')
+        wins = Transaction.objects.filter(user_id__in=balances, transaction_type='DICE_WIN').count()
+        if wins != 1:
+            self.failures.append(f'{game.room_code}: {wins} transacciones DICE_WIN')
@@ -0,0 +1,126 @@
+"""
+Benchmark de compra de tickets de rifa.
+
+Compara, sobre una rifa y un comprador temporales:
+- legacy: un Ticket.objects.create y un Transaction.objects.create por número (la
+  antigua buy_multiple_tickets)
+- bulk: utils.ticket_purchase.purchase_tickets (bulk_create y un solo asiento)
+
+Para cada tamaño informa la latencia y la cantidad de consultas. Todo se ejecuta en
+una transacción que se revierte al final, salvo con --keep.
+
+Ejecutar: python manage.py benchmark_ticket_purchase --sizes 1,100,1000
+
+La regresión (mismas consultas para cualquier tamaño) la cubre TicketPurchaseTests.
+"""
+
+import datetime
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bingo_app.models import Raffle, Ticket, Transaction, User
+from bingo_app.utils.raffle_tickets import mark_sold
+from bingo_app.utils.ticket_purchase import TICKET_PURCHASE_MAX, purchase_tickets
+
+TICKET_PRICE = Decimal('1.00')
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_purchase(user, raffle, numbers):
+    with transaction.atomic():
+        buyer = User.objects.select_for_update().get(pk=user.pk)
+        total_cost = raffle.ticket_price * len(numbers)
+        buyer.credit_balance -= total_cost
+        buyer.save()
+
+        locked_raffle = mark_sold(Raffle.objects.select_for_update().get(pk=raffle.pk), numbers)
+        raffle.sold_count = locked_raffle.sold_count
+        raffle.sold_bitmap = locked_raffle.sold_bitmap
+        for number in numbers:
+            Ticket.objects.create(raffle=raffle, number=number, owner=buyer)
+            Transaction.objects.create(
+                user=buyer,
+                amount=-raffle.ticket_price,
+                transaction_type='PURCHASE',
+                description=f"Ticket #{number} para rifa: {raffle.title}"
+            )
+        raffle.held_balance += total_cost
+        raffle.save()
+
+
+class Command(BaseCommand):
+    help = 'Mide la compra de tickets de rifa: un INSERT por número frente a bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='1,100,1000',
+                            help='Cantidades de tickets por compra, separadas por comas')
+        parser.add_argument('--keep', action='store_true', help='Conservar los datos creados')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        if not sizes or min(sizes) < 1 or max(sizes) > TICKET_PURCHASE_MAX:
+            raise CommandError(f'Los tamaños deben estar entre 1 y {TICKET_PURCHASE_MAX}')
+
+        try:
+            with transaction.atomic():
+                self._run(sizes)
+                if not options['keep']:
+                    raise _Rollback
+        except _Rollback:
+            self.stdout.write('Datos del benchmark revertidos')
+
+    def _run(self, sizes):
+        stamp = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        # El umbral de IN_PROGRESS (50%) no debe alcanzarse durante la prueba
+        total_numbers = sum(sizes) * 2 * 2 + 10
+        organizer = User.objects.create_user(username=f'bench_org_{stamp}', password=None, is_organizer=True)
+        buyer = User.objects.create_user(username=f'bench_buyer_{stamp}', password=None)
+        User.objects.filter(pk=buyer.pk).update(credit_balance=TICKET_PRICE * total_numbers)
+        raffle = Raffle.objects.create(
+            organizer=organizer,
+            title=f'Benchmark {stamp}',
+            ticket_price=TICKET_PRICE,
+            prize=Decimal('0'),
+            start_number=1,
+            end_number=total_numbers,
+            draw_date=timezone.now() + datetime.timedelta(days=1),
+        )
+
+        self.stdout.write('=== BENCHMARK COMPRA DE TICKETS ===')
+        self.stdout.write(f"{'tickets':>8} | {'legacy ms':>10} | {'consultas':>9} | {'bulk ms':>9} | {'consultas':>9}")
+
+        next_number = raffle.start_number
+        for size in sizes:
+            legacy_numbers = list(range(next_number, next_number + size))
+            bulk_numbers = list(range(next_number + size, next_number + 2 * size))
+            next_number += 2 * size
+
+            raffle.refresh_from_db()
+            legacy_ms, legacy_queries = self._measure(lambda: legacy_purchase(buyer, raffle, legacy_numbers))
+            bulk_ms, bulk_queries = self._measure(
+                lambda: purchase_tickets(buyer, raffle.id, bulk_numbers, notify=False)
+            )
+            self.stdout.write(f'{size:>8} | {legacy_ms:10.1f} | {legacy_queries:>9} | {bulk_ms:9.1f} | {bulk_queries:>9}')
+
+        raffle.refresh_from_db()
+        tickets = raffle.tickets.count()
+        if raffle.sold_count != tickets or raffle.held_balance != TICKET_PRICE * tickets:
+            raise CommandError(
+                f'Inconsistencia: sold_count {raffle.sold_count}, tickets {tickets}, held_balance {raffle.held_balance}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Rifa consistente: {tickets} tickets, held_balance {raffle.held_balance}'))
+
+    def _measure(self, purchase):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            purchase()
+            elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, len(queries.captured_queries)
@@ -0,0 +1,62 @@
+"""
+Exporta el libro contable a archivos comprimidos (.csv.gz o .jsonl.gz).
+
+Conjuntos: transactions, withdrawals, credit_requests y receivable_payments (ver
+utils.ledger_export). Las filas se leen en bloques con un cursor del lado del
+servidor y se escriben directo al archivo gzip, así que la memoria no crece con la
+cantidad de filas.
+
+Ejecutar: python manage.py export_ledger --dataset all --format csv --from 2025-01-01 --to 2025-01-31 --output-dir exports/
+"""
+
+import datetime
+import gzip
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bingo_app.utils.ledger_export import EXPORT_DATASETS, EXPORT_FORMATS, day_bounds, iter_export
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Fecha inválida: {value} (usar AAAA-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = 'Exporta transacciones, retiros, recargas y abonos a archivos gzip (CSV o JSONL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', choices=list(EXPORT_DATASETS) + ['all'], default='all')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--franchise', type=int, help='ID de la franquicia')
+        parser.add_argument('--from', dest='date_from', type=_date, help='Fecha inicial (incluida)')
+        parser.add_argument('--to', dest='date_to', type=_date, help='Fecha final (incluida)')
+        parser.add_argument('--output-dir', default='.', help='Directorio de salida')
+
+    def handle(self, *args, **options):
+        if options['date_from'] and options['date_to'] and options['date_from'] > options['date_to']:
+            raise CommandError('La fecha inicial no puede ser posterior a la final')
+        os.makedirs(options['output_dir'], exist_ok=True)
+
+        datasets = list(EXPORT_DATASETS) if options['dataset'] == 'all' else [options['dataset']]
+        start, end = day_bounds(options['date_from'], options['date_to'])
+        stamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+
+        for dataset in datasets:
+            path = os.path.join(options['output_dir'], f"{dataset}_{stamp}.{options['format']}.gz")
+            started = time.perf_counter()
+            lines = 0
+            with gzip.open(path, 'wt', encoding='utf-8', newline='') as output:
+                for line in iter_export(dataset, options['format'], options['franchise'], start, end):
+                    output.write(line)
+                    lines += 1
+            rows = lines - 1 if options['format'] == 'csv' else lines
+            self.stdout.write(self.style.SUCCESS(
+                f"{dataset}: {rows} filas -> {path} ({os.path.getsize(path) / 1024:.1f} KB, "
+                f"{time.perf_counter() - started:.2f}s)"
+            ))
@@ -20,6 +20,7 @@ from bingo_app.models import (
     BingoTicket,
     User,
 )
+from bingo_app.utils.ledger_rollups import rebuild_ledger_rollups
 
 
 class Command(BaseCommand):
@@ -167,6 +168,7 @@ class Command(BaseCommand):
                 count = Ticket.objects.count()
                 Ticket.objects.all().delete()
                 deleted_counts["tickets"] = count
+                Raffle.objects.update(sold_bitmap=b'', sold_count=0)
 
                 # 4. BingoTickets
                 count = BingoTicket.objects.count()
@@ -254,6 +256,9 @@ class Command(BaseCommand):
                     Transaction.objects.all().delete()
                     deleted_counts["remaining_transactions"] = remaining_transactions
 
+                # 18. Rollups del libro: sin esto el dashboard sigue sumando lo borrado
+                rebuild_ledger_rollups()
+
             total_deleted = sum(deleted_counts.values())
             self.stdout.write("=" * 60)
             self.stdout.write("✅ LIMPIEZA COMPLETADA EXITOSAMENTE")
@@ -275,6 +280,7 @@ from bingo_app.models import (
     WithdrawalRequestNotification, PrintableCard, VideoCallGroup,
     BingoTicket, User
 )
+from bingo_app.utils.ledger_rollups import rebuild_ledger_rollups
 
 
 class Command(BaseCommand):
@@ -421,6 +427,7 @@ class Command(BaseCommand):
                 count = Ticket.objects.count()
                 Ticket.objects.all().delete()
                 deleted_counts['tickets'] = count
+                Raffle.objects.update(sold_bitmap=b'', sold_count=0)
                 self.stdout.write(self.style.SUCCESS(f'  ✅ Eliminados {count} tickets (bingo clásico)'))
 
                 # 4. Eliminar bingotickets (bingo mejorado)
@@ -525,6 +532,11 @@ class Command(BaseCommand):
                     deleted_counts['remaining_transactions'] = remaining_transactions
                     self.stdout.write(self.style.SUCCESS(f'  ✅ Eliminadas {remaining_transactions} transacciones restantes'))
 
+                # 18. Reconstruir los rollups del libro: el dashboard los usa por debajo
+                # de la marca de agua y, si no, seguiría mostrando el dinero borrado
+                rebuild_ledger_rollups()
+                self.stdout.write(self.style.SUCCESS('  ✅ Rollups del libro reconstruidos'))
+
             self.stdout.write('')
             self.stdout.write(self.style.SUCCESS('='*60))
             self.stdout.write(self.style.SUCCESS('✅ LIMPIEZA COMPLETADA EXITOSAMENTE'))
@@ -0,0 +1,66 @@
+"""
+Reconstruye la bandeja unificada de notificaciones (NotificationInboxItem) y los
+contadores de no leídas (NotificationCounter) desde Message,
+CreditRequestNotification y WithdrawalRequestNotification.
+
+Sirve para el relleno inicial y para corregir contadores después de cambios hechos
+fuera de los flujos normales (admin, UPDATE masivos sin mark_read). Con --check solo
+compara los contadores guardados con las notificaciones sin leer y sale con error si
+hay diferencias.
+
+Ejecutar: python manage.py rebuild_notification_inbox [--user usuario] [--check]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from bingo_app.models import CreditRequestNotification, Message, NotificationCounter, User, WithdrawalRequestNotification
+from bingo_app.utils.notification_inbox import publish_unread_count, rebuild_user_inbox
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye (o verifica con --check) la bandeja de notificaciones y los contadores de no leídas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str, help='Solo este usuario (username)')
+        parser.add_argument('--check', action='store_true', help='Comparar sin escribir')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(
+            Q(received_messages__is_read=False) | Q(credit_notifications__is_read=False)
+            | Q(withdrawal_notifications__is_read=False) | Q(notification_counter__isnull=False)
+        ).distinct()
+        if options['user']:
+            users = User.objects.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"No existe el usuario {options['user']}")
+        user_ids = list(users.values_list('id', flat=True))
+
+        if options['check']:
+            self._check(user_ids)
+            return
+
+        for user_id in user_ids:
+            with transaction.atomic():
+                rebuild_user_inbox(user_id)
+                transaction.on_commit(lambda user_id=user_id: publish_unread_count(user_id), robust=True)
+        self.stdout.write(self.style.SUCCESS(f"Bandeja reconstruida para {len(user_ids)} usuarios"))
+
+    def _check(self, user_ids):
+        stored = dict(NotificationCounter.objects.filter(user_id__in=user_ids).values_list('user_id', 'unread'))
+        differences = []
+        for user_id in user_ids:
+            expected = (
+                Message.objects.filter(recipient_id=user_id, is_read=False).count()
+                + CreditRequestNotification.objects.filter(user_id=user_id, is_read=False).count()
+                + WithdrawalRequestNotification.objects.filter(user_id=user_id, is_read=False).count()
+            )
+            if stored.get(user_id) != expected:
+                differences.append(f"Usuario {user_id}: contador {stored.get(user_id)} (esperado {expected})")
+
+        if differences:
+            for line in differences[:50]:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f'{len(differences)} diferencias en NotificationCounter')
+        self.stdout.write(self.style.SUCCESS(f"NotificationCounter coincide para {len(user_ids)} usuarios"))
@@ -0,0 +1,63 @@
+"""
+Reconstruye OrganizerStats desde Game, Raffle y Transaction.
+
+Sirve para el relleno inicial y para corregir filas después de borrados o cambios
+hechos fuera de los flujos normales (admin, limpiezas). Con --check solo compara las
+filas guardadas con los valores recalculados y sale con error si hay diferencias.
+
+Ejecutar: python manage.py rebuild_organizer_stats [--organizer usuario] [--check]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from bingo_app.models import OrganizerStats, User
+from bingo_app.utils.organizer_stats import compute_event_stats, compute_money_stats, rebuild_organizer_stats
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye (o verifica con --check) las estadísticas desnormalizadas de los organizadores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizer', type=str, help='Solo este organizador (username)')
+        parser.add_argument('--check', action='store_true', help='Comparar sin escribir')
+
+    def handle(self, *args, **options):
+        organizers = User.objects.filter(
+            Q(is_organizer=True) | Q(organized_games__isnull=False) | Q(organized_raffles__isnull=False)
+            | Q(organizer_stats__isnull=False)
+        ).distinct()
+        if options['organizer']:
+            organizers = organizers.filter(username=options['organizer'])
+            if not organizers.exists():
+                raise CommandError(f"No existe el organizador {options['organizer']}")
+        organizer_ids = list(organizers.values_list('id', flat=True))
+
+        if options['check']:
+            self._check(organizer_ids)
+            return
+
+        for organizer_id in organizer_ids:
+            with transaction.atomic():
+                rebuild_organizer_stats(organizer_id)
+        self.stdout.write(self.style.SUCCESS(f"Estadísticas reconstruidas para {len(organizer_ids)} organizadores"))
+
+    def _check(self, organizer_ids):
+        stored = OrganizerStats.objects.in_bulk(organizer_ids)
+        differences = []
+        for organizer_id in organizer_ids:
+            expected = {**compute_event_stats(organizer_id), **compute_money_stats(organizer_id)}
+            stats = stored.get(organizer_id)
+            if stats is None:
+                differences.append(f"Organizador {organizer_id}: sin fila")
+                continue
+            for field, value in expected.items():
+                if getattr(stats, field) != value:
+                    differences.append(f"Organizador {organizer_id}: {field} = {getattr(stats, field)} (esperado {value})")
+
+        if differences:
+            for line in differences[:50]:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f'{len(differences)} diferencias en OrganizerStats')
+        self.stdout.write(self.style.SUCCESS(f"OrganizerStats coincide para {len(organizer_ids)} organizadores"))
@@ -0,0 +1,51 @@
+"""
+Reconstruye el índice de números vendidos (Raffle.sold_bitmap y sold_count) desde
+la tabla Ticket.
+
+Sirve después de borrar o mover tickets fuera de los flujos de compra (admin,
+limpiezas). Con --check solo compara y sale con error si hay diferencias.
+
+Ejecutar: python manage.py rebuild_raffle_bitmaps [--raffle ID] [--check]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from bingo_app.models import Raffle
+from bingo_app.utils.raffle_tickets import build_bitmap, raffle_bitmap, rebuild_sold_bitmap
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye (o verifica con --check) el índice de números vendidos de las rifas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raffle', type=int, help='Solo esta rifa (ID)')
+        parser.add_argument('--check', action='store_true', help='Comparar sin escribir')
+
+    def handle(self, *args, **options):
+        raffles = Raffle.objects.order_by('id')
+        if options['raffle']:
+            raffles = raffles.filter(id=options['raffle'])
+            if not raffles.exists():
+                raise CommandError(f"No existe la rifa {options['raffle']}")
+
+        differences = []
+        total = 0
+        for raffle in raffles.iterator(chunk_size=200):
+            total += 1
+            if options['check']:
+                numbers = list(raffle.tickets.values_list('number', flat=True))
+                expected = build_bitmap([n - raffle.start_number for n in numbers
+                                         if raffle.start_number <= n <= raffle.end_number], raffle.total_tickets)
+                if raffle.sold_count != len(numbers) or raffle_bitmap(raffle).rstrip(b'\x00') != expected.rstrip(b'\x00'):
+                    differences.append(f"Rifa {raffle.id}: sold_count {raffle.sold_count} (tickets {len(numbers)})")
+            else:
+                with transaction.atomic():
+                    rebuild_sold_bitmap(Raffle.objects.select_for_update().get(pk=raffle.pk))
+
+        if differences:
+            for line in differences[:50]:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f'{len(differences)} rifas con el índice desactualizado')
+        action = 'verificado' if options['check'] else 'reconstruido'
+        self.stdout.write(self.style.SUCCESS(f"Índice de vendidos {action} para {total} rifas"))
@@ -0,0 +1,105 @@
+"""
+Reconciliación de los rollups del libro con la tabla Transaction.
+
+1. Cada hora de LedgerRollup (por tipo y promoción) contra la agregación directa de
+   las transacciones hasta la marca de agua.
+2. Los totales del dashboard (ledger_totals / daily_totals) contra los escaneos
+   directos de Transaction para los últimos 7 y 30 días y para todo el libro.
+
+Sale con error si algún número no coincide. Si hay diferencias en las horas (por
+ejemplo, transacciones borradas al eliminar usuarios), corregir con
+update_ledger_rollups --rebuild.
+
+Ejecutar: python manage.py reconcile_ledger_rollups
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from bingo_app.models import LedgerRollup, LedgerRollupState, Transaction
+from bingo_app.utils.ledger_rollups import (
+    METRICS, _is_promotion, _metrics, daily_totals, ledger_totals, transaction_buckets,
+)
+
+DASHBOARD_TYPES = ['PLATFORM_COMMISSION', 'GAME_CREATION_FEE', 'RAFFLE_CREATION_FEE']
+
+
+class Command(BaseCommand):
+    help = 'Verifica que los rollups del libro coincidan con la tabla Transaction'
+
+    def handle(self, *args, **options):
+        watermark = LedgerRollupState.current_watermark()
+        self.stdout.write(f"Marca de agua: transacción {watermark}\n")
+
+        failures = self._check_buckets(watermark)
+        now = timezone.now()
+        for label, start in (('7 días', now - timezone.timedelta(days=7)),
+                             ('30 días', now - timezone.timedelta(days=30)),
+                             ('todo el libro', None)):
+            failures += self._check_range(label, start)
+
+        if failures:
+            for failure in failures[:50]:
+                self.stdout.write(self.style.ERROR(failure))
+            raise CommandError(f'{len(failures)} diferencias entre rollups y transacciones')
+        self.stdout.write(self.style.SUCCESS('Rollups y transacciones coinciden'))
+
+    def _check_buckets(self, watermark):
+        expected = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+        for row in transaction_buckets(Transaction.objects.filter(id__lte=watermark)):
+            totals = expected[(row['bucket'], row['transaction_type'], row['is_promotion'])]
+            for metric in METRICS:
+                totals[metric] += row[metric]
+
+        actual = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+        rollups = LedgerRollup.objects.values('bucket', 'transaction_type', 'is_promotion').annotate(
+            **{metric: Sum(metric) for metric in METRICS}
+        )
+        for row in rollups:
+            totals = actual[(row['bucket'], row['transaction_type'], row['is_promotion'])]
+            for metric in METRICS:
+                totals[metric] += row[metric]
+
+        failures = []
+        for key in sorted(set(expected) | set(actual), key=str):
+            if expected[key] != actual[key]:
+                bucket, transaction_type, is_promotion = key
+                failures.append(f"{bucket:%Y-%m-%d %H:00} {transaction_type} promo={is_promotion}: "
+                                f"transacciones {expected[key]} vs rollup {actual[key]}")
+        self.stdout.write(f"Horas verificadas: {len(expected)}")
+        return failures
+
+    def _check_range(self, label, start):
+        failures = []
+        raw = Transaction.objects.order_by()
+        if start:
+            raw = raw.filter(created_at__gte=start)
+
+        totals = ledger_totals(start)
+        raw_rows = raw.annotate(is_promotion=_is_promotion()).values('transaction_type', 'is_promotion').annotate(**_metrics())
+        for row in raw_rows:
+            for metric in METRICS:
+                combined = totals.sum(metric, types=[row['transaction_type']], promotion=row['is_promotion'])
+                if combined != row[metric]:
+                    failures.append(f"[{label}] {row['transaction_type']} promo={row['is_promotion']} {metric}: "
+                                    f"directo {row[metric]} vs rollups {combined}")
+        if totals.sum('count') != raw.count():
+            failures.append(f"[{label}] cantidad total: directo {raw.count()} vs rollups {totals.sum('count')}")
+
+        raw_days = {
+            row['day']: row['total'] or Decimal('0.00')
+            for row in raw.filter(transaction_type__in=DASHBOARD_TYPES)
+            .annotate(day=TruncDay('created_at')).values('day').annotate(total=Sum('amount'))
+        }
+        combined_days = {row['day']: row['total'] for row in daily_totals(start, types=DASHBOARD_TYPES)}
+        if raw_days != combined_days:
+            failures.append(f"[{label}] ingresos por día: directo {raw_days} vs rollups {combined_days}")
+
+        if not failures:
+            self.stdout.write(f"[{label}] {totals.sum('count')} transacciones: OK")
+        return failures
@@ -0,0 +1,45 @@
+"""
+Worker dedicado de llamada automática de números.
+
+Retoma todos los juegos con is_auto_calling=True y llama números respetando
+auto_call_interval. Puede ejecutarse en varias instancias a la vez: cada juego
+queda bajo un lease en Redis, por lo que solo un worker llama por juego.
+Es el proceso autocall del Procfile (BINGO_AUTO_CALL_MODE='worker'). Requiere el
+estado vivo en Redis (BINGO_LIVE_STATE_BACKEND='redis' y REDIS_URL): con el backend
+en memoria los procesos web no verían los números que llama.
+
+Ejecutar: python manage.py run_auto_call_scheduler
+"""
+
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bingo_app.utils.auto_call_scheduler import AutoCallScheduler
+from bingo_app.utils.live_state import get_live_state_store
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta el planificador distribuido de llamada automática de números'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tick', type=float, default=None,
+                            help='Segundos por casilla de la rueda de temporizadores')
+        parser.add_argument('--discovery-interval', type=float, default=None,
+                            help='Segundos entre búsquedas de juegos con auto-calling activo')
+
+    def handle(self, *args, **options):
+        if not get_live_state_store().shared:
+            raise CommandError(
+                "El estado vivo está en memoria: configura BINGO_LIVE_STATE_BACKEND='redis' y REDIS_URL, "
+                "o usa BINGO_AUTO_CALL_MODE='inline' para llamar dentro del proceso web"
+            )
+        scheduler = AutoCallScheduler(
+            tick=options['tick'],
+            discovery_interval=options['discovery_interval'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Planificador de auto-calling iniciado ({scheduler.owner})'))
+        try:
+            asyncio.run(scheduler.run())
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Planificador detenido'))
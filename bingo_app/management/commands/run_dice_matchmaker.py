@@ -0,0 +1,36 @@
+"""
+Worker dedicado de matchmaking del módulo de dados.
+
+Consume los eventos de entrada y salida de la cola que publican las vistas en Redis,
+mantiene las colas FIFO por precio en memoria y crea las partidas apenas hay tres
+jugadores del mismo precio (ver utils.dice_matchmaking). Al arrancar, y cada
+--resync-interval segundos, reconstruye las colas desde DiceMatchmakingQueue.
+
+Es el proceso matchmaker del Procfile; debe ejecutarse una sola instancia. Si está
+caído, el trabajo periódico dice.matchmaking_resync del worker forma los tríos.
+
+Ejecutar: python manage.py run_dice_matchmaker
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bingo_app.utils.dice_matchmaking import DiceMatchmaker, get_matchmaking_events, run_matchmaker
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta el worker de matchmaking de dados (colas por precio, anuncio con match_found)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resync-interval', type=float, default=None,
+                            help='Segundos entre reconstrucciones de las colas desde la base')
+
+    def handle(self, *args, **options):
+        events = get_matchmaking_events()
+        if events is None:
+            raise CommandError('Requiere BINGO_DICE_MATCHMAKING_BACKEND=redis y REDIS_URL; '
+                               'con backend en memoria el matchmaking corre en el proceso web')
+        self.stdout.write(self.style.SUCCESS('Worker de matchmaking de dados iniciado'))
+        try:
+            run_matchmaker(DiceMatchmaker(), events, resync_interval=options['resync_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Worker de matchmaking detenido'))
@@ -0,0 +1,42 @@
+"""
+Worker de trabajos en segundo plano (utils.jobs): emails y análisis con Gemini.
+
+Toma los trabajos PENDING de la base respetando el límite de concurrencia de cada
+cola (BINGO_JOB_QUEUES), reintenta los fallidos con espera exponencial y libera los
+que quedaron en ejecución en un worker caído. Pueden correr varias instancias.
+
+Ejecutar: python manage.py run_job_worker [--queues email,ai] [--once]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bingo_app.utils.jobs import new_worker_id, queue_limits, run_worker
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los trabajos en segundo plano (emails, IA)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queues', default='',
+                            help='Colas a atender separadas por coma (por defecto todas las de BINGO_JOB_QUEUES)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Segundos de espera cuando no hay trabajos listos')
+        parser.add_argument('--once', action='store_true',
+                            help='Ejecuta los trabajos listos y termina')
+
+    def handle(self, *args, **options):
+        queues = [queue.strip() for queue in options['queues'].split(',') if queue.strip()] or None
+        unknown = set(queues or []) - set(queue_limits())
+        if unknown:
+            raise CommandError(f"Colas sin límite configurado en BINGO_JOB_QUEUES: {', '.join(sorted(unknown))}")
+
+        worker_id = new_worker_id()
+        if options['once']:
+            processed = run_worker(queues, worker_id=worker_id, once=True)
+            self.stdout.write(self.style.SUCCESS(f'{processed} trabajos ejecutados'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Worker de trabajos iniciado ({worker_id})'))
+        try:
+            run_worker(queues, poll_interval=options['poll_interval'], worker_id=worker_id)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Worker de trabajos detenido'))
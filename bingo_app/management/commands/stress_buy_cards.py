@@ -0,0 +1,143 @@
+"""
+Prueba de concurrencia de la compra de cartones (purchase_cards).
+
+Crea un organizador, un juego y N compradores con saldo, lanza compras simultáneas
+desde varios hilos y verifica que no haya actualizaciones perdidas:
+- total_cards_sold del juego == cartones de las compras exitosas
+- saldo inicial - saldo final de cada comprador == precio * cartones del jugador
+- total_cards_sold del juego == suma de cartones de los jugadores
+- held_balance del juego == precio * total_cards_sold
+- transacciones PURCHASE == débitos realizados
+- ningún cartón se repite dentro del juego
+- ninguna compra terminó con un error inesperado
+
+Si alguna verificación falla el comando termina con código distinto de cero.
+
+Con SQLite las escrituras se serializan y pueden aparecer errores de "database is
+locked"; la prueba representativa es contra PostgreSQL (DATABASE_URL).
+
+Ejecutar: python manage.py stress_buy_cards --buyers 20 --threads 16 --purchases 10
+"""
+
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from bingo_app.models import Game, Player, Transaction, User
+from bingo_app.utils.card_generator import pack_card
+from bingo_app.utils.card_purchase import CardPurchaseError, purchase_cards
+
+
+class Command(BaseCommand):
+    help = 'Prueba de estrés de compras concurrentes de cartones sin actualizaciones perdidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=20, help='Cantidad de compradores')
+        parser.add_argument('--threads', type=int, default=16, help='Hilos concurrentes')
+        parser.add_argument('--purchases', type=int, default=10, help='Compras por hilo')
+        parser.add_argument('--keep', action='store_true', help='No borrar los datos de prueba al final')
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:6]
+        card_price = Decimal('1.00')
+        initial_balance = Decimal('1000.00')
+
+        self.stdout.write("=== PRUEBA DE ESTRÉS: COMPRA DE CARTONES ===\n")
+        organizer = User.objects.create(username=f'stress_org_{run_id}', is_organizer=True)
+        game = Game.objects.create(
+            name=f'Stress {run_id}',
+            organizer=organizer,
+            card_price=card_price,
+            max_cards_per_player=10000,
+            base_prize=Decimal('10.00'),
+        )
+        buyers = [
+            User.objects.create(username=f'stress_buyer_{run_id}_{i}', credit_balance=initial_balance)
+            for i in range(options['buyers'])
+        ]
+        for buyer in buyers:
+            Player.objects.create(user=buyer, game=game)
+
+        results = {'ok': 0, 'rejected': 0, 'errors': 0, 'cards': 0}
+        results_lock = threading.Lock()
+
+        def worker(index):
+            try:
+                for n in range(options['purchases']):
+                    buyer = buyers[(index + n) % len(buyers)]
+                    quantity = 1 + (index + n) % 3
+                    bought = 0
+                    try:
+                        purchase_cards(buyer, game.id, quantity)
+                        outcome, bought = 'ok', quantity
+                    except CardPurchaseError:
+                        outcome = 'rejected'
+                    except Exception as e:
+                        self.stdout.write(self.style.WARNING(f"Hilo {index}: {str(e)}"))
+                        outcome = 'errors'
+                    with results_lock:
+                        results[outcome] += 1
+                        results['cards'] += bought
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f"Compras exitosas: {results['ok']}, rechazadas: {results['rejected']}, errores: {results['errors']}")
+        self.stdout.write(f"Tiempo: {elapsed:.2f}s ({(results['ok'] / elapsed) if elapsed else 0:.1f} compras/s)\n")
+
+        failures = self._verify(game, buyers, initial_balance, card_price, results['cards'])
+        if results['errors']:
+            failures.append(f"{results['errors']} compras terminaron con error")
+
+        if not options['keep']:
+            Transaction.objects.filter(related_game=game).delete()
+            game.delete()
+            User.objects.filter(id__in=[b.id for b in buyers] + [organizer.id]).delete()
+
+        if failures:
+            for failure in failures:
+                self.stdout.write(self.style.ERROR(failure))
+            raise CommandError('Se detectaron actualizaciones perdidas o compras con error')
+        self.stdout.write(self.style.SUCCESS('Sin actualizaciones perdidas: saldos, contadores y transacciones cuadran'))
+
+    def _verify(self, game, buyers, initial_balance, card_price, cards_bought):
+        failures = []
+        game.refresh_from_db()
+        total_cards = 0
+        seen_cards = set()
+        for player in Player.objects.filter(game=game).select_related('user'):
+            cards = len(player.cards)
+            total_cards += cards
+            seen_cards.update(pack_card(card) for card in player.cards)
+            spent = initial_balance - player.user.credit_balance
+            if spent != card_price * cards:
+                failures.append(f"{player.user.username}: gastó {spent} pero tiene {cards} cartones")
+            debits = Transaction.objects.filter(
+                user=player.user, related_game=game, transaction_type='PURCHASE'
+            ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+            if -debits != spent:
+                failures.append(f"{player.user.username}: transacciones {debits} vs débito {spent}")
+
+        if game.total_cards_sold != cards_bought:
+            failures.append(f"total_cards_sold={game.total_cards_sold} pero las compras exitosas suman {cards_bought}")
+        if game.total_cards_sold != total_cards:
+            failures.append(f"total_cards_sold={game.total_cards_sold} pero los jugadores tienen {total_cards}")
+        if len(seen_cards) != total_cards:
+            failures.append(f"Cartones repetidos: {total_cards - len(seen_cards)}")
+        if game.held_balance != card_price * total_cards:
+            failures.append(f"held_balance={game.held_balance} esperado {card_price * total_cards}")
+
+        self.stdout.write(f"Cartones vendidos: {game.total_cards_sold} | held_balance: {game.held_balance} | premio: {game.prize}")
+        return failures
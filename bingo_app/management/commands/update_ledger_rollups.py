@@ -0,0 +1,50 @@
+"""
+Actualiza los rollups del libro de transacciones (LedgerRollup).
+
+Procesa solo las transacciones posteriores a la marca de agua. En producción lo
+hace el worker de trabajos (ledger.rollups, cada BINGO_LEDGER_ROLLUP_INTERVAL);
+el comando sirve para ponerse al día a mano o en bucle con --interval. Con --rebuild borra
+los rollups y reprocesa todo el libro.
+
+Ejecutar: python manage.py update_ledger_rollups [--rebuild] [--interval 60]
+"""
+
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from bingo_app.models import LedgerRollupState
+from bingo_app.utils.ledger_rollups import (
+    ROLLUP_BATCH_SIZE, catch_up_ledger_rollups, rebuild_ledger_rollups,
+)
+
+
+class Command(BaseCommand):
+    help = 'Suma a los rollups del libro las transacciones nuevas desde la marca de agua'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Borrar los rollups y reprocesar todo')
+        parser.add_argument('--batch-size', type=int, default=ROLLUP_BATCH_SIZE,
+                            help='Transacciones por lote (por id)')
+        parser.add_argument('--lag', type=int, default=None,
+                            help='Segundos recientes que se dejan sin procesar (BINGO_LEDGER_ROLLUP_LAG)')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Repetir cada N segundos en lugar de ejecutar una vez')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            processed = rebuild_ledger_rollups()
+            self.stdout.write(self.style.SUCCESS(f'Rollups reconstruidos: {processed} transacciones'))
+            if options['interval'] is None:
+                return
+
+        lag = datetime.timedelta(seconds=options['lag']) if options['lag'] is not None else None
+        while True:
+            processed = catch_up_ledger_rollups(batch_size=options['batch_size'], lag=lag)
+            self.stdout.write(self.style.SUCCESS(
+                f'Procesadas {processed} transacciones (marca de agua: {LedgerRollupState.current_watermark()})'
+            ))
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -47,7 +47,11 @@ class FranchiseMiddleware(MiddlewareMixin):
     Detecta la franquicia por dominio personalizado o por usuario.
     """
     def process_request(self, request):
-        from .models import Franchise
+        # Las franquicias salen del directorio en memoria (utils.franchise_cache):
+        # las peticiones habituales no consultan la tabla Franchise
+        from .utils.franchise_cache import get_franchise_directory
+        
+        directory = get_franchise_directory()
         
         # Inicializar request.franchise como None
         request.franchise = None
@@ -55,15 +59,12 @@ class FranchiseMiddleware(MiddlewareMixin):
         # 1. PRIMERO: Intentar detectar por dominio personalizado
         host = request.get_host()
         if host:
-            # Limpiar el host (quitar puerto si existe)
-            host = host.split(':')[0].lower()
-            
-            # Intentar obtener franquicia por dominio personalizado
-            franchise_by_domain = Franchise.get_by_domain(host)
+            # Intentar obtener franquicia por dominio personalizado (los hosts desconocidos también se recuerdan)
+            franchise_by_domain = directory.by_domain(host)
             if franchise_by_domain:
                 request.franchise = franchise_by_domain
                 # Guardar en sesión para mantenerla después de logout
-                request.session['franchise_id'] = franchise_by_domain.id
+                remember_franchise(request, franchise_by_domain)
                 # Si se detecta por dominio, no continuar con la lógica de usuario
                 return None
         
@@ -71,35 +72,27 @@ class FranchiseMiddleware(MiddlewareMixin):
         if not request.franchise:
             franchise_id = request.session.get('franchise_id')
             if franchise_id:
-                try:
-                    request.franchise = Franchise.objects.get(id=franchise_id, is_active=True)
-                except Franchise.DoesNotExist:
+                request.franchise = directory.get(franchise_id, active_only=True)
+                if request.franchise is None:
                     # Si la franquicia ya no existe o está inactiva, limpiar sesión
                     request.session.pop('franchise_id', None)
         
-        # 2. SEGUNDO: Si no hay dominio personalizado, usar lógica de usuario
+        # 2. SEGUNDO: Si no hay dominio personalizado, usar lógica de usuario.
+        # Super admins y usuarios normales: primero la franquicia propia y luego a la que
+        # pertenecen; sin ninguna, los super admins ven todo y los demás quedan sin franquicia
         if request.user.is_authenticated:
-            # Si el usuario es super admin, puede ver todo (franchise = None)
-            if request.user.is_superuser or request.user.is_admin:
-                # Los super admins pueden ver todo, pero también pueden tener una franquicia asignada
-                # Si tienen una franquicia propia, usarla
-                if hasattr(request.user, 'owned_franchise'):
-                    request.franchise = request.user.owned_franchise
-                elif request.user.franchise:
-                    request.franchise = request.user.franchise
-                # Si no tienen franquicia, pueden ver todo (franchise = None)
-            else:
-                # Usuarios normales: usar su franquicia
-                if hasattr(request.user, 'owned_franchise'):
-                    # Es propietario de una franquicia
-                    request.franchise = request.user.owned_franchise
-                elif request.user.franchise:
-                    # Pertenece a una franquicia
-                    request.franchise = request.user.franchise
-                # Si no tiene franquicia, request.franchise = None (usuario sin franquicia)
+            user_franchise = directory.owned_by(request.user.id) or directory.get(request.user.franchise_id)
+            if user_franchise:
+                request.franchise = user_franchise
             
             # Guardar franquicia del usuario en sesión para mantenerla después de logout
             if request.franchise:
-                request.session['franchise_id'] = request.franchise.id
+                remember_franchise(request, request.franchise)
         
-        return None
\ No newline at end of file
+        return None
+
+
+def remember_franchise(request, franchise):
+    """Guarda la franquicia en sesión solo si cambió, para no reescribir la sesión en cada petición."""
+    if request.session.get('franchise_id') != franchise.id:
+        request.session['franchise_id'] = franchise.id
@@ -0,0 +1,58 @@
+# Cartones del jugador en formato binario empaquetado (utils.card_storage)
+
+from django.db import migrations
+
+import bingo_app.utils.card_storage
+
+
+def pack_player_cards(apps, schema_editor):
+    from bingo_app.utils.card_storage import encode_cards
+
+    Player = apps.get_model('bingo_app', 'Player')
+    batch = []
+    for player in Player.objects.only('id', 'cards').iterator(chunk_size=2000):
+        player.cards_packed = encode_cards(player.cards or [])
+        batch.append(player)
+        if len(batch) >= 2000:
+            Player.objects.bulk_update(batch, ['cards_packed'])
+            batch = []
+    if batch:
+        Player.objects.bulk_update(batch, ['cards_packed'])
+
+
+def unpack_player_cards(apps, schema_editor):
+    Player = apps.get_model('bingo_app', 'Player')
+    batch = []
+    for player in Player.objects.only('id', 'cards_packed').iterator(chunk_size=2000):
+        player.cards = list(player.cards_packed or [])
+        batch.append(player)
+        if len(batch) >= 2000:
+            Player.objects.bulk_update(batch, ['cards'])
+            batch = []
+    if batch:
+        Player.objects.bulk_update(batch, ['cards'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo_app', '0063_add_accumulated_pool_to_dice_settings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='cards_packed',
+            field=bingo_app.utils.card_storage.PackedCardsField(default=list),
+        ),
+        migrations.RunPython(pack_player_cards, unpack_player_cards),
+        migrations.RemoveField(
+            model_name='player',
+            name='cards',
+        ),
+        migrations.RenameField(
+            model_name='player',
+            old_name='cards_packed',
+            new_name='cards',
+        ),
+    ]
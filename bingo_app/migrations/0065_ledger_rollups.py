@@ -0,0 +1,46 @@
+# Rollups del libro de transacciones (utils.ledger_rollups)
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo_app', '0064_player_cards_packed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_transaction_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='LedgerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='Inicio de la hora (UTC)')),
+                ('transaction_type', models.CharField(choices=[('ENTRY_FEE', 'Entrada a juego'), ('PURCHASE', 'Compra de cartones'), ('ADMIN_ADD', 'Recarga administrativa'), ('PRIZE', 'Premio de juego'), ('GAME_CREATION_FEE', 'Tarifa de creación de juego'), ('RAFFLE_CREATION_FEE', 'Tarifa de creación de rifa'), ('PRIZE_LOCK', 'Bloqueo de premio'), ('PRIZE_UNLOCK', 'Desbloqueo de premio'), ('ORGANIZER_REVENUE', 'Ingresos del organizador'), ('PLATFORM_COMMISSION', 'Comisión de la plataforma'), ('WITHDRAWAL', 'Retiro de créditos'), ('WITHDRAWAL_REFUND', 'Reembolso de retiro'), ('OTHER', 'Otra transacción')], max_length=20)),
+                ('is_promotion', models.BooleanField(default=False)),
+                ('franchise_id', models.IntegerField(blank=True, null=True)),
+                ('role', models.CharField(choices=[('ADMIN', 'Administrador'), ('ORGANIZER', 'Organizador'), ('PLAYER', 'Jugador')], max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('positive_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('negative_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('large_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket', 'transaction_type'], name='bingo_app_l_bucket_d16276_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Estadísticas desnormalizadas por organizador (utils.organizer_stats)
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo_app', '0065_ledger_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizerStats',
+            fields=[
+                ('organizer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='organizer_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('games_created', models.PositiveIntegerField(default=0)),
+                ('raffles_created', models.PositiveIntegerField(default=0)),
+                ('games_completed', models.PositiveIntegerField(default=0)),
+                ('raffles_completed', models.PositiveIntegerField(default=0)),
+                ('completed_game_players', models.PositiveIntegerField(default=0)),
+                ('completed_raffle_tickets', models.PositiveIntegerField(default=0)),
+                ('net_revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('creation_fees', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('commissions_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('prizes_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
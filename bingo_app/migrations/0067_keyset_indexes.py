@@ -0,0 +1,25 @@
+# Índices para el historial de transacciones y la gestión de usuarios paginados por cursor
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo_app', '0066_organizer_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'created_at'], name='bingo_tx_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_type', 'created_at'], name='bingo_tx_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['date_joined', 'id'], name='bingo_user_joined_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Índice de números vendidos por rifa (utils.raffle_tickets)
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_sold_bitmaps(apps, schema_editor):
+    Raffle = apps.get_model('bingo_app', 'Raffle')
+    Ticket = apps.get_model('bingo_app', 'Ticket')
+
+    sold = defaultdict(list)
+    for raffle_id, number in Ticket.objects.values_list('raffle_id', 'number').iterator(chunk_size=5000):
+        sold[raffle_id].append(number)
+
+    for raffle in Raffle.objects.filter(id__in=list(sold)).only('id', 'start_number', 'end_number'):
+        numbers = sold[raffle.id]
+        bitmap = bytearray((raffle.end_number - raffle.start_number + 8) // 8)
+        for number in numbers:
+            offset = number - raffle.start_number
+            if 0 <= offset <= raffle.end_number - raffle.start_number:
+                bitmap[offset >> 3] |= 0x80 >> (offset & 7)
+        Raffle.objects.filter(pk=raffle.id).update(sold_bitmap=bytes(bitmap), sold_count=len(numbers))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo_app', '0067_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raffle',
+            name='sold_bitmap',
+            field=models.BinaryField(default=bytes, editable=False),
+        ),
+        migrations.AddField(
+            model_name='raffle',
+            name='sold_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_sold_bitmaps, migrations.RunPython.noop),
+    ]
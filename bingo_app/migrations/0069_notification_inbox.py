@@ -0,0 +1,40 @@
+# Índice unificado de notificaciones y contador de no leídas (utils.notification_inbox)
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo_app', '0068_raffle_sold_bitmap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationInboxItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('MESSAGE', 'Mensaje'), ('CREDIT_REQUEST', 'Solicitud de crédito'), ('WITHDRAWAL_REQUEST', 'Solicitud de retiro')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('actor_name', models.CharField(blank=True, max_length=150)),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='inbox_user_unread_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='inbox_unique_source')],
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Conversaciones privadas con contador de no leídos por lado (utils.conversations)
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_conversations(apps, schema_editor):
+    """Crea una Conversation por par de usuarios y le asigna sus mensajes existentes."""
+    Conversation = apps.get_model('bingo_app', 'Conversation')
+    Message = apps.get_model('bingo_app', 'Message')
+
+    pairs = {}
+    rows = Message.objects.order_by('timestamp', 'id').values_list('id', 'sender_id', 'recipient_id', 'timestamp', 'is_read')
+    for message_id, sender_id, recipient_id, timestamp, is_read in rows.iterator(chunk_size=2000):
+        low, high = sorted((sender_id, recipient_id))
+        pair = pairs.setdefault((low, high), {'ids': [], 'low_unread': 0, 'high_unread': 0})
+        pair['ids'].append(message_id)
+        pair['last'] = (message_id, timestamp)
+        if not is_read:
+            pair['low_unread' if recipient_id == low else 'high_unread'] += 1
+
+    for (low, high), pair in pairs.items():
+        last_id, last_at = pair['last']
+        conversation = Conversation.objects.create(
+            user_low_id=low, user_high_id=high,
+            low_unread=pair['low_unread'], high_unread=pair['high_unread'],
+            last_message_id=last_id, last_message_at=last_at,
+        )
+        ids = pair['ids']
+        for start in range(0, len(ids), 1000):
+            Message.objects.filter(id__in=ids[start:start + 1000]).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo_app', '0069_notification_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('low_unread', models.PositiveIntegerField(default=0)),
+                ('high_unread', models.PositiveIntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bingo_app.message')),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['user_low', '-last_message_at'], name='conversation_low_recent_idx'),
+                    models.Index(fields=['user_high', '-last_message_at'], name='conversation_high_recent_idx'),
+                ],
+                'constraints': [models.UniqueConstraint(fields=('user_low', 'user_high'), name='conversation_unique_pair')],
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='bingo_app.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-timestamp', '-id'], name='message_conversation_idx'),
+        ),
+        migrations.RunPython(assign_conversations, migrations.RunPython.noop),
+    ]
@@ -12,6 +12,16 @@ from django.db.models import Sum
 from django.shortcuts import get_object_or_404
 from asgiref.sync import async_to_sync  # Necesario para llamadas síncronas a Channels
 from channels.layers import get_channel_layer  # Para enviar mensajes via WebSocket
+from bingo_app.utils.bingo_patterns import card_has_bingo, compile_pattern, discard_game_index, find_game_winners
+from bingo_app.utils.card_generator import discard_card_pool, generate_cards
+from bingo_app.utils.card_storage import PackedCardsField
+from bingo_app.utils.lobby_data import invalidate_lobby_cache
+from bingo_app.utils.raffle_draw import pay_raffle_prizes, resolve_multiple_winners
+from bingo_app.utils.organizer_stats import get_organizer_stats, refresh_event_stats
+from bingo_app.utils.live_state import apply_live_state, close_live_state, flush_live_state, get_live_state_store
+from bingo_app.utils.game_broadcast import broadcast_on_commit, progress_aggregator
+from bingo_app.utils.settings_cache import get_dice_settings, get_percentage_settings
+from bingo_app.utils.franchise_cache import normalize_domain
 
 
 REPUTATION_CHOICES = [
@@ -69,9 +79,12 @@ class User(AbstractUser):
         if self.manual_reputation != 'AUTO':
             return self.get_manual_reputation_display()
 
-        completed_games = self.organized_games.filter(is_finished=True).count()
-        completed_raffles = self.organized_raffles.filter(status='FINISHED').count()
+        # Solo lectura: mostrar la reputación no crea la fila de estadísticas
+        stats = getattr(self, 'prefetched_organizer_stats', None) or get_organizer_stats(self.id, save=False)
+        return stats.reputation_level
 
+    @staticmethod
+    def reputation_from_counts(completed_games, completed_raffles):
         if completed_games >= 151 and completed_raffles >= 10:
             return "Platino"
         elif completed_games >= 61 and completed_raffles >= 4:
@@ -119,6 +132,11 @@ class User(AbstractUser):
         help_text="Franquicia a la que pertenece este usuario (si aplica)"
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['date_joined', 'id'], name='bingo_user_joined_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -299,14 +317,15 @@ class Game(models.Model):
         return int((cards_for_progress / target) * 100)
 
     def call_number(self):
-        available_numbers = [n for n in range(1, 76) if n not in self.called_numbers]
-        if available_numbers:
-            number = secrets.choice(available_numbers)
-            self.current_number = number
-            self.called_numbers.append(number)
-            self.save()
-            return number
-        return None
+        # El número se registra en el estado vivo; Game se actualiza por lotes
+        # (sin el save() completo que recalcula el premio en cada llamada)
+        store = get_live_state_store()
+        number = store.call_number(self)
+        if number is None:
+            return None
+        apply_live_state(self, store=store)
+        flush_live_state(self, store=store)
+        return number
     
     def start_game(self):
         if not self.is_started and not self.is_finished:
@@ -329,7 +348,7 @@ class Game(models.Model):
 
     def _distribute_revenue(self):
         logger.warning(f"[Game {self.id}] Iniciando _distribute_revenue.")
-        percentage_settings = PercentageSettings.objects.first()
+        percentage_settings = get_percentage_settings()
         if not percentage_settings:
             logger.error(f"[Game {self.id}] PercentageSettings no encontradas. No se puede distribuir la ganancia.")
             raise Exception("PercentageSettings no configuradas. No se puede distribuir la ganancia.")
@@ -383,8 +402,58 @@ class Game(models.Model):
         organizer.total_completed_events += 1
         organizer.save()
         self.organizer.refresh_from_db()
+        refresh_event_stats(self.organizer_id)
         logger.warning(f"[Game {self.id}] Eventos completados del organizador: {self.organizer.total_completed_events}")
 
+    def _pay_winners(self, winner_ids, player_prize_per_winner):
+        """
+        Acredita el premio a cada ganador (filas bloqueadas con una sola consulta, en
+        orden de id) y devuelve los avisos con el saldo ya actualizado de cada uno.
+        """
+        from bingo_app.utils.game_broadcast import PayoutNotifications
+
+        num_winners = len(winner_ids)
+        if num_winners > 1:
+            message = f"¡Felicidades! Has ganado junto con {num_winners - 1} otro(s) jugador(es).<br>Premio total: {self.prize:.2f} créditos<br>Premio dividido: {player_prize_per_winner:.2f} créditos cada uno"
+        else:
+            message = f"¡Ganaste {player_prize_per_winner:.2f} créditos en {self.name}!"
+        details = {
+            'player_prize': float(player_prize_per_winner),
+            'total_winners': num_winners,
+            'total_prize': float(self.prize),
+        }
+
+        locked = {user.id: user for user in User.objects.select_for_update().filter(id__in=winner_ids).order_by('id')}
+        notifications = PayoutNotifications()
+        for winner_id in winner_ids:
+            winner = locked[winner_id]
+            logger.warning(f"[Game {self.id}] Pagando {player_prize_per_winner} al ganador {winner.username}. Saldo ANTES: {winner.credit_balance}")
+            winner.credit_balance += player_prize_per_winner
+            winner.save()
+            logger.warning(f"[Game {self.id}] Saldo DESPUÉS de {winner.username}: {winner.credit_balance}")
+            Transaction.objects.create(
+                user=winner,
+                amount=player_prize_per_winner,
+                transaction_type='PRIZE',
+                description=f"Premio por ganar {self.name}",
+                related_game=self
+            )
+            logger.warning(f"[Game {self.id}] Transacción de premio creada para {winner.username}")
+            notifications.win(winner.id, message, dict(details), new_balance=winner.credit_balance)
+        return notifications
+
+    def _game_ended_event(self, winners_usernames, player_prize_per_winner):
+        return {
+            "type": "game_ended",
+            "winners": winners_usernames,  # Lista completa de ganadores
+            "winner": winners_usernames[0] if winners_usernames else None,  # Primer ganador para compatibilidad
+            "num_winners": len(winners_usernames),
+            "prize": float(self.prize),
+            "player_prize_per_winner": float(player_prize_per_winner),
+            "seq": len(self.called_numbers),
+            "held_balance": float(self.held_balance),
+        }
+
     def end_game(self):
         logger.warning(f"[Game {self.id}] Iniciando end_game.")
         
@@ -397,18 +466,24 @@ class Game(models.Model):
             logger.warning(f"[Game {self.id}] Juego no iniciado, abortando end_game.")
             return False
             
-        players = Player.objects.filter(game=self)
-        winners = [player.user for player in players if player.check_bingo()]
+        apply_live_state(self)
+        winners = [player.user for player in find_game_winners(self)]
+        discard_game_index(self.id)
+        discard_card_pool(self.id)
+        invalidate_lobby_cache(self.franchise_id)
 
         if not winners:
             logger.warning(f"[Game {self.id}] No se encontraron ganadores. Finalizando juego.")
             self.is_finished = True
             self.save()
+            refresh_event_stats(self.organizer_id)
+            close_live_state(self)
             return False
 
         self.prize = self.calculate_prize()
         self.is_finished = True
         self.save()
+        close_live_state(self)
         logger.warning(f"[Game {self.id}] Juego marcado como finalizado. Premio total: {self.prize}. Ganadores: {[w.username for w in winners]}")
 
         try:
@@ -421,74 +496,15 @@ class Game(models.Model):
                 winner_ids = [w.id for w in winners]
                 logger.warning(f"[Game {self.id}] Procesando {num_winners} ganadores. Premio por ganador: {player_prize_per_winner}")
                 
-                for winner_id in winner_ids:
-                    # Obtener el ganador directamente desde la DB para cada iteración con select_for_update
-                    winner = User.objects.select_for_update().get(id=winner_id)
-                    logger.warning(f"[Game {self.id}] Pagando {player_prize_per_winner} al ganador {winner.username}. Saldo ANTES: {winner.credit_balance}")
-                    winner.credit_balance += player_prize_per_winner
-                    winner.save()
-                    logger.warning(f"[Game {self.id}] Saldo DESPUÉS de {winner.username}: {winner.credit_balance}")
-                    Transaction.objects.create(
-                        user=winner,
-                        amount=player_prize_per_winner,
-                        transaction_type='PRIZE',
-                        description=f"Premio por ganar {self.name}",
-                        related_game=self
-                    )
-                    logger.warning(f"[Game {self.id}] Transacción de premio creada para {winner.username}")
+                notifications = self._pay_winners(winner_ids, player_prize_per_winner)
                 
                 # Marcar todos los ganadores
                 updated = Player.objects.filter(user__in=winners, game=self).update(is_winner=True)
                 logger.warning(f"[Game {self.id}] {updated} jugadores marcados como ganadores")
 
-                channel_layer = get_channel_layer()
-                
                 # Notificar a todo el grupo que el juego ha terminado con todos los ganadores
                 winners_usernames = [w.username for w in winners]
-                async_to_sync(channel_layer.group_send)(
-                    f"game_{self.id}",
-                    {
-                        "type": "game_ended",
-                        "winners": winners_usernames,  # Lista completa de ganadores
-                        "winner": winners_usernames[0] if winners_usernames else None,  # Primer ganador para compatibilidad
-                        "num_winners": num_winners,
-                        "prize": float(self.prize),
-                        "player_prize_per_winner": float(player_prize_per_winner),
-                        "called_numbers": self.called_numbers,
-                        "held_balance": float(self.held_balance),
-                    },
-                )
-                
-                # Notificar a cada ganador individualmente con su nuevo balance
-                # Usar winner_ids para obtener cada ganador desde la DB
-                for winner_id in winner_ids:
-                    winner = User.objects.get(id=winner_id)
-                    # Crear mensaje que indique si hubo múltiples ganadores
-                    if num_winners > 1:
-                        message = f"¡Felicidades! Has ganado junto con {num_winners - 1} otro(s) jugador(es).<br>Premio total: {self.prize:.2f} créditos<br>Premio dividido: {player_prize_per_winner:.2f} créditos cada uno"
-                    else:
-                        message = f"¡Ganaste {player_prize_per_winner:.2f} créditos en {self.name}!"
-                    async_to_sync(channel_layer.group_send)(
-                        f"user_{winner.id}", 
-                        {
-                            'type': 'win_notification', 
-                            'message': message, 
-                            'details': {
-                                'player_prize': float(player_prize_per_winner), 
-                                'total_winners': num_winners, 
-                                'total_prize': float(self.prize),
-                                'new_balance': float(winner.credit_balance)
-                            }
-                        }
-                    )
-                    # También enviar actualización de créditos
-                    async_to_sync(channel_layer.group_send)(
-                        f"user_{winner.id}",
-                        {
-                            'type': 'credit_update',
-                            'new_balance': float(winner.credit_balance)
-                        }
-                    )
+                notifications.group(f"game_{self.id}", self._game_ended_event(winners_usernames, player_prize_per_winner))
 
                 logger.warning(f"[Game {self.id}] Desbloqueando {self.base_prize} de premio para el organizador {self.organizer.username}. Saldo bloqueado ANTES: {self.organizer.blocked_credits}")
                 
@@ -529,6 +545,11 @@ class Game(models.Model):
                     )
 
                 self._distribute_revenue()
+                if organizer_is_winner:
+                    # Saldo final del organizador ganador, ya con sus ingresos (self.organizer está al día)
+                    notifications.balance(self.organizer.id, self.organizer.credit_balance)
+                # Un mensaje por usuario, enviados juntos tras el commit
+                notifications.dispatch()
                 
                 self.save()
                 logger.warning(f"[Game {self.id}] Transacción completada exitosamente.")
@@ -546,13 +567,18 @@ class Game(models.Model):
             logger.warning(f"[Game {self.id}] Juego ya finalizado, abortando end_game_manual.")
             return False
             
+        apply_live_state(self)
         self.is_finished = True
         self.prize = self.calculate_prize()
+        discard_game_index(self.id)
+        discard_card_pool(self.id)
+        invalidate_lobby_cache(self.franchise_id)
 
         if not isinstance(winners, (list, tuple)):
             winners = [winners]
 
         self.save()
+        close_live_state(self)
         logger.warning(f"[Game {self.id}] Juego (manual) marcado como finalizado. Premio: {self.prize}. Ganadores: {[w.username for w in winners]}")
 
         try:
@@ -565,21 +591,7 @@ class Game(models.Model):
                 winner_ids = [w.id for w in winners]
                 logger.warning(f"[Game {self.id}] Procesando {num_winners} ganadores. Premio por ganador: {player_prize_per_winner}")
                 
-                for winner_id in winner_ids:
-                    # Obtener el ganador directamente desde la DB para cada iteración con select_for_update
-                    winner = User.objects.select_for_update().get(id=winner_id)
-                    logger.warning(f"[Game {self.id}] Pagando {player_prize_per_winner} al ganador {winner.username}. Saldo ANTES: {winner.credit_balance}")
-                    winner.credit_balance += player_prize_per_winner
-                    winner.save()
-                    logger.warning(f"[Game {self.id}] Saldo DESPUÉS de {winner.username}: {winner.credit_balance}")
-                    Transaction.objects.create(
-                        user=winner, 
-                        amount=player_prize_per_winner, 
-                        transaction_type='PRIZE', 
-                        description=f"Premio por ganar {self.name}", 
-                        related_game=self
-                    )
-                    logger.warning(f"[Game {self.id}] Transacción de premio creada para {winner.username}")
+                notifications = self._pay_winners(winner_ids, player_prize_per_winner)
                 
                 # Marcar todos los ganadores
                 updated = Player.objects.filter(user__in=winners, game=self).update(is_winner=True)
@@ -625,56 +637,12 @@ class Game(models.Model):
 
                 self._distribute_revenue()
 
-                channel_layer = get_channel_layer()
-
                 # Notificar a todo el grupo que el juego ha terminado con todos los ganadores
                 winners_usernames = [w.username for w in winners]
-                async_to_sync(channel_layer.group_send)(
-                    f"game_{self.id}",
-                    {
-                        "type": "game_ended",
-                        "winners": winners_usernames,  # Lista completa de ganadores
-                        "winner": winners_usernames[0] if winners_usernames else None,  # Primer ganador para compatibilidad
-                        "num_winners": num_winners,
-                        "prize": float(self.prize),
-                        "player_prize_per_winner": float(player_prize_per_winner),
-                        "called_numbers": self.called_numbers,
-                        "held_balance": float(self.held_balance),
-                    },
-                )
-
-                # Notificar a los ganadores individualmente
-                # Usar winner_ids para obtener cada ganador desde la DB
-                for winner_id in winner_ids:
-                    winner = User.objects.get(id=winner_id)
-                    # Crear mensaje que indique si hubo múltiples ganadores
-                    if num_winners > 1:
-                        message = f"¡Felicidades! Has ganado junto con {num_winners - 1} otro(s) jugador(es).<br>Premio total: {self.prize:.2f} créditos<br>Premio dividido: {player_prize_per_winner:.2f} créditos cada uno"
-                    else:
-                        message = f"¡Ganaste {player_prize_per_winner:.2f} créditos en {self.name}!"
-                    async_to_sync(channel_layer.group_send)(
-                        f"user_{winner.id}",
-                        {
-                            "type": "win_notification",
-                            "message": message,
-                            "details": {
-                                "player_prize": float(player_prize_per_winner),
-                                "total_winners": num_winners,
-                                "total_prize": float(self.prize),
-                                "new_balance": float(winner.credit_balance)
-                            },
-                        },
-                    )
-                
-                # Notificar al organizador sobre su nuevo saldo
-                self.organizer.refresh_from_db()
-                async_to_sync(channel_layer.group_send)(
-                    f"user_{self.organizer.id}",
-                    {
-                        "type": "credit_update",
-                        "new_balance": float(self.organizer.credit_balance),
-                    },
-                )
+                notifications.group(f"game_{self.id}", self._game_ended_event(winners_usernames, player_prize_per_winner))
+                # Nuevo saldo del organizador (si también ganó, va en su mismo aviso de premio)
+                notifications.balance(self.organizer.id, self.organizer.credit_balance)
+                notifications.dispatch()
 
                 self.save()
                 logger.warning(f"[Game {self.id}] Transacción (manual) completada exitosamente.")
@@ -720,17 +688,9 @@ class Game(models.Model):
         
         prize_increase = self.prize - old_prize
         
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f'game_{self.id}',
-            {
-                'type': 'prize_updated',
-                'new_prize': float(self.prize),
-                'increase_amount': float(prize_increase) if prize_increase > 0 else 0,
-                'total_cards': self.max_cards_sold,
-                'next_target': self.next_prize_target
-            }
-        )
+        # El aviso sale agrupado en 'game_progress' después del commit
+        game_id = self.id
+        transaction.on_commit(lambda: progress_aggregator.add(game_id, prize_before=old_prize))
         
         return prize_increase
             
@@ -749,10 +709,14 @@ class Game(models.Model):
         
         super().save(*args, **kwargs)
 
+        # Mantener el estado vivo alineado con premio y cartones durante la partida
+        if self.pk and self.is_started and not self.is_finished:
+            get_live_state_store().update(self.id, prize=self.prize, total_cards_sold=self.total_cards_sold)
+
 class Player(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
-    cards = models.JSONField(default=list)
+    cards = PackedCardsField(default=list)  # Lista de cartones; binario empaquetado en la base
     is_winner = models.BooleanField(default=False)
     is_manual_marking = models.BooleanField(default=False, help_text="Si True, el jugador marca números manualmente; si False, se marcan automáticamente")
     marked_numbers = models.JSONField(default=list, help_text="Números marcados manualmente por el jugador")
@@ -764,74 +728,20 @@ class Player(models.Model):
         unique_together = ('user', 'game')
 
     def generate_card(self):
-        card = []
-        for _ in range(5):
-            row = sorted(secrets.sample(range(1, 91), 5))
-            card.append(row)
-        return card
+        return generate_cards(1)[0]
 
     def check_bingo(self):
-        called_numbers_set = set(self.game.called_numbers)
-        manual_marked_set = set(self.marked_numbers or [])
-        
-        for card in self.cards:
-            # Función auxiliar para verificar si un número está marcado
-            def is_marked(num):
-                if num == 0:  # Comodín siempre está marcado
-                    return True
-                # En modo automático, usa los números llamados
-                if not self.is_manual_marking:
-                    return num in called_numbers_set
-                # En modo manual, usa los números marcados manualmente
-                else:
-                    return num in manual_marked_set
-            
-            if self.game.winning_pattern == 'HORIZONTAL':
-                for row in card:
-                    if all(is_marked(num) for num in row):
-                        return True
-            elif self.game.winning_pattern == 'VERTICAL':
-                for col in range(5):
-                    if all(is_marked(row[col]) for row in card):
-                        return True
-            elif self.game.winning_pattern == 'DIAGONAL':
-                if all(is_marked(card[i][i]) for i in range(5)) or \
-                all(is_marked(card[i][4-i]) for i in range(5)):
-                    return True
-            elif self.game.winning_pattern == 'FULL':
-                if all(is_marked(num) for row in card for num in row):
-                    return True
-            elif self.game.winning_pattern == 'CORNERS':
-                corners = [card[0][0], card[0][4], card[4][0], card[4][4]]
-                print(f"DEBUG CORNERS: Checking corners {corners}")
-                print(f"DEBUG CORNERS: Manual marking: {self.is_manual_marking}")
-                print(f"DEBUG CORNERS: Called numbers: {called_numbers_set}")
-                print(f"DEBUG CORNERS: Manual marked: {manual_marked_set}")
-                
-                corner_status = []
-                for corner in corners:
-                    is_marked_corner = is_marked(corner)
-                    corner_status.append(f"{corner}:{is_marked_corner}")
-                    print(f"DEBUG CORNERS: Corner {corner} marked: {is_marked_corner}")
-                
-                print(f"DEBUG CORNERS: Corner status: {corner_status}")
-                
-                if all(is_marked(corner) for corner in corners):
-                    print("DEBUG CORNERS: BINGO! All corners marked!")
-                    return True
-            elif self.game.winning_pattern == 'CUSTOM' and self.game.custom_pattern:
-                # Verificar patrón personalizado
-                pattern = self.game.custom_pattern
-                for i in range(5):
-                    for j in range(5):
-                        if pattern[i][j] == 1 and not is_marked(card[i][j]):
-                            break
-                    else:
-                        continue
-                    break
-                else:
-                    return True
-        return False
+        # Comodín (0) siempre marcado; en modo automático cuentan los números llamados
+        # y en modo manual los marcados por el jugador
+        targets = compile_pattern(self.game.winning_pattern, self.game.custom_pattern)
+        if not targets:
+            return False
+        apply_live_state(self.game)
+        if self.is_manual_marking:
+            marked = set(self.marked_numbers or [])
+        else:
+            marked = set(self.game.called_numbers)
+        return any(card_has_bingo(card, marked, targets) for card in self.cards)
 
     def acheck_bingo(self):
         return sync_to_async(self.check_bingo)()
@@ -866,21 +776,125 @@ class Transaction(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES, default='PURCHASE')
     description = models.TextField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     related_game = models.ForeignKey(Game, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Historial paginado por (created_at, id) filtrado por usuario o por tipo
+            models.Index(fields=['user', 'created_at'], name='bingo_tx_user_created_idx'),
+            models.Index(fields=['transaction_type', 'created_at'], name='bingo_tx_type_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.get_transaction_type_display()} - ${self.amount}"
 
+
+class LedgerRollup(models.Model):
+    """Totales por hora del libro de transacciones (ver utils.ledger_rollups)"""
+    ROLE_CHOICES = [
+        ('ADMIN', 'Administrador'),
+        ('ORGANIZER', 'Organizador'),
+        ('PLAYER', 'Jugador'),
+    ]
+
+    bucket = models.DateTimeField(help_text="Inicio de la hora (UTC)")
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPES)
+    is_promotion = models.BooleanField(default=False)
+    franchise_id = models.IntegerField(null=True, blank=True)
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    positive_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    negative_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    large_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket', 'transaction_type']),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket:%Y-%m-%d %H:00} {self.transaction_type} ({self.role}): {self.total_amount}"
+
+
+class LedgerRollupState(models.Model):
+    """Marca de agua de los rollups: última transacción incluida"""
+    last_transaction_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def current_watermark(cls):
+        return cls.objects.filter(pk=1).values_list('last_transaction_id', flat=True).first() or 0
+
+
+class OrganizerStats(models.Model):
+    """Contadores desnormalizados de un organizador (ver utils.organizer_stats)"""
+    organizer = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='organizer_stats')
+    games_created = models.PositiveIntegerField(default=0)
+    raffles_created = models.PositiveIntegerField(default=0)
+    games_completed = models.PositiveIntegerField(default=0)
+    raffles_completed = models.PositiveIntegerField(default=0)
+    completed_game_players = models.PositiveIntegerField(default=0)
+    completed_raffle_tickets = models.PositiveIntegerField(default=0)
+    net_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    creation_fees = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    commissions_paid = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    prizes_paid = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def reputation_level(self):
+        return User.reputation_from_counts(self.games_completed, self.raffles_completed)
+
+    def __str__(self):
+        return f"Estadísticas de {self.organizer_id}: {self.games_completed} juegos, {self.raffles_completed} rifas"
+
+class Conversation(models.Model):
+    """
+    Conversación privada entre dos usuarios (ver utils.conversations).
+    El par se guarda ordenado (user_low.id < user_high.id) y cada lado tiene su
+    contador de mensajes sin leer.
+    """
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    low_unread = models.PositiveIntegerField(default=0)
+    high_unread = models.PositiveIntegerField(default=0)
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='conversation_unique_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['user_low', '-last_message_at'], name='conversation_low_recent_idx'),
+            models.Index(fields=['user_high', '-last_message_at'], name='conversation_high_recent_idx'),
+        ]
+
+    def other_user_id(self, user_id):
+        return self.user_high_id if user_id == self.user_low_id else self.user_low_id
+
+    def unread_for(self, user_id):
+        return self.low_unread if user_id == self.user_low_id else self.high_unread
+
+    def __str__(self):
+        return f"Conversación {self.user_low_id}-{self.user_high_id}"
+
 class Message(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_messages')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, null=True, blank=True, related_name='messages')
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['conversation', '-timestamp', '-id'], name='message_conversation_idx'),
+        ]
         
     def __str__(self):
         return f"De {self.sender.username} a {self.recipient.username}"
@@ -945,6 +959,9 @@ class Raffle(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='WAITING')
     winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     winning_number = models.PositiveIntegerField(null=True, blank=True)
+    # Índice de números vendidos (ver utils.raffle_tickets)
+    sold_bitmap = models.BinaryField(default=bytes, editable=False)
+    sold_count = models.PositiveIntegerField(default=0, editable=False)
 
     manual_winning_number = models.PositiveIntegerField(
         null=True,
@@ -984,6 +1001,19 @@ class Raffle(models.Model):
         help_text="Lista de números ganadores en orden de posición"
     )
 
+    # Solo los escribe utils.raffle_tickets, con la fila bloqueada
+    SOLD_INDEX_FIELDS = ('sold_bitmap', 'sold_count')
+
+    def save(self, *args, **kwargs):
+        # Una instancia cargada antes de una compra no debe pisar el índice de vendidos
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            skipped = set(self.SOLD_INDEX_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
     def format_ticket_number(self, number):
         """Formatea un número de ticket según number_format_digits"""
         if self.number_format_digits > 0:
@@ -999,23 +1029,11 @@ class Raffle(models.Model):
     
     @property
     def available_tickets(self):
-        return self.total_tickets - self.tickets.count()
-    
-    @property
-    def progress_percentage(self):
-        return (self.tickets.count() / self.total_tickets) * 100
-    
-    @property
-    def total_tickets(self):
-        return self.end_number - self.start_number + 1
-    
-    @property
-    def available_tickets(self):
-        return self.total_tickets - self.tickets.count()
+        return self.total_tickets - self.sold_count
     
     @property
     def progress_percentage(self):
-        return (self.tickets.count() / self.total_tickets) * 100
+        return (self.sold_count / self.total_tickets) * 100
     
     def can_be_drawn(self):
         """Determina si la rifa puede ser sorteada"""
@@ -1026,29 +1044,30 @@ class Raffle(models.Model):
         if not self.can_be_drawn():
             return None
 
-        percentage_settings = PercentageSettings.objects.first()
+        percentage_settings = get_percentage_settings()
         if not percentage_settings:
             return None
 
         try:
             with transaction.atomic():
-                # Broadcast de anuncio e inicio para todos los espectadores de la rifa
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
+                # Broadcast de anuncio e inicio para todos los espectadores de la rifa.
+                # Los avisos salen juntos y en orden tras el commit, directo al channel layer
+                fanout = []
+                fanout.append((
                     f"raffle_{self.id}",
                     {
                         'type': 'raffle_draw_announcement',
                         'message': f"¡El sorteo de {self.title} está por comenzar!"
                     }
-                )
-                async_to_sync(channel_layer.group_send)(
+                ))
+                fanout.append((
                     f"raffle_{self.id}",
                     {
                         'type': 'raffle_draw_start',
                         'duration_ms': 5000,
                         'countdown_seconds': 3
                     }
-                )
+                ))
                 # Check if multiple winners are enabled
                 if self.multiple_winners_enabled and self.prize_structure:
                     # Multiple winners logic - MUST use manual winning numbers
@@ -1056,64 +1075,13 @@ class Raffle(models.Model):
                         logger.error(f"[Raffle {self.id}] Múltiples ganadores habilitados pero no hay números ganadores manuales definidos.")
                         return None
                     
-                    winners_list = []
-                    winning_numbers_list = []
-                    total_prizes_distributed = Decimal('0.00')
-                    
-                    # Sort prize structure by position
-                    sorted_prizes = sorted(self.prize_structure, key=lambda x: x.get('position', 0))
-                    
-                    # Validate that we have enough manual winning numbers
-                    if len(self.manual_winning_numbers) < len(sorted_prizes):
-                        logger.error(f"[Raffle {self.id}] No hay suficientes números ganadores manuales. Se requieren {len(sorted_prizes)} pero solo hay {len(self.manual_winning_numbers)}.")
+                    # Ganadores en una consulta; premios con un UPDATE y bulk_create (utils.raffle_draw)
+                    resolved = resolve_multiple_winners(self)
+                    if resolved is None:
+                        logger.error(f"[Raffle {self.id}] No hay suficientes números ganadores manuales. Se requieren {len(self.prize_structure)} pero solo hay {len(self.manual_winning_numbers)}.")
                         return None
-                    
-                    # Select winners using manual winning numbers
-                    selected_user_ids = set()
-                    
-                    for idx, prize_info in enumerate(sorted_prizes):
-                        position = prize_info.get('position', 0)
-                        prize_amount = Decimal(str(prize_info.get('prize', 0)))
-                        manual_number = self.manual_winning_numbers[idx]
-                        
-                        # Find ticket with this number
-                        try:
-                            winning_ticket = self.tickets.get(number=manual_number)
-                        except Ticket.DoesNotExist:
-                            logger.warning(f"[Raffle {self.id}] El ticket #{manual_number} no ha sido vendido. Saltando este premio.")
-                            continue  # Skip this prize if ticket not sold
-                        
-                        winner = winning_ticket.owner
-                        
-                        # If user already won, skip this prize (one user can only win once)
-                        if winner.id in selected_user_ids:
-                            logger.warning(f"[Raffle {self.id}] El usuario {winner.username} ya ganó con otro ticket. Saltando premio {position}° lugar.")
-                            continue
-                        
-                        # Mark user as selected
-                        selected_user_ids.add(winner.id)
-                        
-                        # Credit prize to the winner
-                        winner.credit_balance += prize_amount
-                        winner.save()
-                        Transaction.objects.create(
-                            user=winner,
-                            amount=prize_amount,
-                            transaction_type='PRIZE',
-                            description=f"Premio {position}° lugar de la rifa: {self.title}"
-                        )
-                        
-                        # Store winner info
-                        winners_list.append({
-                            'user_id': winner.id,
-                            'username': winner.username,
-                            'position': position,
-                            'prize': float(prize_amount),
-                            'ticket_number': winning_ticket.number,
-                            'ticket_id': winning_ticket.id
-                        })
-                        winning_numbers_list.append(winning_ticket.number)
-                        total_prizes_distributed += prize_amount
+                    winners_list, winning_numbers_list, total_prizes_distributed = resolved
+                    pay_raffle_prizes(self, winners_list)
                     
                     # Unlock organizer's credits for total prizes distributed
                     # IMPORTANT: Refresh organizer from DB to get latest credit_balance if they won a prize
@@ -1147,8 +1115,7 @@ class Raffle(models.Model):
                     
                     # Set first winner for backward compatibility
                     if winners_list:
-                        first_winner = User.objects.get(id=winners_list[0]['user_id'])
-                        self.winner = first_winner
+                        self.winner_id = winners_list[0]['user_id']
                         self.winning_number = winning_numbers_list[0]
                     
                 else:
@@ -1205,7 +1172,7 @@ class Raffle(models.Model):
 
                 # --- NEW LOGIC FOR HELD BALANCE DISTRIBUTION ---
                 total_revenue = self.held_balance
-                percentage_settings = PercentageSettings.objects.first()
+                percentage_settings = get_percentage_settings()
                 if not percentage_settings:
                     # Handle case where settings are not configured
                     # This should ideally not happen as it's checked at the beginning of the method
@@ -1252,32 +1219,33 @@ class Raffle(models.Model):
                 self.status = 'FINISHED'
                 self.tickets_income = total_revenue
                 self.save()
+                refresh_event_stats(self.organizer_id)
 
                 # Notify winners
                 if self.multiple_winners_enabled and self.winners:
                     # Multiple winners notification
-                    async_to_sync(channel_layer.group_send)(
+                    fanout.append((
                         f"raffle_{self.id}",
                         {
                             'type': 'raffle_multiple_winners',
                             'winners': self.winners,
                             'winning_numbers': self.winning_numbers
                         }
-                    )
+                    ))
                     
                     # Notify each winner individually
                     for winner_info in self.winners:
-                        async_to_sync(channel_layer.group_send)(
+                        fanout.append((
                             f"user_{winner_info['user_id']}",
                             {
                                 'type': 'win_notification',
                                 'message': f"¡Felicidades! Ganaste {winner_info['position']}° lugar en la rifa '{self.title}'",
                                 'prize': winner_info['prize']
                             }
-                        )
+                        ))
                     
                     # Announcement in raffle lobby
-                    async_to_sync(channel_layer.group_send)(
+                    fanout.append((
                         'raffle_lobby',
                         {
                             'type': 'raffle_multiple_winners_announcement',
@@ -1285,7 +1253,8 @@ class Raffle(models.Model):
                             'winners': self.winners,
                             'winning_numbers': self.winning_numbers
                         }
-                    )
+                    ))
+                    broadcast_on_commit(fanout)
                     
                     # Return first winning ticket for backward compatibility
                     if self.winners:
@@ -1294,7 +1263,7 @@ class Raffle(models.Model):
                     return None
                 else:
                     # Single winner notification (original)
-                    async_to_sync(channel_layer.group_send)(
+                    fanout.append((
                         f"raffle_{self.id}",
                         {
                             'type': 'raffle_winner',
@@ -1302,21 +1271,21 @@ class Raffle(models.Model):
                             'winner_username': self.winner.username if self.winner else 'N/A',
                             'prize': float(self.final_prize) if self.final_prize else 0
                         }
-                    )
+                    ))
 
                     # Notificar a todos los compradores por su canal personal
                     buyer_ids = list(self.tickets.values_list('owner_id', flat=True).distinct())
                     for uid in buyer_ids:
-                        async_to_sync(channel_layer.group_send)(
+                        fanout.append((
                             f"user_{uid}",
                             {
                                 'type': 'win_notification',
                                 'message': f"Resultado rifa '{self.title}': ganó {self.winner.username if self.winner else 'N/A'} con el número {self.winning_number} (premio {float(self.final_prize):.2f})."
                             }
-                        )
+                        ))
 
                     # Anuncio en lobby de rifas
-                    async_to_sync(channel_layer.group_send)(
+                    fanout.append((
                         'raffle_lobby',
                         {
                             'type': 'raffle_winner_announcement',
@@ -1325,18 +1294,19 @@ class Raffle(models.Model):
                             'winner_username': self.winner.username if self.winner else 'N/A',
                             'prize': float(self.final_prize) if self.final_prize else 0
                         }
-                    )
+                    ))
 
                     # Notificación privada adicional al ganador
                     if self.winner:
-                        async_to_sync(channel_layer.group_send)(
+                        fanout.append((
                             f"user_{self.winner.id}",
                             {
                                 'type': 'win_notification',
                                 'message': f"¡Felicidades! Ganaste la rifa '{self.title}'",
                                 'prize': float(self.final_prize) if self.final_prize else 0
                             }
-                        )
+                        ))
+                    broadcast_on_commit(fanout)
 
                     # Return winning ticket
                     if self.winning_number:
@@ -1595,6 +1565,97 @@ class WithdrawalRequestNotification(models.Model):
         ordering = ['-created_at']
 
 
+class NotificationInboxItem(models.Model):
+    """Índice unificado de notificaciones por usuario (ver utils.notification_inbox)"""
+    KIND_CHOICES = [
+        ('MESSAGE', 'Mensaje'),
+        ('CREDIT_REQUEST', 'Solicitud de crédito'),
+        ('WITHDRAWAL_REQUEST', 'Solicitud de retiro'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inbox_items')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    actor_name = models.CharField(max_length=150, blank=True)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='inbox_user_unread_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='inbox_unique_source'),
+        ]
+
+    @property
+    def notification_type(self):
+        """Tipo que esperan mark_as_read y el menú de notificaciones"""
+        return {
+            'MESSAGE': 'message',
+            'CREDIT_REQUEST': 'credit_request_notification',
+            'WITHDRAWAL_REQUEST': 'withdrawal_request_notification',
+        }[self.kind]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id} para {self.user_id}"
+
+
+class NotificationCounter(models.Model):
+    """Notificaciones sin leer de un usuario, mantenido por utils.notification_inbox"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} sin leer"
+
+
+class BackgroundJob(models.Model):
+    """Trabajo en segundo plano, ejecutado por run_job_worker (ver utils.jobs)"""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pendiente'),
+        ('RUNNING', 'En ejecución'),
+        ('DONE', 'Completado'),
+        ('FAILED', 'Fallido'),
+    ]
+
+    queue = models.CharField(max_length=50, default='default')
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    # Casilla de concurrencia de la cola mientras está RUNNING (0..límite-1)
+    slot = models.PositiveSmallIntegerField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Trabajo en segundo plano"
+        verbose_name_plural = "Trabajos en segundo plano"
+        indexes = [
+            models.Index(fields=['status', 'queue', 'run_after'], name='job_ready_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['queue', 'slot'],
+                condition=models.Q(status='RUNNING'),
+                name='job_running_slot_unique'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.queue}] - {self.get_status_display()}"
+
+
 
 class PrintableCard(models.Model):
     unique_id = models.CharField(max_length=20, unique=True, db_index=True)
@@ -2415,19 +2476,11 @@ class Franchise(models.Model):
     @classmethod
     def get_by_domain(cls, domain):
         """Obtener franquicia por dominio personalizado"""
+        # Limpiar el dominio
+        domain = normalize_domain(domain)
         if not domain:
             return None
         
-        # Limpiar el dominio
-        domain = domain.strip().lower()
-        if domain.startswith('http://'):
-            domain = domain[7:]
-        if domain.startswith('https://'):
-            domain = domain[8:]
-        if domain.startswith('www.'):
-            domain = domain[4:]
-        domain = domain.rstrip('/')
-        
         try:
             return cls.objects.get(custom_domain=domain, is_active=True)
         except cls.DoesNotExist:
@@ -2818,7 +2871,7 @@ class DiceGame(models.Model):
             })
         
         # Verificar mÃ¡ximo (si estÃ¡ configurado)
-        settings = DiceModuleSettings.get_settings()
+        settings = get_dice_settings()
         if settings.max_entry_price and self.entry_price > settings.max_entry_price:
             raise ValidationError({
                 'entry_price': f'El precio mÃ¡ximo permitido es ${settings.max_entry_price}'
@@ -2837,7 +2890,7 @@ class DiceGame(models.Model):
         import random
         from django.db import transaction
         
-        settings = DiceModuleSettings.get_settings()
+        settings = get_dice_settings()
         
         # Refrescar el pozo desde la base de datos para obtener el valor más reciente
         settings.refresh_from_db()
@@ -1,11 +1,15 @@
 """
 Señales para enviar emails de bienvenida cuando usuarios se registran
+y para mantener al día las estadísticas de los organizadores (OrganizerStats)
+y los registros en memoria de configuraciones y franquicias (utils.settings_cache,
+utils.franchise_cache), además de la bandeja de notificaciones (utils.notification_inbox)
 """
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from allauth.account.signals import user_signed_up
 from allauth.socialaccount.signals import social_account_added
-from django.core.mail import send_mail
-from django.conf import settings
+from bingo_app.jobs import send_email_later, welcome_email_key
 from datetime import datetime
 import logging
 
@@ -59,15 +63,8 @@ Saludos,
 El equipo de Bingo JyM
                     '''
                     
-                    logger.info(f"Enviando email de bienvenida (señal) a {user.email} (método: {provider})")
-                    result = send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [user.email],
-                        fail_silently=False,
-                    )
-                    logger.info(f"Email de bienvenida enviado (señal) a {user.email}, resultado: {result}")
+                    logger.info(f"Encolando email de bienvenida (señal) a {user.email} (método: {provider})")
+                    send_email_later(subject, message, [user.email], idempotency_key=welcome_email_key(user))
     except Exception as e:
         logger.error(f"Error enviando email de bienvenida (señal) a {user.email}: {str(e)}", exc_info=True)
 
@@ -123,18 +120,75 @@ Saludos,
 El equipo de Bingo JyM
                 '''
                 
-                logger.info(f"Enviando email de bienvenida (social_account_added signal) a {user.email} (provider: {provider})")
-                result = send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=False,
-                )
-                logger.info(f"Email de bienvenida enviado (social_account_added signal) a {user.email}, resultado: {result}")
+                logger.info(f"Encolando email de bienvenida (social_account_added signal) a {user.email} (provider: {provider})")
+                send_email_later(subject, message, [user.email], idempotency_key=welcome_email_key(user))
             else:
                 logger.info(f"No se envía email (social_account_added signal) - is_new: {is_new}, is_first: {is_first_social_account}, email: {user.email}")
     except Exception as e:
         logger.error(f"Error enviando email de bienvenida (social_account_added): {str(e)}", exc_info=True)
 
 
+@receiver(post_save, sender='bingo_app.Game')
+def count_created_game(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        from bingo_app.utils.organizer_stats import bump_organizer_stats
+        bump_organizer_stats(instance.organizer_id, games_created=1)
+
+
+@receiver(post_save, sender='bingo_app.Raffle')
+def count_created_raffle(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        from bingo_app.utils.organizer_stats import bump_organizer_stats
+        bump_organizer_stats(instance.organizer_id, raffles_created=1)
+
+
+@receiver(post_save, sender='bingo_app.Transaction')
+def count_organizer_transaction(sender, instance, created, raw=False, **kwargs):
+    """Ingresos, tarifas, comisiones y premios se suman a OrganizerStats en la misma transacción"""
+    if created and not raw:
+        from bingo_app.utils.organizer_stats import record_transaction
+        record_transaction(instance)
+
+
+@receiver(post_save, sender='bingo_app.PercentageSettings')
+@receiver(post_save, sender='bingo_app.BingoTicketSettings')
+@receiver(post_save, sender='bingo_app.DiceModuleSettings')
+@receiver(post_delete, sender='bingo_app.PercentageSettings')
+@receiver(post_delete, sender='bingo_app.BingoTicketSettings')
+@receiver(post_delete, sender='bingo_app.DiceModuleSettings')
+def invalidate_cached_settings(sender, raw=False, **kwargs):
+    """Tras el commit, los procesos recargan la configuración en BINGO_SETTINGS_CHECK_SECONDS como mucho"""
+    if not raw:
+        from bingo_app.utils.settings_cache import invalidate_settings
+        transaction.on_commit(lambda: invalidate_settings(sender), robust=True)
+
+
+@receiver(post_save, sender='bingo_app.Franchise')
+@receiver(post_delete, sender='bingo_app.Franchise')
+def invalidate_franchise_directory(sender, raw=False, **kwargs):
+    """Dominios, dueños y datos de franquicia en memoria se recargan tras el commit"""
+    if not raw:
+        from bingo_app.utils.franchise_cache import get_franchise_directory
+        transaction.on_commit(lambda: get_franchise_directory().invalidate(), robust=True)
+
+
+@receiver(post_save, sender='bingo_app.Message')
+@receiver(post_save, sender='bingo_app.CreditRequestNotification')
+@receiver(post_save, sender='bingo_app.WithdrawalRequestNotification')
+def sync_notification_inbox(sender, instance, created, raw=False, **kwargs):
+    """El ítem de la bandeja y el contador de no leídas cambian en la misma transacción"""
+    if raw:
+        return
+    from bingo_app.utils.notification_inbox import record_notification, sync_read_state
+    if created:
+        record_notification(instance)
+    else:
+        sync_read_state(instance)
+
+
+@receiver(post_delete, sender='bingo_app.Message')
+@receiver(post_delete, sender='bingo_app.CreditRequestNotification')
+@receiver(post_delete, sender='bingo_app.WithdrawalRequestNotification')
+def remove_from_notification_inbox(sender, instance, **kwargs):
+    from bingo_app.utils.notification_inbox import forget_notification
+    forget_notification(instance)
@@ -1,3 +1,1079 @@
-from django.test import TestCase
+import asyncio
+import io
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from bingo_app.models import BingoTicketSettings, Game, PercentageSettings, Player, Transaction, User
+from bingo_app.utils import settings_cache
+from bingo_app.utils.settings_cache import (
+    InMemorySettingsVersions,
+    SettingsRegistry,
+    get_dice_settings,
+    get_percentage_settings,
+    get_ticket_settings,
+)
+
+
+def reset_settings_registry():
+    # Cada prueba arranca con un registro vacío (el global vive todo el proceso)
+    settings_cache._registry = None
+
+
+class SettingsCacheTests(TestCase):
+    """Registro en memoria de configuraciones (utils.settings_cache)"""
+
+    def setUp(self):
+        reset_settings_registry()
+        PercentageSettings.objects.create()
+
+    def test_hot_reads_do_not_query(self):
+        from bingo_app.context_processors import system_settings_processor
+        from bingo_app.utils.dice_module import is_dice_module_enabled
+
+        request = RequestFactory().get('/')
+
+        def hot_path():
+            system_settings_processor(request)
+            is_dice_module_enabled()
+            get_percentage_settings()
+            get_ticket_settings()
+            get_dice_settings()
+
+        hot_path()  # calienta la caché
+        with self.assertNumQueries(0):
+            for _ in range(50):
+                hot_path()
+
+    def test_returns_copies(self):
+        first = get_percentage_settings()
+        first.platform_commission = 99
+        self.assertNotEqual(get_percentage_settings().platform_commission, 99)
+
+    def test_save_invalidates_this_process_and_other_registries(self):
+        registry = settings_cache.get_settings_registry()
+        other_worker = SettingsRegistry(registry.versions, check_seconds=0.1)
+        other_worker.get('bingo_app.percentagesettings')
+        get_percentage_settings()
+
+        current = PercentageSettings.objects.first()
+        current.platform_commission = 17
+        with self.captureOnCommitCallbacks(execute=True):
+            current.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_percentage_settings().platform_commission, 17)
+        time.sleep(other_worker.check_seconds)
+        with self.assertNumQueries(1):
+            self.assertEqual(other_worker.get('bingo_app.percentagesettings').platform_commission, 17)
+
+
+class SettingsCacheEmptyDatabaseTests(TransactionTestCase):
+    """En autocommit, get_settings() crea la fila y la señal invalida en el mismo hilo"""
+
+    def setUp(self):
+        reset_settings_registry()
+
+    def test_first_read_on_empty_database_does_not_deadlock(self):
+        self.assertFalse(BingoTicketSettings.objects.exists())
+        result = {}
+
+        def read():
+            try:
+                result['settings'] = get_ticket_settings()
+            finally:
+                connection.close()
+
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        reader.join(timeout=10)
+        self.assertFalse(reader.is_alive(), 'get_ticket_settings() quedó bloqueado')
+        self.assertIsNotNone(result['settings'])
+        self.assertTrue(BingoTicketSettings.objects.exists())
+
+
+class GameRoomPurchaseTests(TestCase):
+    """La compra desde la sala pasa por utils.card_purchase.purchase_cards"""
+
+    def setUp(self):
+        reset_settings_registry()
+        PercentageSettings.objects.create()
+        organizer = User.objects.create_user('organizer', password='x', is_organizer=True)
+        self.game = Game.objects.create(
+            name='Sala', organizer=organizer, card_price=Decimal('1.00'), max_cards_per_player=2
+        )
+        self.buyer = User.objects.create_user('buyer', password='x', credit_balance=Decimal('10.00'))
+        self.client.force_login(self.buyer)
+
+    def buy(self):
+        return self.client.post(
+            reverse('game_room', args=[self.game.id]), {'buy_card': '1'}, secure=True, HTTP_HOST='localhost'
+        )
+
+    def test_buy_card_updates_counters_once(self):
+        self.buy()
+        self.game.refresh_from_db()
+        self.buyer.refresh_from_db()
+        player = Player.objects.get(user=self.buyer, game=self.game)
+        self.assertEqual(self.game.total_cards_sold, 1)
+        self.assertEqual(self.game.held_balance, Decimal('1.00'))
+        self.assertEqual(len(player.cards), 1)
+        self.assertEqual(self.buyer.credit_balance, Decimal('9.00'))
+        self.assertEqual(Transaction.objects.filter(user=self.buyer, transaction_type='PURCHASE').count(), 1)
+
+    def test_buy_card_holds_revenue_until_game_ends(self):
+        from django.db import transaction as db_transaction
+
+        settings = PercentageSettings.objects.get()
+        settings.platform_commission = Decimal('10.00')
+        settings.save()
+        reset_settings_registry()
+        admin = User.objects.create_user('admin', password='x', is_admin=True)
+        organizer = self.game.organizer
+
+        self.buy()
+        admin.refresh_from_db()
+        organizer.refresh_from_db()
+        self.game.refresh_from_db()
+        # Como en buy_card: nada se reparte al comprar, el dinero queda retenido en el juego
+        self.assertEqual(admin.credit_balance, Decimal('0.00'))
+        self.assertEqual(organizer.credit_balance, Decimal('0.00'))
+        self.assertEqual(self.game.held_balance, Decimal('1.00'))
+        self.assertFalse(Transaction.objects.filter(transaction_type='ADMIN_ADD').exists())
+
+        with db_transaction.atomic():
+            self.game._distribute_revenue()
+        admin.refresh_from_db()
+        organizer.refresh_from_db()
+        self.assertEqual(admin.credit_balance, Decimal('0.10'))
+        self.assertEqual(organizer.credit_balance, Decimal('0.90'))
+
+    def test_buy_card_respects_limit(self):
+        for _ in range(3):
+            self.buy()
+        self.game.refresh_from_db()
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.game.total_cards_sold, 2)
+        self.assertEqual(self.buyer.credit_balance, Decimal('8.00'))
+
+
+class WinnerParityMixin:
+    """Juego con cartones reproducibles para comparar evaluadores con Player.check_bingo"""
+
+    PATTERNS = ('HORIZONTAL', 'VERTICAL', 'DIAGONAL', 'FULL', 'CORNERS', 'CUSTOM')
+    CUSTOM_PATTERN = [[1, 0, 0, 0, 1], [0, 1, 0, 1, 0], [0, 0, 1, 0, 0], [0, 1, 0, 1, 0], [1, 0, 0, 0, 1]]
+
+    def create_players(self, count, cards_per_player=3, manual_every=0):
+        import random
+
+        from bingo_app.utils.card_generator import generate_cards
+
+        organizer = User.objects.create(username='parity_org', is_organizer=True)
+        self.game = Game.objects.create(name='Paridad', organizer=organizer, custom_pattern=self.CUSTOM_PATTERN)
+        cards = generate_cards(count * cards_per_player, seed=b'parity')
+        rng = random.Random(7)
+        for i in range(count):
+            manual = bool(manual_every) and i % manual_every == 0
+            Player.objects.create(
+                user=User.objects.create(username=f'parity_{i}'),
+                game=self.game,
+                cards=cards[i * cards_per_player:(i + 1) * cards_per_player],
+                is_manual_marking=manual,
+                marked_numbers=rng.sample(range(1, 76), 45) if manual else [],
+            )
+        return cards
+
+    def call_numbers(self, count):
+        import random
+
+        self.game.called_numbers = random.Random(count).sample(range(1, 76), count)
+        self.game.save(update_fields=['called_numbers'])
+
+    def set_pattern(self, pattern):
+        self.game.winning_pattern = pattern
+        self.game.save(update_fields=['winning_pattern'])
+
+    def check_bingo_winners(self):
+        return {p.id for p in Player.objects.filter(game=self.game).select_related('game') if p.check_bingo()}
+
+
+class VectorizedWinnerTests(WinnerParityMixin, TestCase):
+    """PackedCards.winning_owners da los mismos ganadores que Player.check_bingo"""
+
+    def test_winning_owners_matches_check_bingo(self):
+        from bingo_app.utils.bingo_patterns import compile_pattern
+        from bingo_app.utils.bingo_vectorized import NUMPY_AVAILABLE, PackedCards
+
+        if not NUMPY_AVAILABLE:
+            self.skipTest('NumPy no está instalado')
+        self.create_players(40)
+        rows = list(Player.objects.filter(game=self.game).values_list('id', 'cards'))
+        winners_seen = 0
+        for called in (20, 45, 65):
+            self.call_numbers(called)
+            for pattern in self.PATTERNS:
+                with self.subTest(pattern=pattern, called=called):
+                    self.set_pattern(pattern)
+                    packed = PackedCards.from_rows(compile_pattern(pattern, self.CUSTOM_PATTERN), rows)
+                    expected = self.check_bingo_winners()
+                    self.assertEqual(packed.winning_owners(self.game.called_numbers), expected)
+                    winners_seen += len(expected)
+        self.assertGreater(winners_seen, 0)
+
+
+class FindGameWinnersTests(WinnerParityMixin, TestCase):
+    """find_game_winners equivale a [p for p in players if p.check_bingo()], manuales incluidos"""
+
+    def setUp(self):
+        from bingo_app.utils.bingo_patterns import discard_game_index
+
+        self.create_players(40, manual_every=4)
+        self.addCleanup(discard_game_index, self.game.id)
+
+    def assert_parity(self):
+        from bingo_app.utils.bingo_patterns import find_game_winners
+
+        winners = sorted(self.check_bingo_winners())
+        self.assertEqual([p.id for p in find_game_winners(self.game)], winners)
+        return winners
+
+    def run_patterns(self):
+        winners_seen = 0
+        for pattern in self.PATTERNS:
+            self.set_pattern(pattern)
+            # Llamadas crecientes: el índice incremental se reutiliza entre una y otra
+            for called in (20, 45, 65):
+                with self.subTest(pattern=pattern, called=called):
+                    self.call_numbers(called)
+                    winners_seen += len(self.assert_parity())
+        self.assertGreater(winners_seen, 0)
+
+    def test_incremental_index_matches_check_bingo(self):
+        self.run_patterns()
+
+    @override_settings(BINGO_VECTORIZED_MIN_CARDS=1)
+    def test_vectorized_matches_check_bingo(self):
+        from bingo_app.utils.bingo_vectorized import NUMPY_AVAILABLE
+
+        if not NUMPY_AVAILABLE:
+            self.skipTest('NumPy no está instalado')
+        self.run_patterns()
+
+    def test_manual_toggle_without_rebuild(self):
+        self.set_pattern('HORIZONTAL')
+        self.call_numbers(45)
+        self.assert_parity()
+        for player in Player.objects.filter(game=self.game):
+            player.is_manual_marking = not player.is_manual_marking
+            player.save(update_fields=['is_manual_marking'])
+        self.assert_parity()
+
+    def test_other_game_lock_does_not_block(self):
+        from bingo_app.utils.bingo_patterns import _game_lock
+
+        self.set_pattern('FULL')
+        self.call_numbers(30)
+        with _game_lock(self.game.id + 1):
+            self.assert_parity()
+
+
+class ReputationLevelTests(TestCase):
+    """Leer reputation_level no crea filas de OrganizerStats"""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+
+    def test_property_computes_without_saving(self):
+        from bingo_app.models import OrganizerStats
+
+        user = User.objects.create(username='sin_fila')
+        self.assertEqual(user.reputation_level, 'Bronce')
+        self.assertFalse(OrganizerStats.objects.exists())
+
+    def test_admin_changelist_does_not_create_rows(self):
+        from bingo_app.models import OrganizerStats
+
+        admin_user = User.objects.create_superuser('root', 'root@example.com', 'x')
+        for i in range(5):
+            User.objects.create(username=f'jugador_{i}')
+        organizer = User.objects.create(username='organizador', is_organizer=True)
+        OrganizerStats.objects.filter(organizer=organizer).delete()
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:bingo_app_user_changelist'), secure=True, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Bronce')
+        self.assertFalse(OrganizerStats.objects.exists())
+
+
+class PackedCardsFieldTests(TestCase):
+    """Player.cards: empaquetado binario con JSON de respaldo y acumulación perezosa"""
+
+    CARD_75 = [[1, 16, 31, 46, 61], [2, 17, 32, 47, 62], [3, 18, 0, 48, 63], [4, 19, 34, 49, 64], [15, 30, 45, 60, 75]]
+    CARD_90 = [[1, 19, 37, 55, 73], [2, 20, 38, 56, 74], [3, 21, 0, 57, 88], [4, 22, 40, 58, 89], [18, 36, 54, 72, 90]]
+
+    def setUp(self):
+        organizer = User.objects.create(username='cards_org', is_organizer=True)
+        self.game = Game.objects.create(name='Cartones', organizer=organizer)
+        self.user = User.objects.create(username='cards_player')
+
+    def stored(self, cards):
+        """Guarda un jugador con esos cartones; devuelve el jugador releído y la columna cruda."""
+        player = Player.objects.create(user=self.user, game=self.game, cards=cards)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT cards FROM bingo_app_player WHERE id = %s', [player.id])
+            data = bytes(cursor.fetchone()[0])
+        return Player.objects.get(id=player.id), data
+
+    def test_75_ball_cards_are_packed(self):
+        from bingo_app.utils.card_generator import CARD_BYTES
+        from bingo_app.utils.card_storage import FORMAT_PACKED
+
+        player, data = self.stored([self.CARD_75, self.CARD_75])
+        self.assertEqual(data[:1], FORMAT_PACKED)
+        self.assertEqual(len(data), 1 + 2 * CARD_BYTES)
+        self.assertEqual(len(player.cards), 2)
+        self.assertFalse(player.cards.is_decoded)
+        self.assertEqual(player.cards, [self.CARD_75, self.CARD_75])
+        self.assertEqual(player.cards[0][2][2], 0)  # Comodín central
+
+    def test_unpackable_cards_fall_back_to_json(self):
+        from bingo_app.utils.card_storage import FORMAT_JSON
+
+        no_free_cell = [row[:] for row in self.CARD_75]
+        no_free_cell[2][2] = 33
+        for cards in ([self.CARD_90], [no_free_cell], [self.CARD_75, self.CARD_90]):
+            with self.subTest(cards=cards):
+                Player.objects.filter(user=self.user).delete()
+                player, data = self.stored(cards)
+                self.assertEqual(data[:1], FORMAT_JSON)
+                self.assertEqual(len(player.cards), len(cards))
+                self.assertEqual(player.cards, cards)
+
+    def test_append_and_extend_keep_existing_cards(self):
+        from bingo_app.utils.card_generator import CARD_BYTES, generate_cards
+
+        new_cards = generate_cards(3, seed=b'append')
+        player, _ = self.stored([self.CARD_75])
+        player.cards.append(new_cards[0])
+        player.cards.extend(new_cards[1:])
+        # Acumular no decodifica los cartones guardados
+        self.assertFalse(player.cards.is_decoded)
+        self.assertEqual(len(player.cards), 4)
+        player.save(update_fields=['cards'])
+
+        player.refresh_from_db()
+        self.assertEqual(player.cards, [self.CARD_75] + new_cards)
+        self.assertEqual(len(player.cards.to_bytes()), 1 + 4 * CARD_BYTES)
+
+        # Un cartón que no se puede empaquetar pasa toda la lista a JSON sin perder nada
+        player.cards.append(self.CARD_90)
+        player.save(update_fields=['cards'])
+        player.refresh_from_db()
+        self.assertEqual(player.cards, [self.CARD_75] + new_cards + [self.CARD_90])
+
+    def test_empty_cards(self):
+        player, data = self.stored([])
+        self.assertEqual(data, b'')
+        self.assertEqual(len(player.cards), 0)
+        self.assertEqual(player.cards, [])
+
+
+class PackedCardsMigrationTests(TransactionTestCase):
+    """0064 convierte Player.cards de JSON a binario y la reversión lo devuelve a JSON"""
+
+    before = ('bingo_app', '0063_add_accumulated_pool_to_dice_settings')
+    after = ('bingo_app', '0064_player_cards_packed')
+
+    def migrate(self, target=None):
+        """Migra a target (por defecto, a la última migración) y devuelve los modelos históricos."""
+        from django.db.migrations.executor import MigrationExecutor
+
+        executor = MigrationExecutor(connection)
+        targets = [target] if target else executor.loader.graph.leaf_nodes()
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def test_forward_and_backward_conversion(self):
+        from bingo_app.utils.card_storage import FORMAT_JSON, FORMAT_PACKED
+
+        card_75 = PackedCardsFieldTests.CARD_75
+        card_90 = PackedCardsFieldTests.CARD_90
+        try:
+            apps = self.migrate(self.before)
+            OldUser = apps.get_model('bingo_app', 'User')
+            OldGame = apps.get_model('bingo_app', 'Game')
+            OldPlayer = apps.get_model('bingo_app', 'Player')
+            organizer = OldUser.objects.create(username='mig_org', is_organizer=True)
+            game = OldGame.objects.create(name='Migración', organizer=organizer)
+            packed_id = OldPlayer.objects.create(
+                user=OldUser.objects.create(username='mig_a'), game=game, cards=[card_75, card_75]
+            ).id
+            json_id = OldPlayer.objects.create(user=OldUser.objects.create(username='mig_b'), game=game, cards=[card_90]).id
+            empty_id = OldPlayer.objects.create(user=OldUser.objects.create(username='mig_c'), game=game, cards=[]).id
+
+            apps = self.migrate(self.after)
+            NewPlayer = apps.get_model('bingo_app', 'Player')
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT id, cards FROM bingo_app_player')
+                raw = {row[0]: bytes(row[1]) for row in cursor.fetchall()}
+            self.assertEqual(raw[packed_id][:1], FORMAT_PACKED)
+            self.assertEqual(raw[json_id][:1], FORMAT_JSON)
+            self.assertEqual(raw[empty_id], b'')
+            self.assertEqual(NewPlayer.objects.get(id=packed_id).cards, [card_75, card_75])
+            self.assertEqual(NewPlayer.objects.get(id=json_id).cards, [card_90])
+
+            apps = self.migrate(self.before)
+            OldPlayer = apps.get_model('bingo_app', 'Player')
+            self.assertEqual(OldPlayer.objects.get(id=packed_id).cards, [card_75, card_75])
+            self.assertEqual(OldPlayer.objects.get(id=json_id).cards, [card_90])
+            self.assertEqual(OldPlayer.objects.get(id=empty_id).cards, [])
+        finally:
+            self.migrate()
+
+
+class CsvExportStreamingTests(TestCase):
+    """La exportación se entrega con un generador asíncrono (sin armar el archivo bajo ASGI)"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        Transaction.objects.bulk_create([
+            Transaction(user=self.staff, amount=Decimal(i), transaction_type='PURCHASE', description=f'fila {i}')
+            for i in range(5)
+        ])
+
+    async def test_transaction_history_export_streams_asynchronously(self):
+        from django.test import AsyncClient
+
+        client = AsyncClient()
+        await client.aforce_login(self.staff)
+        response = await client.get(
+            reverse('transaction_history'), {'export': 'csv'}, secure=True, SERVER_NAME='localhost'
+        )
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        content = b''.join(chunks).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeffid,fecha,usuario'))
+        self.assertEqual(content.count('fila '), 5)
+
+    async def test_ledger_export_streams_asynchronously(self):
+        from django.test import AsyncClient
+
+        client = AsyncClient()
+        await client.aforce_login(self.staff)
+        response = await client.get(
+            reverse('ledger_export', args=['transactions']), {'format': 'jsonl'}, secure=True, SERVER_NAME='localhost'
+        )
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        self.assertEqual(len(content.splitlines()), 5)
+
+    async def test_aiter_chunks_groups_lines(self):
+        from bingo_app.utils.csv_export import aiter_chunks
+
+        chunks = [chunk async for chunk in aiter_chunks((f'{i}\n' for i in range(5)), size=2)]
+        self.assertEqual(chunks, ['0\n1\n', '2\n3\n', '4\n'])
+
+
+class RecordingChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, event):
+        self.sent.append((group, event))
+
+
+class PayoutNotificationsTests(TestCase):
+    """Los avisos del pago salen juntos tras el commit, directo al channel layer"""
+
+    def setUp(self):
+        self.layer = RecordingChannelLayer()
+        patcher = mock.patch('bingo_app.utils.game_broadcast.get_channel_layer', return_value=self.layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def notifications(self):
+        from bingo_app.utils.game_broadcast import PayoutNotifications
+
+        notifications = PayoutNotifications()
+        notifications.group('game_1', {'type': 'game_ended'})
+        notifications.win(7, 'Ganaste', {'player_prize': 5.0}, new_balance=Decimal('15.00'))
+        notifications.balance(8, Decimal('3.00'))
+        return notifications
+
+    def test_dispatch_sends_one_message_per_user_after_commit(self):
+        from bingo_app.models import BackgroundJob
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notifications().dispatch()
+            self.assertEqual(self.layer.sent, [])
+
+        self.assertEqual([group for group, _ in self.layer.sent], ['game_1', 'user_7', 'user_8'])
+        self.assertEqual(self.layer.sent[1][1]['new_balance'], 15.0)
+        self.assertEqual(self.layer.sent[1][1]['details']['new_balance'], 15.0)
+        self.assertEqual(self.layer.sent[2][1], {'type': 'credit_update', 'new_balance': 3.0})
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_dispatch_sends_nothing_on_rollback(self):
+        from django.db import transaction
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.notifications().dispatch()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.layer.sent, [])
+
+
+class CalledNumbersProtocolTests(SimpleTestCase):
+    """La instantánea no guarda el orden; la reproducción desde 0 sí"""
+
+    def test_replay_from_zero_restores_call_order(self):
+        from bingo_app.utils.game_events import called_numbers_snapshot, decode_called_bitset, replay_since
+
+        called = [42, 7, 63, 15, 1, 33, 70, 12]
+        snapshot = called_numbers_snapshot(called)
+        self.assertEqual(snapshot['recent_numbers'], called[-5:])
+        self.assertEqual(decode_called_bitset(snapshot['called_bitset']), sorted(called))
+        self.assertEqual(replay_since(called, 0), called)
+
+
+class AutoCallSchedulerTests(SimpleTestCase):
+    """La rueda del planificador solo se toca desde su event loop"""
+
+    def scheduler(self):
+        from bingo_app.utils.auto_call_scheduler import AutoCallScheduler, InMemoryLeaseLock
+
+        scheduler = AutoCallScheduler(lock=InMemoryLeaseLock(), tick=0.01, discovery_interval=3600)
+        scheduler._last_discovery = time.monotonic()  # sin búsqueda de juegos en la base
+        return scheduler
+
+    async def test_cancel_from_another_thread_goes_through_the_loop(self):
+        scheduler = self.scheduler()
+        stop = threading.Event()
+        task = asyncio.create_task(scheduler.run(stop))
+        await asyncio.sleep(0)
+        scheduler.schedule(5, delay=60)
+        self.assertIn(5, scheduler.wheel)
+
+        loop = asyncio.get_running_loop()
+        with mock.patch.object(loop, 'call_soon_threadsafe', wraps=loop.call_soon_threadsafe) as threadsafe:
+            await asyncio.to_thread(scheduler.cancel, 5)
+            await asyncio.sleep(0.05)
+        threadsafe.assert_any_call(scheduler.wheel.cancel, 5)
+        self.assertNotIn(5, scheduler.wheel)
+
+        stop.set()
+        await task
+        self.assertIsNone(scheduler._loop)
+
+    async def test_slow_game_does_not_delay_other_games(self):
+        scheduler = self.scheduler()
+        calls = {1: [], 2: []}
+
+        def call_once(game_id):
+            calls[game_id].append(time.monotonic())
+            if game_id == 1:
+                time.sleep(0.3)  # Juego lento
+            return 0.01
+
+        scheduler.call_once = call_once
+        stop = threading.Event()
+        task = asyncio.create_task(scheduler.run(stop))
+        await asyncio.sleep(0)
+        scheduler.schedule(1)
+        scheduler.schedule(2)
+        await asyncio.sleep(0.25)
+        stop.set()
+        await task
+
+        self.assertEqual(len(calls[1]), 1)
+        # Con la rueda esperando al juego lento, el juego 2 solo se habría llamado una vez
+        self.assertGreater(len(calls[2]), 3)
+        self.assertFalse(scheduler._in_flight)
+
+    @override_settings(BINGO_AUTO_CALL_MODE='worker')
+    async def test_worker_mode_does_not_start_in_web_process(self):
+        scheduler = self.scheduler()
+        self.assertIsNone(scheduler.ensure_running())
+        self.assertIsNone(scheduler._task)
+
+
+@override_settings(BINGO_JOBS_MODE='worker', BINGO_LEDGER_ROLLUP_LAG=0)
+class PeriodicJobsTests(TestCase):
+    """El worker encola solo los rollups del libro, uno por ventana"""
+
+    def test_worker_runs_ledger_rollups_once_per_window(self):
+        from bingo_app.models import BackgroundJob, LedgerRollupState
+        from bingo_app.utils.jobs import DONE, run_worker
+
+        user = User.objects.create_user('ledger', password='x')
+        Transaction.objects.create(user=user, amount=Decimal('5.00'), transaction_type='PURCHASE')
+
+        run_worker(once=True)
+        run_worker(once=True)
+
+        job = BackgroundJob.objects.get(name='ledger.rollups')
+        self.assertEqual(job.status, DONE)
+        self.assertEqual(job.result, {'processed': 1})
+        self.assertEqual(LedgerRollupState.current_watermark(), Transaction.objects.get().id)
+
+    def test_periodic_jobs_only_for_served_queues(self):
+        from bingo_app.models import BackgroundJob
+        from bingo_app.utils.jobs import enqueue_periodic
+
+        enqueue_periodic(queues=['email'])
+        self.assertFalse(BackgroundJob.objects.exists())
+        enqueued = enqueue_periodic(now=120)
+        enqueue_periodic(now=150)  # misma ventana: la clave evita el duplicado
+        with self.assertNumQueries(0):
+            enqueue_periodic(enqueued=enqueued, now=140)
+        BackgroundJob.objects.filter(name='ledger.rollups').update(status='DONE')
+        enqueue_periodic(enqueued=enqueued, now=190)
+        # La ejecución DONE anterior se borra al encolar la de la nueva ventana
+        self.assertEqual(list(BackgroundJob.objects.filter(name='ledger.rollups').values_list('idempotency_key', flat=True)),
+                         ['ledger.rollups:3'])
+
+
+@override_settings(BINGO_LEDGER_ROLLUP_LAG=0)
+class LimpiarDashboardsTests(TestCase):
+    """La limpieza deja los rollups del libro en cero"""
+
+    def test_cleanup_resets_ledger_rollups(self):
+        from django.core.management import call_command
+
+        from bingo_app.models import LedgerRollup, LedgerRollupState
+        from bingo_app.utils.ledger_rollups import catch_up_ledger_rollups, ledger_totals
+
+        user = User.objects.create_user('ledger', password='x')
+        Transaction.objects.create(user=user, amount=Decimal('5.00'), transaction_type='PURCHASE')
+        catch_up_ledger_rollups()
+        self.assertTrue(LedgerRollup.objects.exists())
+
+        call_command('limpiar_dashboards', '--sin-confirmacion', stdout=io.StringIO())
+
+        self.assertFalse(LedgerRollup.objects.exists())
+        self.assertEqual(LedgerRollupState.current_watermark(), 0)
+        self.assertEqual(ledger_totals().sum('count'), 0)
+
+
+class ConcurrentCardPurchaseTests(TransactionTestCase):
+    """Compras simultáneas de cartones sin actualizaciones perdidas (purchase_cards)"""
+
+    def test_counters_match_successful_purchases(self):
+        from django.db.models import Sum
+
+        from bingo_app.utils.card_generator import pack_card
+        from bingo_app.utils.card_purchase import CardPurchaseError, purchase_cards
+
+        organizer = User.objects.create_user('organizer', password='x', is_organizer=True)
+        game = Game.objects.create(
+            name='Concurrente', organizer=organizer, card_price=Decimal('1.00'), max_cards_per_player=1000
+        )
+        buyers = [User.objects.create_user(f'buyer{i}', password='x', credit_balance=Decimal('100.00'))
+                  for i in range(4)]
+        Player.objects.bulk_create([Player(user=buyer, game=game) for buyer in buyers])
+
+        results = {'cards': 0, 'errors': []}
+        lock = threading.Lock()
+
+        def worker(index):
+            try:
+                for n in range(5):
+                    quantity = 1 + (index + n) % 3
+                    try:
+                        purchase_cards(buyers[(index + n) % len(buyers)], game.id, quantity)
+                    except CardPurchaseError:
+                        continue
+                    except Exception as e:
+                        with lock:
+                            results['errors'].append(str(e))
+                        continue
+                    with lock:
+                        results['cards'] += quantity
+            finally:
+                connection.close()
+
+        with mock.patch('bingo_app.utils.card_purchase.progress_aggregator'), \
+                mock.patch('bingo_app.utils.card_purchase.send_cards_to_buyer'):
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        if connection.vendor != 'sqlite':
+            # SQLite serializa las escrituras y puede responder "database is locked":
+            # esas compras se revierten completas y no cuentan como exitosas
+            self.assertEqual(results['errors'], [])
+        self.assertGreater(results['cards'], 0)
+
+        game.refresh_from_db()
+        players = list(Player.objects.filter(game=game).select_related('user'))
+        cards = [card for player in players for card in player.cards]
+        self.assertEqual(game.total_cards_sold, results['cards'])
+        self.assertEqual(len(cards), results['cards'])
+        self.assertEqual(len({pack_card(card) for card in cards}), len(cards))
+        self.assertEqual(game.held_balance, game.card_price * results['cards'])
+        for player in players:
+            self.assertEqual(Decimal('100.00') - player.user.credit_balance, game.card_price * len(player.cards))
+        purchases = Transaction.objects.filter(related_game=game, transaction_type='PURCHASE')
+        self.assertEqual(-purchases.aggregate(total=Sum('amount'))['total'], game.card_price * results['cards'])
+
+
+class InMemoryLiveStateTests(TestCase):
+    """Con el estado vivo en memoria (por proceso) cada número se persiste al llamarlo"""
+
+    def test_each_call_is_flushed_with_memory_backend(self):
+        from bingo_app.utils.live_state import InMemoryLiveStateStore, flush_live_state
+
+        organizer = User.objects.create_user('organizer', password='x', is_organizer=True)
+        game = Game.objects.create(name='Memoria', organizer=organizer, is_started=True)
+        store = InMemoryLiveStateStore()
+        number = store.call_number(game)
+        self.assertTrue(flush_live_state(game, store=store))
+        game.refresh_from_db()
+        self.assertEqual(game.called_numbers, [number])
+        self.assertEqual(store.get(game.id).pending, 0)
+
+    def test_dedicated_scheduler_refuses_memory_backend(self):
+        from django.core.management import CommandError, call_command
+
+        with self.assertRaises(CommandError):
+            call_command('run_auto_call_scheduler')
+
+
+LOBBY_QUERIES_COLD = 9  # Caché de tarjetas vacía
+LOBBY_QUERIES_WARM = 5
+
+
+class LobbyQueryTests(TestCase):
+    """Consultas fijas del lobby: no crecen con la cantidad de juegos y rifas activos"""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        reset_settings_registry()
+        PercentageSettings.objects.create()
+        self.organizer = User.objects.create_user('organizer', password='x', is_organizer=True)
+        self.player = User.objects.create_user('player', password='x')
+        self.client.force_login(self.player)
+
+    def add_events(self, count):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from bingo_app.models import Raffle
+
+        first = Game.objects.count()
+        for i in range(first, first + count):
+            Game.objects.create(name=f'Juego {i}', organizer=self.organizer)
+            Raffle.objects.create(
+                title=f'Rifa {i}', organizer=self.organizer, ticket_price=Decimal('1.00'), prize=Decimal('10.00'),
+                end_number=100, draw_date=timezone.now() + timedelta(days=1),
+            )
+
+    def get_lobby(self):
+        response = self.client.get(reverse('lobby'), secure=True, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_grow_with_events(self):
+        from django.core.cache import cache
+
+        self.add_events(2)
+        self.get_lobby()  # sesión y configuraciones cargadas
+        for extra in (0, 6):
+            self.add_events(extra)
+            cache.clear()
+            with self.assertNumQueries(LOBBY_QUERIES_COLD):
+                response = self.get_lobby()
+            with self.assertNumQueries(LOBBY_QUERIES_WARM):
+                self.get_lobby()
+        content = response.content.decode()
+        self.assertIn('Juego 7', content)
+        self.assertIn('Rifa 7', content)
+
+    def test_invalidation_shows_new_game(self):
+        from bingo_app.utils.lobby_data import invalidate_lobby_cache
+
+        self.get_lobby()
+        game = Game.objects.create(name='Juego nuevo', organizer=self.organizer)
+        self.assertNotIn('Juego nuevo', self.get_lobby().content.decode())
+        invalidate_lobby_cache(game.franchise_id)
+        self.assertIn('Juego nuevo', self.get_lobby().content.decode())
+
+
+TICKET_PURCHASE_QUERIES = 10  # Incluye los savepoints de TestCase
+
+
+class TicketPurchaseTests(TestCase):
+    """Compra de tickets en bloque con un número fijo de consultas (utils.ticket_purchase)"""
+
+    def setUp(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from bingo_app.models import Raffle
+
+        organizer = User.objects.create_user('organizer', password='x', is_organizer=True)
+        self.buyer = User.objects.create_user('buyer', password='x', credit_balance=Decimal('1000.00'))
+        self.raffle = Raffle.objects.create(
+            title='Rifa', organizer=organizer, ticket_price=Decimal('1.00'), prize=Decimal('0'),
+            start_number=1, end_number=1000, draw_date=timezone.now() + timedelta(days=1),
+        )
+
+    def test_query_count_does_not_grow_with_quantity(self):
+        from bingo_app.utils.ticket_purchase import purchase_tickets
+
+        for numbers in ([1], list(range(10, 110)), list(range(200, 400))):
+            with self.assertNumQueries(TICKET_PURCHASE_QUERIES):
+                purchase_tickets(self.buyer, self.raffle.id, numbers, notify=False)
+
+        self.raffle.refresh_from_db()
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.raffle.tickets.count(), 301)
+        self.assertEqual(self.raffle.sold_count, 301)
+        self.assertEqual(self.raffle.held_balance, Decimal('301.00'))
+        self.assertEqual(self.buyer.credit_balance, Decimal('699.00'))
+        purchases = Transaction.objects.filter(user=self.buyer, transaction_type='PURCHASE')
+        self.assertEqual(sorted(purchases.values_list('amount', flat=True)),
+                         [Decimal('-200.00'), Decimal('-100.00'), Decimal('-1.00')])
+
+    def test_taken_number_rolls_back_whole_purchase(self):
+        from bingo_app.utils.raffle_tickets import TicketsUnavailable
+        from bingo_app.utils.ticket_purchase import purchase_tickets
+
+        purchase_tickets(self.buyer, self.raffle.id, [5], notify=False)
+        with self.assertRaises(TicketsUnavailable):
+            purchase_tickets(self.buyer, self.raffle.id, [4, 5, 6], notify=False)
+
+        self.raffle.refresh_from_db()
+        self.buyer.refresh_from_db()
+        self.assertEqual(list(self.raffle.tickets.values_list('number', flat=True)), [5])
+        self.assertEqual(self.raffle.sold_count, 1)
+        self.assertEqual(self.buyer.credit_balance, Decimal('999.00'))
+
+    def test_half_sold_moves_raffle_in_progress(self):
+        from bingo_app.utils.ticket_purchase import purchase_tickets
+
+        purchase_tickets(self.buyer, self.raffle.id, list(range(1, 501)), notify=False)
+        self.raffle.refresh_from_db()
+        self.assertEqual(self.raffle.status, 'IN_PROGRESS')
+
+
+DICE_MATCH_QUERIES = 18  # Crear la partida del trío; entrar sin formar trío no consulta
+
+
+DICE_ROLL_QUERIES = 6  # Ronda abierta o empate; incluye los savepoints de TestCase
+DICE_FINAL_ROLL_QUERIES = 13  # Cierre con premio, pozo y créditos bloqueados
+
+
+class DiceRollTests(TestCase):
+    """roll_dice resuelve cada lanzamiento con un número fijo de consultas"""
+
+    def setUp(self):
+        from bingo_app.models import DiceGame, DiceModuleSettings, DicePlayer
+
+        reset_settings_registry()
+        DiceModuleSettings.objects.create(accumulated_pool=Decimal('50.00'))
+        get_dice_settings()  # Registro de configuraciones ya cargado, como en producción
+        self.entry_price = Decimal('1.00')
+        self.game = DiceGame.objects.create(
+            room_code='ROLL1', status='PLAYING', entry_price=self.entry_price, final_prize=Decimal('5.00')
+        )
+        self.users = [
+            User.objects.create(username=f'roller{i}', credit_balance=Decimal('10.00'), blocked_credits=self.entry_price)
+            for i in range(3)
+        ]
+        self.players = [DicePlayer.objects.create(user=user, game=self.game) for user in self.users]
+
+    def roll(self, user, dice):
+        from bingo_app.utils.dice_rounds import roll_dice
+
+        with mock.patch('bingo_app.utils.dice_rounds.random.randint', side_effect=dice):
+            return roll_dice(self.game.room_code, user.id)
+
+    def test_open_round_roll(self):
+        with self.assertNumQueries(DICE_ROLL_QUERIES):
+            result = self.roll(self.users[0], [3, 4])
+        self.assertEqual(result['roll']['total'], 7)
+        self.assertIsNone(result['round_result'])
+
+    def test_tie_closes_round_without_losing_lives(self):
+        self.roll(self.users[0], [1, 1])
+        self.roll(self.users[1], [1, 1])
+        with self.assertNumQueries(DICE_ROLL_QUERIES):
+            result = self.roll(self.users[2], [6, 6])
+        self.assertTrue(result['round_result']['is_tie'])
+        self.assertEqual(result['round_result']['tie_total'], 2)
+        self.assertEqual(sorted(p.lives for p in self.game.dice_players.all()), [3, 3, 3])
+
+    def test_final_roll_pays_prize_from_pool(self):
+        from bingo_app.models import DiceModuleSettings, DicePlayer
+
+        DicePlayer.objects.filter(id=self.players[2].id).update(is_eliminated=True, lives=0)
+        DicePlayer.objects.filter(id=self.players[1].id).update(lives=1)
+        winner, loser = self.users[0], self.users[1]
+
+        self.roll(loser, [1, 2])
+        with self.assertNumQueries(DICE_FINAL_ROLL_QUERIES):
+            result = self.roll(winner, [5, 6])
+
+        self.assertTrue(result['round_result']['game_finished'])
+        self.assertEqual(result['round_result']['winner'], winner.username)
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.status, 'FINISHED')
+        self.assertEqual(self.game.winner_id, winner.id)
+        self.assertEqual(DiceModuleSettings.objects.get().accumulated_pool, Decimal('45.00'))
+        balances = dict(User.objects.filter(id__in=[u.id for u in self.users]).values_list('id', 'credit_balance'))
+        self.assertEqual(balances[winner.id], Decimal('15.00'))
+        self.assertEqual(balances[loser.id], Decimal('10.00'))
+        blocked = User.objects.filter(id__in=[u.id for u in self.users]).values_list('blocked_credits', flat=True)
+        self.assertEqual(set(blocked), {Decimal('0.00')})
+        self.assertEqual(Transaction.objects.get(transaction_type='DICE_WIN').amount, Decimal('5.00'))
+        self.assertTrue(DicePlayer.objects.get(id=self.players[1].id).is_eliminated)
+
+    def test_final_roll_prize_is_capped_by_pool(self):
+        from bingo_app.models import DiceModuleSettings, DicePlayer
+
+        DiceModuleSettings.objects.update(accumulated_pool=Decimal('2.00'))
+        DicePlayer.objects.filter(id=self.players[2].id).update(is_eliminated=True, lives=0)
+        DicePlayer.objects.filter(id=self.players[1].id).update(lives=1)
+        self.roll(self.users[1], [1, 1])
+        result = self.roll(self.users[0], [2, 2])
+        self.assertEqual(result['round_result']['final_prize'], '2.00')
+        self.assertEqual(DiceModuleSettings.objects.get().accumulated_pool, Decimal('0.00'))
+
+
+class DiceMatchmakingTests(TestCase):
+    """Matchmaking de dados: tríos por precio en orden de llegada (utils.dice_matchmaking)"""
+
+    def setUp(self):
+        reset_settings_registry()
+        self.price = Decimal('1.00')
+
+    def players(self, count, balance=Decimal('10.00')):
+        first = User.objects.count()
+        return [User.objects.create(username=f'dice{i}', credit_balance=balance)
+                for i in range(first, first + count)]
+
+    def enqueue(self, users, price=None):
+        from bingo_app.models import DiceMatchmakingQueue
+
+        return [DiceMatchmakingQueue.objects.create(user=user, entry_price=price or self.price) for user in users]
+
+    def test_failed_match_is_requeued_and_logged(self):
+        from bingo_app.utils.dice_matchmaking import DiceMatchmaker
+
+        matchmaker = DiceMatchmaker()
+        matchmaker.loaded = True
+        entries = self.enqueue(self.players(3))
+        with mock.patch('bingo_app.utils.dice_matchmaking.create_match', side_effect=RuntimeError('sin base')), \
+                self.assertLogs('bingo_app.utils.dice_matchmaking', level='ERROR'):
+            for entry in entries:
+                self.assertIsNone(matchmaker.join(entry.id, entry.user_id, self.price))
+        self.assertEqual(matchmaker.queues.waiting(self.price), 3)
+
+        # Al volver la base, la siguiente entrada forma el trío con los reencolados primero
+        from bingo_app.models import DicePlayer
+
+        late = self.enqueue(self.players(1))[0]
+        with mock.patch('bingo_app.utils.dice_matchmaking.notify_match'):
+            game = matchmaker.join(late.id, late.user_id, self.price)
+        self.assertIsNotNone(game)
+        self.assertEqual(sorted(DicePlayer.objects.filter(game=game).values_list('user_id', flat=True)),
+                         [entry.user_id for entry in entries])
+        self.assertEqual(matchmaker.queues.waiting(self.price), 1)
+
+    def test_resync_job_matches_waiting_entries(self):
+        from bingo_app.jobs import dice_matchmaking_resync
+        from bingo_app.models import DiceGame
+
+        self.enqueue(self.players(4))
+        with mock.patch('bingo_app.utils.dice_matchmaking.notify_match'):
+            self.assertEqual(dice_matchmaking_resync(), {'games': 1})
+            self.assertEqual(dice_matchmaking_resync(), {'games': 0})
+        self.assertEqual(DiceGame.objects.count(), 1)
+
+    def test_memory_queues_form_fifo_trios_per_price(self):
+        import random
+
+        from bingo_app.utils.dice_matchmaking import MATCH_SIZE, MatchmakingQueues
+
+        rng = random.Random(7)
+        prices = [Decimal('0.10'), Decimal('1.00'), Decimal('5.00')]
+        queues = MatchmakingQueues()
+        price_of, groups, left = {}, [], set()
+        for user_id in range(1, 3001):
+            price_of[user_id] = rng.choice(prices)
+            group = queues.join(user_id, user_id, price_of[user_id])
+            if group:
+                groups.append([member for _, member in group])
+            if rng.random() < 0.05:
+                leaving = rng.randint(1, user_id)
+                if queues.leave(leaving):
+                    left.add(leaving)
+
+        matched = [user_id for group in groups for user_id in group]
+        self.assertEqual(len(matched), len(set(matched)))
+        self.assertFalse(left.intersection(matched))
+        for group in groups:
+            self.assertEqual(len(group), MATCH_SIZE)
+            self.assertEqual(len({price_of[user_id] for user_id in group}), 1)
+            self.assertEqual(group, sorted(group))  # orden de llegada
+        for price in prices:
+            self.assertLess(queues.waiting(price), MATCH_SIZE)
+        self.assertEqual(len(queues), 3000 - len(matched) - len(left))
+
+    def test_engine_matches_with_constant_queries(self):
+        import contextlib
+        import io
+        from collections import Counter
+
+        from bingo_app.models import DiceGame, DiceMatchmakingQueue, DicePlayer
+        from bingo_app.utils.dice_matchmaking import MATCH_SIZE, DiceMatchmaker
+
+        prices = [Decimal('0.10'), Decimal('1.00'), Decimal('5.00')]
+        users = self.players(20)
+        price_of = {user.id: prices[i % len(prices)] for i, user in enumerate(users)}
+        matchmaker = DiceMatchmaker()
+        matchmaker.loaded = True
+        get_dice_settings()  # configuración del módulo ya en caché
+
+        # spin_prize: rama de premio base fija (la de bono del pozo hace otras consultas) y sin salida
+        with mock.patch('bingo_app.utils.dice_matchmaking.notify_match'), \
+                mock.patch('random.random', return_value=0.1), contextlib.redirect_stdout(io.StringIO()):
+            for user in users:
+                entry = DiceMatchmakingQueue.objects.create(user=user, entry_price=price_of[user.id])
+                forms_trio = matchmaker.queues.waiting(entry.entry_price) == MATCH_SIZE - 1
+                with self.assertNumQueries(DICE_MATCH_QUERIES if forms_trio else 0):
+                    matchmaker.join(entry.id, user.id, entry.entry_price)
+
+        expected = sum(count // MATCH_SIZE for count in Counter(price_of.values()).values())
+        self.assertEqual(DiceGame.objects.count(), expected)
+        members = Counter(DicePlayer.objects.values_list('user_id', flat=True))
+        self.assertEqual(set(members.values()), {1})
+        for game in DiceGame.objects.all():
+            player_ids = list(DicePlayer.objects.filter(game=game).values_list('user_id', flat=True))
+            self.assertEqual(len(player_ids), MATCH_SIZE)
+            self.assertEqual({price_of[user_id] for user_id in player_ids}, {game.entry_price})
+        for user in User.objects.filter(id__in=price_of):
+            paid = price_of[user.id] if user.id in members else Decimal('0')
+            self.assertEqual(user.credit_balance, Decimal('10.00') - paid)
+        self.assertEqual(Transaction.objects.filter(transaction_type='ENTRY_FEE').count(), len(members))
+        waiting = Counter(DiceMatchmakingQueue.objects.filter(status='WAITING').values_list('entry_price', flat=True))
+        self.assertTrue(all(count < MATCH_SIZE for count in waiting.values()))
@@ -54,6 +54,7 @@ urlpatterns = [
     path('admin-panel/settings/', views.percentage_settings, name='percentage_settings'),
     path('admin-panel/transactions/', views.transaction_history, name='transaction_history'),
     path('admin-panel/transactions/user/<int:user_id>/', views.transaction_history, name='transaction_history_user'),
+    path('admin-panel/export/<str:dataset>/', views.ledger_export, name='ledger_export'),
     path('raffle/<int:raffle_id>/draw/', views.draw_raffle, name='draw_raffle'),
     path('withdraw/', views.request_withdrawal, name='request_withdrawal'),
     path('admin-panel/withdrawals/', views.withdrawal_requests, name='withdrawal_requests'),
@@ -73,6 +74,7 @@ urlpatterns = [
     path('admin-panel/users/', views.user_management, name='user_management'),
     path('notifications/mark-as-read/', views.mark_as_read, name='mark_as_read'),
     path('raffle/<int:raffle_id>/buy-multiple/', views.buy_multiple_tickets, name='buy_multiple_tickets'),
+    path('raffle/<int:raffle_id>/numbers/', views.raffle_numbers_api, name='raffle_numbers_api'),
     path('raffle/<int:raffle_id>/set-manual-winner/', views.set_manual_raffle_winner, name='set_manual_raffle_winner'),
     path('raffle/<int:raffle_id>/set-manual-multiple-winners/', views.set_manual_multiple_winners, name='set_manual_multiple_winners'),
     path('admin-panel/printable-cards/', views.manage_printable_cards, name='manage_printable_cards'),
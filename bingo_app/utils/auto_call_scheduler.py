@@ -0,0 +1,334 @@
+"""
+Planificador distribuido de llamada automática de números.
+
+Un único planificador por proceso se encarga de todos los juegos con
+is_auto_calling=True:
+- Cada juego se procesa bajo un lease (candado con expiración) por juego, en Redis
+  o en memoria para pruebas, así varios workers no duplican ni pierden llamadas.
+- Una sola rueda de temporizadores (timer wheel) agenda todas las partidas, sin
+  una tarea asyncio por juego.
+- El estado se retoma de la base (is_auto_calling, números llamados), por lo que
+  un reinicio solo pausa las llamadas hasta el siguiente descubrimiento.
+- number_called se publica directamente en el channel layer, sin depender de una
+  instancia de consumer.
+
+Modos (BINGO_AUTO_CALL_MODE):
+- 'worker': lo ejecuta el proceso autocall del Procfile
+  (python manage.py run_auto_call_scheduler); los procesos web no lo arrancan.
+- 'inline': corre dentro del proceso web, en el event loop de Daphne
+  (desarrollo, un solo proceso).
+
+Configuración opcional en settings:
+- BINGO_AUTO_CALL_LOCK_BACKEND: 'redis' o 'memory' (por defecto igual que el estado vivo)
+- BINGO_AUTO_CALL_TICK: segundos por casilla de la rueda (0.5)
+- BINGO_AUTO_CALL_DISCOVERY_INTERVAL: cada cuántos segundos se buscan juegos activos (10)
+- BINGO_AUTO_CALL_CONCURRENCY: juegos procesados en paralelo por tick (8)
+
+schedule() y cancel() se pueden llamar desde cualquier hilo (p. ej. dentro de
+database_sync_to_async): la rueda solo se toca desde el event loop del planificador,
+con loop.call_soon_threadsafe.
+
+Ejecutar como worker dedicado: python manage.py run_auto_call_scheduler
+"""
+
+import asyncio
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from bingo_app.utils.game_events import number_called_event
+
+LEASE_PREFIX = 'bingo:autocall:lease'
+MIN_LEASE_SECONDS = 10
+
+
+class InMemoryLeaseLock:
+    """Leases dentro del proceso (pruebas y desarrollo con un solo worker)."""
+
+    def __init__(self):
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, owner, ttl_seconds):
+        """Toma el lease o lo renueva si ya es del mismo dueño."""
+        now = time.monotonic()
+        with self._lock:
+            current = self._leases.get(key)
+            if current and current[0] != owner and current[1] > now:
+                return False
+            self._leases[key] = (owner, now + ttl_seconds)
+            return True
+
+    def release(self, key, owner):
+        with self._lock:
+            current = self._leases.get(key)
+            if current and current[0] == owner:
+                del self._leases[key]
+
+
+class RedisLeaseLock:
+    """Leases en Redis: SET NX PX para tomar, scripts Lua para renovar y liberar."""
+
+    ACQUIRE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+        return 1
+    end
+    return 0
+    """
+
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self._acquire = self.client.register_script(self.ACQUIRE_SCRIPT)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    def acquire(self, key, owner, ttl_seconds):
+        return bool(self._acquire(keys=[key], args=[owner, int(ttl_seconds * 1000)]))
+
+    def release(self, key, owner):
+        self._release(keys=[key], args=[owner])
+
+
+def runs_in_process():
+    """True si el planificador corre dentro del proceso web (BINGO_AUTO_CALL_MODE='inline')."""
+    return getattr(settings, 'BINGO_AUTO_CALL_MODE', 'inline') == 'inline'
+
+
+def get_lease_lock():
+    backend = getattr(settings, 'BINGO_AUTO_CALL_LOCK_BACKEND',
+                      getattr(settings, 'BINGO_LIVE_STATE_BACKEND', 'memory'))
+    redis_url = getattr(settings, 'REDIS_URL', None)
+    if backend == 'redis' and redis_url:
+        return RedisLeaseLock(redis_url)
+    return InMemoryLeaseLock()
+
+
+class TimerWheel:
+    """
+    Rueda de temporizadores con hash: `slots` casillas de `tick` segundos.
+    Los retardos más largos que una vuelta completa se guardan con un contador de vueltas.
+    """
+
+    def __init__(self, tick=0.5, slots=512):
+        self.tick = tick
+        self.slots = slots
+        self.current = 0
+        self._wheel = [dict() for _ in range(slots)]
+        self._positions = {}  # {key: slot}
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def schedule(self, key, delay):
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        rounds, offset = divmod(ticks, self.slots)
+        slot = (self.current + offset) % self.slots
+        self._wheel[slot][key] = rounds
+        self._positions[key] = slot
+
+    def cancel(self, key):
+        slot = self._positions.pop(key, None)
+        if slot is not None:
+            self._wheel[slot].pop(key, None)
+
+    def advance(self):
+        """Avanza una casilla y devuelve las claves vencidas."""
+        self.current = (self.current + 1) % self.slots
+        bucket = self._wheel[self.current]
+        due = []
+        for key, rounds in list(bucket.items()):
+            if rounds <= 0:
+                del bucket[key]
+                self._positions.pop(key, None)
+                due.append(key)
+            else:
+                bucket[key] = rounds - 1
+        return due
+
+
+def publish_number_called(game, number):
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+        f'game_{game.id}',
+        number_called_event(number, len(game.called_numbers)),
+    )
+
+
+class AutoCallScheduler:
+    """Planificador de llamadas automáticas para todos los juegos del proceso."""
+
+    def __init__(self, lock=None, tick=None, discovery_interval=None, concurrency=None):
+        self.lock = lock or get_lease_lock()
+        self.wheel = TimerWheel(tick or getattr(settings, 'BINGO_AUTO_CALL_TICK', 0.5))
+        self.discovery_interval = discovery_interval or getattr(
+            settings, 'BINGO_AUTO_CALL_DISCOVERY_INTERVAL', 10)
+        self.concurrency = concurrency or getattr(settings, 'BINGO_AUTO_CALL_CONCURRENCY', 8)
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._task = None
+        self._loop = None
+        self._last_discovery = 0
+        self._in_flight = set()  # Juegos con una llamada en curso (fuera de la rueda)
+
+    def lease_key(self, game_id):
+        return f'{LEASE_PREFIX}:{game_id}'
+
+    def _call_in_loop(self, callback, *args):
+        """Ejecuta callback en el event loop del planificador (la rueda no es thread-safe)."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            callback(*args)
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            callback(*args)
+        else:
+            loop.call_soon_threadsafe(callback, *args)
+
+    def schedule(self, game_id, delay=0):
+        self._call_in_loop(self.wheel.schedule, int(game_id), delay)
+
+    def cancel(self, game_id):
+        self._call_in_loop(self.wheel.cancel, int(game_id))
+        # El lease es seguro entre hilos (Redis o candado propio)
+        self.lock.release(self.lease_key(game_id), self.owner)
+
+    def ensure_running(self):
+        """
+        Arranca el bucle en el event loop actual si aún no corre (p.ej. dentro de Daphne).
+        En modo 'worker' no hace nada: el planificador es el proceso autocall.
+        """
+        if not runs_in_process():
+            return None
+        if self._task is None or self._task.done():
+            print(f"🔄 AutoCallScheduler: iniciando planificador ({self.owner})")
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def run(self, stop_event=None):
+        self._loop = asyncio.get_running_loop()
+        try:
+            await self._run(stop_event)
+        finally:
+            self._loop = None
+
+    async def _run(self, stop_event):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending = set()
+
+        async def process(game_id):
+            try:
+                async with semaphore:
+                    try:
+                        delay = await database_sync_to_async(self.call_once, thread_sensitive=False)(game_id)
+                    except Exception as e:
+                        print(f"❌ AutoCallScheduler: error en juego {game_id}: {str(e)}")
+                        delay = MIN_LEASE_SECONDS
+                    if delay is not None:
+                        self.schedule(game_id, delay)
+            finally:
+                self._in_flight.discard(game_id)
+
+        while stop_event is None or not stop_event.is_set():
+            if time.monotonic() - self._last_discovery >= self.discovery_interval:
+                self._last_discovery = time.monotonic()
+                try:
+                    await self.discover()
+                except Exception as e:
+                    print(f"❌ AutoCallScheduler: error buscando juegos activos: {str(e)}")
+
+            # Las llamadas vencidas corren como tareas (acotadas por el semáforo): la rueda
+            # sigue avanzando y un juego lento no retrasa a los demás
+            for game_id in self.wheel.advance():
+                self._in_flight.add(game_id)
+                task = asyncio.create_task(process(game_id))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.sleep(self.wheel.tick)
+
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def discover(self):
+        """Agenda los juegos con auto-calling activo que aún no están en la rueda."""
+        active = await database_sync_to_async(self.active_games)()
+        for game_id, interval in active:
+            if game_id not in self.wheel and game_id not in self._in_flight:
+                self.schedule(game_id, interval or 1)
+
+    def active_games(self):
+        from bingo_app.models import Game
+
+        return list(
+            Game.objects.filter(is_auto_calling=True, is_started=True, is_finished=False)
+            .values_list('id', 'auto_call_interval')
+        )
+
+    def call_once(self, game_id):
+        """
+        Llama un número para el juego si este proceso tiene el lease.
+        Devuelve el retardo hasta la próxima llamada o None si el juego terminó.
+        """
+        from bingo_app.models import Game
+        from bingo_app.utils.bingo_patterns import find_game_winners
+
+        game = Game.objects.filter(id=game_id).first()
+        if not game or not (game.is_auto_calling and game.is_started and not game.is_finished):
+            self.lock.release(self.lease_key(game_id), self.owner)
+            return None
+
+        interval = max(1, game.auto_call_interval or 1)
+        lease_seconds = max(MIN_LEASE_SECONDS, interval * 3)
+        if not self.lock.acquire(self.lease_key(game_id), self.owner, lease_seconds):
+            # Otro worker tiene el juego; se reintenta por si su lease expira
+            return interval
+
+        number = game.call_number()
+        if number is None:
+            self.lock.release(self.lease_key(game_id), self.owner)
+            return None
+
+        publish_number_called(game, number)
+
+        if find_game_winners(game):
+            # end_game paga a los ganadores y notifica game_ended al grupo
+            game.end_game()
+            print(f"🔄 AutoCallScheduler: juego {game_id} terminado")
+            self.lock.release(self.lease_key(game_id), self.owner)
+            return None
+        return interval
+
+
+_scheduler = None
+
+
+def get_auto_call_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = AutoCallScheduler()
+    return _scheduler
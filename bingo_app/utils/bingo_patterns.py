@@ -0,0 +1,256 @@
+"""
+Motor de patrones de bingo basado en máscaras de bits.
+
+Cada cartón de 5x5 se representa como una máscara de 25 bits (bit = fila * 5 + columna)
+y cada patrón ganador (HORIZONTAL, VERTICAL, DIAGONAL, FULL, CORNERS, CUSTOM) se
+precompila en un conjunto de máscaras objetivo. Un cartón gana cuando su máscara de
+casillas marcadas contiene por completo alguna de las máscaras objetivo.
+
+El índice invertido (número -> cartones/casillas) permite evaluar una llamada
+tocando únicamente los cartones que contienen ese número.
+"""
+
+import threading
+from collections import defaultdict
+
+from bingo_app.utils.live_state import apply_live_state
+
+GRID_SIZE = 5
+FULL_MASK = (1 << (GRID_SIZE * GRID_SIZE)) - 1
+FREE_NUMBER = 0  # Comodín (casilla libre), siempre marcada
+
+
+def _bit(row, col):
+    return 1 << (row * GRID_SIZE + col)
+
+
+ROW_MASKS = tuple(
+    sum(_bit(row, col) for col in range(GRID_SIZE)) for row in range(GRID_SIZE)
+)
+COLUMN_MASKS = tuple(
+    sum(_bit(row, col) for row in range(GRID_SIZE)) for col in range(GRID_SIZE)
+)
+DIAGONAL_MASKS = (
+    sum(_bit(i, i) for i in range(GRID_SIZE)),
+    sum(_bit(i, GRID_SIZE - 1 - i) for i in range(GRID_SIZE)),
+)
+CORNERS_MASK = (
+    _bit(0, 0) | _bit(0, GRID_SIZE - 1) | _bit(GRID_SIZE - 1, 0) | _bit(GRID_SIZE - 1, GRID_SIZE - 1)
+)
+
+
+def compile_pattern(winning_pattern, custom_pattern=None):
+    """
+    Convierte un patrón ganador de Game en una tupla de máscaras objetivo.
+    Una tupla vacía significa que ningún cartón puede ganar (p.ej. CUSTOM sin patrón).
+    """
+    if winning_pattern == 'HORIZONTAL':
+        return ROW_MASKS
+    if winning_pattern == 'VERTICAL':
+        return COLUMN_MASKS
+    if winning_pattern == 'DIAGONAL':
+        return DIAGONAL_MASKS
+    if winning_pattern == 'FULL':
+        return (FULL_MASK,)
+    if winning_pattern == 'CORNERS':
+        return (CORNERS_MASK,)
+    if winning_pattern == 'CUSTOM' and custom_pattern:
+        mask = 0
+        for i, row in enumerate(custom_pattern[:GRID_SIZE]):
+            for j, cell in enumerate(row[:GRID_SIZE]):
+                if cell == 1:
+                    mask |= _bit(i, j)
+        return (mask,)
+    return ()
+
+
+def card_layout(card):
+    """
+    Devuelve (free_mask, {numero: bits}) para un cartón.
+    Un mismo número puede ocupar varias casillas (cartones generados por fila).
+    """
+    free_mask = 0
+    cells = defaultdict(int)
+    for i, row in enumerate(card[:GRID_SIZE]):
+        for j, num in enumerate(row[:GRID_SIZE]):
+            if num == FREE_NUMBER:
+                free_mask |= _bit(i, j)
+            else:
+                cells[num] |= _bit(i, j)
+    return free_mask, dict(cells)
+
+
+def marked_mask(card, marked):
+    """Máscara de casillas marcadas de un cartón dado un conjunto de números marcados."""
+    free_mask, cells = card_layout(card)
+    mask = free_mask
+    for num, bits in cells.items():
+        if num in marked:
+            mask |= bits
+    return mask
+
+
+def is_winning_mask(mask, targets):
+    return any((mask & target) == target for target in targets)
+
+
+def card_has_bingo(card, marked, targets):
+    return is_winning_mask(marked_mask(card, marked), targets)
+
+
+class WinnerIndex:
+    """
+    Índice incremental de cartones de un juego.
+
+    Mantiene la máscara marcada de cada cartón y un índice invertido
+    número -> [(cartón, bits)]. `mark(numero)` solo actualiza los cartones que
+    contienen ese número y devuelve los dueños que completan un patrón.
+    Los dueños se identifican con cualquier valor hashable (p.ej. player_id).
+    """
+
+    def __init__(self, targets):
+        self.targets = tuple(targets)
+        self.applied = set()
+        self.winners = set()
+        self._masks = []
+        self._owners = []
+        self._index = defaultdict(list)
+
+    def add_card(self, owner, card):
+        free_mask, cells = card_layout(card)
+        slot = len(self._masks)
+        mask = free_mask
+        for num, bits in cells.items():
+            self._index[num].append((slot, bits))
+            if num in self.applied:
+                mask |= bits
+        self._masks.append(mask)
+        self._owners.append(owner)
+        if is_winning_mask(mask, self.targets):
+            self.winners.add(owner)
+
+    def mark(self, number):
+        if number in self.applied:
+            return set()
+        self.applied.add(number)
+        new_winners = set()
+        for slot, bits in self._index.get(number, ()):
+            mask = self._masks[slot] | bits
+            self._masks[slot] = mask
+            owner = self._owners[slot]
+            if owner not in self.winners and is_winning_mask(mask, self.targets):
+                self.winners.add(owner)
+                new_winners.add(owner)
+        return new_winners
+
+    def mark_many(self, numbers):
+        new_winners = set()
+        for number in numbers:
+            new_winners |= self.mark(number)
+        return new_winners
+
+    def card_count(self):
+        return len(self._masks)
+
+
+# Evaluadores vivos por juego dentro del proceso: {game_id: (firma, evaluador)}
+_game_indexes = {}
+# Un lock por juego: construir o evaluar un juego grande no frena a los demás.
+# _game_indexes_lock solo protege el diccionario de locks.
+_game_locks = {}
+_game_indexes_lock = threading.Lock()
+
+
+def _game_lock(game_id):
+    with _game_indexes_lock:
+        lock = _game_locks.get(game_id)
+        if lock is None:
+            lock = _game_locks[game_id] = threading.Lock()
+        return lock
+
+
+def _index_signature(game):
+    # Sin consultas: los cartones solo se agregan comprando (total_cards_sold) y el modo
+    # manual se resuelve en cada llamada, así que cambiarlo no obliga a reconstruir
+    return (game.winning_pattern, repr(game.custom_pattern), game.total_cards_sold)
+
+
+def _build_index(game, targets):
+    """
+    Construye el evaluador con los cartones de todos los jugadores: PackedCards
+    (NumPy) para juegos grandes o WinnerIndex en caso contrario.
+    """
+    from bingo_app.models import Player
+    from bingo_app.utils.bingo_vectorized import PackedCards, vectorized_enabled
+
+    rows = list(Player.objects.filter(game_id=game.id).values_list('id', 'cards'))
+    if vectorized_enabled(sum(len(cards or []) for _, cards in rows)):
+        packed = PackedCards.from_rows(targets, rows)
+        if packed is not None:
+            return packed
+
+    index = WinnerIndex(targets)
+    index.applied.update(game.called_numbers or [])
+    for player_id, cards in rows:
+        for card in cards or []:
+            index.add_card(player_id, card)
+    return index
+
+
+def _is_reusable(evaluator, called_numbers):
+    # El índice incremental solo sirve si los números ya aplicados siguen llamados
+    if isinstance(evaluator, WinnerIndex):
+        return evaluator.applied.issubset(called_numbers)
+    return True
+
+
+def find_game_winners(game):
+    """
+    Devuelve la lista de Player ganadores del juego (ordenados por id) usando el
+    índice incremental, o la evaluación vectorizada en juegos grandes.
+    Equivale a [p for p in game.player_set.all() if p.check_bingo()].
+    """
+    from bingo_app.models import Player
+
+    targets = compile_pattern(game.winning_pattern, game.custom_pattern)
+    if not targets:
+        return []
+
+    apply_live_state(game)
+    signature = _index_signature(game)
+    called_numbers = game.called_numbers or []
+
+    with _game_lock(game.id):
+        cached = _game_indexes.get(game.id)
+        if cached and cached[0] == signature and _is_reusable(cached[1], called_numbers):
+            evaluator = cached[1]
+        else:
+            evaluator = _build_index(game, targets)
+            _game_indexes[game.id] = (signature, evaluator)
+        if isinstance(evaluator, WinnerIndex):
+            evaluator.mark_many(called_numbers)
+            winner_ids = set(evaluator.winners)
+        else:
+            winner_ids = evaluator.winning_owners(called_numbers)
+
+    # En modo manual cuentan los números marcados por el jugador, no los llamados
+    manual_rows = Player.objects.filter(game_id=game.id, is_manual_marking=True).values_list(
+        'id', 'cards', 'marked_numbers'
+    )
+    for player_id, cards, marked in manual_rows:
+        winner_ids.discard(player_id)
+        marked_set = set(marked or [])
+        if any(card_has_bingo(card, marked_set, targets) for card in cards or []):
+            winner_ids.add(player_id)
+
+    if not winner_ids:
+        return []
+    return list(Player.objects.filter(id__in=winner_ids).select_related('user').order_by('id'))
+
+
+def discard_game_index(game_id):
+    """Libera el índice de un juego terminado."""
+    with _game_lock(game_id):
+        _game_indexes.pop(game_id, None)
+    with _game_indexes_lock:
+        _game_locks.pop(game_id, None)
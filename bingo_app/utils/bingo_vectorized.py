@@ -0,0 +1,88 @@
+"""
+Evaluación vectorizada de ganadores con NumPy (opcional).
+
+Para juegos grandes todos los cartones se empaquetan en un arreglo contiguo uint8
+de forma (N, 5, 5). Los números llamados se convierten en una tabla booleana de
+consulta (256 posiciones, el comodín 0 siempre marcado) y los patrones de
+bingo_patterns se aplican como matriz (T, 25) en una sola pasada.
+
+Si NumPy no está instalado NUMPY_AVAILABLE es False y se usa el índice incremental.
+"""
+
+from django.conf import settings
+
+from bingo_app.utils.bingo_patterns import FREE_NUMBER, GRID_SIZE
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+CELLS = GRID_SIZE * GRID_SIZE
+
+
+def vectorized_enabled(card_count):
+    """Indica si conviene la evaluación vectorizada para esta cantidad de cartones."""
+    min_cards = getattr(settings, 'BINGO_VECTORIZED_MIN_CARDS', 1000)
+    return NUMPY_AVAILABLE and min_cards > 0 and card_count >= min_cards
+
+
+def targets_matrix(targets):
+    """Convierte las máscaras objetivo en una matriz (T, 25) de 0/1 y sus tamaños."""
+    matrix = np.array(
+        [[(target >> cell) & 1 for cell in range(CELLS)] for target in targets],
+        dtype=np.uint8,
+    )
+    return matrix, matrix.sum(axis=1, dtype=np.int32)
+
+
+class PackedCards:
+    """Cartones de un juego empaquetados para evaluar ganadores en bloque."""
+
+    def __init__(self, targets):
+        self.targets = tuple(targets)
+        self.cards = np.zeros((0, GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+        self.owners = np.zeros(0, dtype=np.int64)
+        matrix, self._sizes = targets_matrix(self.targets)
+        self._matrix_t = matrix.T.astype(np.int32)
+
+    @classmethod
+    def from_rows(cls, targets, rows):
+        """
+        rows: iterable de (owner_id, cards). Devuelve None si algún cartón no es 5x5
+        o tiene números fuera de 0..255 (se usa entonces el evaluador en Python).
+        """
+        packed = cls(targets)
+        owners = []
+        flat = []
+        for owner_id, cards in rows:
+            for card in cards or []:
+                if len(card) != GRID_SIZE or any(len(row) != GRID_SIZE for row in card):
+                    return None
+                flat.append(card)
+                owners.append(owner_id)
+        if flat:
+            cards = np.array(flat, dtype=np.int64)
+            if cards.min() < 0 or cards.max() > 255:
+                return None
+            packed.cards = np.ascontiguousarray(cards, dtype=np.uint8)
+            packed.owners = np.array(owners, dtype=np.int64)
+        return packed
+
+    def card_count(self):
+        return len(self.owners)
+
+    def winning_owners(self, marked_numbers):
+        """Devuelve el conjunto de owner_id con al menos un cartón ganador."""
+        if not len(self.owners) or not self.targets:
+            return set()
+        lookup = np.zeros(256, dtype=bool)
+        numbers = [n for n in marked_numbers if isinstance(n, int) and 0 <= n <= 255]
+        lookup[numbers] = True
+        lookup[FREE_NUMBER] = True
+        marked = lookup[self.cards].reshape(len(self.owners), CELLS).astype(np.uint8)
+        hits = marked @ self._matrix_t
+        won = (hits == self._sizes).any(axis=1)
+        return set(np.unique(self.owners[won]).tolist())
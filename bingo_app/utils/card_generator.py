@@ -0,0 +1,223 @@
+"""
+Generación masiva de cartones B-I-N-G-O en formato empaquetado.
+
+Formato empaquetado (CARD_BYTES = 12 bytes por cartón): cada columna tiene 5
+números de un rango de 15, así que cada casilla se guarda como desplazamiento
+0..14 en 4 bits. Se recorren las columnas B, I, N, G, O de arriba abajo saltando
+el comodín central: 24 casillas * 4 bits = 96 bits.
+
+Los cartones salen de un flujo SHAKE-256 a partir de una semilla de 32 bytes
+(secrets.token_bytes si no se indica otra). Para cada columna se toman 15 claves
+uint32 del flujo y se eligen los 5 números con menor clave: es una muestra
+uniforme sin repetición. La ruta NumPy (opcional) y la de Python puro producen
+exactamente los mismos cartones para la misma semilla.
+
+Unicidad: los bytes empaquetados son la clave canónica del cartón; el generador
+guarda un conjunto (hash) de los ya emitidos y descarta repetidos.
+
+Pools por juego: la semilla de cada juego se deriva con HMAC de SECRET_KEY y el
+id del juego, por lo que la secuencia de cartones del juego es determinista en
+cualquier proceso. La compra (con el juego bloqueado) toma los cartones
+[total_cards_sold, total_cards_sold + cantidad) de esa secuencia: no hay cartones
+repetidos dentro del juego sin leer los cartones de los demás jugadores.
+"""
+
+import hashlib
+import hmac
+import secrets
+import struct
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from bingo_app.utils.bingo_vectorized import NUMPY_AVAILABLE, np
+
+COLUMN_STARTS = (1, 16, 31, 46, 61)
+COLUMN_RANGE = 15
+NUMBERS_PER_COLUMN = 5
+FREE_CELL = 2 * NUMBERS_PER_COLUMN + 2  # Columna N, fila 3 (orden por columnas)
+CELLS_PACKED = 24
+CARD_BYTES = CELLS_PACKED // 2
+KEY_BYTES = 4
+CARD_KEY_BYTES = len(COLUMN_STARTS) * COLUMN_RANGE * KEY_BYTES
+BLOCK_CARDS = 1024
+POOL_MAX_GAMES = 64
+PRINTABLE_CARDS_MAX_BATCH = 100000
+
+_COLUMN_KEYS = struct.Struct(f'<{COLUMN_RANGE}I')
+
+
+def pack_card(card):
+    """
+    Empaqueta un cartón 5x5 (filas, comodín 0 al centro) en CARD_BYTES bytes.
+    Lanza ValueError si el cartón no sigue el esquema B-I-N-G-O 1-75.
+    """
+    if len(card) != NUMBERS_PER_COLUMN or int(card[2][2]) != 0:
+        raise ValueError('El cartón no tiene el formato B-I-N-G-O 5x5 con comodín central')
+    value = 0
+    for col, start in enumerate(COLUMN_STARTS):
+        for row in range(NUMBERS_PER_COLUMN):
+            if col == 2 and row == 2:
+                continue
+            offset = int(card[row][col]) - start
+            if not 0 <= offset < COLUMN_RANGE:
+                raise ValueError(f'Número {card[row][col]} fuera del rango de su columna')
+            value = (value << 4) | offset
+    return value.to_bytes(CARD_BYTES, 'big')
+
+
+_NIBBLES = [(byte >> 4, byte & 0xF) for byte in range(256)]
+_ROW_OFFSETS = [
+    [(row + NUMBERS_PER_COLUMN * col, start) for col, start in enumerate(COLUMN_STARTS)]
+    for row in range(NUMBERS_PER_COLUMN)
+]
+
+
+def unpack_card(packed):
+    """Devuelve el cartón como lista de filas (listas de int), con 0 en el comodín."""
+    cells = []
+    for byte in packed:
+        cells.extend(_NIBBLES[byte])
+    cells.insert(FREE_CELL, -COLUMN_STARTS[2])
+    return [[start + cells[cell] for cell, start in row] for row in _ROW_OFFSETS]
+
+
+def unpack_cards(packed_cards):
+    """Versión en bloque de unpack_card (con NumPy si está disponible)."""
+    if not NUMPY_AVAILABLE or not packed_cards:
+        return [unpack_card(packed) for packed in packed_cards]
+    data = np.frombuffer(b''.join(packed_cards), dtype=np.uint8).reshape(-1, CARD_BYTES)
+    cells = np.empty((len(packed_cards), CELLS_PACKED), dtype=np.uint8)
+    cells[:, 0::2] = data >> 4
+    cells[:, 1::2] = data & 0xF
+    cells = np.insert(cells.astype(np.int16), FREE_CELL, -COLUMN_STARTS[2], axis=1)
+    columns = cells.reshape(-1, len(COLUMN_STARTS), NUMBERS_PER_COLUMN) + np.array(COLUMN_STARTS, dtype=np.int16)[:, None]
+    return columns.transpose(0, 2, 1).tolist()
+
+
+class CardGenerator:
+    """Generador de cartones únicos a partir de una semilla (CSPRNG SHAKE-256)."""
+
+    def __init__(self, seed=None, use_numpy=None):
+        self.seed = seed if seed is not None else secrets.token_bytes(32)
+        self.use_numpy = NUMPY_AVAILABLE if use_numpy is None else (use_numpy and NUMPY_AVAILABLE)
+        self._block = 0
+        self._buffer = []
+        self._seen = set()
+
+    def _block_keys(self):
+        digest = hashlib.shake_256(self.seed + self._block.to_bytes(8, 'big'))
+        self._block += 1
+        return digest.digest(BLOCK_CARDS * CARD_KEY_BYTES)
+
+    def _pack_block_python(self, keys):
+        cards = []
+        offset = 0
+        for _ in range(BLOCK_CARDS):
+            value = 0
+            for col in range(len(COLUMN_STARTS)):
+                column_keys = _COLUMN_KEYS.unpack_from(keys, offset)
+                offset += _COLUMN_KEYS.size
+                chosen = sorted(range(COLUMN_RANGE), key=column_keys.__getitem__)[:NUMBERS_PER_COLUMN]
+                if col == 2:
+                    del chosen[2]
+                for number in chosen:
+                    value = (value << 4) | number
+            cards.append(value.to_bytes(CARD_BYTES, 'big'))
+        return cards
+
+    def _pack_block_numpy(self, keys):
+        keys = np.frombuffer(keys, dtype='<u4').reshape(BLOCK_CARDS, len(COLUMN_STARTS), COLUMN_RANGE)
+        chosen = np.argsort(keys, axis=2, kind='stable')[:, :, :NUMBERS_PER_COLUMN].astype(np.uint8)
+        cells = np.delete(chosen.reshape(BLOCK_CARDS, -1), FREE_CELL, axis=1)
+        packed = (cells[:, 0::2] << 4) | cells[:, 1::2]
+        data = packed.tobytes()
+        return [data[i:i + CARD_BYTES] for i in range(0, len(data), CARD_BYTES)]
+
+    def _next_block(self):
+        keys = self._block_keys()
+        if self.use_numpy:
+            block = self._pack_block_numpy(keys)
+        else:
+            block = self._pack_block_python(keys)
+        unique = []
+        for packed in block:
+            if packed not in self._seen:
+                self._seen.add(packed)
+                unique.append(packed)
+        return unique
+
+    def exclude(self, cards):
+        """Marca como usados cartones ya existentes (listas o bytes empaquetados)."""
+        for card in cards:
+            self._seen.add(card if isinstance(card, bytes) else pack_card(card))
+
+    def generate_packed(self, count):
+        while len(self._buffer) < count:
+            self._buffer.extend(self._next_block())
+        cards = self._buffer[:count]
+        del self._buffer[:count]
+        return cards
+
+    def generate(self, count):
+        return unpack_cards(self.generate_packed(count))
+
+
+def generate_cards(count, seed=None):
+    """Genera `count` cartones únicos entre sí (listas de filas)."""
+    return CardGenerator(seed).generate(count)
+
+
+def game_card_seed(game_id):
+    key = settings.SECRET_KEY.encode('utf-8')
+    return hmac.new(key, f'bingo-cards:{game_id}'.encode('ascii'), hashlib.sha256).digest()
+
+
+class GameCardPool:
+    """Secuencia determinista de cartones únicos de un juego, generada por bloques."""
+
+    def __init__(self, game_id):
+        self.game_id = game_id
+        self._generator = CardGenerator(game_card_seed(game_id))
+        self._cards = []
+        self._lock = threading.Lock()
+
+    def take(self, start, count):
+        """Cartones [start, start + count) de la secuencia del juego."""
+        with self._lock:
+            missing = start + count - len(self._cards)
+            if missing > 0:
+                blocks = -(-missing // BLOCK_CARDS)
+                self._cards.extend(self._generator.generate_packed(blocks * BLOCK_CARDS))
+            packed = self._cards[start:start + count]
+        return unpack_cards(packed)
+
+
+_pools = OrderedDict()
+_pools_lock = threading.Lock()
+
+
+def get_card_pool(game_id):
+    with _pools_lock:
+        pool = _pools.get(game_id)
+        if pool is None:
+            pool = _pools[game_id] = GameCardPool(game_id)
+            while len(_pools) > POOL_MAX_GAMES:
+                _pools.popitem(last=False)
+        else:
+            _pools.move_to_end(game_id)
+        return pool
+
+
+def draw_game_cards(game_id, start, count):
+    """
+    Cartones para una compra: `start` debe ser total_cards_sold leído con el juego
+    bloqueado (select_for_update) para que dos compras no tomen los mismos índices.
+    """
+    return get_card_pool(game_id).take(start, count)
+
+
+def discard_card_pool(game_id):
+    with _pools_lock:
+        _pools.pop(game_id, None)
@@ -0,0 +1,119 @@
+"""
+Servicio de compra de cartones de bingo con bloqueo de filas.
+
+La compra se hace en una transacción corta:
+1. SELECT ... FOR UPDATE del juego y del jugador (orden fijo para evitar deadlocks).
+2. Débito condicional del usuario en un solo UPDATE con F() (no hay saldo negativo
+   ni actualizaciones perdidas aunque el objeto en memoria esté desactualizado).
+3. UPDATE de los cartones del jugador e INSERT del Transaction.
+4. Un solo UPDATE del juego: total_cards_sold/held_balance con F() más el premio
+   y max_cards_sold recalculados.
+
+La difusión por WebSocket se difiere a transaction.on_commit: el progreso del juego
+se agrupa por juego ('game_progress', utils.game_broadcast) y los cartones solo se
+envían al comprador.
+"""
+
+import uuid
+
+from django.db import transaction
+from django.db.models import F
+
+from bingo_app.utils.card_generator import draw_game_cards
+from bingo_app.utils.game_broadcast import progress_aggregator, send_cards_to_buyer
+
+
+class CardPurchaseError(Exception):
+    """Compra rechazada; `status` es el código HTTP sugerido."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def purchase_cards(user, game_id, quantity, card_factory=None):
+    """
+    Compra `quantity` cartones para `user` en el juego. Por defecto los cartones salen
+    del pool del juego (utils.card_generator, únicos dentro del juego); `card_factory()`
+    permite generarlos de otra forma. Devuelve un diccionario con los datos para la
+    respuesta JSON.
+    """
+    from bingo_app.models import Game, Player, Transaction, User
+
+    with transaction.atomic():
+        game = Game.objects.select_for_update().get(id=game_id)
+        if game.is_started:
+            raise CardPurchaseError('El juego ya ha comenzado')
+
+        try:
+            player = Player.objects.select_for_update().get(user_id=user.id, game_id=game_id)
+        except Player.DoesNotExist:
+            raise CardPurchaseError('No formas parte de este juego.', status=404)
+
+        if (len(player.cards) + quantity) > game.max_cards_per_player:
+            raise CardPurchaseError(
+                f'No puedes comprar {quantity} cartones. Excederías el límite de {game.max_cards_per_player} por jugador.'
+            )
+
+        total_cost = game.card_price * quantity
+        debited = User.objects.filter(id=user.id, credit_balance__gte=total_cost).update(
+            credit_balance=F('credit_balance') - total_cost
+        )
+        if not debited:
+            raise CardPurchaseError(f'Saldo insuficiente. Necesitas {total_cost} créditos.')
+
+        if card_factory is None:
+            # El juego está bloqueado: nadie más puede tomar estos índices de la secuencia
+            new_cards = draw_game_cards(game.id, game.total_cards_sold, quantity)
+        else:
+            new_cards = [card_factory() for _ in range(quantity)]
+        player.cards.extend(new_cards)
+        player.save(update_fields=['cards'])
+
+        Transaction.objects.create(
+            user_id=user.id,
+            amount=-total_cost,
+            transaction_type='PURCHASE',
+            description=f"Compra de {quantity} cartón(es) para partida: {game.name}",
+            related_game=game
+        )
+
+        # El juego está bloqueado: el premio se calcula con los valores ya sumados
+        prize_before = game.prize
+        game.total_cards_sold += quantity
+        game.held_balance += total_cost
+        game.max_cards_sold = max(game.max_cards_sold, game.total_cards_sold)
+        game.prize = max(game.calculate_prize(), game.base_prize)
+        Game.objects.filter(id=game.id).update(
+            total_cards_sold=F('total_cards_sold') + quantity,
+            held_balance=F('held_balance') + total_cost,
+            max_cards_sold=game.max_cards_sold,
+            prize=game.prize,
+        )
+
+        new_balance = User.objects.values_list('credit_balance', flat=True).get(id=user.id)
+        user.credit_balance = new_balance
+
+        purchase_id = uuid.uuid4().hex
+        transaction.on_commit(lambda: progress_aggregator.add(game.id, quantity, prize_before))
+        transaction.on_commit(
+            lambda: send_cards_to_buyer(game.id, user.id, purchase_id, new_cards, len(player.cards), new_balance),
+            robust=True,
+        )
+
+    prize_increase = game.prize - prize_before
+    return {
+        'success': True,
+        'purchase_id': purchase_id,
+        'new_balance': float(new_balance),
+        'player_cards_count': len(player.cards),
+        'new_cards': new_cards,
+        'prize_increased': prize_increase > 0,
+        'new_prize': float(game.prize),
+        'increase_amount': float(prize_increase) if prize_increase > 0 else 0,
+        'total_cards_sold': game.total_cards_sold,
+        'max_cards_sold': game.max_cards_sold,
+        'next_prize_target': game.next_prize_target,
+        'progress_percentage': game.progress_percentage
+    }
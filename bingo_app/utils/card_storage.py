@@ -0,0 +1,167 @@
+"""
+Almacenamiento compacto de los cartones de un jugador (Player.cards).
+
+La columna es binaria y empieza con un byte de formato:
+- FORMAT_PACKED (0x01): cartones de CARD_BYTES bytes concatenados
+  (formato de utils.card_generator, 12 bytes por cartón frente a ~90 en JSON).
+- FORMAT_JSON (0x00): lista JSON en UTF-8, para cartones antiguos que no siguen el
+  esquema B-I-N-G-O 1-75 y no se pueden empaquetar.
+- Vacío: sin cartones.
+
+Al leer de la base el campo devuelve un PackedCardList: len() no decodifica nada,
+append()/extend() acumulan los cartones nuevos sin tocar los existentes (al guardar
+solo se empaquetan los nuevos) y los cartones se decodifican a listas de filas la
+primera vez que se recorren. Plantillas, check_bingo y los eventos siguen viendo
+listas de listas de int.
+"""
+
+import json
+from collections.abc import MutableSequence
+
+from django.db import models
+
+from bingo_app.utils.card_generator import CARD_BYTES, pack_card, unpack_cards
+
+FORMAT_JSON = b'\x00'
+FORMAT_PACKED = b'\x01'
+
+
+def _pack_all(cards):
+    """Bytes empaquetados de los cartones, o None si alguno no se puede empaquetar."""
+    try:
+        return b''.join(pack_card(card) for card in cards)
+    except (ValueError, TypeError, IndexError):
+        return None
+
+
+def encode_cards(cards):
+    cards = list(cards)
+    if not cards:
+        return b''
+    packed = _pack_all(cards)
+    if packed is None:
+        return FORMAT_JSON + json.dumps(cards).encode('utf-8')
+    return FORMAT_PACKED + packed
+
+
+def decode_cards(data):
+    data = bytes(data or b'')
+    if not data:
+        return []
+    if data[:1] == FORMAT_PACKED:
+        return unpack_cards([data[i:i + CARD_BYTES] for i in range(1, len(data), CARD_BYTES)])
+    return json.loads(data[1:].decode('utf-8'))
+
+
+class PackedCardList(MutableSequence):
+    """Lista de cartones que se decodifica de forma perezosa."""
+
+    def __init__(self, cards=None, data=b''):
+        self._data = bytes(data or b'')
+        self._tail = []
+        self._cards = None if cards is None else list(cards)
+
+    @classmethod
+    def from_db(cls, data):
+        return cls(data=data)
+
+    @property
+    def is_decoded(self):
+        return self._cards is not None
+
+    def _decoded(self):
+        if self._cards is None:
+            self._cards = decode_cards(self._data) + self._tail
+            self._data = b''
+            self._tail = []
+        return self._cards
+
+    def __len__(self):
+        if self._cards is not None:
+            return len(self._cards)
+        if self._data[:1] == FORMAT_PACKED:
+            stored = (len(self._data) - 1) // CARD_BYTES
+        else:
+            stored = len(decode_cards(self._data))
+        return stored + len(self._tail)
+
+    def __getitem__(self, index):
+        return self._decoded()[index]
+
+    def __setitem__(self, index, value):
+        self._decoded()[index] = value
+
+    def __delitem__(self, index):
+        del self._decoded()[index]
+
+    def __iter__(self):
+        return iter(self._decoded())
+
+    def insert(self, index, value):
+        self._decoded().insert(index, value)
+
+    def append(self, card):
+        if self._cards is None:
+            self._tail.append(card)
+        else:
+            self._cards.append(card)
+
+    def extend(self, cards):
+        for card in cards:
+            self.append(card)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, PackedCardList)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f'PackedCardList({len(self)} cartones)'
+
+    def to_list(self):
+        return list(self._decoded())
+
+    def to_bytes(self):
+        if self._cards is not None:
+            return encode_cards(self._cards)
+        if not self._tail:
+            return self._data
+        if not self._data:
+            return encode_cards(self._tail)
+        if self._data[:1] == FORMAT_PACKED:
+            packed_tail = _pack_all(self._tail)
+            if packed_tail is not None:
+                # Solo se empaquetan los cartones nuevos; los existentes no se decodifican
+                return self._data + packed_tail
+        return encode_cards(decode_cards(self._data) + self._tail)
+
+
+class PackedCardsField(models.BinaryField):
+    """Campo binario con los cartones del jugador; en Python se usa como una lista."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default', list)
+        super().__init__(*args, **kwargs)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return PackedCardList.from_db(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, (list, PackedCardList)):
+            return value
+        if isinstance(value, str):
+            return json.loads(value)
+        return PackedCardList.from_db(value)
+
+    def get_prep_value(self, value):
+        if isinstance(value, PackedCardList):
+            return value.to_bytes()
+        if isinstance(value, (list, tuple)):
+            return encode_cards(value)
+        return value
+
+    def value_to_string(self, obj):
+        # dumpdata/loaddata usan JSON legible en lugar de base64
+        return json.dumps(list(self.value_from_object(obj) or []))
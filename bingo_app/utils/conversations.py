@@ -0,0 +1,152 @@
+"""
+Mensajería privada por conversaciones (Conversation).
+
+Cada par de usuarios tiene una sola Conversation (par ordenado por id) y cada
+Message apunta a la suya, así que una conversación se lee con el índice
+(conversation, -timestamp, -id) en lugar de un OR entre remitente y destinatario.
+
+- send_private_message(): crea el mensaje y, en la misma transacción, suma 1 al
+  contador sin leer del destinatario y mueve last_message con un solo UPDATE.
+- mark_conversation_read(): marca los mensajes recibidos como leídos (con
+  notification_inbox.mark_read, que ajusta también la campana) y pone el contador
+  del lector en 0. Para marcar mensajes sueltos: mark_messages_read().
+- conversation_page(): página de mensajes por cursor (keyset), de los más recientes
+  hacia atrás; el cliente pide los anteriores con el next_cursor recibido.
+
+Los mensajes anteriores a las conversaciones se asignan en la migración 0070.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, PositiveIntegerField, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from bingo_app.utils.keyset_pagination import keyset_paginate
+
+MESSAGE_PAGE_SIZE = 50
+
+
+def _pair(user_a_id, user_b_id):
+    return (user_a_id, user_b_id) if user_a_id < user_b_id else (user_b_id, user_a_id)
+
+
+def find_conversation(user_a_id, user_b_id):
+    from bingo_app.models import Conversation
+
+    low, high = _pair(user_a_id, user_b_id)
+    return Conversation.objects.filter(user_low_id=low, user_high_id=high).first()
+
+
+def get_or_create_conversation(user_a_id, user_b_id):
+    from bingo_app.models import Conversation
+
+    low, high = _pair(user_a_id, user_b_id)
+    try:
+        with transaction.atomic():
+            conversation, _ = Conversation.objects.get_or_create(user_low_id=low, user_high_id=high)
+    except IntegrityError:
+        # Otro proceso la creó al mismo tiempo
+        conversation = Conversation.objects.get(user_low_id=low, user_high_id=high)
+    return conversation
+
+
+def _unread_field(conversation, user_id):
+    return 'low_unread' if user_id == conversation.user_low_id else 'high_unread'
+
+
+def send_private_message(sender, recipient, content):
+    """Crea el mensaje y actualiza la conversación (último mensaje y no leídos del destinatario)."""
+    from bingo_app.models import Conversation, Message
+
+    with transaction.atomic():
+        conversation = get_or_create_conversation(sender.id, recipient.id)
+        message = Message.objects.create(
+            sender=sender,
+            recipient=recipient,
+            conversation=conversation,
+            content=content
+        )
+        unread_field = _unread_field(conversation, recipient.id)
+        Conversation.objects.filter(pk=conversation.pk).update(
+            last_message=message,
+            last_message_at=message.timestamp,
+            **{unread_field: F(unread_field) + 1}
+        )
+    return message
+
+
+def mark_conversation_read(user, other_user_id):
+    """Marca como leídos los mensajes recibidos de `other_user_id`. Devuelve cuántos marcó."""
+    from bingo_app.models import Conversation, Message
+    from bingo_app.utils.notification_inbox import mark_read
+
+    conversation = find_conversation(user.id, other_user_id)
+    if conversation is None:
+        return 0
+    with transaction.atomic():
+        marked = mark_read(Message.objects.filter(conversation=conversation, recipient=user, is_read=False))
+        Conversation.objects.filter(pk=conversation.pk).update(**{_unread_field(conversation, user.id): 0})
+    return marked
+
+
+def _decrement_for(user, side, total):
+    # Resta `total` al contador del lado del usuario (sin bajar de 0); el otro lado queda igual
+    field = f'{side}_unread'
+    return Case(
+        When(**{f'user_{side}': user}, then=Greatest(F(field) - total, Value(0), output_field=PositiveIntegerField())),
+        default=F(field),
+    )
+
+
+def mark_messages_read(user, queryset):
+    """
+    Marca como leídos los mensajes del queryset recibidos por `user` (por ejemplo desde
+    la campana) y descuenta cada uno del contador de su conversación.
+    """
+    from bingo_app.models import Conversation
+    from bingo_app.utils.notification_inbox import mark_read
+
+    queryset = queryset.filter(recipient=user, is_read=False)
+    with transaction.atomic():
+        per_conversation = list(
+            queryset.exclude(conversation=None).values('conversation_id').annotate(total=Count('id'))
+            .values_list('conversation_id', 'total')
+        )
+        marked = mark_read(queryset)
+        for conversation_id, total in per_conversation:
+            Conversation.objects.filter(pk=conversation_id).update(
+                low_unread=_decrement_for(user, 'low', total),
+                high_unread=_decrement_for(user, 'high', total),
+            )
+    return marked
+
+
+def conversation_page(conversation, cursor=None, per_page=MESSAGE_PAGE_SIZE):
+    """Página de mensajes (los más recientes primero) con el remitente ya cargado."""
+    from bingo_app.models import Message
+
+    queryset = Message.objects.filter(conversation=conversation).select_related('sender')
+    return keyset_paginate(queryset, cursor=cursor, per_page=per_page, field='timestamp')
+
+
+def user_conversations(user):
+    """Conversaciones del usuario, la más reciente primero, con el otro usuario y el último mensaje."""
+    from bingo_app.models import Conversation
+
+    conversations = list(
+        Conversation.objects.filter(Q(user_low=user) | Q(user_high=user), last_message_at__isnull=False)
+        .select_related('user_low', 'user_high', 'last_message')
+        .order_by(F('last_message_at').desc(nulls_last=True), '-id')
+    )
+    for conversation in conversations:
+        conversation.other_user = conversation.user_high if conversation.user_low_id == user.id else conversation.user_low
+        conversation.unread_count = conversation.unread_for(user.id)
+    return conversations
+
+
+def unread_message_count(user):
+    """Mensajes privados sin leer del usuario, sumando los contadores de sus conversaciones."""
+    from bingo_app.models import Conversation
+
+    low = Conversation.objects.filter(user_low=user).aggregate(total=Sum('low_unread'))['total'] or 0
+    high = Conversation.objects.filter(user_high=user).aggregate(total=Sum('high_unread'))['total'] or 0
+    return low + high
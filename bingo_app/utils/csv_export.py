@@ -0,0 +1,58 @@
+"""
+Exportación CSV en streaming.
+
+Las filas se escriben una a una en la respuesta: el queryset se recorre con
+iterator(), así que la memoria no crece con la cantidad de filas.
+
+Bajo ASGI (Daphne) Django consume los iteradores síncronos con
+sync_to_async(list), es decir, arma todo el archivo antes de enviarlo. Por eso la
+respuesta recibe un generador asíncrono (aiter_chunks) que pide cada bloque de
+líneas con sync_to_async: en memoria queda un bloque a la vez.
+"""
+
+import csv
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """Objeto tipo archivo que devuelve lo escrito en lugar de guardarlo."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    writer = csv.writer(_Echo())
+    # BOM para que Excel abra el archivo como UTF-8
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _next_chunk(lines, size):
+    return ''.join(islice(lines, size))
+
+
+async def aiter_chunks(lines, size=EXPORT_CHUNK_SIZE):
+    """
+    Recorre un iterador síncrono de líneas por bloques de `size`. Cada bloque se lee
+    con sync_to_async (thread_sensitive): el cursor del queryset se usa siempre desde
+    el mismo hilo y la conexión de la petición.
+    """
+    lines = iter(lines)
+    while True:
+        chunk = await sync_to_async(_next_chunk)(lines, size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def csv_response(filename, header, rows):
+    response = StreamingHttpResponse(aiter_chunks(iter_csv(header, rows)), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,342 @@
+"""
+Motor de matchmaking del módulo de dados.
+
+Los jugadores se agrupan de a 3 por precio de entrada, en orden de llegada:
+- MatchmakingQueues mantiene una cola FIFO por precio en memoria. Entrar a la cola
+  forma el trío en O(1); salir marca la entrada y se descarta al llegar al frente.
+- La tabla DiceMatchmakingQueue sigue siendo el registro durable: al arrancar (y
+  cada BINGO_DICE_MATCHMAKING_RESYNC_INTERVAL segundos) las colas se reconstruyen
+  desde las entradas WAITING.
+- create_match() crea la partida en una transacción: bloquea las entradas y a los
+  jugadores ordenados por id, descarta a quien ya no esté esperando, tenga partida
+  activa o no tenga saldo (los demás vuelven al frente de la cola) y anuncia la
+  partida con la notificación 'match_found' al confirmarse.
+
+Transporte de eventos (BINGO_DICE_MATCHMAKING_BACKEND, por defecto igual que el
+estado vivo):
+- 'redis': las vistas publican los eventos en una lista de Redis y los consume el
+  worker dedicado: python manage.py run_dice_matchmaker (proceso matchmaker del
+  Procfile).
+- 'memory': el evento se procesa en el mismo proceso (desarrollo y pruebas).
+
+Respaldo: el worker de trabajos ejecuta dice.matchmaking_resync cada
+BINGO_DICE_MATCHMAKING_RESYNC_INTERVAL segundos (bingo_app/jobs.py) y forma los
+tríos que quedaron en la base si el matchmaker estuvo caído o se perdió un evento.
+Dos matchmakers a la vez no duplican partidas: create_match bloquea las entradas y
+solo toma las que siguen WAITING.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+MATCH_SIZE = 3
+EVENTS_KEY = 'bingo:dice:matchmaking:events'
+ACTIVE_GAME_STATUSES = ('WAITING', 'SPINNING', 'PLAYING')
+POOL_SHARE = Decimal('0.80')  # 80% de las entradas va al pozo acumulado
+
+logger = logging.getLogger(__name__)
+
+
+class MatchmakingQueues:
+    """Colas FIFO por precio. join() devuelve el trío formado o None."""
+
+    def __init__(self):
+        self._queues = defaultdict(deque)  # {precio: deque[(entry_id, user_id)]}
+        self._members = {}  # {user_id: (precio, entry_id)}
+        self._sizes = defaultdict(int)
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, user_id):
+        return user_id in self._members
+
+    def waiting(self, price):
+        return self._sizes[Decimal(price)]
+
+    def join(self, entry_id, user_id, price):
+        price = Decimal(price)
+        if self._members.get(user_id) == (price, entry_id):
+            return None
+        self.leave(user_id)
+        self._queues[price].append((entry_id, user_id))
+        self._members[user_id] = (price, entry_id)
+        self._sizes[price] += 1
+        if self._sizes[price] >= MATCH_SIZE:
+            return self._pop_group(price)
+        return None
+
+    def leave(self, user_id):
+        member = self._members.pop(user_id, None)
+        if member is not None:
+            self._sizes[member[0]] -= 1
+        return member
+
+    def requeue(self, price, entries):
+        """Devuelve al frente de la cola, en su orden, jugadores de un trío que no se formó."""
+        price = Decimal(price)
+        for entry_id, user_id in reversed(entries):
+            if user_id in self._members:
+                continue
+            self._queues[price].appendleft((entry_id, user_id))
+            self._members[user_id] = (price, entry_id)
+            self._sizes[price] += 1
+
+    def _pop_group(self, price):
+        queue = self._queues[price]
+        group = []
+        while queue and len(group) < MATCH_SIZE:
+            entry_id, user_id = queue.popleft()
+            # Entradas de jugadores que salieron o volvieron a entrar: se descartan aquí
+            if self._members.get(user_id) != (price, entry_id):
+                continue
+            group.append((entry_id, user_id))
+        for entry_id, user_id in group:
+            del self._members[user_id]
+        self._sizes[price] -= len(group)
+        if not queue:
+            del self._queues[price]
+        return group
+
+
+def notify_match(dice_game, entries):
+    from bingo_app.tasks import notify_players_match_found
+
+    notify_players_match_found(dice_game, entries)
+
+
+def create_match(price, group):
+    """
+    Crea la partida para el trío `group` [(entry_id, user_id)]. Devuelve
+    (DiceGame o None, [(entry_id, user_id)] que siguen esperando).
+    """
+    from bingo_app.models import DiceGame, DiceMatchmakingQueue, DiceModuleSettings, DicePlayer, Transaction, User
+    from bingo_app.utils.settings_cache import get_dice_settings
+
+    price = Decimal(price)
+    entry_ids = [entry_id for entry_id, _ in group]
+    with transaction.atomic():
+        entries = list(
+            DiceMatchmakingQueue.objects.select_for_update()
+            .filter(id__in=entry_ids, status='WAITING', entry_price=price)
+            .order_by('id')
+        )
+        user_ids = [entry.user_id for entry in entries]
+        balances = dict(
+            User.objects.select_for_update().filter(id__in=user_ids).order_by('id')
+            .values_list('id', 'credit_balance')
+        )
+        busy = set(
+            DicePlayer.objects.filter(user_id__in=user_ids, game__status__in=ACTIVE_GAME_STATUSES)
+            .values_list('user_id', flat=True)
+        )
+        valid = [entry for entry in entries if entry.user_id not in busy and balances.get(entry.user_id, 0) >= price]
+        rejected = [entry.id for entry in entries if entry not in valid]
+        if rejected:
+            DiceMatchmakingQueue.objects.filter(id__in=rejected).update(status='TIMEOUT')
+        if len(valid) < MATCH_SIZE:
+            order = {entry_id: index for index, entry_id in enumerate(entry_ids)}
+            return None, sorted(((e.id, e.user_id) for e in valid), key=lambda item: order[item[0]])
+
+        valid_user_ids = [entry.user_id for entry in valid]
+        User.objects.filter(id__in=valid_user_ids).update(
+            credit_balance=F('credit_balance') - price,
+            blocked_credits=F('blocked_credits') + price,
+        )
+        for entry in valid:
+            Transaction.objects.create(
+                user_id=entry.user_id,
+                amount=-price,
+                transaction_type='ENTRY_FEE',
+                description=f"Entrada a partida de dados (${price})"
+            )
+
+        dice_settings = get_dice_settings()
+        DiceModuleSettings.objects.filter(pk=dice_settings.pk).update(
+            accumulated_pool=F('accumulated_pool') + price * MATCH_SIZE * POOL_SHARE
+        )
+
+        dice_game = DiceGame.objects.create(entry_price=price, base_prize=price * MATCH_SIZE, status='WAITING')
+        DicePlayer.objects.bulk_create([
+            DicePlayer(user_id=user_id, game=dice_game, lives=3) for user_id in valid_user_ids
+        ])
+        DiceMatchmakingQueue.objects.filter(id__in=[entry.id for entry in valid]).update(
+            status='MATCHED', matched_at=timezone.now()
+        )
+        # Otras entradas WAITING de los mismos jugadores (duplicadas) quedan canceladas
+        DiceMatchmakingQueue.objects.filter(user_id__in=valid_user_ids, status='WAITING').update(status='TIMEOUT')
+
+        # spin_prize fija el premio y deja la partida en SPINNING; el WebSocket pasa a PLAYING
+        dice_game.spin_prize()
+        dice_game.started_at = timezone.now()
+        dice_game.save(update_fields=['started_at'])
+
+        transaction.on_commit(lambda: notify_match(dice_game, valid), robust=True)
+    return dice_game, []
+
+
+class DiceMatchmaker:
+    """Colas en memoria más creación de partidas; un matchmaker por proceso."""
+
+    def __init__(self, queues=None):
+        self.queues = queues or MatchmakingQueues()
+        self.loaded = False
+        self._lock = threading.RLock()
+
+    def load(self):
+        """Reconstruye las colas desde las entradas WAITING y forma los tríos pendientes."""
+        from bingo_app.models import DiceMatchmakingQueue
+
+        rows = list(DiceMatchmakingQueue.objects.filter(status='WAITING').order_by('joined_at', 'id').values_list(
+            'id', 'user_id', 'entry_price'
+        ))
+        games = []
+        with self._lock:
+            self.queues = MatchmakingQueues()
+            self.loaded = True
+            for entry_id, user_id, price in rows:
+                group = self.queues.join(entry_id, user_id, price)
+                if group:
+                    game = self._match(price, group)
+                    if game:
+                        games.append(game)
+        return games
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def join(self, entry_id, user_id, price):
+        with self._lock:
+            self.ensure_loaded()
+            group = self.queues.join(entry_id, user_id, price)
+            return self._match(price, group) if group else None
+
+    def leave(self, user_id):
+        with self._lock:
+            self.queues.leave(user_id)
+
+    def handle_event(self, event):
+        if event.get('type') == 'join':
+            return self.join(event['entry_id'], event['user_id'], Decimal(event['price']))
+        if event.get('type') == 'leave':
+            self.leave(event['user_id'])
+        return None
+
+    def _match(self, price, group):
+        try:
+            game, remaining = create_match(price, group)
+        except Exception:
+            # La transacción se revirtió y las entradas siguen WAITING: el trío vuelve al
+            # frente de su cola y se reintenta con la próxima entrada o resincronización
+            logger.exception('Error creando partida de dados de $%s', price)
+            self.queues.requeue(price, group)
+            return None
+        if remaining:
+            self.queues.requeue(price, remaining)
+        return game
+
+
+class RedisMatchmakingEvents:
+    """Eventos de matchmaking en una lista de Redis (RPUSH de las vistas, BLPOP del worker)."""
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, event):
+        self.client.rpush(EVENTS_KEY, json.dumps(event))
+
+    def next_event(self, timeout=1):
+        item = self.client.blpop(EVENTS_KEY, timeout=timeout)
+        return json.loads(item[1]) if item else None
+
+
+def matchmaking_backend():
+    return getattr(settings, 'BINGO_DICE_MATCHMAKING_BACKEND', getattr(settings, 'BINGO_LIVE_STATE_BACKEND', 'memory'))
+
+
+_matchmaker = None
+_events = None
+_singleton_lock = threading.Lock()
+
+
+def get_dice_matchmaker():
+    global _matchmaker
+    if _matchmaker is None:
+        with _singleton_lock:
+            if _matchmaker is None:
+                _matchmaker = DiceMatchmaker()
+    return _matchmaker
+
+
+def get_matchmaking_events():
+    """Canal de eventos en Redis, o None si los eventos se procesan en el proceso."""
+    global _events
+    redis_url = getattr(settings, 'REDIS_URL', None)
+    if matchmaking_backend() != 'redis' or not redis_url:
+        return None
+    if _events is None:
+        with _singleton_lock:
+            if _events is None:
+                _events = RedisMatchmakingEvents(redis_url)
+    return _events
+
+
+def publish_join(queue_entry):
+    """
+    Anuncia la entrada a la cola. Con backend en memoria el trío se forma aquí mismo y
+    devuelve la partida creada (o None); con Redis lo hace el worker y devuelve None.
+    """
+    event = {
+        'type': 'join',
+        'entry_id': queue_entry.id,
+        'user_id': queue_entry.user_id,
+        'price': str(queue_entry.entry_price),
+    }
+    events = get_matchmaking_events()
+    if events is not None:
+        events.publish(event)
+        return None
+    return get_dice_matchmaker().handle_event(event)
+
+
+def publish_leave(user_id):
+    event = {'type': 'leave', 'user_id': user_id}
+    events = get_matchmaking_events()
+    if events is not None:
+        events.publish(event)
+    else:
+        get_dice_matchmaker().handle_event(event)
+
+
+def run_matchmaker(matchmaker=None, events=None, resync_interval=None, stop_event=None):
+    """Bucle del worker: consume eventos de Redis y resincroniza periódicamente desde la base."""
+    from django.db import close_old_connections
+
+    matchmaker = matchmaker or get_dice_matchmaker()
+    events = events or get_matchmaking_events()
+    if events is None:
+        raise RuntimeError('El worker de matchmaking necesita BINGO_DICE_MATCHMAKING_BACKEND=redis y REDIS_URL')
+    resync_interval = resync_interval or getattr(settings, 'BINGO_DICE_MATCHMAKING_RESYNC_INTERVAL', 30)
+
+    last_sync = 0
+    while stop_event is None or not stop_event.is_set():
+        if time.monotonic() - last_sync >= resync_interval:
+            close_old_connections()
+            matchmaker.load()
+            last_sync = time.monotonic()
+        event = events.next_event(timeout=1)
+        if event:
+            close_old_connections()
+            matchmaker.handle_event(event)
@@ -44,8 +44,8 @@ def is_dice_module_enabled():
     Solo verifica la configuración, no los permisos de franquicia.
     """
     try:
-        from bingo_app.models import DiceModuleSettings
-        settings = DiceModuleSettings.get_settings()
+        from bingo_app.utils.settings_cache import get_dice_settings
+        settings = get_dice_settings()
         return settings.is_module_enabled
     except Exception:
         # Si hay error, retornar False (módulo desactivado)
@@ -0,0 +1,218 @@
+"""
+Motor de rondas de las partidas de dados.
+
+roll_dice() resuelve un lanzamiento en una sola transacción y con un número
+constante de consultas:
+1. SELECT ... FOR UPDATE de la partida: todos los lanzamientos de la misma partida
+   quedan en serie, así que no hacen falta las verificaciones repetidas de antes.
+2. Una consulta trae a los jugadores (con su usuario) y otra la última ronda.
+3. El lanzamiento, el cierre de la ronda (empate, vida perdida o eliminación) y el
+   final de la partida se calculan en memoria.
+4. Se guardan solo las filas que cambiaron: la ronda, el perdedor y, al terminar,
+   la partida, el premio, el pozo y los créditos bloqueados.
+
+Una ronda está cerrada cuando tiene perdedor (eliminated_player, aunque solo haya
+perdido una vida) o cuando todos los jugadores activos lanzaron (empate). El
+siguiente lanzamiento abre la ronda siguiente.
+
+El resultado trae los datos para difundir 'dice_rolled' y, si la ronda cerró,
+'round_result' o 'game_finished', sin volver a consultar la base.
+"""
+
+import random
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+SPIN_SECONDS = 7  # Duración de la animación del premio antes de pasar a PLAYING
+
+
+class DiceRollError(Exception):
+    """Lanzamiento rechazado; el mensaje se envía al jugador."""
+
+
+def round_results(round_obj):
+    """Resultados de jugadores de la ronda, sin las marcas internas ('_tie', ...)."""
+    return {key: value for key, value in (round_obj.player_results or {}).items() if not key.startswith('_')}
+
+
+def round_is_closed(round_obj, active_count):
+    return round_obj.eliminated_player_id is not None or (
+        active_count > 0 and len(round_results(round_obj)) >= active_count
+    )
+
+
+def lives_results(players, player_results):
+    """[dado1, dado2, vidas] de todos los jugadores; el índice 2 lleva las vidas, no el total."""
+    results = {}
+    for player in players:
+        result = player_results.get(str(player.user_id)) or []
+        die1 = result[0] if len(result) > 0 else 0
+        die2 = result[1] if len(result) > 1 else 0
+        results[str(player.user_id)] = [die1, die2, int(player.lives)]
+    return results
+
+
+def _current_round(game, last_round, active_count):
+    from bingo_app.models import DiceRound
+
+    if last_round is not None and not round_is_closed(last_round, active_count):
+        return last_round
+    round_number = last_round.round_number + 1 if last_round else 1
+    return DiceRound(game=game, round_number=round_number, player_results={})
+
+
+def _close_round(round_obj, active_players):
+    """Marca empate o quita una vida al total más bajo. Devuelve el jugador perdedor o None."""
+    results = round_results(round_obj)
+    lowest = min(results[str(player.user_id)][2] for player in active_players)
+    lowest_players = [player for player in active_players if results[str(player.user_id)][2] == lowest]
+
+    if len(lowest_players) > 1:
+        # Empate: nadie pierde vida y todos vuelven a lanzar
+        round_obj.eliminated_player = None
+        round_obj.player_results['_tie'] = True
+        round_obj.player_results['_tie_total'] = lowest
+        round_obj.player_results['_tie_players'] = [str(player.user_id) for player in lowest_players]
+        return None
+
+    loser = lowest_players[0]
+    loser.lives -= 1
+    if loser.lives <= 0:
+        loser.is_eliminated = True
+    round_obj.eliminated_player_id = loser.user_id
+    for key in ('_tie', '_tie_total', '_tie_players'):
+        round_obj.player_results.pop(key, None)
+    return loser
+
+
+def _finish_game(game, winner, players):
+    """Paga el premio desde el pozo, libera los créditos bloqueados y cierra la partida."""
+    from bingo_app.models import DiceModuleSettings, Transaction, User
+    from bingo_app.utils.settings_cache import get_dice_settings
+
+    settings_pk = get_dice_settings().pk
+    pool = DiceModuleSettings.objects.select_for_update().values_list('accumulated_pool', flat=True).get(pk=settings_pk)
+    # Si el pozo no alcanza, el premio se ajusta a lo que haya
+    prize = min(game.final_prize, pool)
+    DiceModuleSettings.objects.filter(pk=settings_pk).update(accumulated_pool=F('accumulated_pool') - prize)
+
+    game.final_prize = prize
+    game.winner_id = winner.user_id
+    game.status = 'FINISHED'
+    game.finished_at = timezone.now()
+    game.save(update_fields=['final_prize', 'winner', 'status', 'finished_at'])
+
+    User.objects.filter(id=winner.user_id).update(credit_balance=F('credit_balance') + prize)
+    Transaction.objects.create(
+        user_id=winner.user_id,
+        amount=prize,
+        transaction_type='DICE_WIN',
+        description=f"Ganador de partida de dados {game.room_code}"
+    )
+    User.objects.filter(
+        id__in=[player.user_id for player in players], blocked_credits__gte=game.entry_price
+    ).update(blocked_credits=F('blocked_credits') - game.entry_price)
+    return prize
+
+
+def roll_dice(room_code, user_id):
+    """
+    Lanza los dados de `user_id` en la partida. Devuelve un diccionario con 'roll'
+    (para 'dice_rolled'), 'round_result' (None si la ronda sigue abierta) y
+    'status_changed' (la partida pasó de SPINNING a PLAYING). Lanza DiceRollError.
+    """
+    from bingo_app.models import DiceGame, DicePlayer
+
+    with transaction.atomic():
+        game = DiceGame.objects.select_for_update().filter(room_code=room_code).first()
+        if game is None:
+            raise DiceRollError('Partida no encontrada')
+
+        # Verificación pasiva: pasada la animación del premio, la primera acción inicia el juego
+        status_changed = False
+        if game.status == 'SPINNING' and game.started_at:
+            if (timezone.now() - game.started_at).total_seconds() > SPIN_SECONDS:
+                game.status = 'PLAYING'
+                game.save(update_fields=['status'])
+                status_changed = True
+
+        if game.status == 'FINISHED':
+            raise DiceRollError('El juego ya terminó.')
+        if game.status == 'SPINNING':
+            raise DiceRollError('El juego aún no ha comenzado. Espera a que termine la animación del premio.')
+        if game.status != 'PLAYING':
+            raise DiceRollError(f'El juego no está disponible para lanzar dados. Estado actual: {game.status}')
+
+        players = list(DicePlayer.objects.filter(game=game).select_related('user').order_by('id'))
+        player = next((p for p in players if p.user_id == user_id), None)
+        if player is None:
+            raise DiceRollError('No eres parte de esta partida.')
+        if player.is_eliminated:
+            raise DiceRollError('Ya estás eliminado de esta partida.')
+        active_players = [p for p in players if not p.is_eliminated]
+        if len(active_players) <= 1:
+            raise DiceRollError('El juego ya terminó. Solo queda 1 jugador.')
+
+        round_obj = _current_round(game, game.rounds.order_by('-round_number').first(), len(active_players))
+        if str(user_id) in round_obj.player_results:
+            raise DiceRollError('Ya lanzaste los dados en esta ronda. Espera a que todos terminen.')
+
+        # Los dados se lanzan en el servidor para evitar trampas
+        die1 = random.randint(1, 6)
+        die2 = random.randint(1, 6)
+        round_obj.player_results[str(user_id)] = [die1, die2, die1 + die2]
+
+        round_result = None
+        if len(round_results(round_obj)) >= len(active_players):
+            loser = _close_round(round_obj, active_players)
+            round_obj.save()
+            if loser is not None:
+                DicePlayer.objects.filter(id=loser.id).update(lives=loser.lives, is_eliminated=loser.is_eliminated)
+
+            remaining = [p for p in active_players if not p.is_eliminated]
+            eliminated = loser.user.username if loser is not None and loser.is_eliminated else None
+            if len(remaining) == 1:
+                winner = remaining[0]
+                _finish_game(game, winner, players)
+                round_result = {
+                    'round_number': round_obj.round_number,
+                    'results': lives_results(players, round_obj.player_results),
+                    'eliminated': eliminated,
+                    'winner': winner.user.username,
+                    'game_finished': True,
+                    'final_prize': str(game.final_prize),
+                    'multiplier': game.multiplier,
+                }
+            else:
+                is_tie = bool(round_obj.player_results.get('_tie'))
+                round_result = {
+                    'round_number': round_obj.round_number,
+                    'results': lives_results(players, round_obj.player_results),
+                    'eliminated': eliminated,
+                    'winner': None,
+                    'game_finished': False,
+                    'is_tie': is_tie,
+                    'tie_total': round_obj.player_results.get('_tie_total') if is_tie else None,
+                }
+        else:
+            round_obj.save()
+
+        if status_changed:
+            from bingo_app.tasks import notify_game_status_change
+
+            transaction.on_commit(lambda: notify_game_status_change(game), robust=True)
+
+    return {
+        'roll': {
+            'user_id': user_id,
+            'username': player.user.username,
+            'die1': die1,
+            'die2': die2,
+            'total': die1 + die2,
+        },
+        'round_number': round_obj.round_number,
+        'round_result': round_result,
+        'status_changed': status_changed,
+    }
@@ -0,0 +1,154 @@
+"""
+Directorio en memoria de franquicias para FranchiseMiddleware y franchise_processor.
+
+Cada proceso guarda, según se van pidiendo:
+- dominio -> id de franquicia activa, o None si el host no es de ninguna
+  (caché negativa: el dominio principal y los hosts desconocidos no consultan);
+- id -> Franchise;
+- id del dueño -> id de su franquicia, o None si no es dueño de ninguna.
+
+Al guardar o borrar una Franchise, una señal (signals.py) incrementa la versión
+compartida 'bingo_app.franchise' tras el commit, con el mismo almacén de versiones
+que utils.settings_cache; cada proceso la revisa como mucho cada
+BINGO_SETTINGS_CHECK_SECONDS y, si cambió, vacía el directorio.
+
+Se devuelve una copia de la franquicia: la petición puede usarla o modificarla sin
+tocar la caché.
+"""
+
+import copy
+import threading
+import time
+
+from django.conf import settings
+
+from bingo_app.utils.settings_cache import CHECK_SECONDS, get_settings_registry
+
+VERSION_LABEL = 'bingo_app.franchise'
+MAX_ENTRIES = 5000  # Tope de claves por mapa (hosts, dueños); al superarlo se vacía ese mapa
+_MISSING = object()
+
+
+def normalize_domain(domain):
+    """Dominio en minúsculas, sin esquema, sin 'www.', sin puerto ni barra final."""
+    domain = (domain or '').strip().lower()
+    if domain.startswith('http://'):
+        domain = domain[7:]
+    if domain.startswith('https://'):
+        domain = domain[8:]
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    return domain.rstrip('/').split(':')[0]
+
+
+class FranchiseDirectory:
+    def __init__(self, versions, check_seconds=CHECK_SECONDS):
+        self.versions = versions
+        self.check_seconds = check_seconds
+        self._by_id = {}
+        self._by_domain = {}
+        self._by_owner = {}
+        self._ids = {}  # id -> id, o None si no existe
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _clear(self):
+        self._by_id.clear()
+        self._by_domain.clear()
+        self._by_owner.clear()
+        self._ids.clear()
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+            return True
+        try:
+            version = self.versions.get_many([VERSION_LABEL])[VERSION_LABEL]
+        except Exception:
+            # Sin versiones no se confía en la caché: se consulta la base
+            self._clear()
+            self._checked_at = None
+            return False
+        if version != self._version:
+            self._clear()
+            self._version = version
+        self._checked_at = now
+        return True
+
+    def _remember(self, franchise):
+        self._by_id[franchise.id] = franchise
+        self._ids[franchise.id] = franchise.id
+        if franchise.owner_id:
+            self._by_owner[franchise.owner_id] = franchise.id
+
+    def _lookup(self, cache, key, query):
+        """Resuelve key -> id en `cache` (guardando también los None) y devuelve la Franchise."""
+        from bingo_app.models import Franchise
+
+        with self._lock:
+            cacheable = self._sync()
+            franchise_id = cache.get(key, _MISSING) if cacheable else _MISSING
+            if franchise_id is _MISSING:
+                franchise = Franchise.objects.filter(**query).first()
+                if cacheable:
+                    if len(cache) >= MAX_ENTRIES:
+                        cache.clear()
+                    cache[key] = franchise.id if franchise else None
+                    if franchise:
+                        self._remember(franchise)
+            elif franchise_id is None:
+                franchise = None
+            else:
+                franchise = self._by_id.get(franchise_id)
+                if franchise is None:
+                    franchise = Franchise.objects.filter(id=franchise_id).first()
+                    if franchise:
+                        self._remember(franchise)
+        return copy.copy(franchise) if franchise else None
+
+    def by_domain(self, host):
+        """Franquicia activa con ese dominio personalizado, o None."""
+        domain = normalize_domain(host)
+        if not domain:
+            return None
+        return self._lookup(self._by_domain, domain, {'custom_domain': domain, 'is_active': True})
+
+    def get(self, franchise_id, active_only=False):
+        if not franchise_id:
+            return None
+        franchise = self._lookup(self._ids, franchise_id, {'id': franchise_id})
+        if franchise and active_only and not franchise.is_active:
+            return None
+        return franchise
+
+    def owned_by(self, user_id):
+        """Franquicia de la que el usuario es dueño, o None."""
+        if not user_id:
+            return None
+        return self._lookup(self._by_owner, user_id, {'owner_id': user_id})
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+            self._checked_at = None
+        try:
+            self.versions.bump(VERSION_LABEL)
+        except Exception:
+            pass
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def get_franchise_directory():
+    global _directory
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                _directory = FranchiseDirectory(
+                    get_settings_registry().versions,
+                    getattr(settings, 'BINGO_SETTINGS_CHECK_SECONDS', CHECK_SECONDS),
+                )
+    return _directory
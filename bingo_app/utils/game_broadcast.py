@@ -0,0 +1,166 @@
+"""
+Difusión agrupada del progreso de las partidas (cartones vendidos y premio).
+
+Durante una avalancha de compras cada compra ya no envía su propio mensaje al grupo
+game_<id>: las compras confirmadas (transaction.on_commit) y los cambios de premio
+progresivo se acumulan por juego y, pasada una ventana corta
+(BINGO_PURCHASE_BROADCAST_WINDOW, 0.25 s por defecto), se envía un único
+'game_progress' con los totales leídos de la base en ese momento.
+
+El contenido de los cartones solo viaja al comprador: en la respuesta HTTP y en su
+grupo game_<id>_user_<user_id> ('cards_purchased').
+
+Al terminar una partida, PayoutNotifications junta los avisos del pago (game_ended
+y uno por usuario con premio y saldo) y los envía juntos tras el commit, directo al
+channel layer (broadcast_on_commit). No pasan por la cola de trabajos: un reintento
+volvería a mandar los mensajes que ya salieron.
+"""
+
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+
+def buyer_group_name(game_id, user_id):
+    return f'game_{game_id}_user_{user_id}'
+
+
+class GameProgressAggregator:
+    """Agrupa las compras y cambios de premio de cada juego dentro de una ventana."""
+
+    def __init__(self, window=None):
+        self.window = window if window is not None else getattr(
+            settings, 'BINGO_PURCHASE_BROADCAST_WINDOW', 0.25)
+        self._pending = {}  # {game_id: {'purchases': n, 'quantity': n, 'prize_before': x}}
+        self._lock = threading.Lock()
+
+    def add(self, game_id, quantity=0, prize_before=None):
+        with self._lock:
+            pending = self._pending.get(game_id)
+            if pending is None:
+                self._pending[game_id] = {
+                    'purchases': 1 if quantity else 0,
+                    'quantity': quantity,
+                    'prize_before': prize_before,
+                }
+                timer = threading.Timer(self.window, self.flush, args=[game_id])
+                timer.daemon = True
+                timer.start()
+                return
+            if quantity:
+                pending['purchases'] += 1
+                pending['quantity'] += quantity
+            if pending['prize_before'] is None:
+                pending['prize_before'] = prize_before
+
+    def flush(self, game_id):
+        with self._lock:
+            pending = self._pending.pop(game_id, None)
+        if pending is None:
+            return
+        from django.db import connection
+
+        from bingo_app.models import Game
+
+        try:
+            game = Game.objects.filter(id=game_id).first()
+            if game is not None:
+                send_game_progress(game, pending)
+        except Exception as e:
+            print(f"❌ Error enviando progreso del juego {game_id}: {str(e)}")
+        finally:
+            # El temporizador corre en su propio hilo: liberar su conexión
+            connection.close()
+
+
+def send_game_progress(game, pending):
+    prize_before = pending['prize_before']
+    prize_increase = game.prize - prize_before if prize_before is not None else 0
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+        f'game_{game.id}',
+        {
+            'type': 'game_progress',
+            'purchases': pending['purchases'],
+            'quantity': pending['quantity'],
+            'prize_increased': prize_increase > 0,
+            'new_prize': float(game.prize),
+            'increase_amount': float(prize_increase) if prize_increase > 0 else 0,
+            'total_cards_sold': game.total_cards_sold,
+            'max_cards_sold': game.max_cards_sold,
+            'held_balance': float(game.held_balance),
+            'next_prize_target': game.next_prize_target,
+            'progress_percentage': game.progress_percentage
+        }
+    )
+
+
+def send_cards_to_buyer(game_id, user_id, purchase_id, new_cards, player_cards_count, new_balance):
+    """Envía el contenido de los cartones solo a los sockets del comprador."""
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+        buyer_group_name(game_id, user_id),
+        {
+            'type': 'cards_purchased',
+            'purchase_id': purchase_id,
+            'new_cards': new_cards,
+            'player_cards_count': player_cards_count,
+            'new_balance': float(new_balance),
+        }
+    )
+
+
+async def _send_batch(messages):
+    """Envía [(grupo, evento), ...] en el orden recibido, en un solo ciclo del event loop."""
+    channel_layer = get_channel_layer()
+    for group, event in messages:
+        await channel_layer.group_send(group, event)
+
+
+def broadcast_on_commit(messages):
+    """Envía los mensajes juntos al confirmarse la transacción (nada si se revierte)."""
+    messages = list(messages)
+    if messages:
+        transaction.on_commit(lambda: async_to_sync(_send_batch)(messages), robust=True)
+
+
+class PayoutNotifications:
+    """
+    Avisos de un pago de premios. Cada usuario recibe un único mensaje en user_<id>:
+    'win_notification' con su saldo (NotificationConsumer lo reenvía también como
+    'credit_update'), o solo 'credit_update' si no ganó. Los saldos salen de las filas
+    ya bloqueadas del pago, sin volver a consultar.
+    """
+
+    def __init__(self):
+        self._group_events = []
+        self._user_events = {}  # user_id -> evento, en orden de llegada
+
+    def group(self, group, event):
+        self._group_events.append((group, event))
+
+    def win(self, user_id, message, details=None, new_balance=None):
+        event = self._user_events.setdefault(user_id, {})
+        event.update({'type': 'win_notification', 'message': message, 'details': details or {}})
+        if new_balance is not None:
+            self.balance(user_id, new_balance)
+
+    def balance(self, user_id, new_balance):
+        """Saldo del usuario; si llega más de uno vale el último."""
+        event = self._user_events.setdefault(user_id, {'type': 'credit_update'})
+        event['new_balance'] = float(new_balance)
+        if 'details' in event:
+            event['details']['new_balance'] = float(new_balance)
+
+    def messages(self):
+        return self._group_events + [(f'user_{user_id}', event) for user_id, event in self._user_events.items()]
+
+    def dispatch(self):
+        """Envía todos los avisos juntos al confirmarse la transacción."""
+        broadcast_on_commit(self.messages())
+
+
+progress_aggregator = GameProgressAggregator()
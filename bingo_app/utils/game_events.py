@@ -0,0 +1,65 @@
+"""
+Protocolo versionado de eventos de partida (números llamados).
+
+Cada number_called lleva solo el número nuevo y un número de secuencia monótono:
+la secuencia es la posición del número en el orden de llamada (1 = primer número),
+de modo que se deriva de called_numbers sin almacenamiento adicional.
+
+Al conectar, el cliente recibe una instantánea compacta (bitset en base64 de los
+números llamados + los últimos números en orden) y, si detecta un hueco en la
+secuencia, pide la reproducción desde su última secuencia con {'type': 'sync'}.
+El bitset no conserva el orden de llamada: si la instantánea trae más números que
+recent_numbers, el cliente pide además la reproducción desde 0 (la lista completa
+en orden) para el historial de números llamados.
+"""
+
+import base64
+
+PROTOCOL_VERSION = 2
+BITSET_BYTES = 12  # Cubre los números 0..95
+RECENT_NUMBERS = 5
+
+
+def encode_called_bitset(numbers):
+    """Bitset little-endian (bit n = número n) codificado en base64."""
+    bits = 0
+    for number in numbers:
+        bits |= 1 << int(number)
+    return base64.b64encode(bits.to_bytes(BITSET_BYTES, 'little')).decode('ascii')
+
+
+def decode_called_bitset(encoded):
+    bits = int.from_bytes(base64.b64decode(encoded), 'little')
+    return [n for n in range(BITSET_BYTES * 8) if bits >> n & 1]
+
+
+def number_called_event(number, seq, **extra):
+    """Mensaje de grupo para number_called (sin la lista completa de números)."""
+    event = {
+        'type': 'number_called',
+        'number': number,
+        'seq': seq,
+    }
+    event.update(extra)
+    return event
+
+
+def called_numbers_snapshot(called_numbers):
+    called_numbers = called_numbers or []
+    return {
+        'protocol': PROTOCOL_VERSION,
+        'seq': len(called_numbers),
+        'called_bitset': encode_called_bitset(called_numbers),
+        'recent_numbers': called_numbers[-RECENT_NUMBERS:],
+    }
+
+
+def replay_since(called_numbers, last_seq):
+    """
+    Números llamados después de last_seq, en orden. Devuelve None si last_seq no
+    es válido (el cliente debe usar una instantánea completa).
+    """
+    called_numbers = called_numbers or []
+    if last_seq is None or last_seq < 0 or last_seq > len(called_numbers):
+        return None
+    return called_numbers[last_seq:]
@@ -0,0 +1,302 @@
+"""
+Cola de trabajos en segundo plano sobre la base de datos (BackgroundJob).
+
+Los efectos secundarios lentos (emails, llamadas a Gemini) se encolan con enqueue()
+y la vista o el consumer responde sin esperarlos. Los avisos por el channel layer
+no pasan por aquí: un reintento repetiría los mensajes ya enviados, así que salen
+directo tras el commit (utils.game_broadcast.broadcast_on_commit).
+La fila se crea dentro de la transacción en curso, así que un trabajo solo existe
+si la operación que lo originó se confirmó.
+
+- Los trabajos se registran con el decorador @job (bingo_app/jobs.py), que fija
+  la cola y los intentos máximos.
+- idempotency_key: un segundo enqueue con la misma clave devuelve el trabajo ya
+  existente en lugar de crear otro.
+- Reintentos: si el trabajo falla vuelve a PENDING con espera exponencial
+  (BINGO_JOB_RETRY_BASE_SECONDS * 2^(intento-1), con jitter y tope RETRY_MAX_SECONDS)
+  hasta agotar max_attempts; entonces queda FAILED con el error en last_error.
+- Concurrencia por cola (BINGO_JOB_QUEUES): cada trabajo RUNNING ocupa una casilla
+  (queue, slot) con restricción única, así que varios workers nunca superan el
+  límite de la cola. Un trabajo RUNNING sin terminar tras BINGO_JOB_LEASE_SECONDS
+  (worker caído) se libera y cuenta como intento fallido.
+- Trabajos periódicos (@job(..., every=segundos)): run_worker encola uno por
+  ventana de `every` segundos con la clave '<nombre>:<ventana>', así que con
+  varios workers sale uno solo por ventana. Las ejecuciones DONE anteriores se
+  borran al encolar la siguiente; las FAILED quedan para revisarlas.
+
+Modos (BINGO_JOBS_MODE):
+- 'worker': los ejecuta python manage.py run_job_worker (producción).
+- 'inline': el mismo proceso web lo ejecuta al confirmarse la transacción
+  (desarrollo); los reintentos quedan para run_job_worker si se ejecuta.
+"""
+
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = 'default'
+QUEUE_LIMITS = {DEFAULT_QUEUE: 2}  # Valor por defecto de BINGO_JOB_QUEUES
+RETRY_MAX_SECONDS = 600
+LEASE_SECONDS = 300  # Valor por defecto de BINGO_JOB_LEASE_SECONDS
+
+PENDING = 'PENDING'
+RUNNING = 'RUNNING'
+DONE = 'DONE'
+FAILED = 'FAILED'
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    name: str
+    func: object
+    queue: str = DEFAULT_QUEUE
+    max_attempts: int = 5
+    every: float = None
+
+
+_registry = {}
+
+
+def job(name, queue=DEFAULT_QUEUE, max_attempts=5, every=None):
+    """
+    Registra la función como trabajo `name`; se llama con el payload como kwargs.
+    Con every (segundos) el worker lo encola solo, una vez por ventana.
+    """
+    def decorator(func):
+        _registry[name] = JobSpec(name, func, queue, max_attempts, every)
+        return func
+    return decorator
+
+
+def get_job_spec(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f'Trabajo no registrado: {name}') from None
+
+
+def jobs_mode():
+    return getattr(settings, 'BINGO_JOBS_MODE', 'inline')
+
+
+def queue_limits():
+    return {**QUEUE_LIMITS, **getattr(settings, 'BINGO_JOB_QUEUES', {})}
+
+
+def lease_seconds():
+    return getattr(settings, 'BINGO_JOB_LEASE_SECONDS', LEASE_SECONDS)
+
+
+def retry_delay(attempts):
+    """Segundos de espera antes del siguiente intento (exponencial con jitter)."""
+    base = getattr(settings, 'BINGO_JOB_RETRY_BASE_SECONDS', 5)
+    delay = min(base * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def enqueue(name, payload=None, *, idempotency_key=None, queue=None, delay=None, max_attempts=None):
+    """
+    Crea el trabajo (o devuelve el que ya tiene esa idempotency_key). El payload
+    debe ser serializable a JSON.
+    """
+    from bingo_app.models import BackgroundJob
+
+    spec = get_job_spec(name)
+    fields = {
+        'queue': queue or spec.queue,
+        'name': name,
+        'payload': payload or {},
+        'max_attempts': max_attempts or spec.max_attempts,
+        'run_after': timezone.now() + timedelta(seconds=delay or 0),
+    }
+    if idempotency_key:
+        try:
+            with transaction.atomic():
+                background_job = BackgroundJob.objects.create(idempotency_key=idempotency_key, **fields)
+        except IntegrityError:
+            return BackgroundJob.objects.get(idempotency_key=idempotency_key)
+    else:
+        background_job = BackgroundJob.objects.create(**fields)
+
+    if jobs_mode() == 'inline' and not delay:
+        job_id = background_job.id
+        transaction.on_commit(lambda: run_job_now(job_id), robust=True)
+    return background_job
+
+
+def job_result(idempotency_key):
+    """Resultado del trabajo con esa clave si ya terminó bien, o None."""
+    from bingo_app.models import BackgroundJob
+
+    return BackgroundJob.objects.filter(idempotency_key=idempotency_key, status=DONE).values_list(
+        'result', flat=True
+    ).first()
+
+
+def _claim(job_id, slot, worker_id):
+    from bingo_app.models import BackgroundJob
+
+    try:
+        with transaction.atomic():
+            return BackgroundJob.objects.filter(id=job_id, status=PENDING).update(
+                status=RUNNING, slot=slot, locked_by=worker_id, locked_at=timezone.now(),
+                attempts=F('attempts') + 1
+            ) == 1
+    except IntegrityError:
+        # Otro worker ocupó esa casilla de la cola
+        return None
+
+
+def claim_next(worker_id, queues=None):
+    """Toma el siguiente trabajo listo de alguna cola con casillas libres, o None."""
+    from bingo_app.models import BackgroundJob
+
+    limits = queue_limits()
+    now = timezone.now()
+    for queue in queues or list(limits):
+        limit = limits.get(queue, 1)
+        busy = set(BackgroundJob.objects.filter(queue=queue, status=RUNNING).values_list('slot', flat=True))
+        free_slots = [slot for slot in range(limit) if slot not in busy]
+        if not free_slots:
+            continue
+        candidates = BackgroundJob.objects.filter(
+            queue=queue, status=PENDING, run_after__lte=now
+        ).order_by('run_after', 'id').values_list('id', flat=True)[:len(free_slots) + 5]
+        for job_id in candidates:
+            while free_slots:
+                claimed = _claim(job_id, free_slots[0], worker_id)
+                if claimed is None:
+                    free_slots.pop(0)
+                    continue
+                if claimed:
+                    return BackgroundJob.objects.get(id=job_id)
+                break  # Lo tomó otro worker: siguiente candidato
+            if not free_slots:
+                break
+    return None
+
+
+def _finish(background_job, **fields):
+    from bingo_app.models import BackgroundJob
+
+    BackgroundJob.objects.filter(
+        id=background_job.id, status=RUNNING, locked_by=background_job.locked_by
+    ).update(slot=None, **fields)
+
+
+def execute(background_job):
+    """Ejecuta un trabajo ya reclamado y registra el resultado o programa el reintento."""
+    try:
+        spec = get_job_spec(background_job.name)
+        result = spec.func(**background_job.payload)
+    except Exception as e:
+        error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        logger.warning(f"Trabajo {background_job.name} #{background_job.id} falló "
+                       f"(intento {background_job.attempts}/{background_job.max_attempts}): {error}")
+        if background_job.attempts >= background_job.max_attempts:
+            _finish(background_job, status=FAILED, last_error=traceback.format_exc()[-4000:],
+                    finished_at=timezone.now())
+        else:
+            _finish(background_job, status=PENDING, last_error=traceback.format_exc()[-4000:],
+                    run_after=timezone.now() + timedelta(seconds=retry_delay(background_job.attempts)))
+        return False
+    _finish(background_job, status=DONE, result=result, last_error='', finished_at=timezone.now())
+    return True
+
+
+def run_job_now(job_id):
+    """Modo inline: reclama y ejecuta el trabajo en este proceso si hay casilla libre."""
+    from bingo_app.models import BackgroundJob
+
+    background_job = BackgroundJob.objects.filter(id=job_id, status=PENDING).first()
+    if background_job is None:
+        return False
+    worker_id = f'inline:{os.getpid()}'
+    limit = queue_limits().get(background_job.queue, 1)
+    for slot in range(limit):
+        claimed = _claim(job_id, slot, worker_id)
+        if claimed:
+            return execute(BackgroundJob.objects.get(id=job_id))
+        if claimed is False:
+            return False
+    return False  # Cola llena: lo ejecutará run_job_worker
+
+
+def release_stale_jobs():
+    """Devuelve a PENDING (o marca FAILED) los trabajos RUNNING cuyo lease venció."""
+    from bingo_app.models import BackgroundJob
+
+    expired = timezone.now() - timedelta(seconds=lease_seconds())
+    stale = BackgroundJob.objects.filter(status=RUNNING, locked_at__lt=expired)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=FAILED, slot=None, last_error='Lease vencido', finished_at=timezone.now()
+    )
+    retried = stale.update(status=PENDING, slot=None, last_error='Lease vencido', run_after=timezone.now())
+    return failed + retried
+
+
+def enqueue_periodic(queues=None, enqueued=None, now=None):
+    """
+    Encola los trabajos periódicos de la ventana actual (de las colas indicadas).
+    `enqueued` ({nombre: ventana}) evita volver a consultar la base dentro de la
+    misma ventana; la idempotency_key evita duplicados entre workers.
+    """
+    from bingo_app.models import BackgroundJob
+
+    enqueued = {} if enqueued is None else enqueued
+    now = time.time() if now is None else now
+    for spec in _registry.values():
+        if not spec.every or (queues and spec.queue not in queues):
+            continue
+        window = int(now // spec.every)
+        if enqueued.get(spec.name) != window:
+            current = enqueue(spec.name, idempotency_key=f'{spec.name}:{window}')
+            BackgroundJob.objects.filter(name=spec.name, status=DONE).exclude(id=current.id).delete()
+            enqueued[spec.name] = window
+    return enqueued
+
+
+def new_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def run_worker(queues=None, poll_interval=1.0, stop_event=None, worker_id=None, once=False):
+    """
+    Bucle del worker: libera leases vencidos, encola los trabajos periódicos y
+    ejecuta trabajos mientras haya listos. Con once=True termina cuando no queda
+    ninguno listo. Devuelve cuántos ejecutó.
+    """
+    from django.db import close_old_connections
+
+    worker_id = worker_id or new_worker_id()
+    processed = 0
+    last_release = 0
+    periodic = {}
+    while stop_event is None or not stop_event.is_set():
+        close_old_connections()
+        if time.monotonic() - last_release >= lease_seconds() / 4:
+            release_stale_jobs()
+            last_release = time.monotonic()
+        enqueue_periodic(queues, periodic)
+        background_job = claim_next(worker_id, queues)
+        if background_job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        execute(background_job)
+        processed += 1
+    return processed
@@ -0,0 +1,80 @@
+"""
+Paginación por cursor (keyset) para listados grandes del panel de administración.
+
+En lugar de OFFSET, cada página filtra por la clave (fecha, id) de la última fila de
+la página anterior: (fecha < f) OR (fecha = f AND id < i). Con un índice que empiece
+por la fecha (o por el filtro y la fecha) cada página cuesta lo mismo sin importar
+cuán atrás esté. El cursor viaja en la URL como texto opaco (?cursor=...).
+"""
+
+import base64
+import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    raw = f'{value.isoformat()}|{pk}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        value, pk = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f'Cursor inválido: {cursor}') from e
+
+
+def page_size_from(request, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(request.GET.get('per_page', default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, per_page, is_first):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+        self.is_first = is_first
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(queryset, cursor=None, per_page=DEFAULT_PAGE_SIZE, field='created_at'):
+    """
+    Página de `queryset` ordenada por (field, id) descendente, empezando después del
+    cursor. Lanza InvalidCursor si el cursor no se puede leer.
+    """
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+
+    # Una fila extra indica si hay página siguiente sin hacer COUNT
+    items = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(items, next_cursor, per_page, is_first=not cursor)
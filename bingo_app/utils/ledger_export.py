@@ -0,0 +1,118 @@
+"""
+Exportación contable del libro: transacciones, retiros, recargas y abonos de
+cuentas por cobrar.
+
+Cada conjunto se recorre con values_list().iterator(chunk_size=EXPORT_CHUNK_SIZE):
+en PostgreSQL usa un cursor del lado del servidor y en ningún motor se guardan las
+filas en memoria, así que el consumo no depende de la cantidad de filas. Las filas
+salen ordenadas por id y se pueden filtrar por franquicia y por fecha de creación.
+
+Lo usan la vista ledger_export (CSV o JSONL en streaming; la respuesta recorre
+iter_export con csv_export.aiter_chunks) y el comando export_ledger (archivos .gz).
+"""
+
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from bingo_app.utils.csv_export import EXPORT_CHUNK_SIZE, iter_csv
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# dataset: (modelo, búsqueda de franquicia, [(columna, campo), ...])
+EXPORT_DATASETS = {
+    'transactions': ('Transaction', 'user__franchise_id', [
+        ('id', 'id'),
+        ('fecha', 'created_at'),
+        ('usuario_id', 'user_id'),
+        ('usuario', 'user__username'),
+        ('franquicia_id', 'user__franchise_id'),
+        ('tipo', 'transaction_type'),
+        ('monto', 'amount'),
+        ('partida_id', 'related_game_id'),
+        ('descripcion', 'description'),
+    ]),
+    'withdrawals': ('WithdrawalRequest', 'franchise_id', [
+        ('id', 'id'),
+        ('fecha', 'created_at'),
+        ('procesado', 'processed_at'),
+        ('usuario_id', 'user_id'),
+        ('usuario', 'user__username'),
+        ('franquicia_id', 'franchise_id'),
+        ('monto', 'amount'),
+        ('estado', 'status'),
+        ('banco', 'bank_name'),
+        ('titular', 'account_holder_name'),
+        ('referencia', 'transaction_reference'),
+    ]),
+    'credit_requests': ('CreditRequest', 'franchise_id', [
+        ('id', 'id'),
+        ('fecha', 'created_at'),
+        ('procesado', 'processed_at'),
+        ('usuario_id', 'user_id'),
+        ('usuario', 'user__username'),
+        ('franquicia_id', 'franchise_id'),
+        ('monto', 'amount'),
+        ('estado', 'status'),
+        ('metodo_pago_id', 'payment_method_id'),
+    ]),
+    'receivable_payments': ('AccountsReceivablePayment', 'account_receivable__organizer__franchise_id', [
+        ('id', 'id'),
+        ('fecha', 'created_at'),
+        ('cuenta_id', 'account_receivable_id'),
+        ('deudor', 'account_receivable__debtor__username'),
+        ('organizador', 'account_receivable__organizer__username'),
+        ('franquicia_id', 'account_receivable__organizer__franchise_id'),
+        ('monto', 'amount'),
+        ('metodo_pago_id', 'payment_method_id'),
+        ('notas', 'notes'),
+    ]),
+}
+
+
+def day_bounds(date_from=None, date_to=None):
+    """Fechas (date) a datetimes [inicio, fin) en la zona actual; date_to incluye el día completo."""
+    start = end = None
+    if date_from:
+        start = timezone.make_aware(datetime.datetime.combine(date_from, datetime.time.min))
+    if date_to:
+        end = timezone.make_aware(datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def export_columns(dataset):
+    return [column for column, _ in EXPORT_DATASETS[dataset][2]]
+
+
+def export_queryset(dataset, franchise_id=None, start=None, end=None):
+    from django.apps import apps
+
+    model_name, franchise_lookup, fields = EXPORT_DATASETS[dataset]
+    queryset = apps.get_model('bingo_app', model_name).objects.all()
+    if franchise_id:
+        queryset = queryset.filter(**{franchise_lookup: franchise_id})
+    if start:
+        queryset = queryset.filter(created_at__gte=start)
+    if end:
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset.order_by('id').values_list(*[field for _, field in fields])
+
+
+def export_rows(dataset, franchise_id=None, start=None, end=None):
+    return export_queryset(dataset, franchise_id, start, end).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def iter_jsonl(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def iter_export(dataset, export_format='csv', franchise_id=None, start=None, end=None):
+    """Líneas de texto del conjunto en CSV (con encabezado) o JSONL."""
+    columns = export_columns(dataset)
+    rows = export_rows(dataset, franchise_id, start, end)
+    if export_format == 'jsonl':
+        return iter_jsonl(columns, rows)
+    return iter_csv(columns, rows)
@@ -0,0 +1,290 @@
+"""
+Totales materializados del libro de transacciones para el dashboard de administración.
+
+LedgerRollup guarda por hora (UTC), tipo de transacción, promoción, franquicia y rol
+del usuario: cantidad, suma total, suma de montos positivos, suma de montos
+negativos y cantidad de montos grandes (> LARGE_AMOUNT).
+
+catch_up_ledger_rollups() procesa solo las transacciones posteriores a la marca de
+agua (LedgerRollupState.last_transaction_id), agregándolas en la base. Deja fuera
+las de los últimos BINGO_LEDGER_ROLLUP_LAG segundos (300 por defecto) para no
+saltarse transacciones con id menor que todavía no se confirmaron.
+
+ledger_totals() y daily_totals() devuelven los mismos números que los escaneos
+directos de Transaction: horas completas desde los rollups; los bordes del rango
+(horas incompletas) y la cola posterior a la marca de agua, directo de Transaction
+con el índice de created_at / la clave primaria.
+
+La franquicia y el rol son los del usuario al momento de procesar la transacción.
+"""
+
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Case, CharField, Count, DecimalField, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+
+LARGE_AMOUNT = Decimal('500')
+PROMOTION_TEXT = 'promoción'
+ROLLUP_BATCH_SIZE = 20000
+ZERO = Decimal('0.00')
+METRICS = ('count', 'total_amount', 'positive_amount', 'negative_amount', 'large_count')
+
+
+def rollup_lag():
+    return datetime.timedelta(seconds=getattr(settings, 'BINGO_LEDGER_ROLLUP_LAG', 300))
+
+
+def _money(expression):
+    return Coalesce(expression, Value(ZERO), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _is_promotion():
+    # Mismo criterio que el dashboard: OTHER con "promoción" en la descripción
+    return Case(
+        When(transaction_type='OTHER', description__icontains=PROMOTION_TEXT, then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def _user_role():
+    return Case(
+        When(Q(user__is_superuser=True) | Q(user__is_admin=True), then=Value('ADMIN')),
+        When(user__is_organizer=True, then=Value('ORGANIZER')),
+        default=Value('PLAYER'),
+        output_field=CharField(),
+    )
+
+
+def _metrics():
+    return {
+        'count': Count('id'),
+        'total_amount': _money(Sum('amount')),
+        'positive_amount': _money(Sum('amount', filter=Q(amount__gt=0))),
+        'negative_amount': _money(Sum('amount', filter=Q(amount__lt=0))),
+        'large_count': Count('id', filter=Q(amount__gt=LARGE_AMOUNT)),
+    }
+
+
+def transaction_buckets(queryset):
+    """Agrupa transacciones por hora y dimensiones, con las métricas del rollup."""
+    return (
+        queryset.order_by()
+        .annotate(
+            bucket=TruncHour('created_at', tzinfo=datetime.timezone.utc),
+            is_promotion=_is_promotion(),
+            franchise_ref=F('user__franchise_id'),
+            role=_user_role(),
+        )
+        .values('bucket', 'transaction_type', 'is_promotion', 'franchise_ref', 'role')
+        .annotate(**_metrics())
+    )
+
+
+def catch_up_ledger_rollups(batch_size=ROLLUP_BATCH_SIZE, lag=None):
+    """
+    Suma a los rollups las transacciones posteriores a la marca de agua. Devuelve la
+    cantidad de transacciones procesadas.
+    """
+    from bingo_app.models import LedgerRollup, LedgerRollupState, Transaction
+
+    cutoff = timezone.now() - (rollup_lag() if lag is None else lag)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            state, _ = LedgerRollupState.objects.select_for_update().get_or_create(pk=1)
+            watermark = state.last_transaction_id
+            pending = Transaction.objects.filter(id__gt=watermark)
+            # Solo un rango contiguo de ids: se corta antes de la primera transacción reciente
+            first_recent = pending.filter(created_at__gte=cutoff).aggregate(first=Min('id'))['first']
+            if first_recent is not None:
+                upper = first_recent - 1
+            else:
+                upper = pending.aggregate(last=Max('id'))['last'] or watermark
+            upper = min(upper, watermark + batch_size)
+            if upper <= watermark:
+                return processed
+
+            rows = Transaction.objects.filter(id__gt=watermark, id__lte=upper)
+            groups = list(transaction_buckets(rows))
+            _merge_into_rollups(LedgerRollup, groups)
+
+            processed += sum(group['count'] for group in groups)
+            state.last_transaction_id = upper
+            state.save(update_fields=['last_transaction_id', 'updated_at'])
+
+
+def _rollup_key(bucket, transaction_type, is_promotion, franchise_id, role):
+    return (bucket, transaction_type, bool(is_promotion), franchise_id, role)
+
+
+def _merge_into_rollups(LedgerRollup, groups):
+    if not groups:
+        return
+    existing = {
+        _rollup_key(r.bucket, r.transaction_type, r.is_promotion, r.franchise_id, r.role): r
+        for r in LedgerRollup.objects.filter(bucket__in={g['bucket'] for g in groups})
+    }
+    to_create = []
+    to_update = {}
+    for group in groups:
+        key = _rollup_key(group['bucket'], group['transaction_type'], group['is_promotion'],
+                          group['franchise_ref'], group['role'])
+        rollup = existing.get(key)
+        if rollup is None:
+            rollup = LedgerRollup(
+                bucket=group['bucket'], transaction_type=group['transaction_type'],
+                is_promotion=bool(group['is_promotion']), franchise_id=group['franchise_ref'],
+                role=group['role'],
+            )
+            existing[key] = rollup
+            to_create.append(rollup)
+        elif rollup.pk is not None:
+            to_update[rollup.pk] = rollup
+        for metric in METRICS:
+            setattr(rollup, metric, getattr(rollup, metric) + group[metric])
+    LedgerRollup.objects.bulk_create(to_create, batch_size=1000)
+    LedgerRollup.objects.bulk_update(list(to_update.values()), list(METRICS), batch_size=1000)
+
+
+def rebuild_ledger_rollups():
+    """Borra los rollups y reprocesa todo el libro desde el principio."""
+    from bingo_app.models import LedgerRollup, LedgerRollupState
+
+    with transaction.atomic():
+        LedgerRollupState.objects.select_for_update().get_or_create(pk=1)
+        LedgerRollup.objects.all().delete()
+        LedgerRollupState.objects.filter(pk=1).update(last_transaction_id=0)
+    return catch_up_ledger_rollups()
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    # Fecha sola: medianoche en la zona horaria actual (igual que el filtro created_at__gte=date)
+    return timezone.make_aware(datetime.datetime.combine(value, datetime.time.min))
+
+
+def _hour_ceil(value):
+    floor = value.replace(minute=0, second=0, microsecond=0)
+    return floor if floor == value else floor + datetime.timedelta(hours=1)
+
+
+def _hour_floor(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _range_q(start, end, field='created_at'):
+    query = Q()
+    if start:
+        query &= Q(**{f'{field}__gte': start})
+    if end:
+        query &= Q(**{f'{field}__lt': end})
+    return query
+
+
+class LedgerTotals:
+    """Métricas agregadas por (tipo, promoción) de un rango de fechas."""
+
+    def __init__(self):
+        self._totals = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+
+    def add(self, transaction_type, is_promotion, values):
+        totals = self._totals[(transaction_type, bool(is_promotion))]
+        for metric in METRICS:
+            totals[metric] += values[metric] or 0
+
+    def sum(self, metric, types=None, promotion=None):
+        result = 0 if metric in ('count', 'large_count') else ZERO
+        for (transaction_type, is_promotion), totals in self._totals.items():
+            if types is not None and transaction_type not in types:
+                continue
+            if promotion is not None and is_promotion != promotion:
+                continue
+            result += totals[metric]
+        return result
+
+    def by_type(self):
+        """[{'transaction_type', 'count', 'total_amount'}] ordenado por total descendente."""
+        merged = defaultdict(lambda: {'count': 0, 'total_amount': ZERO})
+        for (transaction_type, _), totals in self._totals.items():
+            merged[transaction_type]['count'] += totals['count']
+            merged[transaction_type]['total_amount'] += totals['total_amount']
+        rows = [{'transaction_type': t, **values} for t, values in merged.items() if values['count']]
+        return sorted(rows, key=lambda row: row['total_amount'], reverse=True)
+
+
+def _sources(watermark, start, end):
+    """
+    Divide [start, end) en un filtro de buckets de LedgerRollup (horas completas, o
+    None si no hay ninguna) y un filtro Q de Transaction con lo que falta: las horas
+    incompletas de los bordes y la cola posterior a la marca de agua.
+    """
+    full_start = _hour_ceil(start) if start else None
+    full_end = _hour_floor(end) if end else None
+    if full_start and full_end and full_start >= full_end:
+        return None, _range_q(start, end)
+
+    edges = Q(pk__in=[])
+    if start:
+        edges |= Q(created_at__gte=start, created_at__lt=full_start)
+    if end:
+        edges |= Q(created_at__gte=full_end, created_at__lt=end)
+    raw = (Q(id__lte=watermark) & edges) | (Q(id__gt=watermark) & _range_q(start, end))
+    return _range_q(full_start, full_end, 'bucket'), raw
+
+
+def ledger_totals(start=None, end=None):
+    """Totales del libro en [start, end) combinando rollups y Transaction."""
+    from bingo_app.models import LedgerRollup, LedgerRollupState, Transaction
+
+    start, end = _as_datetime(start), _as_datetime(end)
+    rollup_q, raw_q = _sources(LedgerRollupState.current_watermark(), start, end)
+    totals = LedgerTotals()
+
+    if rollup_q is not None:
+        rollups = LedgerRollup.objects.filter(rollup_q).values('transaction_type', 'is_promotion').annotate(
+            **{metric: Sum(metric) for metric in METRICS}
+        )
+        for row in rollups:
+            totals.add(row['transaction_type'], row['is_promotion'], row)
+
+    raw = (
+        Transaction.objects.filter(raw_q).order_by()
+        .annotate(is_promotion=_is_promotion())
+        .values('transaction_type', 'is_promotion')
+        .annotate(**_metrics())
+    )
+    for row in raw:
+        totals.add(row['transaction_type'], row['is_promotion'], row)
+    return totals
+
+
+def daily_totals(start=None, end=None, types=()):
+    """[{'day': datetime, 'total': Decimal}] por día, como TruncDay sobre Transaction."""
+    from bingo_app.models import LedgerRollup, LedgerRollupState, Transaction
+
+    start, end = _as_datetime(start), _as_datetime(end)
+    rollup_q, raw_q = _sources(LedgerRollupState.current_watermark(), start, end)
+    days = defaultdict(lambda: ZERO)
+
+    if rollup_q is not None:
+        rollups = (
+            LedgerRollup.objects.filter(rollup_q, transaction_type__in=types)
+            .annotate(day=TruncDay('bucket')).values('day').annotate(total=Sum('total_amount'))
+        )
+        for row in rollups:
+            days[row['day']] += row['total']
+
+    raw = (
+        Transaction.objects.filter(raw_q, transaction_type__in=types).order_by()
+        .annotate(day=TruncDay('created_at')).values('day').annotate(total=Sum('amount'))
+    )
+    for row in raw:
+        days[row['day']] += row['total']
+    return [{'day': day, 'total': days[day]} for day in sorted(days)]
@@ -0,0 +1,303 @@
+"""
+Estado en vivo de las partidas de bingo.
+
+Mantiene por juego los números llamados (como bitset), el número actual, el premio
+y los cartones vendidos fuera de la tabla Game, para que cada llamada no haga un
+save() completo (que recalcula el premio y reescribe toda la fila).
+
+El estado se persiste en Game por lotes (BINGO_LIVE_STATE_FLUSH_EVERY números) y
+siempre al finalizar la partida, con un UPDATE limitado a called_numbers/current_number.
+
+Backends:
+- RedisLiveStateStore: compartido entre procesos (producción, usa REDIS_URL).
+- InMemoryLiveStateStore: dentro del proceso (desarrollo y pruebas). Los demás
+  procesos no lo ven, así que con este backend cada número se persiste al
+  llamarlo y el planificador dedicado (run_auto_call_scheduler) no arranca.
+"""
+
+import secrets
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+
+MAX_AUTO_NUMBER = 75  # Rango de la llamada automática (Game.call_number)
+STATE_TTL_SECONDS = 60 * 60 * 24
+
+
+class LiveGameState:
+    """Instantánea del estado vivo de un juego."""
+
+    __slots__ = ('game_id', 'called_bits', 'called_numbers', 'current_number',
+                 'prize', 'total_cards_sold', 'pending')
+
+    def __init__(self, game_id, called_numbers=None, current_number=None,
+                 prize=None, total_cards_sold=0, pending=0):
+        self.game_id = game_id
+        self.called_numbers = list(called_numbers or [])
+        self.called_bits = numbers_to_bits(self.called_numbers)
+        self.current_number = current_number
+        self.prize = prize
+        self.total_cards_sold = total_cards_sold
+        self.pending = pending
+
+    def is_called(self, number):
+        return bool(self.called_bits >> number & 1)
+
+
+def numbers_to_bits(numbers):
+    bits = 0
+    for number in numbers:
+        bits |= 1 << int(number)
+    return bits
+
+
+def _pick_uncalled(called_bits, max_number):
+    available = [n for n in range(1, max_number + 1) if not called_bits >> n & 1]
+    if not available:
+        return None
+    return secrets.choice(available)
+
+
+class InMemoryLiveStateStore:
+    """Estado vivo dentro del proceso (un diccionario protegido por lock)."""
+
+    shared = False  # Otros procesos no ven este estado
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def get(self, game_id):
+        with self._lock:
+            state = self._states.get(game_id)
+            if state is None:
+                return None
+            return LiveGameState(
+                game_id, state.called_numbers, state.current_number,
+                state.prize, state.total_cards_sold, state.pending,
+            )
+
+    def load(self, game):
+        with self._lock:
+            if game.id not in self._states:
+                self._states[game.id] = LiveGameState(
+                    game.id, game.called_numbers, game.current_number,
+                    game.prize, game.total_cards_sold,
+                )
+        return self.get(game.id)
+
+    def call_number(self, game, number=None, max_number=MAX_AUTO_NUMBER):
+        """
+        Marca un número como llamado y lo devuelve. Si no se indica número se
+        elige uno al azar entre los no llamados. Devuelve None si ya estaba llamado
+        o no quedan números.
+        """
+        self.load(game)
+        with self._lock:
+            state = self._states[game.id]
+            if number is None:
+                number = _pick_uncalled(state.called_bits, max_number)
+                if number is None:
+                    return None
+            elif state.is_called(number):
+                return None
+            state.called_bits |= 1 << number
+            state.called_numbers.append(number)
+            state.current_number = number
+            state.pending += 1
+            return number
+
+    def update(self, game_id, prize=None, total_cards_sold=None):
+        with self._lock:
+            state = self._states.get(game_id)
+            if state is None:
+                return
+            if prize is not None:
+                state.prize = prize
+            if total_cards_sold is not None:
+                state.total_cards_sold = total_cards_sold
+
+    def mark_flushed(self, game_id, count):
+        with self._lock:
+            state = self._states.get(game_id)
+            if state is not None:
+                state.pending = max(0, state.pending - count)
+
+    def discard(self, game_id):
+        with self._lock:
+            self._states.pop(game_id, None)
+
+
+class RedisLiveStateStore:
+    """
+    Estado vivo en Redis, compartido por todos los procesos (Daphne y workers).
+
+    Claves por juego:
+    - bingo:live:<id>:bits   bitmap de números llamados (SETBIT es atómico)
+    - bingo:live:<id>:order  lista con el orden de llamada
+    - bingo:live:<id>:meta   hash con current, prize, cards_sold y pending
+    """
+
+    shared = True
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def _keys(self, game_id):
+        prefix = f'bingo:live:{game_id}'
+        return f'{prefix}:bits', f'{prefix}:order', f'{prefix}:meta'
+
+    def get(self, game_id):
+        bits_key, order_key, meta_key = self._keys(game_id)
+        pipe = self.client.pipeline()
+        pipe.lrange(order_key, 0, -1)
+        pipe.hgetall(meta_key)
+        order, meta = pipe.execute()
+        if not meta:
+            return None
+        current = meta.get(b'current')
+        prize = meta.get(b'prize')
+        return LiveGameState(
+            game_id,
+            [int(n) for n in order],
+            int(current) if current else None,
+            Decimal(prize.decode()) if prize else None,
+            int(meta.get(b'cards_sold', 0)),
+            int(meta.get(b'pending', 0)),
+        )
+
+    def load(self, game):
+        bits_key, order_key, meta_key = self._keys(game.id)
+
+        def seed(pipe):
+            if pipe.exists(meta_key):
+                return
+            pipe.multi()
+            pipe.delete(bits_key, order_key)
+            for number in game.called_numbers or []:
+                pipe.setbit(bits_key, int(number), 1)
+            if game.called_numbers:
+                pipe.rpush(order_key, *game.called_numbers)
+            pipe.hset(meta_key, mapping={
+                'current': game.current_number or '',
+                'prize': str(game.prize) if game.prize is not None else '',
+                'cards_sold': game.total_cards_sold,
+                'pending': 0,
+            })
+            for key in (bits_key, order_key, meta_key):
+                pipe.expire(key, STATE_TTL_SECONDS)
+
+        self.client.transaction(seed, meta_key)
+        return self.get(game.id)
+
+    def call_number(self, game, number=None, max_number=MAX_AUTO_NUMBER):
+        state = self.load(game)
+        bits_key, order_key, meta_key = self._keys(game.id)
+        for _ in range(max_number):
+            candidate = number
+            if candidate is None:
+                candidate = _pick_uncalled(state.called_bits, max_number)
+                if candidate is None:
+                    return None
+            # SETBIT devuelve el valor anterior: si era 1 otro proceso ya lo llamó
+            if self.client.setbit(bits_key, candidate, 1):
+                if number is not None:
+                    return None
+                state.called_bits |= 1 << candidate
+                continue
+            pipe = self.client.pipeline()
+            pipe.rpush(order_key, candidate)
+            pipe.hset(meta_key, 'current', candidate)
+            pipe.hincrby(meta_key, 'pending', 1)
+            pipe.execute()
+            return candidate
+        return None
+
+    def update(self, game_id, prize=None, total_cards_sold=None):
+        bits_key, order_key, meta_key = self._keys(game_id)
+        if not self.client.exists(meta_key):
+            return
+        mapping = {}
+        if prize is not None:
+            mapping['prize'] = str(prize)
+        if total_cards_sold is not None:
+            mapping['cards_sold'] = total_cards_sold
+        if mapping:
+            self.client.hset(meta_key, mapping=mapping)
+
+    def mark_flushed(self, game_id, count):
+        bits_key, order_key, meta_key = self._keys(game_id)
+        pending = self.client.hincrby(meta_key, 'pending', -count)
+        if pending < 0:
+            self.client.hset(meta_key, 'pending', 0)
+
+    def discard(self, game_id):
+        self.client.delete(*self._keys(game_id))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_live_state_store():
+    """Devuelve el store configurado en BINGO_LIVE_STATE_BACKEND ('redis' o 'memory')."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = getattr(settings, 'BINGO_LIVE_STATE_BACKEND', 'memory')
+                redis_url = getattr(settings, 'REDIS_URL', None)
+                if backend == 'redis' and redis_url:
+                    _store = RedisLiveStateStore(redis_url)
+                else:
+                    _store = InMemoryLiveStateStore()
+    return _store
+
+
+def flush_live_state(game, force=False, store=None):
+    """
+    Persiste en Game los números llamados pendientes con un UPDATE acotado.
+    Sin force solo escribe cuando hay BINGO_LIVE_STATE_FLUSH_EVERY números pendientes;
+    con un store no compartido (memoria) escribe siempre.
+    """
+    from bingo_app.models import Game
+
+    store = store or get_live_state_store()
+    state = store.get(game.id)
+    if state is None or state.pending == 0:
+        return False
+    flush_every = getattr(settings, 'BINGO_LIVE_STATE_FLUSH_EVERY', 5) if store.shared else 1
+    if not force and state.pending < flush_every:
+        return False
+    Game.objects.filter(id=game.id).update(
+        called_numbers=state.called_numbers,
+        current_number=state.current_number,
+    )
+    store.mark_flushed(game.id, state.pending)
+    return True
+
+
+def apply_live_state(game, store=None):
+    """
+    Superpone sobre la instancia el estado vivo (números llamados, número actual,
+    premio y cartones vendidos). Devuelve el estado o None si el juego no tiene.
+    """
+    store = store or get_live_state_store()
+    state = store.get(game.id)
+    if state is not None:
+        game.called_numbers = state.called_numbers
+        game.current_number = state.current_number
+        if state.prize is not None:
+            game.prize = state.prize
+        game.total_cards_sold = state.total_cards_sold
+    return state
+
+
+def close_live_state(game, store=None):
+    """Persiste lo pendiente y libera el estado vivo de un juego terminado."""
+    store = store or get_live_state_store()
+    flush_live_state(game, force=True, store=store)
+    store.discard(game.id)
@@ -0,0 +1,150 @@
+"""
+Datos del lobby con un número fijo de consultas.
+
+Las tarjetas de juegos y rifas se renderizan una sola vez por alcance (franquicia,
+'all' para el super admin o 'none' para usuarios sin franquicia) y se guardan en la
+caché durante BINGO_LOBBY_CACHE_TIMEOUT segundos (30 por defecto). Cada juego se
+guarda en dos variantes (con y sin "Ya estás dentro"), así que el fragmento no
+depende del usuario. invalidate_lobby_cache() se llama junto a los avisos
+new_game_created / new_raffle_created y al terminar un juego.
+
+Con la caché fría el renderizado cuesta 3 consultas (juegos con jugadores, rifas
+(con su sold_count) y OrganizerStats para la reputación de los organizadores);
+con la caché caliente no consulta nada. Lo propio del usuario (juegos unidos y
+victorias) son 2 consultas más.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+GAME_CARD_TEMPLATE = 'bingo_app/partials/game_card.html'
+RAFFLE_CARD_TEMPLATE = 'bingo_app/partials/raffle_card.html'
+
+
+def lobby_cache_timeout():
+    return getattr(settings, 'BINGO_LOBBY_CACHE_TIMEOUT', 30)
+
+
+def lobby_scope(user, franchise):
+    if franchise:
+        return franchise.id
+    if user.is_superuser or user.is_admin:
+        return 'all'
+    return 'none'
+
+
+def _fragments_key(scope):
+    return f'lobby_fragments:{scope}'
+
+
+def invalidate_lobby_cache(franchise_id=None):
+    """Descarta las tarjetas cacheadas del alcance de la franquicia y del super admin."""
+    cache.delete_many([_fragments_key(franchise_id or 'none'), _fragments_key('all')])
+
+
+def organizer_levels(organizers):
+    """
+    Nivel de reputación de varios organizadores con una consulta a OrganizerStats
+    (en lugar de User.reputation_level por tarjeta).
+    """
+    from bingo_app.utils.organizer_stats import stats_for_organizers
+
+    organizers = {organizer.id: organizer for organizer in organizers}
+    stats = stats_for_organizers(oid for oid, organizer in organizers.items() if organizer.manual_reputation == 'AUTO')
+
+    levels = {}
+    for oid, organizer in organizers.items():
+        if organizer.manual_reputation != 'AUTO':
+            levels[oid] = organizer.get_manual_reputation_display()
+        else:
+            levels[oid] = stats[oid].reputation_level
+    return levels
+
+
+def _scope_filter(scope):
+    if scope == 'all':
+        return {}
+    if scope == 'none':
+        return {'franchise__isnull': True}
+    return {'franchise_id': scope}
+
+
+def render_lobby_fragments(scope):
+    from bingo_app.models import Game, Raffle
+
+    scope_filter = _scope_filter(scope)
+    games = list(
+        Game.objects.filter(is_active=True, is_finished=False, **scope_filter)
+        .select_related('organizer').annotate(player_count=Count('player'))
+    )
+    raffles = list(
+        Raffle.objects.filter(status__in=['WAITING', 'IN_PROGRESS'], **scope_filter)
+        .select_related('organizer').defer('sold_bitmap')
+    )
+    levels = organizer_levels([game.organizer for game in games] + [raffle.organizer for raffle in raffles])
+
+    game_cards = []
+    for game in games:
+        context = {'game': game, 'level': levels[game.organizer_id]}
+        game_cards.append((
+            game.id,
+            render_to_string(GAME_CARD_TEMPLATE, {**context, 'joined_game_ids': []}),
+            render_to_string(GAME_CARD_TEMPLATE, {**context, 'joined_game_ids': [game.id]}),
+        ))
+    raffle_cards = [
+        render_to_string(RAFFLE_CARD_TEMPLATE, {'raffle': raffle, 'level': levels[raffle.organizer_id]})
+        for raffle in raffles
+    ]
+    return {'games': game_cards, 'raffles': raffle_cards}
+
+
+def get_lobby_fragments(scope):
+    key = _fragments_key(scope)
+    fragments = cache.get(key)
+    if fragments is None:
+        fragments = render_lobby_fragments(scope)
+        cache.set(key, fragments, lobby_cache_timeout())
+    return fragments
+
+
+def get_active_announcements(request):
+    """
+    Anuncios activos compartidos por la petición: el lobby y announcements_processor
+    usan el mismo queryset, que se evalúa una sola vez.
+    """
+    from bingo_app.models import Announcement
+
+    announcements = getattr(request, '_active_announcements', None)
+    if announcements is None:
+        announcements = Announcement.objects.filter(is_active=True).select_related(
+            'related_game', 'related_raffle'
+        ).order_by('order', '-created_at')
+        request._active_announcements = announcements
+    return announcements
+
+
+def get_lobby_context(request):
+    from bingo_app.models import Game, Player
+
+    user = request.user
+    franchise = getattr(request, 'franchise', None)
+    fragments = get_lobby_fragments(lobby_scope(user, franchise))
+
+    joined_game_ids = set(Player.objects.filter(user=user).values_list('game_id', flat=True))
+    wins = Game.objects.filter(winner=user)
+    if franchise:
+        wins = wins.filter(franchise=franchise)
+
+    return {
+        'game_cards': [
+            mark_safe(joined_html if game_id in joined_game_ids else html)
+            for game_id, html, joined_html in fragments['games']
+        ],
+        'raffle_cards': [mark_safe(html) for html in fragments['raffles']],
+        'wins_count': wins.count(),
+        'announcements': get_active_announcements(request),
+        'joined_game_ids': joined_game_ids,
+    }
@@ -0,0 +1,231 @@
+"""
+Bandeja unificada de notificaciones (NotificationInboxItem) y contador de no leídas
+(NotificationCounter).
+
+Message, CreditRequestNotification y WithdrawalRequestNotification siguen siendo el
+origen de cada notificación; por cada fila se guarda un NotificationInboxItem con el
+usuario, el tipo, la fecha, quién la generó y si está leída. Las señales (signals.py)
+crean, sincronizan y borran los ítems en la misma transacción que la fila de origen
+y ajustan el contador con F(). Los UPDATE masivos de is_read no emiten señales: hay
+que hacerlos con mark_read().
+
+notifications_global lee el contador desde la caché y, solo si hay algo sin leer,
+los últimos BINGO_NOTIFICATION_INBOX_LIMIT ítems con una consulta sobre el índice
+(user, is_read, -created_at). Al confirmarse cada cambio del contador se refresca la
+caché y se envía 'unread_count' al grupo user_<id> (NotificationConsumer).
+
+Si el usuario no tiene contador (datos anteriores a la bandeja) se reconstruye a
+partir de sus notificaciones sin leer la primera vez que se consulta. Para rellenar o
+corregir todas las bandejas: python manage.py rebuild_notification_inbox
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+INBOX_LIMIT = 20  # Valor por defecto de BINGO_NOTIFICATION_INBOX_LIMIT
+
+logger = logging.getLogger(__name__)
+
+MESSAGE = 'MESSAGE'
+CREDIT_REQUEST = 'CREDIT_REQUEST'
+WITHDRAWAL_REQUEST = 'WITHDRAWAL_REQUEST'
+
+
+def inbox_limit():
+    return getattr(settings, 'BINGO_NOTIFICATION_INBOX_LIMIT', INBOX_LIMIT)
+
+
+def unread_cache_timeout():
+    return getattr(settings, 'BINGO_NOTIFICATION_COUNT_CACHE_TIMEOUT', 300)
+
+
+def _count_key(user_id):
+    return f'notification_unread:{user_id}'
+
+
+def _sources():
+    """tipo -> (modelo, campo del destinatario, campo de fecha, ruta al autor)"""
+    from bingo_app.models import CreditRequestNotification, Message, WithdrawalRequestNotification
+
+    return {
+        MESSAGE: (Message, 'recipient_id', 'timestamp', 'sender__username'),
+        CREDIT_REQUEST: (CreditRequestNotification, 'user_id', 'created_at', 'credit_request__user__username'),
+        WITHDRAWAL_REQUEST: (WithdrawalRequestNotification, 'user_id', 'created_at', 'withdrawal_request__user__username'),
+    }
+
+
+def kind_for(model):
+    for kind, (source_model, *_) in _sources().items():
+        if source_model is model:
+            return kind
+    return None
+
+
+def _actor_name(instance, path):
+    # sender__username -> instance.sender.username (normalmente ya está en memoria)
+    value = instance
+    for attr in path.split('__'):
+        value = getattr(value, attr, None)
+        if value is None:
+            return ''
+    return value
+
+
+def _publish_on_commit(user_id):
+    transaction.on_commit(lambda: publish_unread_count(user_id), robust=True)
+
+
+def _bump(user_id, delta):
+    from bingo_app.models import NotificationCounter
+
+    if not delta:
+        return
+    updated = NotificationCounter.objects.filter(user_id=user_id).update(unread=F('unread') + delta)
+    if not updated:
+        # Sin contador todavía: se reconstruye con el estado ya actualizado
+        rebuild_user_inbox(user_id)
+    _publish_on_commit(user_id)
+
+
+def record_notification(instance):
+    """Crea el ítem de la bandeja para una notificación recién creada."""
+    from bingo_app.models import NotificationInboxItem
+
+    kind = kind_for(type(instance))
+    _, user_field, date_field, actor_path = _sources()[kind]
+    user_id = getattr(instance, user_field)
+    NotificationInboxItem.objects.create(
+        user_id=user_id,
+        kind=kind,
+        object_id=instance.pk,
+        actor_name=_actor_name(instance, actor_path),
+        is_read=instance.is_read,
+        created_at=getattr(instance, date_field),
+    )
+    if not instance.is_read:
+        _bump(user_id, 1)
+
+
+def sync_read_state(instance):
+    """Lleva is_read de la notificación de origen a su ítem y ajusta el contador."""
+    from bingo_app.models import NotificationInboxItem
+
+    kind = kind_for(type(instance))
+    user_id = getattr(instance, _sources()[kind][1])
+    changed = NotificationInboxItem.objects.filter(
+        kind=kind, object_id=instance.pk, is_read=not instance.is_read
+    ).update(is_read=instance.is_read)
+    if changed:
+        _bump(user_id, -changed if instance.is_read else changed)
+
+
+def forget_notification(instance):
+    """Borra el ítem de una notificación eliminada."""
+    from bingo_app.models import NotificationInboxItem
+
+    kind = kind_for(type(instance))
+    user_id = getattr(instance, _sources()[kind][1])
+    unread = NotificationInboxItem.objects.filter(kind=kind, object_id=instance.pk, is_read=False).count()
+    NotificationInboxItem.objects.filter(kind=kind, object_id=instance.pk).delete()
+    if unread:
+        _bump(user_id, -unread)
+
+
+def mark_read(queryset):
+    """
+    Marca como leídas las notificaciones del queryset (Message, CreditRequestNotification
+    o WithdrawalRequestNotification) junto con sus ítems y contadores. Devuelve cuántas marcó.
+    """
+    from bingo_app.models import NotificationInboxItem
+
+    kind = kind_for(queryset.model)
+    ids = list(queryset.filter(is_read=False).values_list('id', flat=True))
+    if not ids:
+        return 0
+    with transaction.atomic():
+        queryset.model.objects.filter(id__in=ids).update(is_read=True)
+        items = NotificationInboxItem.objects.filter(kind=kind, object_id__in=ids, is_read=False)
+        per_user = list(items.values('user_id').annotate(total=Count('id')).values_list('user_id', 'total'))
+        items.update(is_read=True)
+        for user_id, total in per_user:
+            _bump(user_id, -total)
+    return len(ids)
+
+
+def rebuild_user_inbox(user_id):
+    """
+    Agrega a la bandeja las notificaciones sin leer que falten, marca como leídos los
+    ítems cuyo origen ya se leyó o se borró y recalcula el contador.
+    """
+    from bingo_app.models import NotificationCounter, NotificationInboxItem, User
+
+    if not User.objects.filter(id=user_id).exists():
+        return 0
+    items = []
+    for kind, (model, user_field, date_field, actor_path) in _sources().items():
+        rows = list(model.objects.filter(**{user_field: user_id, 'is_read': False}).values_list('id', date_field, actor_path))
+        items += [
+            NotificationInboxItem(user_id=user_id, kind=kind, object_id=pk, actor_name=actor or '', created_at=created)
+            for pk, created, actor in rows
+        ]
+        unread_ids = [pk for pk, _, _ in rows]
+        NotificationInboxItem.objects.filter(user_id=user_id, kind=kind, is_read=False).exclude(
+            object_id__in=unread_ids
+        ).update(is_read=True)
+        NotificationInboxItem.objects.filter(kind=kind, object_id__in=unread_ids, is_read=True).update(is_read=False)
+    NotificationInboxItem.objects.bulk_create(items, ignore_conflicts=True, batch_size=1000)
+    unread = NotificationInboxItem.objects.filter(user_id=user_id, is_read=False).count()
+    try:
+        with transaction.atomic():
+            NotificationCounter.objects.update_or_create(user_id=user_id, defaults={'unread': unread})
+    except IntegrityError:
+        # Otro proceso creó el contador a la vez: su valor ya incluye estos ítems
+        pass
+    return unread
+
+
+def get_unread_count(user_id):
+    """Notificaciones sin leer del usuario, desde la caché cuando está disponible."""
+    from bingo_app.models import NotificationCounter
+
+    key = _count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = NotificationCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first()
+        if count is None:
+            count = rebuild_user_inbox(user_id)
+        cache.set(key, count, unread_cache_timeout())
+    return count
+
+
+def latest_unread(user_id, limit=None):
+    """Últimos ítems sin leer, con una sola consulta sobre el índice de la bandeja."""
+    from bingo_app.models import NotificationInboxItem
+
+    return list(
+        NotificationInboxItem.objects.filter(user_id=user_id, is_read=False)
+        .order_by('-created_at', '-id')[:limit or inbox_limit()]
+    )
+
+
+def publish_unread_count(user_id):
+    """Refresca la caché del contador y lo envía al usuario por WebSocket."""
+    from bingo_app.models import NotificationCounter
+
+    count = NotificationCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first() or 0
+    cache.set(_count_key(user_id), count, unread_cache_timeout())
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        async_to_sync(get_channel_layer().group_send)(
+            f'user_{user_id}',
+            {'type': 'unread_count', 'count': count}
+        )
+    except Exception:
+        logger.exception('Error enviando el contador de notificaciones al usuario %s', user_id)
+    return count
@@ -0,0 +1,177 @@
+"""
+Estadísticas desnormalizadas por organizador (OrganizerStats).
+
+User.reputation_level y el dashboard del organizador leen una sola fila en lugar de
+contar juegos, rifas, jugadores y sumar transacciones en cada acceso.
+
+- Eventos completados (juegos, rifas, jugadores y tickets de esos eventos): se
+  recalculan para el organizador con refresh_event_stats() cada vez que un juego o
+  una rifa termina. Son 4 consultas acotadas a un organizador y el resultado no
+  depende de cuántas veces se llame.
+- Juegos/rifas creados y montos (ingresos netos, tarifas de creación, comisiones y
+  premios de sus juegos): se suman con F() al guardarse el Game, la Raffle o la
+  Transaction (ver signals.py), dentro de la misma transacción de base de datos.
+
+Si la fila no existe se reconstruye desde cero, salvo en las lecturas con save=False
+(User.reputation_level, admin de usuarios), que la calculan sin guardarla para no
+crear una fila por cada usuario que se muestra. get_organizer_stats() guarda la fila
+en la caché durante BINGO_ORGANIZER_STATS_CACHE_TIMEOUT segundos (300 por defecto);
+la entrada se borra al confirmarse cada cambio. Para rellenar o corregir las filas:
+python manage.py rebuild_organizer_stats
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+ZERO = Decimal('0.00')
+CREATION_FEE_TYPES = ('GAME_CREATION_FEE', 'RAFFLE_CREATION_FEE')
+
+
+def organizer_stats_cache_timeout():
+    return getattr(settings, 'BINGO_ORGANIZER_STATS_CACHE_TIMEOUT', 300)
+
+
+def _stats_key(organizer_id):
+    return f'organizer_stats:{organizer_id}'
+
+
+def _invalidate_on_commit(organizer_id):
+    key = _stats_key(organizer_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def _money(expression):
+    return Coalesce(expression, Value(ZERO), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def compute_event_stats(organizer_id):
+    from bingo_app.models import Game, Player, Raffle, Ticket
+
+    games = Game.objects.filter(organizer_id=organizer_id).aggregate(
+        games_created=Count('id'),
+        games_completed=Count('id', filter=Q(is_finished=True)),
+    )
+    raffles = Raffle.objects.filter(organizer_id=organizer_id).aggregate(
+        raffles_created=Count('id'),
+        raffles_completed=Count('id', filter=Q(status='FINISHED')),
+    )
+    return {
+        **games,
+        **raffles,
+        'completed_game_players': Player.objects.filter(
+            game__organizer_id=organizer_id, game__is_finished=True
+        ).count(),
+        'completed_raffle_tickets': Ticket.objects.filter(
+            raffle__organizer_id=organizer_id, raffle__status='FINISHED'
+        ).count(),
+    }
+
+
+def compute_money_stats(organizer_id):
+    from bingo_app.models import Transaction
+
+    own = Transaction.objects.filter(user_id=organizer_id).aggregate(
+        net_revenue=_money(Sum('amount', filter=Q(transaction_type='ORGANIZER_REVENUE', amount__gt=0))),
+        creation_fees=_money(Sum('amount', filter=Q(transaction_type__in=CREATION_FEE_TYPES, amount__lt=0))),
+    )
+    own['creation_fees'] = abs(own['creation_fees'])
+    games = Transaction.objects.filter(related_game__organizer_id=organizer_id).aggregate(
+        commissions_paid=_money(Sum('amount', filter=Q(transaction_type='PLATFORM_COMMISSION'))),
+        prizes_paid=_money(Sum('amount', filter=Q(transaction_type='PRIZE'))),
+    )
+    return {**own, **games}
+
+
+def rebuild_organizer_stats(organizer_id):
+    """Recalcula la fila completa del organizador desde Game, Raffle y Transaction."""
+    from bingo_app.models import OrganizerStats
+
+    values = {**compute_event_stats(organizer_id), **compute_money_stats(organizer_id)}
+    stats, _ = OrganizerStats.objects.update_or_create(organizer_id=organizer_id, defaults=values)
+    _invalidate_on_commit(organizer_id)
+    return stats
+
+
+def refresh_event_stats(organizer_id):
+    """Recalcula los eventos completados; llamar después de marcar un juego o rifa como terminado."""
+    from bingo_app.models import OrganizerStats
+
+    values = compute_event_stats(organizer_id)
+    if not OrganizerStats.objects.filter(organizer_id=organizer_id).update(updated_at=timezone.now(), **values):
+        rebuild_organizer_stats(organizer_id)
+        return
+    _invalidate_on_commit(organizer_id)
+
+
+def bump_organizer_stats(organizer_id, **deltas):
+    """
+    Suma los deltas a la fila del organizador. Se llama después de guardar el registro
+    que los origina: si la fila todavía no existe, la reconstrucción ya lo incluye.
+    """
+    from bingo_app.models import OrganizerStats
+
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if not OrganizerStats.objects.filter(organizer_id=organizer_id).update(updated_at=timezone.now(), **updates):
+        rebuild_organizer_stats(organizer_id)
+        return
+    _invalidate_on_commit(organizer_id)
+
+
+def record_transaction(tx):
+    """Aplica a las estadísticas una transacción recién creada."""
+    amount = tx.amount or ZERO
+    if tx.transaction_type == 'ORGANIZER_REVENUE' and amount > 0:
+        bump_organizer_stats(tx.user_id, net_revenue=amount)
+    elif tx.transaction_type in CREATION_FEE_TYPES and amount < 0:
+        bump_organizer_stats(tx.user_id, creation_fees=-amount)
+    elif tx.transaction_type in ('PLATFORM_COMMISSION', 'PRIZE') and tx.related_game_id:
+        field = 'commissions_paid' if tx.transaction_type == 'PLATFORM_COMMISSION' else 'prizes_paid'
+        bump_organizer_stats(tx.related_game.organizer_id, **{field: amount})
+
+
+def computed_organizer_stats(organizer_id):
+    """OrganizerStats calculada desde cero, sin guardarla."""
+    from bingo_app.models import OrganizerStats
+
+    return OrganizerStats(organizer_id=organizer_id, **compute_event_stats(organizer_id), **compute_money_stats(organizer_id))
+
+
+def _missing_stats(organizer_id, save):
+    return rebuild_organizer_stats(organizer_id) if save else computed_organizer_stats(organizer_id)
+
+
+def get_organizer_stats(organizer_id, save=True):
+    """
+    OrganizerStats del organizador, desde la caché. Si todavía no existe la fila se
+    reconstruye; con save=False se calcula sin guardarla (solo lectura).
+    """
+    from bingo_app.models import OrganizerStats
+
+    key = _stats_key(organizer_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = OrganizerStats.objects.filter(organizer_id=organizer_id).first()
+        if stats is None:
+            stats = _missing_stats(organizer_id, save)
+        cache.set(key, stats, organizer_stats_cache_timeout())
+    return stats
+
+
+def stats_for_organizers(organizer_ids, save=True):
+    """{organizer_id: OrganizerStats} con una consulta; las filas que falten como en get_organizer_stats."""
+    from bingo_app.models import OrganizerStats
+
+    organizer_ids = set(organizer_ids)
+    stats = {s.organizer_id: s for s in OrganizerStats.objects.filter(organizer_id__in=organizer_ids)}
+    for organizer_id in organizer_ids - stats.keys():
+        stats[organizer_id] = _missing_stats(organizer_id, save)
+    return stats
@@ -0,0 +1,91 @@
+"""
+Sorteo de rifas con múltiples ganadores resuelto por conjuntos.
+
+El costo en consultas no depende de la cantidad de premios:
+1. Una consulta trae los tickets de todos los números ganadores manuales con su dueño.
+2. Los ganadores se asignan en memoria siguiendo prize_structure por posición, con las
+   mismas reglas de siempre (número no vendido o usuario que ya ganó: se salta el premio).
+3. Un SELECT ... FOR UPDATE bloquea a todos los ganadores ordenados por id, así dos
+   sorteos concurrentes toman los bloqueos en el mismo orden y no se bloquean entre sí.
+4. Un solo UPDATE acredita los premios con F() y un Case por usuario.
+5. bulk_create de las transacciones PRIZE.
+
+Lo usa Raffle.draw_winner; el JSON de ganadores (Raffle.winners) no cambia.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Value, When
+
+
+def resolve_multiple_winners(raffle):
+    """
+    Ganadores de la rifa según prize_structure y manual_winning_numbers, con una
+    consulta. Devuelve (winners, winning_numbers, total) con el formato de
+    Raffle.winners, o None si faltan números ganadores manuales.
+    """
+    sorted_prizes = sorted(raffle.prize_structure, key=lambda x: x.get('position', 0))
+    manual_numbers = list(raffle.manual_winning_numbers or [])
+    if len(manual_numbers) < len(sorted_prizes):
+        return None
+
+    tickets = {
+        row['number']: row
+        for row in raffle.tickets.filter(number__in=manual_numbers[:len(sorted_prizes)]).values(
+            'id', 'number', 'owner_id', 'owner__username'
+        )
+    }
+
+    winners = []
+    winning_numbers = []
+    total = Decimal('0.00')
+    selected_user_ids = set()
+    for idx, prize_info in enumerate(sorted_prizes):
+        position = prize_info.get('position', 0)
+        prize_amount = Decimal(str(prize_info.get('prize', 0)))
+        ticket = tickets.get(int(manual_numbers[idx]))
+        # Número no vendido o usuario que ya ganó con otro ticket: se salta el premio
+        if ticket is None or ticket['owner_id'] in selected_user_ids:
+            continue
+        selected_user_ids.add(ticket['owner_id'])
+
+        winners.append({
+            'user_id': ticket['owner_id'],
+            'username': ticket['owner__username'],
+            'position': position,
+            'prize': float(prize_amount),
+            'ticket_number': ticket['number'],
+            'ticket_id': ticket['id'],
+        })
+        winning_numbers.append(ticket['number'])
+        total += prize_amount
+    return winners, winning_numbers, total
+
+
+def pay_raffle_prizes(raffle, winners):
+    """
+    Acredita los premios de `winners` (formato de Raffle.winners). Debe llamarse dentro
+    de transaction.atomic(). Devuelve las transacciones PRIZE creadas.
+    """
+    from bingo_app.models import Transaction, User
+
+    prizes = {winner['user_id']: Decimal(str(winner['prize'])) for winner in winners}
+    if not prizes:
+        return []
+
+    # Bloqueo en orden de id para no cruzarse con otros sorteos o compras
+    list(User.objects.select_for_update().filter(id__in=prizes).order_by('id').values_list('id', flat=True))
+    User.objects.filter(id__in=prizes).update(credit_balance=F('credit_balance') + Case(
+        *[When(id=user_id, then=Value(amount)) for user_id, amount in prizes.items()],
+        default=Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    ))
+    return Transaction.objects.bulk_create([
+        Transaction(
+            user_id=winner['user_id'],
+            amount=prizes[winner['user_id']],
+            transaction_type='PRIZE',
+            description=f"Premio {winner['position']}° lugar de la rifa: {raffle.title}",
+        )
+        for winner in winners
+    ])
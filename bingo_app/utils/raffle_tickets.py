@@ -0,0 +1,169 @@
+"""
+Índice de números vendidos de una rifa.
+
+Raffle.sold_bitmap guarda un bit por número (bit i = número start_number + i, bit
+más significativo primero): una rifa de 100.000 números ocupa 12,5 KB. Junto con
+Raffle.sold_count responde disponibilidad, progreso y la cuadrícula de números sin
+leer la tabla Ticket.
+
+La compra (utils.ticket_purchase.purchase_tickets) bloquea la rifa y llama a
+mark_sold(), que verifica y marca los números y suma sold_count en el mismo UPDATE
+que el resto de contadores, dentro de la transacción que crea los tickets; la
+restricción única (raffle, number) de Ticket sigue siendo la última garantía. Para reconstruir
+el índice desde Ticket: python manage.py rebuild_raffle_bitmaps
+"""
+
+from django.db.models import F
+
+RAFFLE_GRID_WINDOW = 500
+RAFFLE_GRID_MAX_WINDOW = 2000
+
+
+class TicketsUnavailable(Exception):
+    """Algunos números ya están vendidos o fuera de rango."""
+
+    def __init__(self, sold=(), out_of_range=()):
+        self.sold = sorted(sold)
+        self.out_of_range = sorted(out_of_range)
+        errors = [f'El número {n} está fuera de rango.' for n in self.out_of_range]
+        errors += [f'El número {n} ya fue vendido.' for n in self.sold]
+        super().__init__(' '.join(errors))
+
+
+def bitmap_length(total_numbers):
+    return (total_numbers + 7) // 8
+
+
+def is_sold(bitmap, offset):
+    byte = offset >> 3
+    return 0 <= byte < len(bitmap) and bool(bitmap[byte] & (0x80 >> (offset & 7)))
+
+
+def set_sold(bitmap, offsets):
+    """Copia del bitmap con los offsets marcados (se amplía si hace falta)."""
+    data = bytearray(bitmap)
+    for offset in offsets:
+        byte = offset >> 3
+        if byte >= len(data):
+            data.extend(b'\x00' * (byte + 1 - len(data)))
+        data[byte] |= 0x80 >> (offset & 7)
+    return bytes(data)
+
+
+def build_bitmap(offsets, total_numbers):
+    return set_sold(b'\x00' * bitmap_length(total_numbers), offsets)
+
+
+def sold_offsets(bitmap, first=0, last=None):
+    """Offsets vendidos en [first, last) recorriendo solo los bytes de esa ventana."""
+    first = max(first, 0)
+    last = len(bitmap) * 8 if last is None else min(last, len(bitmap) * 8)
+    offsets = []
+    for byte in range(first >> 3, (last + 7) >> 3):
+        value = bitmap[byte]
+        if not value:
+            continue
+        base = byte << 3
+        for bit in range(8):
+            offset = base + bit
+            if value & (0x80 >> bit) and first <= offset < last:
+                offsets.append(offset)
+    return offsets
+
+
+def raffle_bitmap(raffle):
+    return bytes(raffle.sold_bitmap or b'')
+
+
+def sold_numbers_in_window(raffle, first_number, last_number):
+    """Números vendidos entre first_number y last_number (incluidos)."""
+    offsets = sold_offsets(raffle_bitmap(raffle), first_number - raffle.start_number,
+                           last_number - raffle.start_number + 1)
+    return [raffle.start_number + offset for offset in offsets]
+
+
+def number_is_sold(raffle, number):
+    return is_sold(raffle_bitmap(raffle), number - raffle.start_number)
+
+
+def grid_window(raffle, window_start=None, size=RAFFLE_GRID_WINDOW):
+    """(primer, último) número de la ventana visible de la cuadrícula, alineada a size."""
+    size = max(1, min(size, RAFFLE_GRID_MAX_WINDOW))
+    if window_start is None or window_start < raffle.start_number:
+        window_start = raffle.start_number
+    window_start = min(window_start, raffle.end_number)
+    window_start -= (window_start - raffle.start_number) % size
+    return window_start, min(window_start + size - 1, raffle.end_number)
+
+
+def grid_state(raffle, first, last, user_numbers=()):
+    """Vendidos, propios y ganadores de la ventana [first, last] (lo que devuelve la API)."""
+    winning = []
+    if raffle.status == 'FINISHED':
+        if raffle.multiple_winners_enabled and raffle.winning_numbers:
+            winning = [int(n) for n in raffle.winning_numbers]
+        elif not raffle.multiple_winners_enabled and raffle.winning_number is not None:
+            winning = [raffle.winning_number]
+    return {
+        'first': first,
+        'last': last,
+        'sold': sold_numbers_in_window(raffle, first, last),
+        'mine': sorted(n for n in set(user_numbers) if first <= n <= last),
+        'winning': sorted(n for n in winning if first <= n <= last),
+    }
+
+
+def grid_cells(raffle, state):
+    """Celdas de la cuadrícula para la plantilla: número, etiqueta, estado y si ganó."""
+    sold, mine, winning = set(state['sold']), set(state['mine']), set(state['winning'])
+    cells = []
+    for number in range(state['first'], state['last'] + 1):
+        if number in mine:
+            status = 'mine'
+        elif number in sold:
+            status = 'sold'
+        else:
+            status = 'available'
+        cells.append({
+            'number': number,
+            'label': raffle.format_ticket_number(number),
+            'status': status,
+            'winning': status != 'available' and number in winning,
+        })
+    return cells
+
+
+def mark_sold(raffle, numbers, **updates):
+    """
+    Marca los números en el índice de una rifa ya bloqueada (select_for_update) y
+    guarda sold_bitmap, sold_count y `updates` en un solo UPDATE. Lanza
+    TicketsUnavailable si alguno ya estaba vendido o está fuera de rango.
+    """
+    from bingo_app.models import Raffle
+
+    bitmap = raffle_bitmap(raffle)
+    numbers = set(numbers)
+
+    out_of_range = {n for n in numbers if not (raffle.start_number <= n <= raffle.end_number)}
+    sold = {n for n in numbers - out_of_range if is_sold(bitmap, n - raffle.start_number)}
+    if out_of_range or sold:
+        raise TicketsUnavailable(sold=sold, out_of_range=out_of_range)
+
+    raffle.sold_bitmap = set_sold(bitmap, [n - raffle.start_number for n in numbers])
+    Raffle.objects.filter(pk=raffle.pk).update(
+        sold_bitmap=raffle.sold_bitmap, sold_count=F('sold_count') + len(numbers), **updates
+    )
+    raffle.sold_count += len(numbers)
+    return raffle
+
+
+def rebuild_sold_bitmap(raffle):
+    """Recalcula sold_bitmap y sold_count de la rifa desde la tabla Ticket."""
+    from bingo_app.models import Raffle
+
+    numbers = list(raffle.tickets.values_list('number', flat=True))
+    offsets = [n - raffle.start_number for n in numbers if raffle.start_number <= n <= raffle.end_number]
+    bitmap = build_bitmap(offsets, raffle.total_tickets)
+    Raffle.objects.filter(pk=raffle.pk).update(sold_bitmap=bitmap, sold_count=len(numbers))
+    raffle.sold_bitmap, raffle.sold_count = bitmap, len(numbers)
+    return raffle
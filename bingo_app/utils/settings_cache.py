@@ -0,0 +1,161 @@
+"""
+Registro en memoria de las configuraciones singleton (PercentageSettings,
+BingoTicketSettings y DiceModuleSettings).
+
+Cada proceso guarda la última instancia leída de cada modelo junto con su versión.
+Al guardar o borrar una configuración, una señal (signals.py) incrementa la versión
+compartida del modelo después del commit; los demás procesos (workers de Daphne)
+vuelven a leer la versión como mucho cada BINGO_SETTINGS_CHECK_SECONDS segundos y,
+si cambió, recargan la fila. Las lecturas en las rutas calientes no hacen consultas.
+
+Versiones (mismo backend que el estado vivo, BINGO_LIVE_STATE_BACKEND):
+- RedisSettingsVersions: una clave por modelo, bingo:settings:<modelo>:version.
+- InMemorySettingsVersions: dentro del proceso (desarrollo y pruebas).
+
+Se devuelve una copia de la instancia: quien la modifique no altera la caché.
+Para editar una configuración o leer datos que cambian con cada partida (el pozo
+acumulado de los dados) hay que seguir consultando la base.
+"""
+
+import copy
+import functools
+import threading
+import time
+
+from django.conf import settings
+
+CHECK_SECONDS = 2  # Valor por defecto de BINGO_SETTINGS_CHECK_SECONDS
+_MISSING = object()
+
+
+class InMemorySettingsVersions:
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, labels):
+        return {label: self._versions.get(label, 0) for label in labels}
+
+    def bump(self, label):
+        with self._lock:
+            self._versions[label] = self._versions.get(label, 0) + 1
+
+
+class RedisSettingsVersions:
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, label):
+        return f'bingo:settings:{label}:version'
+
+    def get_many(self, labels):
+        values = self.client.mget([self._key(label) for label in labels])
+        return {label: int(value or 0) for label, value in zip(labels, values)}
+
+    def bump(self, label):
+        self.client.incr(self._key(label))
+
+
+@functools.lru_cache(maxsize=None)
+def _loaders():
+    from bingo_app.models import BingoTicketSettings, DiceModuleSettings, PercentageSettings
+
+    return {
+        PercentageSettings._meta.label_lower: PercentageSettings.objects.first,
+        BingoTicketSettings._meta.label_lower: BingoTicketSettings.get_settings,
+        DiceModuleSettings._meta.label_lower: DiceModuleSettings.get_settings,
+    }
+
+
+class SettingsRegistry:
+    """Instancias de configuración por modelo, válidas mientras no cambie su versión."""
+
+    def __init__(self, versions, check_seconds=CHECK_SECONDS):
+        self.versions = versions
+        self.check_seconds = check_seconds
+        self._entries = {}  # label -> (versión, instancia o None)
+        self._known = {}  # label -> última versión compartida leída
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _refresh_versions(self, labels):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+            return
+        try:
+            self._known = self.versions.get_many(labels)
+        except Exception:
+            # Sin acceso a las versiones no se confía en la caché: se lee de la base
+            self._known = {}
+            self._entries.clear()
+            return
+        self._checked_at = now
+
+    def get(self, label):
+        loaders = _loaders()
+        with self._lock:
+            self._refresh_versions(list(loaders))
+            version = self._known.get(label, _MISSING)
+            cached_version, instance = self._entries.get(label, (_MISSING, None))
+            if version is not _MISSING and cached_version == version:
+                return copy.copy(instance) if instance is not None else None
+
+        # La carga va fuera del lock: get_settings() puede crear la fila y su señal
+        # llama a invalidate() (en autocommit, en este mismo hilo)
+        instance = loaders[label]()
+        if version is not _MISSING:
+            with self._lock:
+                # Si se invalidó durante la carga, la próxima lectura ve la versión nueva y recarga
+                self._entries[label] = (version, instance)
+        return copy.copy(instance) if instance is not None else None
+
+    def invalidate(self, label):
+        """Invalida la configuración en este proceso y en los demás (versión compartida)."""
+        with self._lock:
+            self._entries.pop(label, None)
+            self._checked_at = None
+        try:
+            self.versions.bump(label)
+        except Exception:
+            pass
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_settings_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                backend = getattr(settings, 'BINGO_LIVE_STATE_BACKEND', 'memory')
+                redis_url = getattr(settings, 'REDIS_URL', None)
+                if backend == 'redis' and redis_url:
+                    versions = RedisSettingsVersions(redis_url)
+                else:
+                    versions = InMemorySettingsVersions()
+                _registry = SettingsRegistry(
+                    versions, getattr(settings, 'BINGO_SETTINGS_CHECK_SECONDS', CHECK_SECONDS)
+                )
+    return _registry
+
+
+def get_percentage_settings():
+    """PercentageSettings vigente (o None si no existe), sin consultar la base."""
+    return get_settings_registry().get('bingo_app.percentagesettings')
+
+
+def get_ticket_settings():
+    return get_settings_registry().get('bingo_app.bingoticketsettings')
+
+
+def get_dice_settings():
+    """DiceModuleSettings vigente. El pozo acumulado puede estar desactualizado."""
+    return get_settings_registry().get('bingo_app.dicemodulesettings')
+
+
+def invalidate_settings(model):
+    get_settings_registry().invalidate(model._meta.label_lower)
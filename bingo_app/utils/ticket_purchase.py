@@ -0,0 +1,129 @@
+"""
+Compra de tickets de rifa en bloque.
+
+La compra cuesta un número fijo de consultas sin importar cuántos números se
+compren:
+1. SELECT ... FOR UPDATE de la rifa y verificación de los números en su índice de
+   vendidos (utils.raffle_tickets).
+2. Débito condicional del usuario en un solo UPDATE con F().
+3. bulk_create de los tickets; la restricción única (raffle, number) de Ticket es la
+   última garantía y un conflicto se informa con los números afectados.
+4. Un solo Transaction PURCHASE por el total, con los números en la descripción.
+5. Un solo UPDATE de la rifa: índice, sold_count y held_balance con F() y, si
+   corresponde, el paso a IN_PROGRESS.
+
+La difusión 'ticket_purchased' se envía una vez por compra, al confirmarse la
+transacción.
+"""
+
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from bingo_app.utils.raffle_tickets import TicketsUnavailable, mark_sold
+
+TICKET_PURCHASE_MAX = 5000
+# Proporción de vendidos a partir de la cual la rifa pasa a IN_PROGRESS (check_raffle_progress)
+IN_PROGRESS_RATIO = Decimal('0.5')
+
+
+class TicketPurchaseError(Exception):
+    """Compra rechazada; `status` es el código HTTP sugerido."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def purchase_description(raffle, numbers):
+    listed = ', '.join(f'#{raffle.format_ticket_number(n)}' for n in numbers)
+    if len(numbers) == 1:
+        return f"Ticket {listed} para rifa: {raffle.title}"
+    return f"Compra de {len(numbers)} tickets para rifa: {raffle.title} ({listed})"
+
+
+def _notify_ticket_purchase(raffle_id, numbers, buyer, sold_count, total_tickets):
+    progress = (sold_count / total_tickets) * 100 if total_tickets else 0
+    async_to_sync(get_channel_layer().group_send)(
+        f"raffle_{raffle_id}",
+        {
+            'type': 'ticket_purchased',
+            'number': numbers[0] if len(numbers) == 1 else None,
+            'numbers': numbers,
+            'buyer': buyer,
+            'progress_percentage': progress,
+            'total_tickets_sold': sold_count,
+        }
+    )
+
+
+def purchase_tickets(user, raffle_id, numbers, notify=True):
+    """
+    Compra los números para `user`. Lanza TicketsUnavailable si alguno está vendido o
+    fuera de rango y TicketPurchaseError por otros rechazos. Devuelve un diccionario
+    con los datos para la respuesta JSON.
+    """
+    from bingo_app.models import Raffle, Ticket, Transaction, User
+
+    numbers = sorted(set(numbers))
+    if not numbers:
+        raise TicketPurchaseError('No se seleccionaron números.')
+    if len(numbers) > TICKET_PURCHASE_MAX:
+        raise TicketPurchaseError(f'No se pueden comprar más de {TICKET_PURCHASE_MAX} tickets a la vez.')
+
+    with transaction.atomic():
+        raffle = Raffle.objects.select_for_update().get(id=raffle_id)
+        if raffle.status not in ['WAITING', 'IN_PROGRESS']:
+            raise TicketPurchaseError('Esta rifa no está activa.')
+
+        total_cost = raffle.ticket_price * len(numbers)
+        debited = User.objects.filter(id=user.id, credit_balance__gte=total_cost).update(
+            credit_balance=F('credit_balance') - total_cost
+        )
+        if not debited:
+            raise TicketPurchaseError(f'Saldo insuficiente. Necesitas {total_cost} créditos.')
+
+        updates = {'held_balance': F('held_balance') + total_cost}
+        sold_after = raffle.sold_count + len(numbers)
+        if raffle.status == 'WAITING' and sold_after >= raffle.total_tickets * IN_PROGRESS_RATIO:
+            updates['status'] = 'IN_PROGRESS'
+        mark_sold(raffle, numbers, **updates)
+
+        try:
+            with transaction.atomic():
+                Ticket.objects.bulk_create([
+                    Ticket(raffle_id=raffle.id, number=number, owner_id=user.id) for number in numbers
+                ], batch_size=1000)
+        except IntegrityError:
+            # El índice estaba desactualizado: informar qué números ya tenían ticket
+            taken = set(Ticket.objects.filter(raffle_id=raffle.id, number__in=numbers).values_list('number', flat=True))
+            raise TicketsUnavailable(sold=taken)
+
+        Transaction.objects.create(
+            user_id=user.id,
+            amount=-total_cost,
+            transaction_type='PURCHASE',
+            description=purchase_description(raffle, numbers),
+        )
+
+        new_balance = User.objects.values_list('credit_balance', flat=True).get(id=user.id)
+        user.credit_balance = new_balance
+        sold_count = raffle.sold_count
+        if notify:
+            transaction.on_commit(
+                lambda: _notify_ticket_purchase(raffle.id, numbers, user.username, sold_count, raffle.total_tickets),
+                robust=True,
+            )
+
+    return {
+        'success': True,
+        'tickets_bought': len(numbers),
+        'numbers': numbers,
+        'new_balance': float(new_balance),
+        'total_tickets_sold': sold_count,
+        'progress_percentage': (sold_count / raffle.total_tickets) * 100 if raffle.total_tickets else 0,
+    }
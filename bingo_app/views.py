@@ -3,20 +3,18 @@ import sentry_sdk
 from django.utils import timezone
 from datetime import datetime
 from decimal import Decimal
-from .error_monitor import get_facebook_error_summary, reset_facebook_error_counters, facebook_monitor
+from .error_monitor import get_facebook_error_summary, reset_facebook_error_counters
 from allauth.socialaccount.models import SocialAccount
-import secrets
 import json
 import uuid
 import random
 
 from django.core.management import call_command
-from django.core.paginator import Paginator
 from django.urls import reverse
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth import login, authenticate
+from django.contrib.auth import login
 from django.contrib.auth.forms import AuthenticationForm
 from django.db.models import Sum, Q, Count, Avg, F
 from django.db.models.functions import TruncDay
@@ -36,17 +34,43 @@ import time
 from .forms import (
     PercentageSettingsForm, RegistrationForm, GameForm, GameEditForm, BuyTicketForm, 
     RaffleForm, CreditRequestForm, UserWithdrawalRequestForm, 
-    AdminWithdrawalProcessForm, PaymentMethodForm, AnnouncementForm, PromotionForm,
-    GeneralAnnouncementForm, ExternalAdForm, AccountsReceivableForm, AccountsReceivablePaymentForm
+    PaymentMethodForm, PromotionForm,
+    GeneralAnnouncementForm, ExternalAdForm, AccountsReceivableForm, AccountsReceivablePaymentForm,
+    TransactionFilterForm, LedgerExportForm
 )
 from .models import (
     User, Game, Player, ChatMessage, Raffle, Ticket,
     Transaction, Message, CreditRequest, PercentageSettings, UserBlockHistory, WithdrawalRequest, BankAccount, CreditRequestNotification, WithdrawalRequestNotification, PrintableCard, Announcement, VideoCallGroup, BingoTicket, DailyBingoSchedule, BingoTicketSettings, AccountsReceivable, AccountsReceivablePayment, PackageTemplate, Franchise, FranchiseManual,
-    DiceModuleSettings, DiceGame, DicePlayer, DiceRound, DiceMatchmakingQueue
+    DiceModuleSettings, DiceGame, DicePlayer, DiceMatchmakingQueue
 )
 from .serializers import VideoCallGroupSerializer
 from .smart_assistant import smart_assistant
 from .ai_assistant import ai_assistant
+from .utils.bingo_patterns import find_game_winners
+from .utils.live_state import apply_live_state, flush_live_state, get_live_state_store
+from .utils.game_events import number_called_event
+from .utils.card_purchase import CardPurchaseError, purchase_cards
+from .utils.card_generator import PRINTABLE_CARDS_MAX_BATCH, generate_cards
+from .utils.lobby_data import get_lobby_context, invalidate_lobby_cache
+from .utils.ledger_rollups import daily_totals, ledger_totals
+from .utils.organizer_stats import get_organizer_stats, refresh_event_stats
+from .utils.keyset_pagination import InvalidCursor, keyset_paginate, page_size_from
+from .utils.csv_export import EXPORT_CHUNK_SIZE, aiter_chunks, csv_response
+from .utils.settings_cache import get_dice_settings, get_percentage_settings, get_ticket_settings
+from .utils.notification_inbox import get_unread_count, mark_read
+from .utils.conversations import (
+    MESSAGE_PAGE_SIZE, conversation_page, find_conversation, mark_conversation_read, mark_messages_read,
+    send_private_message, unread_message_count, user_conversations,
+)
+from .utils.ledger_export import EXPORT_DATASETS, day_bounds, iter_export
+from .utils.raffle_tickets import (
+    RAFFLE_GRID_WINDOW, TicketsUnavailable, grid_cells, grid_state, grid_window, number_is_sold,
+    sold_numbers_in_window,
+)
+from .utils.ticket_purchase import TicketPurchaseError, purchase_tickets
+from .utils.dice_matchmaking import publish_join, publish_leave
+from .utils.jobs import enqueue, job_result
+from .utils.game_broadcast import progress_aggregator, send_cards_to_buyer
 # Sistema híbrido: usa IA real (Gemini) si está disponible, sino usa asistente local
 
 # PWA Views - Deben estar al inicio para evitar problemas de importación
@@ -149,8 +173,7 @@ def _finalize_player_win(player):
             
             # Buscar TODOS los jugadores que tienen bingo en este momento
             # Esto asegura que el premio se divida entre todos los ganadores
-            players = Player.objects.filter(game=game)
-            winners = [p.user for p in players if p.check_bingo()]
+            winners = [p.user for p in find_game_winners(game)]
             
             # Si no hay ganadores, algo salió mal
             if not winners:
@@ -217,9 +240,8 @@ def register(request):
             
             # Enviar email de bienvenida
             try:
-                from django.core.mail import send_mail
-                from django.conf import settings
                 from datetime import datetime
+                from .jobs import send_email_later, welcome_email_key
                 
                 if user.email:
                     subject = '🎉 ¡Bienvenido a Bingo JyM!'
@@ -243,13 +265,8 @@ Saludos,
 El equipo de Bingo JyM
                     '''
                     
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [user.email],
-                        fail_silently=True,  # No fallar el registro si el email falla
-                    )
+                    # Lo envía el worker; no retrasa ni hace fallar el registro
+                    send_email_later(subject, message, [user.email], idempotency_key=welcome_email_key(user))
             except Exception as e:
                 # Log el error pero no interrumpir el registro
                 import logging
@@ -282,19 +299,19 @@ El equipo de Bingo JyM
 
 def process_referral_code(new_user, referral_code, request):
     """Procesar código de referido y otorgar tickets de bingo"""
-    from .models import User, ReferralProgram, BingoTicket, BingoTicketSettings
+    from .models import User, ReferralProgram, BingoTicket
     from django.contrib import messages
     from datetime import timedelta
     
     try:
         # Verificar si el sistema de referidos está habilitado
-        percentage_settings = PercentageSettings.objects.first()
+        percentage_settings = get_percentage_settings()
         if not percentage_settings or not percentage_settings.referral_system_enabled:
             messages.warning(request, "El sistema de referidos está temporalmente deshabilitado.")
             return
         
         # Obtener configuración de tickets
-        ticket_settings = BingoTicketSettings.get_settings()
+        ticket_settings = get_ticket_settings()
         
         # Si el sistema de tickets no está activo, usar el sistema anterior de créditos
         if not ticket_settings.is_system_active:
@@ -466,57 +483,17 @@ def franchise_landing(request, franchise_slug):
 
 @login_required
 def lobby(request):
-    # Obtener la franquicia del usuario (si tiene)
-    franchise = getattr(request, 'franchise', None)
-    
-    # Filtrar juegos y rifas por franquicia
-    # Si es super admin, puede ver todo (franchise = None)
-    # Si tiene franquicia, solo ve los de su franquicia
-    if franchise:
-        active_games = Game.objects.filter(is_active=True, is_finished=False, franchise=franchise)
-        active_raffles = Raffle.objects.filter(status__in=['WAITING', 'IN_PROGRESS'], franchise=franchise)
-    elif request.user.is_superuser or request.user.is_admin:
-        # Super admin puede ver todo
-        active_games = Game.objects.filter(is_active=True, is_finished=False)
-        active_raffles = Raffle.objects.filter(status__in=['WAITING', 'IN_PROGRESS'])
-    else:
-        # Usuario sin franquicia solo ve juegos/rifas sin franquicia asignada
-        active_games = Game.objects.filter(is_active=True, is_finished=False, franchise__isnull=True)
-        active_raffles = Raffle.objects.filter(status__in=['WAITING', 'IN_PROGRESS'], franchise__isnull=True)
-    
-    joined_game_ids = list(Player.objects.filter(user=request.user).values_list('game_id', flat=True))
-    
-    if request.user.is_authenticated:
-        if franchise:
-            wins_count = Game.objects.filter(winner=request.user, franchise=franchise).count()
-        else:
-            wins_count = Game.objects.filter(winner=request.user).count()
-    else:
-        wins_count = 0
-    
-    # Fetch active announcements for the lobby
-    announcements = Announcement.objects.filter(is_active=True).order_by('order')
+    # Juegos y rifas según la franquicia (super admin ve todo, usuario sin franquicia
+    # solo lo que no tiene franquicia); las tarjetas vienen cacheadas por alcance
+    context = get_lobby_context(request)
     
     # Verificar si el módulo de dados está habilitado y si el usuario puede acceder
     from .utils.dice_module import is_dice_module_enabled, can_user_access_dice_module
     dice_module_enabled = False
-    dice_module_enabled_global = is_dice_module_enabled()
-    if dice_module_enabled_global:
-        if request.user.is_authenticated:
-            can_access, _ = can_user_access_dice_module(request.user)
-            dice_module_enabled = can_access
-        else:
-            # Usuario no autenticado - solo mostrar si está habilitado globalmente
-            dice_module_enabled = True
-
-    context = {
-        'games': active_games,
-        'raffles': active_raffles,
-        'wins_count': wins_count,
-        'announcements': announcements, # Add this line
-        'joined_game_ids': joined_game_ids,
-        'dice_module_enabled': dice_module_enabled,
-    }
+    if is_dice_module_enabled():
+        can_access, _ = can_user_access_dice_module(request.user)
+        dice_module_enabled = can_access
+    context['dice_module_enabled'] = dice_module_enabled
     
     return render(request, 'bingo_app/lobby.html', context)
 
@@ -535,7 +512,7 @@ def create_game(request):
             try:
                 with transaction.atomic():
                     # Calcular tarifa de creación de juego (solo si está activada)
-                    percentage_settings = PercentageSettings.objects.first()
+                    percentage_settings = get_percentage_settings()
                     creation_fee = Decimal('0.00')
                     
                     if percentage_settings and percentage_settings.game_creation_fee_enabled:
@@ -586,6 +563,7 @@ def create_game(request):
                         video_group.participants.add(request.user)
 
                     # Notify lobby
+                    invalidate_lobby_cache(game.franchise_id)
                     channel_layer = get_channel_layer()
                     html = render_to_string('bingo_app/partials/game_card.html', {
                         'game': game,
@@ -721,7 +699,7 @@ def edit_game_config(request, game_id):
                                 return render(request, 'bingo_app/edit_game_config.html', {
                                     'form': form,
                                     'game': game,
-                                    'percentage_settings': PercentageSettings.objects.first()
+                                    'percentage_settings': get_percentage_settings()
                                 })
                         
                         elif diferencia < 0:  # REDUCIR premio
@@ -759,7 +737,7 @@ def edit_game_config(request, game_id):
                                 return render(request, 'bingo_app/edit_game_config.html', {
                                     'form': form,
                                     'game': game,
-                                    'percentage_settings': PercentageSettings.objects.first()
+                                    'percentage_settings': get_percentage_settings()
                                 })
                     
                     # Guardar los cambios del formulario
@@ -789,7 +767,7 @@ def edit_game_config(request, game_id):
     else:
         form = GameEditForm(instance=game)
     
-    percentage_settings = PercentageSettings.objects.first()
+    percentage_settings = get_percentage_settings()
     
     return render(request, 'bingo_app/edit_game_config.html', {
         'form': form,
@@ -800,6 +778,7 @@ def edit_game_config(request, game_id):
 @login_required
 def game_room(request, game_id):
     game = get_object_or_404(Game, id=game_id)
+    apply_live_state(game)
     
     # Verificar si el jugador ya existe ANTES de crear
     player = Player.objects.filter(user=request.user, game=game).first()
@@ -808,8 +787,6 @@ def game_room(request, game_id):
     if not player:
         # Solo crear si realmente no existe
         player, created = Player.objects.get_or_create(user=request.user, game=game)
-    
-    percentage_settings = PercentageSettings.objects.first()
 
     # Get all video call groups for this game (incluso si el juego terminó)
     # También incluir salas persistentes donde el usuario es participante o creador
@@ -832,45 +809,19 @@ def game_room(request, game_id):
 
     # Handle card purchases
     if request.method == 'POST' and 'buy_card' in request.POST and not game.is_started:
-        if len(player.cards) >= game.max_cards_per_player:
-            messages.error(request, 'Has alcanzado el límite de cartones')
-        elif request.user.credit_balance < game.card_price:
-            messages.error(request, f'Saldo insuficiente. Necesitas {game.card_price} créditos')
+        try:
+            # Misma compra que buy_card: juego y jugador bloqueados, débito y contadores con F()
+            # y el importe retenido en held_balance hasta que _distribute_revenue lo reparte al final
+            purchase_cards(request.user, game.id, 1)
+            messages.success(request, '¡Cartón comprado exitosamente!')
+        except CardPurchaseError as e:
+            messages.error(request, e.message)
+        except Exception as e:
+            messages.error(request, f'Error al comprar cartón: {str(e)}')
         else:
-            try:
-                with transaction.atomic():
-                    # Generate new card
-                    new_card = generate_bingo_card()
-                    player.cards.append(new_card)
-                    player.save()
-                    
-                    # Charge for card
-                    request.user.credit_balance -= game.card_price
-                    request.user.save()
-                    
-                    # Record transaction
-                    Transaction.objects.create(
-                        user=request.user,
-                        amount=-game.card_price,
-                        transaction_type='PURCHASE',
-                        description=f"Cartón adicional para {game.name}",
-                        related_game=game
-                    )
-                    
-                    # Distribute purchase
-                    distribute_purchase(game, game.card_price, percentage_settings)
-                    
-                    # Update game stats
-                    game.total_cards_sold += 1
-                    game.save()
-                    
-                    # Check for progressive prize
-                    check_progressive_prize(game)
-                    
-                    messages.success(request, '¡Cartón comprado exitosamente!')
-                    
-            except Exception as e:
-                messages.error(request, f'Error al comprar cartón: {str(e)}')
+            game.refresh_from_db()
+            apply_live_state(game)
+            player.refresh_from_db()
 
     # Handle bingo claims
     if request.method == 'POST' and 'claim_bingo' in request.POST and game.is_started and not game.is_finished:
@@ -884,6 +835,7 @@ def game_room(request, game_id):
                     game.winner = request.user
                     game.is_finished = True
                     game.save()
+                    refresh_event_stats(game.organizer_id)
 
                     print("PASE POR AQUI EN CLAIM 1")
                     add_flash_message(request, f"¡GANASTE EL BINGO! Premio: {game.prize} créditos")
@@ -1035,31 +987,8 @@ def distribute_remaining_funds(game, percentage_settings):
 
 def generate_bingo_card():
     """Genera un cartón de Bingo tradicional 5x5 con letras B-I-N-G-O y comodín central"""
-    # Rangos para cada columna según las letras B-I-N-G-O
-    ranges = {
-        'B': (1, 15),
-        'I': (16, 30),
-        'N': (31, 45),
-        'G': (46, 60),
-        'O': (61, 75)
-    }
-    
-    card = []
-    for letter in ['B', 'I', 'N', 'G', 'O']:
-        # Generar 5 números únicos para cada columna
-        start, end = ranges[letter]
-        numbers = random.sample(range(start, end+1), 5)
-        
-        # Para la columna N (tercera columna), el tercer número es comodín (0 o vacío)
-        if letter == 'N':
-            numbers[2] = 0  # O usar "" para representar el comodín
-        
-        card.append(numbers)
-    
-    # Transponer la matriz para tener filas en lugar de columnas
-    card_rows = list(zip(*card))
-    
-    return list(card_rows)
+    # Columnas B(1-15) I(16-30) N(31-45) G(46-60) O(61-75); ver utils.card_generator
+    return generate_cards(1)[0]
 
 @login_required
 def profile(request):
@@ -1179,7 +1108,7 @@ def profile(request):
 @login_required
 def request_credits(request):
     # Verificar si el sistema de compra de créditos está habilitado
-    settings_obj = PercentageSettings.objects.first()
+    settings_obj = get_percentage_settings()
     if not settings_obj or not settings_obj.credits_purchase_enabled:
         messages.error(request, 'El sistema de compra de créditos está temporalmente deshabilitado.')
         return redirect('profile')
@@ -1348,7 +1277,7 @@ def process_request(request, request_id):
 @require_http_methods(["POST"])
 def buy_card(request, game_id):
     game = get_object_or_404(Game, id=game_id)
-    player = get_object_or_404(Player, user=request.user, game=game)
+    get_object_or_404(Player, user=request.user, game=game)
     
     try:
         data = json.loads(request.body)
@@ -1358,82 +1287,15 @@ def buy_card(request, game_id):
     except (json.JSONDecodeError, ValueError):
         quantity = 1
 
-    # Validaciones
+    # Validación rápida; purchase_cards la repite con las filas bloqueadas
     if game.is_started:
         return JsonResponse({'success': False, 'error': 'El juego ya ha comenzado'}, status=400)
     
-    if (len(player.cards) + quantity) > game.max_cards_per_player:
-        return JsonResponse({'success': False, 'error': f'No puedes comprar {quantity} cartones. Excederías el límite de {game.max_cards_per_player} por jugador.'}, status=400)
-    
-    total_cost = game.card_price * quantity
-    if request.user.credit_balance < total_cost:
-        return JsonResponse({'success': False, 'error': f'Saldo insuficiente. Necesitas {total_cost} créditos.'}, status=400)
-    
     try:
-        with transaction.atomic():
-            # Generar nuevos cartones
-            new_cards = [generate_bingo_card() for _ in range(quantity)]
-            player.cards.extend(new_cards)
-            player.save()
-            
-            # Descontar créditos
-            request.user.credit_balance -= total_cost
-            request.user.save()
-            
-            # Registrar transacción
-            Transaction.objects.create(
-                user=request.user,
-                amount=-total_cost,
-                transaction_type='PURCHASE',
-                description=f"Compra de {quantity} cartón(es) para partida: {game.name}",
-                related_game=game
-            )
-            
-            # Actualizar saldo bloqueado del juego (held_balance)
-            game.held_balance += total_cost
-            
-            # Actualizar estadísticas del juego
-            game.total_cards_sold += quantity
-            game.save()
-            
-            # Verificar premio progresivo
-            prize_increase = game.check_progressive_prize()
-            
-            response_data = {
-                'success': True,
-                'new_balance': float(request.user.credit_balance),
-                'player_cards_count': len(player.cards),
-                'new_cards': new_cards,
-                'prize_increased': prize_increase > 0,
-                'new_prize': float(game.prize),
-                'increase_amount': float(prize_increase) if prize_increase > 0 else 0,
-                'total_cards_sold': game.total_cards_sold,
-                'max_cards_sold': game.max_cards_sold,
-                'next_prize_target': game.next_prize_target,
-                'progress_percentage': game.progress_percentage
-            }
-            
-            # Notificar a otros jugadores via WebSocket
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f'game_{game.id}',
-                {
-                    'type': 'card_purchased',
-                    'user': request.user.username,
-                    'new_cards': new_cards,
-                    'prize_increased': prize_increase > 0,
-                    'sound_type': 'credit_purchase',
-                    'new_prize': float(game.prize),
-                    'increase_amount': float(prize_increase) if prize_increase > 0 else 0,
-                    'total_cards_sold': game.total_cards_sold,
-                    'max_cards_sold': game.max_cards_sold,
-                    'next_prize_target': game.next_prize_target,
-                    'progress_percentage': game.progress_percentage
-                }
-            )
-            
-            return JsonResponse(response_data)
-            
+        response_data = purchase_cards(request.user, game.id, quantity)
+        return JsonResponse(response_data)
+    except CardPurchaseError as e:
+        return JsonResponse({'success': False, 'error': e.message}, status=e.status)
     except Exception as e:
         logger.error(f"Error en compra de cartón: {str(e)}")
         return JsonResponse({
@@ -1628,6 +1490,7 @@ def mark_number(request, game_id):
     if number == 0:
         return JsonResponse({'success': False, 'error': 'La casilla libre ya está marcada automáticamente'}, status=400)
 
+    apply_live_state(game)
     if number not in game.called_numbers:
         return JsonResponse({'success': False, 'error': 'Solo puedes marcar números ya llamados'}, status=400)
 
@@ -1668,10 +1531,14 @@ def message_list_api(request):
     except User.DoesNotExist:
         return JsonResponse({'error': 'User not found'}, status=404)
     
-    messages = Message.objects.filter(
-        Q(sender=request.user, recipient=other_user) |
-        Q(sender=other_user, recipient=request.user)
-    ).order_by('timestamp')
+    # Página más reciente de la conversación; ?cursor=<next_cursor> trae los mensajes anteriores
+    conversation = find_conversation(request.user.id, other_user.id)
+    if conversation is None:
+        return JsonResponse({'messages': [], 'next_cursor': None, 'has_more': False})
+    try:
+        page = conversation_page(conversation, request.GET.get('cursor'), page_size_from(request, MESSAGE_PAGE_SIZE))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
     
     messages_data = [{
         'id': msg.id,
@@ -1684,9 +1551,9 @@ def message_list_api(request):
         'content': msg.content,
         'timestamp': msg.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
         'is_read': msg.is_read
-    } for msg in messages]
+    } for msg in reversed(page.items)]  # en orden cronológico para mostrarlos
     
-    return JsonResponse({'messages': messages_data})
+    return JsonResponse({'messages': messages_data, 'next_cursor': page.next_cursor, 'has_more': page.has_next})
 
 @login_required
 @require_http_methods(["POST"])
@@ -1695,11 +1562,7 @@ def send_message_api(request):
         data = json.loads(request.body)
         recipient = User.objects.get(id=data.get('recipient_id'))
         
-        message = Message.objects.create(
-            sender=request.user,
-            recipient=recipient,
-            content=data.get('content', '')
-        )
+        message = send_private_message(request.user, recipient, data.get('content', ''))
 
         # --- INICIO DE LA CORRECCIÓN ---
         # Notificar al destinatario en tiempo real
@@ -1741,12 +1604,8 @@ def send_message_api(request):
 
 @login_required
 def unread_count_api(request):
-    total_unread = Message.objects.filter(
-        recipient=request.user,
-        is_read=False
-    ).count()
-    
-    return JsonResponse({'unread_count': total_unread})
+    # Suma de los contadores por conversación, sin contar los mensajes
+    return JsonResponse({'unread_count': unread_message_count(request.user)})
 
 @login_required
 @require_http_methods(["POST"])
@@ -1760,59 +1619,23 @@ def mark_conversation_read_api(request):
     except User.DoesNotExist:
         return JsonResponse({'error': 'User not found'}, status=404)
     
-    Message.objects.filter(
-        sender=sender,
-        recipient=request.user,
-        is_read=False
-    ).update(is_read=True)
+    # Marca los mensajes, la bandeja de notificaciones y el contador de la conversación
+    mark_conversation_read(request.user, sender.id)
     
     return JsonResponse({'status': 'success'})
 
 @login_required
 def messaging(request):
-    # Get all users except current user
-    all_users = User.objects.exclude(id=request.user.id)
-    
-    # Get existing conversations
-    user_messages = Message.objects.filter(
-        Q(sender=request.user) | Q(recipient=request.user)
-    )
-    
-    # Get user IDs with conversations
-    user_ids_with_chats = set()
-    for message in user_messages:
-        if message.sender != request.user:
-            user_ids_with_chats.add(message.sender.id)
-        if message.recipient != request.user:
-            user_ids_with_chats.add(message.recipient.id)
-    
-    # Separate users with and without conversations
-    users_with_chats = User.objects.filter(id__in=user_ids_with_chats)
-    users_without_chats = all_users.exclude(id__in=user_ids_with_chats)
-    
-    # Prepare conversation data
-    conversations = []
-    for user in users_with_chats:
-        last_message = Message.objects.filter(
-            Q(sender=request.user, recipient=user) |
-            Q(sender=user, recipient=request.user)
-        ).order_by('-timestamp').first()
-        
-        unread_count = Message.objects.filter(
-            sender=user,
-            recipient=request.user,
-            is_read=False
-        ).count()
-        
-        conversations.append({
-            'other_user': user,
-            'last_message': last_message.content if last_message else '',
-            'unread_count': unread_count,
-            'last_message_time': last_message.timestamp if last_message else None
-        })
+    # Conversaciones con el otro usuario, el último mensaje y los no leídos en una consulta
+    conversations = [{
+        'other_user': conversation.other_user,
+        'last_message': conversation.last_message.content if conversation.last_message else '',
+        'unread_count': conversation.unread_count,
+        'last_message_time': conversation.last_message_at
+    } for conversation in user_conversations(request.user)]
+    user_ids_with_chats = [conversation['other_user'].id for conversation in conversations]
     
-    # Sort conversations by last message
-    conversations.sort(key=lambda x: x['last_message_time'] or datetime.min, reverse=True)
+    users_without_chats = User.objects.exclude(id=request.user.id).exclude(id__in=user_ids_with_chats)
     
     return render(request, 'bingo_app/messaging.html', {
         'conversations': conversations,
@@ -1857,6 +1680,7 @@ def create_raffle(request):
                     raffle.save()
 
                     # Notify lobby
+                    invalidate_lobby_cache(raffle.franchise_id)
                     channel_layer = get_channel_layer()
                     html = render_to_string('bingo_app/partials/raffle_card.html', {'raffle': raffle})
                     async_to_sync(channel_layer.group_send)(
@@ -1930,13 +1754,10 @@ def raffle_lobby(request):
 @login_required
 def raffle_detail(request, raffle_id):
     raffle = get_object_or_404(Raffle, id=raffle_id)
-    percentage_settings = PercentageSettings.objects.first()
+    percentage_settings = get_percentage_settings()
     
-    # Preparar datos de tickets
-    tickets_dict = {t.number: t for t in raffle.tickets.select_related('owner')}
-    user_tickets = raffle.tickets.filter(owner=request.user)
-    available_numbers = list(range(raffle.start_number, raffle.end_number + 1))
-    sold_numbers = list(tickets_dict.keys())
+    # Tickets del usuario; los vendidos salen del índice de la rifa (utils.raffle_tickets)
+    user_tickets = list(raffle.tickets.filter(owner=request.user).order_by('number'))
     
     # Manejar compra de tickets
     if request.method == 'POST' and raffle.status == 'WAITING':
@@ -1944,58 +1765,19 @@ def raffle_detail(request, raffle_id):
         if form.is_valid():
             number = form.cleaned_data['number']
             
-            if number not in available_numbers:
+            if not (raffle.start_number <= number <= raffle.end_number):
                 messages.error(request, 'Número fuera de rango')
-            elif number in sold_numbers:
+            elif number_is_sold(raffle, number):
                 messages.error(request, 'Este número ya está comprado')
             elif request.user.credit_balance < raffle.ticket_price:
                 messages.error(request, 'Saldo insuficiente')
             else:
                 try:
-                    with transaction.atomic():
-                        # Crear ticket
-                        Ticket.objects.create(
-                            raffle=raffle,
-                            number=number,
-                            owner=request.user
-                        )
-                        
-                        # Descontar créditos
-                        request.user.credit_balance -= raffle.ticket_price
-                        request.user.save()
-                        
-                        # Registrar transacción
-                        Transaction.objects.create(
-                            user=request.user,
-                            amount=-raffle.ticket_price,
-                            transaction_type='PURCHASE',
-                            description=f"Ticket #{number} para rifa: {raffle.title}",
-                            related_game=None
-                        )
-                        
-                        channel_layer = get_channel_layer()
-                        sold_count = raffle.tickets.count()
-                        progress_percentage = (sold_count / raffle.total_tickets) * 100 if raffle.total_tickets else 0
-                        buyer_username = request.user.username
-
-                        transaction.on_commit(lambda channel_layer=channel_layer, raffle_id=raffle.id, number=number, buyer=buyer_username, progress=progress_percentage, sold_count=sold_count: async_to_sync(channel_layer.group_send)(
-                            f"raffle_{raffle_id}",
-                            {
-                                'type': 'ticket_purchased',
-                                'number': number,
-                                'numbers': [number],
-                                'buyer': buyer,
-                                'progress_percentage': progress,
-                                'total_tickets_sold': sold_count
-                            }
-                        ))
-
-                        
-                        messages.success(request, f'¡Has comprado el ticket #{number}!')
-                        
-                        # Verificar si la rifa debe cambiar de estado
-                        check_raffle_progress(raffle)
-                        
+                    result = purchase_tickets(request.user, raffle.id, [number])
+                    raffle.sold_count = result['total_tickets_sold']
+                    messages.success(request, f'¡Has comprado el ticket #{number}!')
+                except (TicketsUnavailable, TicketPurchaseError) as e:
+                    messages.error(request, str(e))
                 except Exception as e:
                     messages.error(request, f'Error al comprar ticket: {str(e)}')
             
@@ -2007,20 +1789,23 @@ def raffle_detail(request, raffle_id):
     if request.method == 'POST' and 'draw_raffle' in request.POST and request.user == raffle.organizer:
         if raffle.status != 'WAITING' and raffle.status != 'IN_PROGRESS':
             messages.error(request, 'Esta rifa ya ha sido sorteada')
-        elif not tickets_dict:
+        elif not raffle.sold_count:
             messages.error(request, 'No hay tickets vendidos para sortear')
         else:
             try:
                 with transaction.atomic():
-                    # Seleccionar ganador aleatorio
-                    winning_number = random.choice(list(tickets_dict.keys()))
-                    winner = tickets_dict[winning_number].owner
+                    # Seleccionar ganador aleatorio entre los números vendidos
+                    winning_number = random.choice(
+                        sold_numbers_in_window(raffle, raffle.start_number, raffle.end_number)
+                    )
+                    winner = raffle.tickets.select_related('owner').get(number=winning_number).owner
                     
                     # Actualizar rifa
                     raffle.winning_number = winning_number
                     raffle.winner = winner
                     raffle.status = 'FINISHED'
                     raffle.save()
+                    refresh_event_stats(raffle.organizer_id)
                     
                     # Premiar al ganador
                     winner.credit_balance += raffle.prize
@@ -2055,14 +1840,19 @@ def raffle_detail(request, raffle_id):
     # Get all video call groups for this raffle
     video_groups = VideoCallGroup.objects.filter(raffle=raffle)
     
+    # Solo la ventana visible de la cuadrícula; el resto se pide a raffle_numbers_api
+    window_first, window_last = grid_window(raffle, _int_param(request.GET.get('desde')))
+    grid = grid_state(raffle, window_first, window_last, [t.number for t in user_tickets])
+    
     return render(request, 'bingo_app/raffle_detail.html', {
         'raffle': raffle,
         'user_tickets': user_tickets,
-        'available_numbers': available_numbers,
-        'sold_numbers': sold_numbers,
-        'tickets_dict': tickets_dict,
+        'grid_cells': grid_cells(raffle, grid),
+        'grid_window_size': RAFFLE_GRID_WINDOW,
+        'grid_prev': window_first - RAFFLE_GRID_WINDOW if window_first > raffle.start_number else None,
+        'grid_next': window_last + 1 if window_last < raffle.end_number else None,
         'form': form,
-        'progress_percentage': (len(sold_numbers) / raffle.total_tickets) * 100,
+        'progress_percentage': raffle.progress_percentage,
         'video_groups': video_groups,
         'agora_app_id': settings.AGORA_APP_ID,
     })
@@ -2087,21 +1877,97 @@ def percentage_settings(request):
         'settings': settings
     })
 
+TRANSACTION_CSV_HEADER = ['id', 'fecha', 'usuario', 'tipo', 'monto', 'partida_id', 'partida', 'descripcion']
+
+
 @staff_member_required
 def transaction_history(request, user_id=None):
     transactions = Transaction.objects.all()
     
     if user_id:
         transactions = transactions.filter(user__id=user_id)
+
+    filter_form = TransactionFilterForm(request.GET or None)
+    transactions = filter_form.filter(transactions)
+
+    if request.GET.get('export') == 'csv':
+        # values_list + iterator(): sin instancias de modelo ni caché del queryset
+        rows = transactions.order_by('-created_at', '-id').values_list(
+            'id', 'created_at', 'user__username', 'transaction_type', 'amount',
+            'related_game_id', 'related_game__name', 'description',
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return csv_response(f"transacciones_{timezone.now():%Y%m%d_%H%M}.csv", TRANSACTION_CSV_HEADER, rows)
+
+    transactions = transactions.select_related('user', 'related_game')
+    per_page = page_size_from(request)
+    try:
+        page = keyset_paginate(transactions, request.GET.get('cursor'), per_page)
+    except InvalidCursor:
+        messages.error(request, 'El enlace de paginación no es válido; se muestra la primera página.')
+        page = keyset_paginate(transactions, None, per_page)
+
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    query.pop('export', None)
     
     return render(request, 'bingo_app/admin/transaction_history.html', {
-        'transactions': transactions.order_by('-created_at')
+        'transactions': page,
+        'page': page,
+        'filter_form': filter_form,
+        'filter_query': query.urlencode(),
+        'history_user': User.objects.filter(id=user_id).first() if user_id else None,
+    })
+
+
+@staff_member_required
+def ledger_export(request, dataset):
+    """Exportación contable en streaming: ?format=csv|jsonl&franchise=&date_from=&date_to="""
+    if dataset not in EXPORT_DATASETS:
+        raise Http404("Conjunto de exportación desconocido")
+    form = LedgerExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+
+    data = form.cleaned_data
+    start, end = day_bounds(data['date_from'], data['date_to'])
+    lines = iter_export(dataset, data['format'], data['franchise'], start, end)
+    content_type = 'application/x-ndjson; charset=utf-8' if data['format'] == 'jsonl' else 'text/csv; charset=utf-8'
+    # Generador asíncrono: bajo ASGI el archivo sale por bloques y no se arma en memoria
+    response = StreamingHttpResponse(aiter_chunks(lines), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{dataset}_{timezone.now():%Y%m%d_%H%M}.{data["format"]}"'
+    return response
+
+
+def _int_param(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@login_required
+def raffle_numbers_api(request, raffle_id):
+    """Ventana de la cuadrícula de números: ?desde=<número>&cantidad=<tamaño>"""
+    raffle = get_object_or_404(Raffle, id=raffle_id)
+    first, last = grid_window(raffle, _int_param(request.GET.get('desde')),
+                              _int_param(request.GET.get('cantidad')) or RAFFLE_GRID_WINDOW)
+    user_numbers = raffle.tickets.filter(
+        owner=request.user, number__gte=first, number__lte=last
+    ).values_list('number', flat=True)
+    return JsonResponse({
+        **grid_state(raffle, first, last, user_numbers),
+        'start_number': raffle.start_number,
+        'end_number': raffle.end_number,
+        'digits': raffle.number_format_digits,
+        'status': raffle.status,
+        'sold_count': raffle.sold_count,
+        'total_tickets': raffle.total_tickets,
     })
 
 
 def check_raffle_progress(raffle):
     """Verifica el progreso de la rifa y actualiza el estado si es necesario"""
-    sold_count = raffle.tickets.count()
+    sold_count = raffle.sold_count
     if sold_count >= raffle.total_tickets * 0.5 and raffle.status == 'WAITING':
         raffle.status = 'IN_PROGRESS'
         raffle.save()
@@ -2110,7 +1976,7 @@ def check_raffle_progress(raffle):
 @login_required
 def draw_raffle(request, raffle_id):
     raffle = get_object_or_404(Raffle, id=raffle_id)
-    percentage_settings = PercentageSettings.objects.first()
+    percentage_settings = get_percentage_settings()
     
     # Validaciones
     if request.user != raffle.organizer:
@@ -2121,7 +1987,7 @@ def draw_raffle(request, raffle_id):
         messages.error(request, "Esta rifa ya terminó")
         return redirect('raffle_detail', raffle_id=raffle.id)
     
-    if not raffle.tickets.exists():
+    if not raffle.sold_count:
         messages.error(request, "No hay tickets vendidos")
         return redirect('raffle_detail', raffle_id=raffle.id)
     
@@ -2129,12 +1995,13 @@ def draw_raffle(request, raffle_id):
         with transaction.atomic():
             # 1. Seleccionar ganador con select_for_update para bloquear el registro
             winning_ticket = Ticket.objects.select_related('owner').select_for_update().get(
-                id=random.choice([t.id for t in raffle.tickets.all()])
+                raffle=raffle,
+                number=random.choice(sold_numbers_in_window(raffle, raffle.start_number, raffle.end_number))
             )
             winner = winning_ticket.owner
             
             # 2. Calcular valores
-            total_tickets_income = raffle.ticket_price * raffle.tickets.count()
+            total_tickets_income = raffle.ticket_price * raffle.sold_count
             # El ganador recibe el 100% del premio
             player_prize = raffle.prize
             
@@ -2208,6 +2075,7 @@ def draw_raffle(request, raffle_id):
             raffle.final_prize = player_prize
             raffle.tickets_income = total_tickets_income
             raffle.save()
+            refresh_event_stats(raffle.organizer_id)
 
             request.session['show_win_notification'] = {
                     'message': f"¡GANASTE LA RIFA! Premio: {raffle.prize} créditos",
@@ -2233,7 +2101,7 @@ def draw_raffle(request, raffle_id):
 @login_required
 def request_withdrawal(request):
     # Verificar si el sistema de retiro de créditos está habilitado
-    settings_obj = PercentageSettings.objects.first()
+    settings_obj = get_percentage_settings()
     if not settings_obj or not settings_obj.credits_withdrawal_enabled:
         messages.error(request, 'El sistema de retiro de créditos está temporalmente deshabilitado.')
         return redirect('profile')
@@ -2462,32 +2330,28 @@ def call_number(request, game_id):
         if number < 1 or number > 90:
             return JsonResponse({'success': False, 'error': 'Número fuera de rango'}, status=400)
             
-        if number in game.called_numbers:
+        # Registrar en el estado vivo; Game se persiste por lotes
+        store = get_live_state_store()
+        if store.call_number(game, number=number) is None:
             return JsonResponse({'success': False, 'error': 'Número ya llamado'}, status=400)
-            
-        game.current_number = number
-        game.called_numbers.append(number)
-        game.save()
+        apply_live_state(game, store=store)
+        flush_live_state(game, store=store)
         
         # Verificar si algún jugador ha ganado - buscar TODOS los ganadores
-        winners = []
-        for player in game.player_set.all():
-            if player.check_bingo():
-                winners.append(player.user)
+        winners = [player.user for player in find_game_winners(game)]
         
         # Notificar via WebSocket
         channel_layer = get_channel_layer()
         winner = winners[0] if winners else None
         async_to_sync(channel_layer.group_send)(
             f'game_{game.id}',
-            {
-                'type': 'number_called',
-                'number': number,
-                'called_numbers': game.called_numbers,
-                'is_manual': True,
-                'has_winner': winner is not None,
-                'winner': winner.username if winner else None
-            }
+            number_called_event(
+                number,
+                len(game.called_numbers),
+                is_manual=True,
+                has_winner=winner is not None,
+                winner=winner.username if winner else None,
+            )
         )
         
         # Si hay ganadores, finalizar el juego (esto activará la distribución de premios entre TODOS los ganadores)
@@ -2597,7 +2461,7 @@ def toggle_payment_method(request, method_id):
 @login_required
 def notifications(request):
 
-    request.user.credit_notifications.filter(is_read=False).update(is_read=True)
+    mark_read(request.user.credit_notifications.filter(is_read=False))
 
     unread_notifications = request.user.credit_notifications.filter(is_read=False)
     read_notifications = request.user.credit_notifications.filter(is_read=True)[:10]
@@ -2702,11 +2566,27 @@ def unblock_user(request, user_id):
 
 @staff_member_required
 def user_management(request):
-    users = User.objects.all().order_by('-date_joined')
-    blocked_users = User.objects.filter(is_blocked=True)
+    users = User.objects.all()
+    search = request.GET.get('q', '').strip()
+    if search:
+        users = users.filter(username__istartswith=search)
+
+    per_page = page_size_from(request)
+    try:
+        page = keyset_paginate(users, request.GET.get('cursor'), per_page, field='date_joined')
+    except InvalidCursor:
+        messages.error(request, 'El enlace de paginación no es válido; se muestra la primera página.')
+        page = keyset_paginate(users, None, per_page, field='date_joined')
+    blocked_users = User.objects.filter(is_blocked=True).select_related('blocked_by').order_by('-blocked_at')
+
+    query = request.GET.copy()
+    query.pop('cursor', None)
     
     return render(request, 'bingo_app/admin/user_management.html', {
-        'users': users,
+        'users': page,
+        'page': page,
+        'search': search,
+        'filter_query': query.urlencode(),
         'blocked_users': blocked_users
     })
 
@@ -2725,8 +2605,7 @@ def mark_as_read(request):
 
         if notification_type == 'message':
             notification = get_object_or_404(Message, id=notification_id, recipient=request.user)
-            notification.is_read = True
-            notification.save()
+            mark_messages_read(request.user, Message.objects.filter(id=notification.id))
             redirect_url = reverse('messaging') + f'?user_id={notification.sender.id}'
         
         elif notification_type == 'credit_request_notification':
@@ -2752,7 +2631,12 @@ def mark_as_read(request):
         else:
             return JsonResponse({'status': 'error', 'message': 'Invalid notification type'}, status=400)
 
-        return JsonResponse({'status': 'success', 'redirect_url': redirect_url})
+        # El contador ya se ajustó al guardar (signals.py); se devuelve para actualizar la campana
+        return JsonResponse({
+            'status': 'success',
+            'redirect_url': redirect_url,
+            'unread_count': get_unread_count(request.user.id),
+        })
 
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
@@ -2771,17 +2655,16 @@ def buy_multiple_tickets(request, raffle_id):
         if not isinstance(numbers_to_buy, list) or not numbers_to_buy:
             return JsonResponse({'success': False, 'error': 'No se seleccionaron números.'})
         
-        numbers_to_buy = [int(n) for n in numbers_to_buy]
+        numbers_to_buy = list(dict.fromkeys(int(n) for n in numbers_to_buy))
 
     except (json.JSONDecodeError, ValueError):
         return JsonResponse({'success': False, 'error': 'Solicitud inválida.'}, status=400)
 
-    sold_numbers = set(raffle.tickets.values_list('number', flat=True))
     errors = []
     for number in numbers_to_buy:
         if not (raffle.start_number <= number <= raffle.end_number):
             errors.append(f'El número {number} está fuera de rango.')
-        if number in sold_numbers:
+        elif number_is_sold(raffle, number):
             errors.append(f'El número {number} ya fue vendido.')
     
     if errors:
@@ -2792,57 +2675,12 @@ def buy_multiple_tickets(request, raffle_id):
         return JsonResponse({'success': False, 'error': f'Saldo insuficiente. Necesitas {total_cost} créditos.'})
 
     try:
-        with transaction.atomic():
-            user = User.objects.select_for_update().get(pk=request.user.pk)
-            
-            if user.credit_balance < total_cost:
-                raise ValueError("Saldo insuficiente.")
-
-            user.credit_balance -= total_cost
-            user.save()
-
-            for number in numbers_to_buy:
-                Ticket.objects.create(
-                    raffle=raffle,
-                    number=number,
-                    owner=user
-                )
-                Transaction.objects.create(
-                    user=user,
-                    amount=-raffle.ticket_price,
-                    transaction_type='PURCHASE',
-                    description=f"Ticket #{number} para rifa: {raffle.title}"
-                )
-            
-            raffle.held_balance += total_cost
-            raffle.save() # Save raffle to update held_balance
-
-            check_raffle_progress(raffle)
-
-            channel_layer = get_channel_layer()
-            sold_count = raffle.tickets.count()
-            progress_percentage = (sold_count / raffle.total_tickets) * 100 if raffle.total_tickets else 0
-            buyer_username = user.username
-            purchased_numbers = tuple(numbers_to_buy)
-
-            def notify_raffle_purchase():
-                async_to_sync(channel_layer.group_send)(
-                    f"raffle_{raffle.id}",
-                    {
-                        'type': 'ticket_purchased',
-                        'numbers': list(purchased_numbers),
-                        'buyer': buyer_username,
-                        'progress_percentage': progress_percentage,
-                        'total_tickets_sold': sold_count
-                    }
-                )
-
-            transaction.on_commit(notify_raffle_purchase)
-
-        return JsonResponse({'success': True, 'tickets_bought': len(numbers_to_buy)})
-
-    except ValueError as e:
-         return JsonResponse({'success': False, 'error': str(e)})
+        # Un bloqueo, un débito, un bulk_create y un solo asiento PURCHASE (utils.ticket_purchase)
+        return JsonResponse(purchase_tickets(request.user, raffle.id, numbers_to_buy))
+    except TicketsUnavailable as e:
+        return JsonResponse({'success': False, 'error': str(e), 'sold': e.sold})
+    except TicketPurchaseError as e:
+        return JsonResponse({'success': False, 'error': e.message})
     except Exception as e:
         logger.error(f"Error en compra múltiple de rifa: {str(e)}")
         return JsonResponse({'success': False, 'error': 'Ocurrió un error inesperado al procesar la compra.'})
@@ -2965,19 +2803,17 @@ def generate_printable_cards(request):
     if request.method == 'POST':
         try:
             quantity = int(request.POST.get('quantity', '10'))
-            if not (1 <= quantity <= 1000): # Basic validation
-                messages.error(request, "La cantidad debe estar entre 1 y 1000.")
+            if not (1 <= quantity <= PRINTABLE_CARDS_MAX_BATCH): # Basic validation
+                messages.error(request, f"La cantidad debe estar entre 1 y {PRINTABLE_CARDS_MAX_BATCH}.")
                 return redirect('manage_printable_cards')
 
-            new_cards = []
-            for _ in range(quantity):
-                card_data = generate_bingo_card() # Re-use the existing function
-                unique_id = f"P-{uuid.uuid4().hex[:8].upper()}"
-                new_cards.append(
-                    PrintableCard(unique_id=unique_id, card_data=card_data)
-                )
+            # Generación en bloque: cartones únicos dentro del lote
+            new_cards = [
+                PrintableCard(unique_id=f"P-{uuid.uuid4().hex[:12].upper()}", card_data=card_data)
+                for card_data in generate_cards(quantity)
+            ]
             
-            PrintableCard.objects.bulk_create(new_cards)
+            PrintableCard.objects.bulk_create(new_cards, batch_size=2000)
             
             messages.success(request, f"Se generaron {quantity} nuevos cartones imprimibles.")
         except (ValueError, TypeError):
@@ -3041,7 +2877,7 @@ def activate_printable_card(request, game_id):
 
             with transaction.atomic():
                 # Get percentage settings for distribution
-                percentage_settings = PercentageSettings.objects.first()
+                percentage_settings = get_percentage_settings()
                 if not percentage_settings:
                     messages.error(request, "Configuración del sistema no encontrada.")
                     return redirect('game_room', game_id=game.id)
@@ -3109,23 +2945,14 @@ def activate_printable_card(request, game_id):
                                 related_game=game
                             )
 
-                # Notify via channels
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    f'game_{game.id}',
-                    {
-                        'type': 'card_purchased',
-                        'user': user.username,
-                        'new_balance': float(user.credit_balance),
-                        'player_cards_count': len(player.cards),
-                        'new_cards': [card.card_data],
-                        'nueva_tarjeta': [card.card_data], # Fix for deployment key error
-                        'prize_increased': prize_increase > 0,
-                        'new_prize': float(game.prize),
-                        'total_cards_sold': game.total_cards_sold,
-                        'next_prize_target': game.next_prize_target,
-                        'progress_percentage': game.progress_percentage
-                    }
+                # Notify via channels: progreso agrupado para la sala, cartón solo al jugador
+                transaction.on_commit(lambda: progress_aggregator.add(game.id, 1))
+                transaction.on_commit(
+                    lambda: send_cards_to_buyer(
+                        game.id, user.id, uuid.uuid4().hex, [card.card_data],
+                        len(player.cards), user.credit_balance,
+                    ),
+                    robust=True,
                 )
 
                 messages.success(request, f"Cartón {card.unique_id} activado para {user.username}.")
@@ -3139,8 +2966,6 @@ def activate_printable_card(request, game_id):
 
     return redirect('game_room', game_id=game.id)
 
-from django.http import Http404
-
 @login_required
 def print_printable_card(request, card_id):
     card = get_object_or_404(PrintableCard, unique_id=card_id)
@@ -3243,7 +3068,7 @@ def create_promotion(request):
         return redirect('lobby')
 
     # Obtener la configuración de precios de promoción
-    percentage_settings = PercentageSettings.objects.first()
+    percentage_settings = get_percentage_settings()
     if not percentage_settings:
         messages.error(request, "La configuración de precios de promoción no está disponible. Contacta al administrador.")
         return redirect('lobby')
@@ -3412,55 +3237,41 @@ def _get_admin_dashboard_context_mejorado(start_date=None, end_date=None):
     # Filtros de fecha - por defecto últimos 30 días
     date_filter = Q()
     if start_date:
-        date_filter &= Q(created_at__gte=start_date)
+        range_start = start_date
     else:
         # Si no hay fecha de inicio, usar últimos 30 días por defecto
-        thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-        date_filter &= Q(created_at__gte=thirty_days_ago)
+        range_start = timezone.now() - timezone.timedelta(days=30)
+    date_filter &= Q(created_at__gte=range_start)
     
+    range_end = None
     if end_date:
-        end_date_plus_one = end_date + timezone.timedelta(days=1)
-        date_filter &= Q(created_at__lt=end_date_plus_one)
+        range_end = end_date + timezone.timedelta(days=1)
+        date_filter &= Q(created_at__lt=range_end)
+
+    # Totales del libro desde los rollups por hora (utils.ledger_rollups): mismos
+    # números que sumar Transaction en el rango, sin escanear toda la tabla
+    ledger = ledger_totals(range_start, range_end)
+    platform_revenue_types = ['PLATFORM_COMMISSION', 'GAME_CREATION_FEE', 'RAFFLE_CREATION_FEE']
 
     # ===== MÉTRICAS FINANCIERAS CORREGIDAS =====
     
     # 1. Ingresos Totales de la Plataforma (CORREGIDO)
-    platform_revenue = Transaction.objects.filter(
-        transaction_type__in=[
-            'PLATFORM_COMMISSION',
-            'GAME_CREATION_FEE', 
-            'RAFFLE_CREATION_FEE'
-        ],
-        amount__gt=0
-    ).filter(date_filter).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
+    platform_revenue = ledger.sum('positive_amount', types=platform_revenue_types)
     
     # Agregar ingresos por promociones/anuncios (transacciones OTHER negativas del usuario = ingresos para la plataforma)
-    promotion_revenue = Transaction.objects.filter(
-        transaction_type='OTHER',
-        amount__lt=0,  # Negativas para el usuario = positivas para la plataforma
-        description__icontains='promoción'
-    ).filter(date_filter).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
+    promotion_revenue = ledger.sum('negative_amount', types=['OTHER'], promotion=True)
     promotion_revenue = abs(promotion_revenue)  # Convertir a positivo
     
     platform_revenue += promotion_revenue
 
     # 2. Créditos Asignados por Administradores
-    credits_added = Transaction.objects.filter(
-        transaction_type='ADMIN_ADD',
-        amount__gt=0
-    ).filter(date_filter).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
+    credits_added = ledger.sum('positive_amount', types=['ADMIN_ADD'])
 
     # 3. Premios Pagados (mantener cálculo actual)
-    prizes_paid = Transaction.objects.filter(
-        transaction_type='PRIZE',
-        amount__gt=0
-    ).filter(date_filter).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
-
-    # 4. Retiros Procesados
-    withdrawals_processed = Transaction.objects.filter(
-        transaction_type='WITHDRAWAL',
-        amount__lt=0  # Los retiros son negativos
-    ).filter(date_filter).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
+    prizes_paid = ledger.sum('positive_amount', types=['PRIZE'])
+
+    # 4. Retiros Procesados (los retiros son negativos)
+    withdrawals_processed = ledger.sum('negative_amount', types=['WITHDRAWAL'])
     withdrawals_processed = abs(withdrawals_processed)  # Convertir a positivo para mostrar
 
     # 5. Ganancia Neta de la Plataforma (CORREGIDO)
@@ -3469,11 +3280,10 @@ def _get_admin_dashboard_context_mejorado(start_date=None, end_date=None):
 
     # ===== MÉTRICAS DE LIQUIDEZ =====
     
-    # Saldo Total en Circulación
-    total_balance = User.objects.aggregate(Sum('credit_balance'))['credit_balance__sum'] or Decimal('0.00')
-    
-    # Saldo Total Bloqueado
-    total_blocked = User.objects.aggregate(Sum('blocked_credits'))['blocked_credits__sum'] or Decimal('0.00')
+    # Saldo Total en Circulación y Saldo Total Bloqueado (una sola pasada por User)
+    balances = User.objects.aggregate(Sum('credit_balance'), Sum('blocked_credits'))
+    total_balance = balances['credit_balance__sum'] or Decimal('0.00')
+    total_blocked = balances['blocked_credits__sum'] or Decimal('0.00')
     
     # Saldo en Escrow (juegos activos)
     total_escrow = Game.objects.filter(
@@ -3503,11 +3313,11 @@ def _get_admin_dashboard_context_mejorado(start_date=None, end_date=None):
     # ===== MÉTRICAS DE RENDIMIENTO =====
     
     # Comisión Promedio por Juego
-    avg_commission = Transaction.objects.filter(
-        transaction_type='PLATFORM_COMMISSION'
-    ).filter(date_filter).aggregate(
-        avg_amount=Avg('amount')
-    )['avg_amount'] or Decimal('0.00')
+    commission_count = ledger.sum('count', types=['PLATFORM_COMMISSION'])
+    avg_commission = (
+        ledger.sum('total_amount', types=['PLATFORM_COMMISSION']) / commission_count
+        if commission_count else Decimal('0.00')
+    )
     
     # Juegos Completados
     completed_games = Game.objects.filter(
@@ -3546,18 +3356,13 @@ def _get_admin_dashboard_context_mejorado(start_date=None, end_date=None):
     # ===== MÉTRICAS FINANCIERAS AVANZADAS =====
     
     # Calcular ingresos del sistema (transacciones negativas = ingresos) - optimizado
-    income_total = Transaction.objects.filter(
-        amount__lt=0
-    ).filter(date_filter).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
+    income_total = ledger.sum('negative_amount')
     
     # Entradas vs Salidas por día
     # Las compras aparecen como negativas, pero son ingresos para el sistema
     daily_income = abs(income_total)
     
-    daily_expenses = Transaction.objects.filter(
-        transaction_type__in=['PRIZE', 'WITHDRAWAL', 'REFUND'],
-        amount__lt=0
-    ).filter(date_filter).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
+    daily_expenses = ledger.sum('negative_amount', types=['PRIZE', 'WITHDRAWAL', 'REFUND'])
     daily_expenses = abs(daily_expenses)  # Convertir a positivo
     
     # Balance del sistema
@@ -3582,10 +3387,7 @@ def _get_admin_dashboard_context_mejorado(start_date=None, end_date=None):
     ).count()
     
     # Transacciones sospechosas (monto > $500)
-    suspicious_transactions = Transaction.objects.filter(
-        amount__gt=500,
-        created_at__gte=week_ago
-    ).count()
+    suspicious_transactions = ledger_totals(week_ago).sum('large_count')
     
     # Tiempo promedio de procesamiento de retiros (en horas)
     avg_withdrawal_time = WithdrawalRequest.objects.filter(
@@ -3608,25 +3410,8 @@ def _get_admin_dashboard_context_mejorado(start_date=None, end_date=None):
     if not chart_start_date:
         chart_start_date = timezone.now().date() - timezone.timedelta(days=30)
     
-    chart_date_filter = Q(created_at__gte=chart_start_date)
-    if end_date:
-        chart_date_filter &= Q(created_at__lt=end_date + timezone.timedelta(days=1))
-
     # Ingresos de la plataforma por día
-    revenue_by_day = (
-        Transaction.objects.filter(
-            transaction_type__in=[
-                'PLATFORM_COMMISSION',
-                'GAME_CREATION_FEE', 
-                'RAFFLE_CREATION_FEE'
-            ]
-        )
-        .filter(chart_date_filter)
-        .annotate(day=TruncDay('created_at'))
-        .values('day')
-        .annotate(total=Sum('amount'))
-        .order_by('day')
-    )
+    revenue_by_day = daily_totals(chart_start_date, range_end, types=platform_revenue_types)
 
     # Usuarios registrados por día
     users_by_day = (
@@ -3638,18 +3423,10 @@ def _get_admin_dashboard_context_mejorado(start_date=None, end_date=None):
     )
 
     # Transacciones por tipo
-    transactions_by_type = (
-        Transaction.objects.filter(date_filter)
-        .values('transaction_type')
-        .annotate(
-            count=Count('id'),
-            total_amount=Sum('amount')
-        )
-        .order_by('-total_amount')
-    )
+    transactions_by_type = ledger.by_type()
 
     # Convertir a listas de forma eficiente (evaluar querysets una sola vez)
-    revenue_by_day_list = list(revenue_by_day)
+    revenue_by_day_list = revenue_by_day
     users_by_day_list = list(users_by_day)
     
     revenue_labels = [r['day'].strftime('%Y-%m-%d') for r in revenue_by_day_list]
@@ -3807,7 +3584,7 @@ def _get_admin_dashboard_context_mejorado(start_date=None, end_date=None):
         'revenue_data': json.dumps(revenue_data),
         'user_labels': json.dumps(user_labels),
         'user_data': json.dumps(user_data),
-        'transactions_by_type': list(transactions_by_type),
+        'transactions_by_type': transactions_by_type,
         
         # Tablas de Datos
         'top_players': top_players,
@@ -3829,12 +3606,14 @@ def _get_organizer_dashboard_context_mejorado(request):
     con métricas específicas para organizadores.
     """
     organizer = request.user
+    # Contadores y montos acumulados desde OrganizerStats (utils.organizer_stats)
+    stats = get_organizer_stats(organizer.id)
     
     # ===== MÉTRICAS DE RENDIMIENTO PERSONAL =====
     
     # Juegos y Rifas Creados
-    total_games = Game.objects.filter(organizer=organizer).count()
-    total_raffles = Raffle.objects.filter(organizer=organizer).count()
+    total_games = stats.games_created
+    total_raffles = stats.raffles_created
     
     # Juegos y Rifas Activos
     active_games = Game.objects.filter(
@@ -3848,43 +3627,22 @@ def _get_organizer_dashboard_context_mejorado(request):
     ).count()
     
     # Juegos y Rifas Completados
-    completed_games = Game.objects.filter(
-        organizer=organizer,
-        is_finished=True
-    ).count()
-    completed_raffles = Raffle.objects.filter(
-        organizer=organizer,
-        status='FINISHED'
-    ).count()
+    completed_games = stats.games_completed
+    completed_raffles = stats.raffles_completed
 
     # ===== MÉTRICAS FINANCIERAS =====
     
     # Ingresos Netos de Eventos (después de comisiones)
-    total_net_revenue_from_events = Transaction.objects.filter(
-        user=organizer,
-        transaction_type='ORGANIZER_REVENUE',
-        amount__gt=0
-    ).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
+    total_net_revenue_from_events = stats.net_revenue
     
     # Comisiones Pagadas a la Plataforma
-    total_commissions = Transaction.objects.filter(
-        related_game__organizer=organizer,
-        transaction_type='PLATFORM_COMMISSION'
-    ).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
+    total_commissions = stats.commissions_paid
     
-    # Costos de Creación (tarifas de entrada)
-    creation_fees = Transaction.objects.filter(
-        user=organizer,
-        transaction_type__in=['GAME_CREATION_FEE', 'RAFFLE_CREATION_FEE'],
-        amount__lt=0
-    ).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
-    creation_fees = abs(creation_fees)  # Convertir a positivo
+    # Costos de Creación (tarifas de entrada, en positivo)
+    creation_fees = stats.creation_fees
     
     # Premios Pagados por el organizador
-    prizes_paid_by_organizer = Transaction.objects.filter(
-        related_game__organizer=organizer,
-        transaction_type='PRIZE'
-    ).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
+    prizes_paid_by_organizer = stats.prizes_paid
     
     # Ganancia Neta del Organizador
     net_profit = total_net_revenue_from_events - creation_fees
@@ -3896,28 +3654,10 @@ def _get_organizer_dashboard_context_mejorado(request):
     # ===== MÉTRICAS DE PARTICIPACIÓN =====
     
     # Participación Promedio en Juegos
-    games_with_players = Game.objects.filter(
-        organizer=organizer,
-        is_finished=True
-    ).annotate(
-        player_count=Count('player')
-    )
-    
-    avg_game_participation = games_with_players.aggregate(
-        avg_players=Avg('player_count')
-    )['avg_players'] or 0
+    avg_game_participation = stats.completed_game_players / completed_games if completed_games else 0
     
     # Participación Promedio en Rifas
-    raffles_with_tickets = Raffle.objects.filter(
-        organizer=organizer,
-        status='FINISHED'
-    ).annotate(
-        ticket_count=Count('tickets')
-    )
-    
-    avg_raffle_participation = raffles_with_tickets.aggregate(
-        avg_tickets=Avg('ticket_count')
-    )['avg_tickets'] or 0
+    avg_raffle_participation = stats.completed_raffle_tickets / completed_raffles if completed_raffles else 0
     
     # Ingresos Promedio por Evento
     total_events = completed_games + completed_raffles
@@ -3943,7 +3683,7 @@ def _get_organizer_dashboard_context_mejorado(request):
     # ===== ANÁLISIS DE RENDIMIENTO =====
     
     # Tasa de Finalización de Juegos
-    total_games_created = Game.objects.filter(organizer=organizer).count()
+    total_games_created = total_games
     completion_rate = (completed_games / total_games_created * 100) if total_games_created > 0 else 0
     
     # ROI (Return on Investment)
@@ -3971,7 +3711,7 @@ def _get_organizer_dashboard_context_mejorado(request):
     total_potential_revenue = potential_revenue_games + potential_revenue_raffles
     
     # Estimación de comisiones a pagar
-    percentage_settings = PercentageSettings.objects.first()
+    percentage_settings = get_percentage_settings()
     commission_rate = percentage_settings.platform_commission if percentage_settings else Decimal('10.00')
     estimated_commissions = total_potential_revenue * (commission_rate / 100)
     estimated_net_revenue = total_potential_revenue - estimated_commissions
@@ -4053,6 +3793,25 @@ def _get_organizer_dashboard_context_mejorado(request):
 
 # MODIFICAR FUNCIONES EXISTENTES PARA USAR LAS MEJORADAS
 
+AI_ANALYSIS_REFRESH_SECONDS = 600
+
+
+def _gemini_dashboard_analysis(start_date=None, end_date=None):
+    """
+    Último análisis de Gemini del dashboard para ese rango de fechas, o None. Encola
+    el cálculo una vez por ventana de AI_ANALYSIS_REFRESH_SECONDS (idempotency key).
+    """
+    if not ai_assistant.is_available():
+        return None
+    window = int(time.time() // AI_ANALYSIS_REFRESH_SECONDS)
+    base_key = f"ai-dashboard:{start_date or ''}:{end_date or ''}"
+    enqueue('ai.dashboard_analysis', {
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat() if end_date else None,
+    }, idempotency_key=f"{base_key}:{window}")
+    return job_result(f"{base_key}:{window}") or job_result(f"{base_key}:{window - 1}")
+
+
 # Modificar admin_dashboard
 @staff_member_required
 def admin_dashboard(request):
@@ -4076,51 +3835,16 @@ def admin_dashboard(request):
 
     context = _get_admin_dashboard_context_mejorado(start_date, end_date)
     
-    # Usar asistente local (siempre funciona, sin APIs externas)
-    # Solo usar Gemini si está explícitamente configurado y funcionando
+    # El análisis de Gemini se calcula en segundo plano (trabajo ai.dashboard_analysis);
+    # mientras no esté listo se muestra el del asistente local
     try:
-        # Verificar si Gemini está realmente disponible y funcionando
-        gemini_available = False
-        if ai_assistant.is_available():
-            try:
-                # Intentar una llamada rápida para verificar que funciona
-                test_context = {'test': True}
-                test_result = ai_assistant.analyze_dashboard_metrics(test_context)
-                if test_result and test_result.get('source') != 'quota_error':
-                    gemini_available = True
-            except:
-                gemini_available = False
-        
-        if gemini_available:
-            # Usar IA real (Gemini) solo si está funcionando
-            try:
-                ai_analysis = ai_assistant.analyze_dashboard_metrics(context)
-                context['ai_analysis'] = ai_analysis
-                context['ai_available'] = True
-                context['ai_type'] = 'gemini'
-            except:
-                # Si falla, usar asistente local
-                ai_analysis = smart_assistant.analyze_dashboard_metrics(context)
-                context['ai_analysis'] = ai_analysis
-                context['ai_available'] = True
-                context['ai_type'] = 'local'
-        else:
-            # Usar asistente local (siempre funciona)
-            ai_analysis = smart_assistant.analyze_dashboard_metrics(context)
-            context['ai_analysis'] = ai_analysis
-            context['ai_available'] = True
-            context['ai_type'] = 'local'
+        ai_analysis = _gemini_dashboard_analysis(start_date, end_date)
+        context['ai_type'] = 'gemini' if ai_analysis else 'local'
+        context['ai_analysis'] = ai_analysis or smart_assistant.analyze_dashboard_metrics(context)
+        context['ai_available'] = True
     except Exception as e:
         logger.error(f"Error en análisis de IA: {str(e)}")
-        # Fallback final al asistente local
-        try:
-            ai_analysis = smart_assistant.analyze_dashboard_metrics(context)
-            context['ai_analysis'] = ai_analysis
-            context['ai_available'] = True
-            context['ai_type'] = 'local'
-        except Exception as e2:
-            logger.error(f"Error en asistente local: {str(e2)}")
-            context['ai_available'] = False
+        context['ai_available'] = False
     
     return render(request, 'bingo_app/admin/dashboard.html', context)
 
@@ -4176,10 +3900,10 @@ def user_manual(request):
 @login_required
 def launch_promotions(request):
     """Página de promociones de lanzamiento"""
-    from .models import LaunchPromotion, UserPromotion, LaunchAchievement, UserAchievement
+    from .models import LaunchPromotion, LaunchAchievement, UserAchievement
     
     # Verificar si el sistema de promociones está habilitado
-    settings_obj = PercentageSettings.objects.first()
+    settings_obj = get_percentage_settings()
     if not settings_obj or not settings_obj.promotions_enabled:
         messages.error(request, 'El sistema de promociones está temporalmente deshabilitado.')
         return redirect('profile')
@@ -4214,7 +3938,7 @@ def claim_promotion(request, promotion_id):
     from django.contrib import messages
     
     # Verificar si el sistema de promociones está habilitado
-    settings_obj = PercentageSettings.objects.first()
+    settings_obj = get_percentage_settings()
     if not settings_obj or not settings_obj.promotions_enabled:
         messages.error(request, 'El sistema de promociones está temporalmente deshabilitado.')
         return redirect('profile')
@@ -4259,7 +3983,7 @@ def referral_system(request):
     from django.contrib import messages
     
     # Verificar si el sistema de referidos está habilitado
-    settings_obj = PercentageSettings.objects.first()
+    settings_obj = get_percentage_settings()
     if not settings_obj or not settings_obj.referral_system_enabled:
         messages.error(request, 'El sistema de referidos está temporalmente deshabilitado.')
         return redirect('profile')
@@ -4637,7 +4361,7 @@ def videocall_popup(request):
 def my_bingo_tickets(request):
     """Vista para mostrar los tickets de bingo del usuario"""
     # Verificar si el sistema de tickets está habilitado
-    ticket_settings = BingoTicketSettings.get_settings()
+    ticket_settings = get_ticket_settings()
     if not ticket_settings.is_system_active:
         messages.error(request, 'El sistema de tickets de bingo está temporalmente deshabilitado.')
         return redirect('profile')
@@ -4664,7 +4388,7 @@ def my_bingo_tickets(request):
 def daily_bingo_schedule(request):
     """Vista para mostrar el horario de bingos diarios"""
     # Verificar si el sistema de tickets está habilitado
-    ticket_settings = BingoTicketSettings.get_settings()
+    ticket_settings = get_ticket_settings()
     if not ticket_settings.is_system_active:
         messages.error(request, 'El sistema de bingos diarios está temporalmente deshabilitado.')
         return redirect('profile')
@@ -4692,7 +4416,7 @@ def daily_bingo_schedule(request):
 def join_daily_bingo(request, schedule_id):
     """Vista para unirse a un bingo diario usando un ticket"""
     schedule = get_object_or_404(DailyBingoSchedule, id=schedule_id)
-    ticket_settings = BingoTicketSettings.get_settings()
+    ticket_settings = get_ticket_settings()
     
     if not ticket_settings.is_system_active:
         messages.error(request, "El sistema de tickets está desactivado.")
@@ -4955,35 +4679,17 @@ def ai_analysis_api(request):
     try:
         context = _get_admin_dashboard_context_mejorado(None, None)
         
-        # Intentar usar IA real (Gemini) primero
-        if ai_assistant.is_available():
-            try:
-                analysis = ai_assistant.analyze_dashboard_metrics(context)
-                return JsonResponse({
-                    'success': True,
-                    'analysis': analysis,
-                    'available': True,
-                    'ai_type': 'gemini'
-                })
-            except Exception as e:
-                logger.warning(f"Error con Gemini, usando asistente local: {str(e)}")
-                # Fallback a asistente local
-                analysis = smart_assistant.analyze_dashboard_metrics(context)
-                return JsonResponse({
-                    'success': True,
-                    'analysis': analysis,
-                    'available': True,
-                    'ai_type': 'local'
-                })
-        else:
-            # Usar asistente local
+        # Análisis de Gemini si ya está calculado; si no, el del asistente local
+        analysis = _gemini_dashboard_analysis()
+        ai_type = 'gemini' if analysis else 'local'
+        if not analysis:
             analysis = smart_assistant.analyze_dashboard_metrics(context)
-            return JsonResponse({
-                'success': True,
-                'analysis': analysis,
-                'available': True,
-                'ai_type': 'local'
-            })
+        return JsonResponse({
+            'success': True,
+            'analysis': analysis,
+            'available': True,
+            'ai_type': ai_type
+        })
     except Exception as e:
         logger.error(f"Error en análisis de IA: {str(e)}")
         return JsonResponse({
@@ -4996,7 +4702,7 @@ def ai_analysis_api(request):
 def admin_ticket_stats(request):
     """Vista de estadísticas de tickets para administradores"""
     from django.db.models import Count, Q
-    from datetime import datetime, timedelta
+    from datetime import timedelta
     
     # Estadísticas generales
     total_tickets = BingoTicket.objects.count()
@@ -5097,7 +4803,7 @@ def admin_accounts_receivable(request):
         settings_obj = PercentageSettings.objects.create()
     
     # Listar todas las cuentas por cobrar con annotations para evitar consultas N+1
-    from django.db.models import Sum, F
+    from django.db.models import Sum
     accounts = AccountsReceivable.objects.all().select_related('debtor', 'organizer').annotate(
         total_paid_calculated=Sum('payments__amount')
     ).prefetch_related('payments')
@@ -5137,7 +4843,7 @@ def organizer_accounts_receivable(request):
         return redirect('lobby')
     
     # Verificar si el módulo está activado
-    settings_obj = PercentageSettings.objects.first()
+    settings_obj = get_percentage_settings()
     if not settings_obj or not settings_obj.accounts_receivable_enabled:
         messages.error(request, 'El módulo de Cuentas por Cobrar está desactivado.')
         return redirect('organizer_dashboard')
@@ -5182,7 +4888,7 @@ def create_account_receivable(request):
         return JsonResponse({'success': False, 'error': 'No tienes permisos para realizar esta acción.'}, status=403)
     
     # Verificar si el módulo está activado
-    settings_obj = PercentageSettings.objects.first()
+    settings_obj = get_percentage_settings()
     if not settings_obj or not settings_obj.accounts_receivable_enabled:
         return JsonResponse({'success': False, 'error': 'El módulo está desactivado.'}, status=403)
     
@@ -5919,8 +5625,6 @@ def franchise_owner_toggle_bank_account(request, account_id):
 # ============================================================================
 
 from .decorators import dice_module_required, super_admin_required
-from .utils.dice_module import is_dice_module_enabled, can_user_access_dice_module
-from datetime import timedelta
 
 
 @login_required
@@ -5930,7 +5634,7 @@ def dice_lobby(request):
     Lobby principal del módulo de dados.
     Muestra partidas disponibles y permite crear/unirse a partidas.
     """
-    settings = DiceModuleSettings.get_settings()
+    settings = get_dice_settings()
     
     # Verificar si el usuario tiene una partida activa/en curso PRIMERO
     active_game = DiceGame.objects.filter(
@@ -6057,51 +5761,16 @@ def join_dice_queue(request):
             status='WAITING'
         )
         
-        # Procesar matchmaking (intentar encontrar partida)
-        from .tasks import process_matchmaking_queue
-        result = process_matchmaking_queue()
-        
-        if result:
-            # Partida encontrada - verificar que el usuario esté en la partida usando DicePlayer
-            from .models import DicePlayer
-            result.refresh_from_db()  # Asegurar que la partida esté actualizada
-            
-            player = DicePlayer.objects.filter(
-                user=request.user,
-                game=result
-            ).first()
-            
-            if player:
-                print(f"✅ [JOIN_QUEUE] Usuario {request.user.username} está en partida {result.room_code}")
-                return JsonResponse({
-                    'success': True,
-                    'status': 'matched',
-                    'room_code': result.room_code,
-                    'message': '¡Partida encontrada!'
-                })
-            else:
-                # El usuario no está en la partida (puede ser un problema de timing)
-                print(f"⚠️ [JOIN_QUEUE] Usuario {request.user.username} NO está en partida {result.room_code}")
-                print(f"   Jugadores en partida: {[p.user.username for p in result.dice_players.all()]}")
-                
-                # Esperar un momento y verificar de nuevo
-                import time
-                time.sleep(0.5)
-                player = DicePlayer.objects.filter(
-                    user=request.user,
-                    game=result
-                ).first()
-                
-                if player:
-                    print(f"✅ [JOIN_QUEUE] Usuario encontrado después de esperar")
-                    return JsonResponse({
-                        'success': True,
-                        'status': 'matched',
-                        'room_code': result.room_code,
-                        'message': '¡Partida encontrada!'
-                    })
-                else:
-                    print(f"❌ [JOIN_QUEUE] Usuario aún no está en partida después de esperar")
+        # El matchmaker forma el trío al entrar el tercer jugador y lo anuncia con
+        # 'match_found' (utils.dice_matchmaking); en modo memoria la partida sale aquí mismo
+        dice_game = publish_join(queue_entry)
+        if dice_game and dice_game.dice_players.filter(user=request.user).exists():
+            return JsonResponse({
+                'success': True,
+                'status': 'matched',
+                'room_code': dice_game.room_code,
+                'message': '¡Partida encontrada!'
+            })
         
         # Esperando más jugadores
         return JsonResponse({
@@ -6137,6 +5806,7 @@ def leave_dice_queue(request):
         if queue_entry:
             queue_entry.status = 'TIMEOUT'
             queue_entry.save()
+            publish_leave(request.user.id)
         
         return JsonResponse({
             'success': True,
@@ -6153,8 +5823,9 @@ def leave_dice_queue(request):
 @dice_module_required
 def dice_queue_status(request):
     """
-    Verifica el estado de la cola del usuario y partidas activas.
-    También ejecuta el proceso de matchmaking para encontrar partidas.
+    Verifica el estado de la cola del usuario y partidas activas. Solo lectura: las
+    partidas las forma el matchmaker y se anuncian con 'match_found'; el lobby
+    consulta esta vista como respaldo.
     """
     try:
         # PRIMERO: Verificar si el usuario tiene una partida activa/en curso
@@ -6173,96 +5844,12 @@ def dice_queue_status(request):
                 'message': 'Tienes una partida activa'
             })
         
-        # SEGUNDO: Verificar si está en cola (necesario antes de ejecutar matchmaking)
+        # SEGUNDO: Verificar si está en cola
         queue_entry = DiceMatchmakingQueue.objects.filter(
             user=request.user,
             status='WAITING'
         ).first()
         
-        # TERCERO: Ejecutar proceso de matchmaking para intentar encontrar partida
-        # Esto es importante porque puede haber 3 usuarios esperando
-        from .tasks import process_matchmaking_queue
-        
-        # Verificar cuántos jugadores hay esperando antes de ejecutar matchmaking
-        # IMPORTANTE: Usar la misma lógica de exclusión que el matchmaking
-        from django.db.models import Exists, OuterRef
-        active_games_pre = DiceGame.objects.filter(
-            dice_players__user=OuterRef('user'),
-            status__in=['WAITING', 'SPINNING', 'PLAYING']
-        ).exclude(status='FINISHED')
-        
-        waiting_count = DiceMatchmakingQueue.objects.filter(status='WAITING').exclude(
-            Exists(active_games_pre)
-        ).count()
-        
-        same_price_count_pre = 0
-        if queue_entry:
-            same_price_count_pre = DiceMatchmakingQueue.objects.filter(
-                status='WAITING',
-                entry_price=queue_entry.entry_price
-            ).exclude(
-                Exists(active_games_pre)
-            ).count()
-        
-        print(f"🔄 [QUEUE_STATUS] Ejecutando matchmaking... Total válidos en cola: {waiting_count}, Mismo precio válidos: {same_price_count_pre}")
-        
-        try:
-            matchmaking_result = process_matchmaking_queue()
-        except Exception as e:
-            print(f"❌ [QUEUE_STATUS] Error ejecutando matchmaking: {e}")
-            import traceback
-            traceback.print_exc()
-            matchmaking_result = None
-        
-        # Si se creó una partida, verificar si el usuario está en ella
-        if matchmaking_result:
-            print(f"✅ [QUEUE_STATUS] Matchmaking creó partida: {matchmaking_result.room_code}")
-            
-            # Refrescar desde la base de datos para asegurar que los jugadores estén guardados
-            matchmaking_result.refresh_from_db()
-            
-            # Verificar directamente con DicePlayer
-            player = DicePlayer.objects.filter(
-                user=request.user,
-                game=matchmaking_result
-            ).first()
-            
-            if player:
-                print(f"✅ [QUEUE_STATUS] Usuario {request.user.username} está en partida {matchmaking_result.room_code}")
-                return JsonResponse({
-                    'status': 'matched',
-                    'room_code': matchmaking_result.room_code,
-                    'message': '¡Partida encontrada!'
-                })
-            else:
-                print(f"⚠️ [QUEUE_STATUS] Usuario {request.user.username} NO está en partida {matchmaking_result.room_code}")
-                print(f"   Jugadores en partida: {[p.user.username for p in matchmaking_result.dice_players.all()]}")
-                
-                # Esperar un momento y verificar de nuevo (problema de timing)
-                import time
-                time.sleep(0.5)
-                player = DicePlayer.objects.filter(
-                    user=request.user,
-                    game=matchmaking_result
-                ).first()
-                
-                if player:
-                    print(f"✅ [QUEUE_STATUS] Usuario encontrado después de esperar")
-                    return JsonResponse({
-                        'status': 'matched',
-                        'room_code': matchmaking_result.room_code,
-                        'message': '¡Partida encontrada!'
-                    })
-        else:
-            print(f"⏳ [QUEUE_STATUS] Matchmaking no creó partida (puede que no haya suficientes jugadores válidos)")
-        
-        # CUARTO: Verificar si está en cola (ya se verificó arriba, pero verificar de nuevo por si cambió)
-        if not queue_entry:
-            queue_entry = DiceMatchmakingQueue.objects.filter(
-                user=request.user,
-                status='WAITING'
-            ).first()
-        
         if not queue_entry:
             # Verificar si tiene una entrada MATCHED (partida recién creada)
             matched_entry = DiceMatchmakingQueue.objects.filter(
@@ -6289,57 +5876,10 @@ def dice_queue_status(request):
                 'status': 'not_in_queue'
             })
         
-        print(f"⏳ [QUEUE_STATUS] Usuario {request.user.username} en cola, estado: WAITING")
-        
-        # IMPORTANTE: Hacer el conteo DESPUÉS del matchmaking para reflejar el estado real
-        # Usar la MISMA consulta que process_matchmaking_queue para contar
-        # Esto asegura que el conteo sea consistente con lo que el matchmaking puede usar
-        from django.db.models import Exists, OuterRef
-        
-        # Usar exactamente la misma lógica que process_matchmaking_queue
-        active_games = DiceGame.objects.filter(
-            dice_players__user=OuterRef('user'),
-            status__in=['WAITING', 'SPINNING', 'PLAYING']
-        ).exclude(status='FINISHED')
-        
-        # Contar usando la misma consulta que el matchmaking (DESPUÉS de ejecutarlo)
-        valid_waiting_query = DiceMatchmakingQueue.objects.filter(
+        same_price_count = DiceMatchmakingQueue.objects.filter(
             status='WAITING',
             entry_price=queue_entry.entry_price
-        ).exclude(
-            Exists(active_games)
-        )
-        
-        same_price_count = valid_waiting_query.count()
-        
-        # Logging detallado para debugging
-        all_waiting_same_price = DiceMatchmakingQueue.objects.filter(
-            status='WAITING',
-            entry_price=queue_entry.entry_price
-        )
-        all_count = all_waiting_same_price.count()
-        excluded_count = all_count - same_price_count
-        
-        print(f"📊 [QUEUE_STATUS] Precio ${queue_entry.entry_price} (DESPUÉS del matchmaking):")
-        print(f"   - Total en WAITING: {all_count}")
-        print(f"   - Con partida activa (excluidos): {excluded_count}")
-        print(f"   - Válidos para matchmaking: {same_price_count}")
-        
-        # Mostrar detalles de los jugadores válidos
-        valid_list = list(valid_waiting_query[:5])
-        for entry in valid_list:
-            print(f"   ✓ {entry.user.username} (ID: {entry.id})")
-        
-        # Mostrar detalles de los jugadores excluidos
-        if excluded_count > 0:
-            excluded_entries = all_waiting_same_price.filter(Exists(active_games))
-            for entry in excluded_entries[:5]:
-                active_game = DiceGame.objects.filter(
-                    dice_players__user=entry.user,
-                    status__in=['WAITING', 'SPINNING', 'PLAYING']
-                ).exclude(status='FINISHED').first()
-                if active_game:
-                    print(f"   ⚠️ {entry.user.username} excluido - tiene partida activa: {active_game.room_code} (estado: {active_game.status})")
+        ).count()
         
         return JsonResponse({
             'status': 'waiting',
@@ -268,6 +268,34 @@ CHANNEL_LAYERS = {
         },
     },
 }
+REDIS_URL = redis_url
+
+# Estado vivo de las partidas de bingo: 'redis' (compartido entre procesos) o 'memory' (un solo proceso)
+BINGO_LIVE_STATE_BACKEND = os.environ.get("BINGO_LIVE_STATE_BACKEND", "redis" if redis_url else "memory")
+# Cada cuántos números llamados se persiste el estado vivo en Game
+BINGO_LIVE_STATE_FLUSH_EVERY = int(os.environ.get("BINGO_LIVE_STATE_FLUSH_EVERY", "5"))
+# Eventos del matchmaking de dados: 'redis' (worker run_dice_matchmaker) o 'memory' (en el proceso web)
+BINGO_DICE_MATCHMAKING_BACKEND = os.environ.get("BINGO_DICE_MATCHMAKING_BACKEND", BINGO_LIVE_STATE_BACKEND)
+# Segundos entre reconstrucciones de las colas desde la base (matchmaker y trabajo dice.matchmaking_resync)
+BINGO_DICE_MATCHMAKING_RESYNC_INTERVAL = int(os.environ.get("BINGO_DICE_MATCHMAKING_RESYNC_INTERVAL", "30"))
+# Cada cuántos segundos revisa cada proceso si cambió alguna configuración (utils.settings_cache)
+BINGO_SETTINGS_CHECK_SECONDS = float(os.environ.get("BINGO_SETTINGS_CHECK_SECONDS", "2"))
+# Notificaciones del menú de la campana y segundos que se cachea el contador de no leídas
+BINGO_NOTIFICATION_INBOX_LIMIT = int(os.environ.get("BINGO_NOTIFICATION_INBOX_LIMIT", "20"))
+BINGO_NOTIFICATION_COUNT_CACHE_TIMEOUT = int(os.environ.get("BINGO_NOTIFICATION_COUNT_CACHE_TIMEOUT", "300"))
+# A partir de cuántos cartones se evalúan ganadores con NumPy (0 = desactivado)
+BINGO_VECTORIZED_MIN_CARDS = int(os.environ.get("BINGO_VECTORIZED_MIN_CARDS", "1000"))
+# Llamada automática de números (utils.auto_call_scheduler): 'worker' (proceso autocall) o 'inline' (en el proceso web)
+BINGO_AUTO_CALL_MODE = os.environ.get("BINGO_AUTO_CALL_MODE", "worker" if redis_url else "inline")
+# Trabajos en segundo plano (utils.jobs): 'worker' (run_job_worker) o 'inline' (en el proceso web tras el commit)
+BINGO_JOBS_MODE = os.environ.get("BINGO_JOBS_MODE", "worker" if redis_url else "inline")
+# Segundos entre actualizaciones de los rollups del libro (trabajo periódico ledger.rollups)
+BINGO_LEDGER_ROLLUP_INTERVAL = int(os.environ.get("BINGO_LEDGER_ROLLUP_INTERVAL", "60"))
+# Trabajos simultáneos por cola, entre todos los workers
+BINGO_JOB_QUEUES = {'default': 2, 'email': 2, 'ai': 1}
+# Segundos tras los que un trabajo en ejecución se da por perdido, y espera base entre reintentos
+BINGO_JOB_LEASE_SECONDS = int(os.environ.get("BINGO_JOB_LEASE_SECONDS", "300"))
+BINGO_JOB_RETRY_BASE_SECONDS = int(os.environ.get("BINGO_JOB_RETRY_BASE_SECONDS", "5"))
 
 
 